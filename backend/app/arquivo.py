@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+
+import zstandard
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.database import AsyncSessionLocal
+from app.models import RespostaEscavador
+from app.offload import em_thread
+from app.persistencia import salvar_processos_em_lote
+from app.versoes import confirmar
+
+logger = logging.getLogger(__name__)
+
+NIVEL_ZSTD = 3
+# Quantos CNJs são lidos do arquivo e regravados por transação no replay
+LOTE_REPLAY = 500
+
+# Um ZstdCompressor não pode ser usado por duas threads ao mesmo tempo: um por thread do pool
+_local = threading.local()
+_descompressor = zstandard.ZstdDecompressor()
+
+
+def compactar(payload: dict) -> tuple[str, int, bytes]:
+    """Serializa o payload em JSON canônico e retorna (sha256, tamanho original, bytes zstd)."""
+    compressor = getattr(_local, "compressor", None)
+    if compressor is None:
+        compressor = _local.compressor = zstandard.ZstdCompressor(level=NIVEL_ZSTD)
+    bruto = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(bruto).hexdigest(), len(bruto), compressor.compress(bruto)
+
+
+def descompactar(payload_zstd: bytes) -> dict:
+    return json.loads(_descompressor.decompress(payload_zstd))
+
+
+def _tribunal(payload: dict) -> str | None:
+    return (payload.get("unidade_origem") or {}).get("tribunal_sigla")
+
+
+def _linhas_arquivo(resultados: list, agora: datetime) -> list:
+    """Linhas de escavador_respostas, uma por (numero_cnj, hash) (a última do lote)."""
+    linhas = {}
+    for numero, payload in resultados:
+        hash_conteudo, tamanho, dados = compactar(payload)
+        linhas.pop((numero, hash_conteudo), None)
+        linhas[(numero, hash_conteudo)] = {
+            "numero_cnj": numero,
+            "tribunal_sigla": _tribunal(payload),
+            "obtido_em": agora,
+            "hash_conteudo": hash_conteudo,
+            "tamanho_original": tamanho,
+            "payload_zstd": dados,
+        }
+    return list(linhas.values())
+
+
+async def arquivar_respostas(resultados: list):
+    """
+    Guarda as respostas brutas [(numero_cnj, payload)] no arquivo.
+
+    O conteúdo é endereçado por hash: a mesma resposta do mesmo CNJ só é
+    gravada uma vez, não importa quantas vezes tenha sido consultada. Uma
+    resposta repetida só atualiza `obtido_em`, para que volte a ser a mais
+    recente do CNJ (A, B e A de novo: o replay usa A).
+    """
+    if not resultados:
+        return
+    # Serializar e compactar um lote inteiro seguraria o event loop
+    linhas = await em_thread(_linhas_arquivo, resultados, datetime.now(timezone.utc))
+
+    stmt = insert(RespostaEscavador).values(linhas)
+    async with AsyncSessionLocal() as session:
+        # Com repetidos no mesmo INSERT, o ON CONFLICT DO UPDATE falharia: o lote já vem sem eles
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["numero_cnj", "hash_conteudo"],
+                set_={"obtido_em": stmt.excluded.obtido_em},
+            )
+        )
+        await session.commit()
+
+
+async def carregar_ultimas_respostas(session, numeros_cnj: list) -> dict:
+    """Retorna {numero_cnj: payload} com a resposta arquivada mais recente de cada CNJ."""
+    if not numeros_cnj:
+        return {}
+    result = await session.execute(
+        select(RespostaEscavador.numero_cnj, RespostaEscavador.payload_zstd)
+        .where(RespostaEscavador.numero_cnj.in_(numeros_cnj))
+        .distinct(RespostaEscavador.numero_cnj)
+        # Respostas diferentes do mesmo lote têm o mesmo obtido_em: vale a inserida por último
+        .order_by(RespostaEscavador.numero_cnj, RespostaEscavador.obtido_em.desc(), RespostaEscavador.id.desc())
+    )
+    return {numero: descompactar(dados) for numero, dados in result.all()}
+
+
+async def reprocessar_arquivo(tribunal_sigla: str | None = None, atualizar_existentes: bool = True) -> dict:
+    """
+    Reconstrói as tabelas relacionais a partir do arquivo, sem chamar a API.
+
+    Percorre os CNJs arquivados em ordem (paginação por chave), usando a
+    resposta mais recente de cada um. Com `atualizar_existentes=True` os
+    processos já existentes são atualizados com o mapeamento atual.
+    """
+    ultimo_cnj = ""
+    total = 0
+    inicio = datetime.now(timezone.utc)
+    while True:
+        async with AsyncSessionLocal() as session:
+            stmt = (
+                select(RespostaEscavador.numero_cnj)
+                .where(RespostaEscavador.numero_cnj > ultimo_cnj)
+                .distinct()
+                .order_by(RespostaEscavador.numero_cnj)
+                .limit(LOTE_REPLAY)
+            )
+            if tribunal_sigla:
+                stmt = stmt.where(RespostaEscavador.tribunal_sigla == tribunal_sigla)
+            numeros = (await session.execute(stmt)).scalars().all()
+            if not numeros:
+                break
+
+            payloads = await carregar_ultimas_respostas(session, numeros)
+            await salvar_processos_em_lote(session, list(payloads.values()), atualizar_existentes=atualizar_existentes)
+            await confirmar(session)
+
+        ultimo_cnj = numeros[-1]
+        total += len(numeros)
+        logger.info(f"Replay: {total} CNJs regravados (último {ultimo_cnj})")
+
+    duracao = (datetime.now(timezone.utc) - inicio).total_seconds()
+    return {"cnjs_regravados": total, "duracao_segundos": round(duracao, 1)}
+
+
+if __name__ == "__main__":
+    # Uso: python -m app.arquivo [--tribunal TJSP] [--somente-novos]
+    parser = argparse.ArgumentParser(description="Regrava as tabelas a partir do arquivo de respostas do Escavador.")
+    parser.add_argument("--tribunal", help="Sigla do tribunal (padrão: todos)")
+    parser.add_argument("--somente-novos", action="store_true", help="Não regrava processos que já existem")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(asyncio.run(reprocessar_arquivo(args.tribunal, atualizar_existentes=not args.somente_novos)))
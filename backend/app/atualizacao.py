@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+from sqlalchemy import func, or_, select, update
+
+from app.database import AsyncSessionLocal
+from app.models import Processo
+from app.worker import processar_lote
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Configuração da atualização incremental
+LIMIAR_DIAS = int(os.getenv("ATUALIZACAO_LIMIAR_DIAS", "30"))
+LOTE_ATUALIZACAO = int(os.getenv("ATUALIZACAO_LOTE", "200"))
+INTERVALO_SEGUNDOS = float(os.getenv("ATUALIZACAO_INTERVALO_SEGUNDOS", "300"))
+# Poucas consultas em voo para não disputar a cota com os uploads
+FETCH_WORKERS_ATUALIZACAO = int(os.getenv("ATUALIZACAO_FETCH_WORKERS", "5"))
+ATUALIZACAO_AUTOMATICA = os.getenv("ATUALIZACAO_AUTOMATICA", "false").lower() in ("1", "true", "sim")
+# Depois de n falhas seguidas o processo espera BACKOFF_HORAS * 2^(n-1), até BACKOFF_MAX_HORAS
+BACKOFF_HORAS = float(os.getenv("ATUALIZACAO_BACKOFF_HORAS", "6"))
+BACKOFF_MAX_HORAS = float(os.getenv("ATUALIZACAO_BACKOFF_MAX_HORAS", "720"))
+
+
+def _espera_apos_falhas():
+    """Intervalo (SQL) que um processo com falhas seguidas espera desde a última tentativa."""
+    horas = func.least(BACKOFF_HORAS * func.power(2, func.greatest(Processo.sincronizacao_falhas - 1, 0)), BACKOFF_MAX_HORAS)
+    return func.make_interval(0, 0, 0, 0, 0, 0, horas * 3600)
+
+
+async def selecionar_desatualizados(limiar_dias: int = LIMIAR_DIAS, limite: int = LOTE_ATUALIZACAO,
+                                    tribunal_sigla: str | None = None) -> list:
+    """
+    Retorna os CNJs cuja data_ultima_verificacao ou data_ultima_movimentacao é
+    mais antiga que o limiar e que não foram sincronizados dentro dele.
+    Os sincronizados (ou tentados) há mais tempo vêm primeiro.
+
+    Processos cuja atualização falhou esperam um intervalo que dobra a cada
+    falha seguida; sem isso, como a falha não muda sincronizado_em, eles
+    voltariam no topo de todas as rodadas e tomariam o lugar dos demais.
+    """
+    corte = datetime.now(timezone.utc) - timedelta(days=limiar_dias)
+    stmt = (
+        select(Processo.numero_cnj)
+        .where(
+            or_(Processo.sincronizado_em.is_(None), Processo.sincronizado_em < corte),
+            or_(
+                Processo.data_ultima_verificacao.is_(None),
+                Processo.data_ultima_verificacao < corte,
+                Processo.data_ultima_movimentacao < corte.date(),
+            ),
+            or_(
+                Processo.sincronizacao_falhas == 0,
+                Processo.sincronizacao_tentativa_em.is_(None),
+                Processo.sincronizacao_tentativa_em < func.now() - _espera_apos_falhas(),
+            ),
+        )
+        .order_by(
+            # greatest ignora NULL: nunca tentados nem sincronizados vêm antes
+            func.greatest(Processo.sincronizado_em, Processo.sincronizacao_tentativa_em).asc().nulls_first(),
+            Processo.data_ultima_verificacao.asc().nulls_first(),
+        )
+        .limit(limite)
+    )
+    if tribunal_sigla:
+        stmt = stmt.where(Processo.unidade_origem_tribunal_sigla == tribunal_sigla)
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(stmt)
+        return result.scalars().all()
+
+
+async def atualizar_processos(numeros_cnj: list):
+    """Consulta de novo os CNJs informados e grava o que mudou nos processos e filhos."""
+    if not numeros_cnj:
+        return
+    logger.info(f"Atualizando {len(numeros_cnj)} processos desatualizados")
+    # Conta como falha até o processo ser salvo: uma queda no meio também adia a próxima tentativa
+    await _marcar_processos(
+        numeros_cnj,
+        sincronizacao_tentativa_em=func.now(),
+        sincronizacao_falhas=Processo.sincronizacao_falhas + 1,
+    )
+    await processar_lote(
+        numeros_cnj, registrar=_registrar_salvos, atualizar_existentes=True, fetch_workers=FETCH_WORKERS_ATUALIZACAO
+    )
+
+
+async def _registrar_salvos(estados: list):
+    """Zera as falhas seguidas dos processos salvos (callback `registrar` do pipeline)."""
+    await _marcar_processos([numero for numero, status, _ in estados if status == "salvo"], sincronizacao_falhas=0)
+
+
+async def _marcar_processos(numeros_cnj: list, **valores):
+    if not numeros_cnj:
+        return
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(Processo).where(Processo.numero_cnj.in_(numeros_cnj)).values(**valores))
+        await session.commit()
+
+
+async def loop_atualizacao(limiar_dias: int = LIMIAR_DIAS, lote: int = LOTE_ATUALIZACAO,
+                           intervalo: float = INTERVALO_SEGUNDOS):
+    """Mantém a carteira atualizada em lotes, com uma pausa de `intervalo` segundos entre eles."""
+    while True:
+        try:
+            numeros = await selecionar_desatualizados(limiar_dias, lote)
+            await atualizar_processos(numeros)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Erro na atualização incremental: {e!r}")
+        await asyncio.sleep(intervalo)
@@ -0,0 +1,152 @@
+"""
+Busca aproximada por nome de pessoas (credores, réus...) e advogados.
+
+A busca percorre o cadastro único (app.entidades), não o grafo: cada pessoa
+e cada advogado aparecem uma vez só em `pessoas`/`advogados`, e os vínculos
+(`fontes_pessoas`, `fontes_advogados`) levam aos processos. Envolvidos sem
+CPF/CNPJ e advogados sem CPF nem OAB não estão no cadastro e não são achados.
+
+Os nomes são comparados sem acento e sem caixa, `lower(f_unaccent(nome))`,
+com a similaridade de palavras do pg_trgm (`termo <% nome`): o termo pode ser
+só parte do nome ("banco do brasil" acha "BANCO DO BRASIL S.A."). Os índices
+GIN de trigramas sobre essa mesma expressão (migração 7) atendem o filtro.
+
+Os resultados (um por vínculo: pessoa ou advogado numa fonte de um processo)
+vêm ordenados por similaridade e paginados por keyset: o cursor é a posição
+(similaridade, tipo, id do vínculo) do último resultado, então cada página
+custa o mesmo que a primeira.
+"""
+import base64
+import json
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import REAL, String, cast, func, literal, null, select, tuple_, union_all
+
+from app.models import AdvogadoCadastro, FonteAdvogado, FontePessoa, Pessoa, Processo
+
+load_dotenv()
+
+# Similaridade mínima (0 a 1) para um nome entrar no resultado
+BUSCA_SIMILARIDADE_MINIMA = float(os.getenv("BUSCA_SIMILARIDADE_MINIMA", "0.6"))
+BUSCA_LIMITE_MAXIMO = 200
+# Trigramas precisam de pelo menos 3 caracteres para serem seletivos
+BUSCA_TAMANHO_MINIMO = 3
+
+TIPOS = ("envolvido", "advogado")
+
+
+def _normalizado(expressao):
+    return func.lower(func.f_unaccent(expressao))
+
+
+def codificar_cursor(resultado: dict) -> str:
+    bruto = json.dumps([resultado["similaridade"], resultado["tipo"], resultado["id"]])
+    return base64.urlsafe_b64encode(bruto.encode()).decode()
+
+
+def decodificar_cursor(cursor: str) -> tuple:
+    """Inverso de `codificar_cursor`. Levanta ValueError se o cursor não for válido."""
+    try:
+        similaridade, tipo, id_ = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(similaridade), str(tipo), int(id_)
+    except Exception as e:
+        raise ValueError("Cursor inválido") from e
+
+
+def _consulta_por_tipo(tipo: str, termo, cursor, limite: int, polo: str | None, tribunal_sigla: str | None):
+    if tipo == "envolvido":
+        entidade, vinculo = Pessoa, FontePessoa
+        documento, oab = Pessoa.documento, null()
+        vinculo_entidade, tipo_normalizado = FontePessoa.pessoa_id, FontePessoa.tipo_normalizado
+    else:
+        entidade, vinculo = AdvogadoCadastro, FonteAdvogado
+        documento = AdvogadoCadastro.cpf_digitos
+        oab = AdvogadoCadastro.oab_numero.cast(String) + "/" + AdvogadoCadastro.oab_uf
+        vinculo_entidade, tipo_normalizado = FonteAdvogado.advogado_id, null()
+    nome = _normalizado(entidade.nome)
+    similaridade = func.word_similarity(termo, nome)
+
+    stmt = (
+        select(
+            literal(tipo).label("tipo"),
+            vinculo.id.label("id"),
+            entidade.id.label("entidade_id"),
+            entidade.nome.label("nome"),
+            documento.label("documento"),
+            oab.label("oab"),
+            vinculo.polo.label("polo"),
+            tipo_normalizado.label("tipo_normalizado"),
+            Processo.id.label("processo_id"),
+            Processo.numero_cnj.label("numero_cnj"),
+            Processo.unidade_origem_tribunal_sigla.label("tribunal_sigla"),
+            similaridade.label("similaridade"),
+        )
+        .select_from(entidade)
+        .join(vinculo, vinculo_entidade == entidade.id)
+        .join(Processo, Processo.id == vinculo.processo_id)
+        .where(termo.op("<%")(nome))
+    )
+    if polo:
+        stmt = stmt.where(vinculo.polo == polo)
+    if tribunal_sigla:
+        stmt = stmt.where(Processo.unidade_origem_tribunal_sigla == tribunal_sigla)
+    if cursor:
+        similaridade_cursor, tipo_cursor, id_cursor = cursor
+        stmt = stmt.where(
+            tuple_(similaridade, literal(tipo), vinculo.id)
+            < tuple_(cast(similaridade_cursor, REAL), literal(tipo_cursor), id_cursor)
+        )
+    return stmt.order_by(similaridade.desc(), vinculo.id.desc()).limit(limite).subquery()
+
+
+def consulta_busca(
+    termo: str,
+    *,
+    tipos=TIPOS,
+    cursor: tuple | None = None,
+    limite: int = 50,
+    polo: str | None = None,
+    tribunal_sigla: str | None = None,
+):
+    """
+    Statement da busca: uma consulta por tipo, cada uma já limitada, unidas e
+    reordenadas por (similaridade, tipo, id) decrescentes.
+    """
+    termo_normalizado = _normalizado(literal(termo.strip()))
+    partes = [
+        _consulta_por_tipo(tipo, termo_normalizado, cursor, limite, polo, tribunal_sigla)
+        for tipo in tipos
+    ]
+    uniao = union_all(*(select(parte) for parte in partes)).subquery()
+    return (
+        select(uniao)
+        .order_by(uniao.c.similaridade.desc(), uniao.c.tipo.desc(), uniao.c.id.desc())
+        .limit(limite)
+    )
+
+
+async def buscar_nomes(
+    session,
+    termo: str,
+    *,
+    tipos=TIPOS,
+    cursor: str | None = None,
+    limite: int = 50,
+    polo: str | None = None,
+    tribunal_sigla: str | None = None,
+) -> dict:
+    """Executa a busca e retorna {"resultados": [...], "proximo": cursor da próxima página ou None}."""
+    limite = max(1, min(limite, BUSCA_LIMITE_MAXIMO))
+    posicao = decodificar_cursor(cursor) if cursor else None
+
+    # O operador <% usa o limiar da sessão; set_config(..., true) vale só para esta transação
+    await session.execute(
+        select(func.set_config("pg_trgm.word_similarity_threshold", str(BUSCA_SIMILARIDADE_MINIMA), True))
+    )
+    stmt = consulta_busca(
+        termo, tipos=tipos, cursor=posicao, limite=limite, polo=polo, tribunal_sigla=tribunal_sigla
+    )
+    resultados = [dict(linha) for linha in (await session.execute(stmt)).mappings().all()]
+    proximo = codificar_cursor(resultados[-1]) if len(resultados) == limite else None
+    return {"resultados": resultados, "proximo": proximo}
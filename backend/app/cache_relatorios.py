@@ -0,0 +1,141 @@
+"""
+Cache em disco dos relatórios por tribunal.
+
+Cada arquivo gerado é guardado com a chave (relatório, tribunal, versão dos
+dados do tribunal; ver app.versoes). Enquanto a versão não muda, downloads
+repetidos recebem o mesmo arquivo, sem consultar o grafo; uma gravação no
+tribunal muda a versão e o próximo download gera o relatório de novo.
+
+O ETag da resposta é a própria chave, então um cliente que manda
+If-None-Match com o ETag de um download anterior recebe 304 se nada mudou.
+
+O diretório tem tamanho máximo (RELATORIOS_CACHE_MAX_MB): ao guardar um
+arquivo, versões anteriores do mesmo relatório são removidas e, se ainda passar
+do limite, os arquivos usados há mais tempo (mtime, renovado a cada acerto)
+saem primeiro.
+"""
+import json
+import logging
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RELATORIOS_CACHE_DIR = os.getenv("RELATORIOS_CACHE_DIR", "./cache_relatorios")
+RELATORIOS_CACHE_MAX_MB = int(os.getenv("RELATORIOS_CACHE_MAX_MB", "2048"))
+
+SUFIXO_META = ".json"
+
+
+@dataclass(frozen=True)
+class EntradaCache:
+    caminho: str
+    nome_arquivo: str  # nome sugerido no download
+    media_type: str
+    etag: str
+
+
+def etag(relatorio: str, tribunal_sigla: str, versao: int) -> str:
+    return f'"{relatorio}-{tribunal_sigla}-{versao}"'
+
+
+def etag_confere(if_none_match: str | None, valor: str) -> bool:
+    """Compara o cabeçalho If-None-Match (lista de ETags, fracos ou não, ou *) com o ETag atual."""
+    if not if_none_match:
+        return False
+    candidatos = [c.strip().removeprefix("W/") for c in if_none_match.split(",")]
+    return "*" in candidatos or valor in candidatos
+
+
+def _seguro(texto: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]", "_", texto)
+
+
+class CacheRelatorios:
+    def __init__(self, diretorio: str = RELATORIOS_CACHE_DIR, max_bytes: int = RELATORIOS_CACHE_MAX_MB * 1024 * 1024):
+        self.diretorio = diretorio
+        self.max_bytes = max_bytes
+        self.acertos = 0
+        self.falhas = 0
+
+    def _prefixo(self, relatorio: str, tribunal_sigla: str) -> str:
+        return f"{_seguro(relatorio)}__{_seguro(tribunal_sigla)}__"
+
+    def _caminho(self, relatorio: str, tribunal_sigla: str, versao: int) -> str:
+        return os.path.join(self.diretorio, f"{self._prefixo(relatorio, tribunal_sigla)}{versao}")
+
+    def obter(self, relatorio: str, tribunal_sigla: str, versao: int) -> EntradaCache | None:
+        caminho = self._caminho(relatorio, tribunal_sigla, versao)
+        try:
+            with open(caminho + SUFIXO_META, encoding="utf-8") as f:
+                meta = json.load(f)
+            os.utime(caminho)  # recência para o LRU
+        except (OSError, ValueError):
+            self.falhas += 1
+            return None
+        self.acertos += 1
+        return EntradaCache(caminho, meta["nome_arquivo"], meta["media_type"], etag(relatorio, tribunal_sigla, versao))
+
+    def arquivo_temporario(self, sufixo: str = "") -> str:
+        """Caminho no diretório do cache para gerar o relatório (o os.replace final é atômico)."""
+        os.makedirs(self.diretorio, exist_ok=True)
+        fd, caminho = tempfile.mkstemp(dir=self.diretorio, prefix=".gerando_", suffix=sufixo)
+        os.close(fd)
+        return caminho
+
+    def guardar(
+        self, relatorio: str, tribunal_sigla: str, versao: int, gerado: str, nome_arquivo: str, media_type: str
+    ) -> EntradaCache:
+        """Move o arquivo gerado para o cache e aplica o limite de tamanho."""
+        caminho = self._caminho(relatorio, tribunal_sigla, versao)
+        os.replace(gerado, caminho)
+        with open(caminho + SUFIXO_META, "w", encoding="utf-8") as f:
+            json.dump({"nome_arquivo": nome_arquivo, "media_type": media_type}, f)
+        self._remover_versoes_antigas(relatorio, tribunal_sigla, versao)
+        self._aplicar_limite(manter=caminho)
+        return EntradaCache(caminho, nome_arquivo, media_type, etag(relatorio, tribunal_sigla, versao))
+
+    def _remover(self, caminho: str):
+        for alvo in (caminho + SUFIXO_META, caminho):
+            try:
+                os.remove(alvo)
+            except FileNotFoundError:
+                pass
+
+    def _remover_versoes_antigas(self, relatorio: str, tribunal_sigla: str, versao: int):
+        """Remove só versões menores: uma geração lenta que termina depois não apaga a mais nova."""
+        prefixo = self._prefixo(relatorio, tribunal_sigla)
+        for nome in os.listdir(self.diretorio):
+            if not nome.startswith(prefixo) or nome.endswith(SUFIXO_META):
+                continue
+            sufixo = nome[len(prefixo):]
+            if sufixo.isdigit() and int(sufixo) < versao:
+                self._remover(os.path.join(self.diretorio, nome))
+
+    def _aplicar_limite(self, manter: str):
+        arquivos = []
+        for entrada in os.scandir(self.diretorio):
+            if entrada.is_file() and not entrada.name.startswith(".") and not entrada.name.endswith(SUFIXO_META):
+                info = entrada.stat()
+                arquivos.append((info.st_mtime, info.st_size, entrada.path))
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self.max_bytes:
+                break
+            if caminho == manter:
+                continue
+            logger.info(f"Cache de relatórios cheio: removendo {caminho}")
+            self._remover(caminho)
+            total -= tamanho
+
+    def metricas(self) -> dict:
+        return {"acertos": self.acertos, "falhas": self.falhas}
+
+
+cache_relatorios = CacheRelatorios()
@@ -1,18 +1,69 @@
+import asyncio
 import aiohttp
 import async_timeout
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 import os
 from dotenv import load_dotenv
+from app.rate_limit import limitador_escavador
 
 load_dotenv()
 ESCAVADOR_API_KEY = os.getenv("ESCAVADOR_API_KEY")
-ESCAVADOR_API_BASE = "https://api.escavador.com/api/v2/processos/numero_cnj"
+ESCAVADOR_API_BASE = os.getenv("ESCAVADOR_API_BASE", "https://api.escavador.com/api/v2/processos/numero_cnj")
+TENTATIVAS = int(os.getenv("ESCAVADOR_TENTATIVAS", "4"))
 
 if not ESCAVADOR_API_KEY:
     raise RuntimeError("ESCAVADOR_API_KEY não configurada!")
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10),
-       retry=retry_if_exception_type(Exception))
+# Status que podem dar certo numa nova tentativa; os demais (400, 401, 403,
+# 404, 422...) são permanentes e nunca são repetidos.
+STATUS_TRANSIENTES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class ErroEscavador(Exception):
+    def __init__(self, status: int, numero: str, retry_after: float | None = None):
+        super().__init__(f"Erro HTTP {status} para {numero}")
+        self.status = status
+        self.numero = numero
+        self.retry_after = retry_after
+
+
+class ErroPermanente(ErroEscavador):
+    """Resposta que não muda ao repetir (CNJ desconhecido, credencial inválida...)."""
+
+
+class ErroTransiente(ErroEscavador):
+    """Resposta que pode dar certo em uma nova tentativa (429, 5xx)."""
+
+
+def _retry_after(valor: str | None) -> float | None:
+    """Interpreta o cabeçalho Retry-After (segundos ou data HTTP)."""
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(valor) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+_backoff = wait_exponential(multiplier=1, min=2, max=10)
+
+
+def _espera(retry_state) -> float:
+    # Em 429 o limitador já pausa pelo Retry-After; não espera de novo aqui
+    erro = retry_state.outcome.exception()
+    if isinstance(erro, ErroTransiente) and erro.status == 429:
+        return 0
+    return _backoff(retry_state)
+
+
+@retry(stop=stop_after_attempt(TENTATIVAS), wait=_espera, reraise=True,
+       retry=retry_if_exception_type((ErroTransiente, aiohttp.ClientError, asyncio.TimeoutError)))
 async def consultar_numero(session: aiohttp.ClientSession, numero: str) -> dict:
     headers = {
         "Authorization": f"Bearer {ESCAVADOR_API_KEY}",
@@ -20,8 +71,16 @@ async def consultar_numero(session: aiohttp.ClientSession, numero: str) -> dict:
         "Accept": "application/json"
     }
     url = f"{ESCAVADOR_API_BASE}/{numero}"
+    requisicao = await limitador_escavador.adquirir()
     async with async_timeout.timeout(15):
         async with session.get(url, headers=headers) as resp:
+            if resp.status == 429:
+                retry_after = _retry_after(resp.headers.get("Retry-After"))
+                limitador_escavador.registrar_limite(retry_after, requisicao)
+                raise ErroTransiente(resp.status, numero, retry_after)
+            if resp.status in STATUS_TRANSIENTES:
+                raise ErroTransiente(resp.status, numero)
             if resp.status != 200:
-                raise Exception(f"Erro HTTP {resp.status} para {numero}")
+                raise ErroPermanente(resp.status, numero)
+            limitador_escavador.registrar_sucesso()
             return await resp.json()
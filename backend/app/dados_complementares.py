@@ -0,0 +1,228 @@
+"""
+Carga da planilha de dados complementares dos precatórios (dados_precatorios).
+
+Cada chunk da planilha é copiado com COPY para uma tabela temporária e
+aplicado com um único `INSERT ... SELECT ... ON CONFLICT (processo_id) DO
+UPDATE`, ligado a `processos` pelo numero_cnj no próprio banco. Não há
+consulta CNJ -> id nem objeto ORM por linha.
+
+Os campos são convertidos por coluna (`converter_planilha`), com operações
+vetorizadas do pandas; valores que não convertem viram nulos e são contados
+num relatório de rejeições por coluna, em vez de um aviso por linha.
+"""
+import logging
+
+import pandas as pd
+from sqlalchemy import text
+
+from app.offload import em_processo
+from app.resumo import atualizar_dados_resumo
+
+logger = logging.getLogger(__name__)
+
+TABELA_CARGA = "dados_precatorios_carga"
+
+# Colunas da tabela temporária, na ordem dos registros enviados no COPY
+COLUNAS_CARGA = [
+    "numero_cnj", "tipo_regime", "ano_orcamentario", "natureza_precatorio",
+    "valor_deferido", "data_base_calculo", "data_expedicao",
+]
+
+# CNJs sem processo listados no log (o total sempre é informado)
+MAX_CNJS_NO_LOG = 20
+# Exemplos de valores rejeitados guardados por coluna
+MAX_EXEMPLOS_REJEITADOS = 5
+
+
+def _texto(serie: pd.Series) -> pd.Series:
+    """Coluna como texto sem espaços nas pontas; vazio vira NA."""
+    serie = serie.astype("string").str.strip()
+    return serie.mask(serie == "")
+
+
+def _coluna(df: pd.DataFrame, nome: str) -> pd.Series:
+    if nome in df.columns:
+        return _texto(df[nome])
+    return pd.Series(pd.NA, index=df.index, dtype="string")
+
+
+def _moeda(serie: pd.Series) -> pd.Series:
+    """"R$ 1.234,56" -> 1234.56"""
+    limpa = (
+        serie.str.replace("R$", "", regex=False)
+        .str.replace(".", "", regex=False)
+        .str.replace(",", ".", regex=False)
+        .str.strip()
+    )
+    return pd.to_numeric(limpa, errors="coerce").astype("float64")
+
+
+def _ano(serie: pd.Series) -> pd.Series:
+    numeros = pd.to_numeric(serie, errors="coerce").astype("float64")
+    return numeros.where(numeros % 1 == 0).astype("Int64")
+
+
+def _mes_ano(serie: pd.Series) -> pd.Series:
+    """"03/2021" -> 2021-03-01"""
+    return pd.to_datetime(serie, format="%m/%Y", errors="coerce")
+
+
+def _data(serie: pd.Series) -> pd.Series:
+    # Cada valor pode vir num formato diferente, como no parse linha a linha
+    return pd.to_datetime(serie, format="mixed", errors="coerce")
+
+
+# coluna da planilha -> conversor (colunas ausentes ficam nulas)
+CONVERSORES = {
+    "ano_orcamentario": _ano,
+    "valor_deferido": _moeda,
+    "data_base_calculo": _mes_ano,
+    "data_expedicao": _data,
+}
+
+
+def converter_planilha(df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    """
+    Converte as colunas da planilha (tudo texto) de uma vez, coluna a coluna.
+
+    Retorna o DataFrame tipado, com as colunas de COLUNAS_CARGA, e o relatório
+    de rejeições: {coluna: {"rejeitados": n, "exemplos": [{"numero": cnj, "valor": texto}]}}.
+    Valor preenchido que não converte vira nulo e entra no relatório.
+    """
+    tipado = pd.DataFrame({
+        "numero_cnj": df["numero"],
+        "tipo_regime": _coluna(df, "tipo_regime"),
+        "natureza_precatorio": _coluna(df, "natureza_precatorio"),
+    })
+    rejeicoes = {}
+    for nome, conversor in CONVERSORES.items():
+        original = _coluna(df, nome)
+        convertido = conversor(original)
+        tipado[nome] = convertido
+        rejeitados = original.notna() & convertido.isna()
+        if rejeitados.any():
+            exemplos = df.loc[rejeitados, "numero"].head(MAX_EXEMPLOS_REJEITADOS)
+            rejeicoes[nome] = {
+                "rejeitados": int(rejeitados.sum()),
+                "exemplos": [
+                    {"numero": numero, "valor": original[i]} for i, numero in exemplos.items()
+                ],
+            }
+    return tipado[COLUNAS_CARGA], rejeicoes
+
+
+def _valores(serie: pd.Series, converter=None) -> list:
+    return [None if pd.isna(v) else (converter(v) if converter else v) for v in serie.tolist()]
+
+
+def _registros(tipado: pd.DataFrame) -> list:
+    """Registros para o COPY, com tipos Python (None no lugar de NA/NaT)."""
+    return list(zip(
+        _valores(tipado["numero_cnj"]),
+        _valores(tipado["tipo_regime"]),
+        _valores(tipado["ano_orcamentario"], int),
+        _valores(tipado["natureza_precatorio"]),
+        _valores(tipado["valor_deferido"], float),
+        _valores(tipado["data_base_calculo"].dt.date),
+        _valores(tipado["data_expedicao"].dt.date),
+    ))
+
+
+def preparar_carga(df: pd.DataFrame) -> tuple[list, dict]:
+    """Converte o chunk e monta os registros do COPY. Retorna (registros, rejeições); roda no offload."""
+    tipado, rejeicoes = converter_planilha(df)
+    return _registros(tipado), rejeicoes
+
+
+def somar_rejeicoes(total: dict, rejeicoes: dict) -> dict:
+    """Acumula o relatório de rejeições de um chunk no relatório do arquivo."""
+    for coluna, info in rejeicoes.items():
+        acumulado = total.setdefault(coluna, {"rejeitados": 0, "exemplos": []})
+        acumulado["rejeitados"] += info["rejeitados"]
+        faltam = MAX_EXEMPLOS_REJEITADOS - len(acumulado["exemplos"])
+        acumulado["exemplos"].extend(info["exemplos"][:max(0, faltam)])
+    return total
+
+
+async def _copiar_para_carga(session, registros: list):
+    """Cria a tabela temporária (descartada no commit) e copia os registros com COPY do asyncpg."""
+    await session.execute(text(
+        f"""
+        CREATE TEMP TABLE {TABELA_CARGA} (
+            numero_cnj text NOT NULL,
+            tipo_regime text,
+            ano_orcamentario integer,
+            natureza_precatorio text,
+            valor_deferido double precision,
+            data_base_calculo date,
+            data_expedicao date
+        ) ON COMMIT DROP
+        """
+    ))
+    conexao = await session.connection()
+    bruta = await conexao.get_raw_connection()
+    await bruta.driver_connection.copy_records_to_table(TABELA_CARGA, records=registros, columns=COLUNAS_CARGA)
+
+
+async def _aplicar_carga(session) -> list:
+    """Upsert da tabela de carga em dados_precatorios. Retorna os processo_id gravados."""
+    result = await session.execute(text(
+        f"""
+        INSERT INTO dados_precatorios AS d (
+            processo_id, tipo_regime, ano_orcamentario, natureza_precatorio,
+            valor_deferido, data_base_calculo, data_expedicao
+        )
+        SELECT DISTINCT ON (p.id)
+            p.id, c.tipo_regime, c.ano_orcamentario, c.natureza_precatorio,
+            c.valor_deferido, c.data_base_calculo, c.data_expedicao
+        FROM {TABELA_CARGA} c
+        JOIN processos p ON p.numero_cnj = c.numero_cnj
+        ORDER BY p.id
+        ON CONFLICT (processo_id) DO UPDATE SET
+            tipo_regime = EXCLUDED.tipo_regime,
+            ano_orcamentario = EXCLUDED.ano_orcamentario,
+            natureza_precatorio = EXCLUDED.natureza_precatorio,
+            valor_deferido = EXCLUDED.valor_deferido,
+            data_base_calculo = EXCLUDED.data_base_calculo,
+            data_expedicao = EXCLUDED.data_expedicao
+        RETURNING d.processo_id
+        """
+    ))
+    return result.scalars().all()
+
+
+async def _avisar_sem_processo(session, quantidade: int):
+    result = await session.execute(text(
+        f"""
+        SELECT c.numero_cnj FROM {TABELA_CARGA} c
+        WHERE NOT EXISTS (SELECT 1 FROM processos p WHERE p.numero_cnj = c.numero_cnj)
+        LIMIT {MAX_CNJS_NO_LOG}
+        """
+    ))
+    exemplos = ", ".join(result.scalars().all())
+    logger.warning(f"{quantidade} CNJs da planilha sem processo no banco foram ignorados (ex.: {exemplos}).")
+
+
+async def gravar_dados_precatorios(session, df: pd.DataFrame) -> tuple[int, dict]:
+    """
+    Grava os dados complementares de um chunk já com CNJs formatados e sem duplicatas.
+
+    Roda na transação de quem chama (não faz commit) e atualiza o resumo dos
+    processos gravados. Faça o commit com app.versoes.confirmar, para publicar
+    a versão dos tribunais alterados. Retorna (linhas gravadas, relatório de rejeições).
+    """
+    # Conversão das colunas é CPU pura: vai para o pool de processos, fora do event loop
+    registros, rejeicoes = await em_processo(preparar_carga, df)
+    for coluna, info in rejeicoes.items():
+        logger.warning(f"{info['rejeitados']} valores inválidos em '{coluna}' ignorados (ex.: {info['exemplos']}).")
+    if not registros:
+        return 0, rejeicoes
+
+    await _copiar_para_carga(session, registros)
+    processo_ids = await _aplicar_carga(session)
+    if len(processo_ids) < len(registros):
+        await _avisar_sem_processo(session, len(registros) - len(processo_ids))
+    await session.execute(text(f"DROP TABLE {TABELA_CARGA}"))
+
+    await atualizar_dados_resumo(session, processo_ids)
+    return len(processo_ids), rejeicoes
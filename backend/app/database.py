@@ -1,3 +1,6 @@
+import logging
+from dataclasses import dataclass
+
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
@@ -5,12 +8,116 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+# Log de SQL: "" (desligado), "info" (statements) ou "debug" (statements e linhas)
+DB_LOG_SQL = os.getenv("DB_LOG_SQL", "").lower()
+
+
+@dataclass(frozen=True)
+class PerfilEngine:
+    """Configuração de pool e conexão de uma engine (ingestão ou relatórios)."""
+    nome: str
+    pool_size: int
+    max_overflow: int
+    pool_timeout: float  # segundos esperando uma conexão livre
+    pool_recycle: int  # segundos até reabrir uma conexão
+    pool_pre_ping: bool
+    statement_timeout_ms: int  # 0 = sem limite
+    cache_prepared_statements: int
+
+    @classmethod
+    def do_ambiente(cls, nome: str, **padroes) -> "PerfilEngine":
+        """Lê DB_<NOME>_<CAMPO> do ambiente, caindo nos valores padrão informados."""
+        valores = {}
+        for campo, padrao in padroes.items():
+            bruto = os.getenv(f"DB_{nome.upper()}_{campo.upper()}")
+            if bruto is None:
+                valores[campo] = padrao
+            elif isinstance(padrao, bool):
+                valores[campo] = bruto.lower() in ("1", "true", "sim")
+            else:
+                valores[campo] = type(padrao)(bruto)
+        return cls(nome=nome, **valores)
+
+
+# Ingestão: muitas transações curtas (lotes de persistência, estados dos jobs, arquivo)
+PERFIL_INGESTAO = PerfilEngine.do_ambiente(
+    "ingestao",
+    pool_size=10,
+    max_overflow=10,
+    pool_timeout=30.0,
+    pool_recycle=1800,
+    pool_pre_ping=True,
+    statement_timeout_ms=60_000,
+    cache_prepared_statements=500,
+)
+
+# Relatórios: poucas consultas longas, num pool separado para não tomar as conexões da ingestão
+PERFIL_RELATORIOS = PerfilEngine.do_ambiente(
+    "relatorios",
+    pool_size=4,
+    max_overflow=2,
+    pool_timeout=120.0,
+    pool_recycle=1800,
+    pool_pre_ping=True,
+    statement_timeout_ms=600_000,
+    cache_prepared_statements=100,
+)
+
+
+def criar_engine(perfil: PerfilEngine, url: str = DATABASE_URL):
+    echo = {"info": True, "debug": "debug"}.get(DB_LOG_SQL, False)
+    return create_async_engine(
+        url,
+        echo=echo,
+        pool_size=perfil.pool_size,
+        max_overflow=perfil.max_overflow,
+        pool_timeout=perfil.pool_timeout,
+        pool_recycle=perfil.pool_recycle,
+        pool_pre_ping=perfil.pool_pre_ping,
+        connect_args={
+            "prepared_statement_cache_size": perfil.cache_prepared_statements,
+            "server_settings": {
+                "application_name": f"recall-{perfil.nome}",
+                "statement_timeout": str(perfil.statement_timeout_ms),
+            },
+        },
+    )
+
+
+engine = criar_engine(PERFIL_INGESTAO)
 AsyncSessionLocal = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+engine_relatorios = criar_engine(PERFIL_RELATORIOS)
+AsyncSessionRelatorios = sessionmaker(engine_relatorios, expire_on_commit=False, class_=AsyncSession)
+
 Base = declarative_base()
 
 async def init_db():
+    """Cria as tabelas declaradas em app.models que ainda não existirem e aplica as migrações pendentes."""
+    from app import models
+    from app.migracoes import migrar
+
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(models.Base.metadata.create_all)
+    # create_all não altera tabelas existentes: colunas e índices novos vêm das migrações
+    await migrar(engine)
+
+
+async def preencher_dados():
+    """Preenchimentos (backfills) das migrações, em lotes. O startup chama em segundo plano, sem esperar."""
+    from app.migracoes import preencher
+
+    try:
+        await preencher(engine)
+    except Exception:
+        # Continua de onde parou no próximo startup (ou com python -m app.migracoes --preencher)
+        logger.exception("Falha nos preenchimentos das migrações")
+
+
+async def fechar_engines():
+    await engine.dispose()
+    await engine_relatorios.dispose()
@@ -0,0 +1,301 @@
+"""
+Cadastro único de pessoas e advogados.
+
+O grafo do Escavador repete o mesmo advogado (e a mesma pessoa) em cada
+envolvido de cada fonte de cada processo. Aqui cada um vira uma linha só
+(`pessoas` por documento, `advogados` por CPF ou OAB) e as fontes apontam para
+eles por vínculos enxutos (`fontes_pessoas`, `fontes_advogados`). Consultas por
+pessoa ou advogado partem do cadastro e seguem os índices dos vínculos.
+
+Envolvidos sem CPF/CNPJ e advogados sem CPF nem OAB não entram no cadastro:
+o nome sozinho não identifica ninguém.
+
+Leem do cadastro a busca por nome (app.busca) e a lista de advogados do
+relatório Lemitt (app.exportacoes). As tabelas do grafo continuam sendo
+gravadas: a comparação com o payload (app.persistencia) e os relatórios
+detalhados precisam de uma linha por envolvido de cada fonte. Os vínculos
+são refeitos na mesma transação da gravação; os de processos gravados antes
+do cadastro existir vêm do preenchimento da migração 7 (app.migracoes).
+"""
+import argparse
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.models import (
+    OAB,
+    Advogado,
+    AdvogadoCadastro,
+    Envolvido,
+    Fonte,
+    FonteAdvogado,
+    FontePessoa,
+    Pessoa,
+    Processo,
+)
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Processos por consulta ao refazer os vínculos
+LOTE_VINCULOS = 500
+# Chaves por INSERT/SELECT ao resolver o cadastro
+LOTE_CADASTRO = 1000
+# Entradas (chave -> id) mantidas em memória por tabela do cadastro
+ENTIDADES_CACHE_MAX = int(os.getenv("ENTIDADES_CACHE_MAX", "200000"))
+
+
+def oab_principal(oabs: list) -> tuple | None:
+    """A primeira OAB completa, na ordem (UF, número): [(uf, numero), ...] -> (UF, numero)."""
+    validas = sorted((uf.upper(), numero) for uf, numero in oabs if uf and numero)
+    return validas[0] if validas else None
+
+
+def chave_advogado(cpf_digitos: str | None, oabs: list) -> str | None:
+    """Identificador do advogado: o CPF, senão a OAB principal."""
+    if cpf_digitos:
+        return f"cpf:{cpf_digitos}"
+    oab = oab_principal(oabs)
+    if oab:
+        return f"oab:{oab[0]}:{oab[1]}"
+    return None
+
+
+class CacheCadastro:
+    """
+    Resolve chaves do cadastro (documento/chave do advogado) em ids, com LRU em memória.
+
+    Chaves novas são inseridas numa transação própria, curta e já confirmada:
+    assim um id só entra no cache depois de existir de fato no banco, mesmo
+    que a gravação do lote que pediu a chave seja desfeita depois.
+    """
+
+    def __init__(self, modelo, coluna_chave: str, maximo: int = ENTIDADES_CACHE_MAX):
+        self.modelo = modelo
+        self.coluna = getattr(modelo, coluna_chave)
+        self.coluna_chave = coluna_chave
+        self.maximo = maximo
+        self.ids = OrderedDict()
+        self.acertos = 0
+        self.consultas = 0
+
+    def _guardar(self, chave: str, id_: int):
+        self.ids[chave] = id_
+        self.ids.move_to_end(chave)
+        if len(self.ids) > self.maximo:
+            self.ids.popitem(last=False)
+
+    async def resolver(self, linhas: dict) -> dict:
+        """Recebe {chave: linha do cadastro} e retorna {chave: id}, criando o que faltar."""
+        resolvidos = {}
+        faltando = []
+        for chave in linhas:
+            id_ = self.ids.get(chave)
+            if id_ is None:
+                faltando.append(chave)
+            else:
+                self.ids.move_to_end(chave)
+                resolvidos[chave] = id_
+        self.acertos += len(resolvidos)
+        if not faltando:
+            return resolvidos
+
+        from app.database import AsyncSessionLocal
+
+        # Ordem fixa das chaves: inserções concorrentes travam as linhas na mesma ordem
+        faltando.sort()
+        async with AsyncSessionLocal() as session:
+            for i in range(0, len(faltando), LOTE_CADASTRO):
+                lote = faltando[i:i + LOTE_CADASTRO]
+                await session.execute(
+                    pg_insert(self.modelo)
+                    .values([linhas[chave] for chave in lote])
+                    .on_conflict_do_nothing(index_elements=[self.coluna_chave])
+                )
+                result = await session.execute(select(self.coluna, self.modelo.id).where(self.coluna.in_(lote)))
+                for chave, id_ in result.all():
+                    resolvidos[chave] = id_
+            await session.commit()
+        self.consultas += len(faltando)
+        for chave in faltando:
+            self._guardar(chave, resolvidos[chave])
+        return resolvidos
+
+    def metricas(self) -> dict:
+        return {"em_cache": len(self.ids), "acertos": self.acertos, "consultas": self.consultas}
+
+
+cache_pessoas = CacheCadastro(Pessoa, "documento")
+cache_advogados = CacheCadastro(AdvogadoCadastro, "chave")
+
+
+async def _ler_grafo(session, processo_ids: list) -> tuple:
+    """Envolvidos e advogados (com OABs) das fontes dos processos, só com as colunas do cadastro."""
+    envolvidos = (await session.execute(
+        select(
+            Envolvido.id, Envolvido.fonte_id, Fonte.processo_id, Envolvido.nome, Envolvido.tipo_pessoa, Envolvido.polo,
+            Envolvido.tipo_normalizado, Envolvido.cpf_digitos, Envolvido.cnpj_digitos,
+        )
+        .join(Fonte, Fonte.id == Envolvido.fonte_id)
+        .where(Fonte.processo_id.in_(processo_ids))
+    )).all()
+
+    advogados = OrderedDict()
+    linhas = (await session.execute(
+        select(Advogado.id, Advogado.envolvido_id, Advogado.nome, Advogado.cpf_digitos, OAB.uf, OAB.numero)
+        .join(Envolvido, Envolvido.id == Advogado.envolvido_id)
+        .join(Fonte, Fonte.id == Envolvido.fonte_id)
+        .outerjoin(OAB, OAB.advogado_id == Advogado.id)
+        .where(Fonte.processo_id.in_(processo_ids))
+        .order_by(Advogado.id, OAB.id)
+    )).all()
+    for linha in linhas:
+        adv = advogados.setdefault(linha.id, {
+            "envolvido_id": linha.envolvido_id,
+            "nome": linha.nome,
+            "cpf_digitos": linha.cpf_digitos,
+            "oabs": [],
+        })
+        if linha.uf is not None or linha.numero is not None:
+            adv["oabs"].append((linha.uf, linha.numero))
+    return envolvidos, list(advogados.values())
+
+
+async def vincular_entidades(session, processo_ids: list):
+    """
+    Refaz os vínculos fonte -> pessoa/advogado dos processos informados.
+
+    Roda na transação de quem chama (não faz commit), logo depois da escrita
+    do grafo, como o resumo dos relatórios.
+    """
+    ids = sorted(set(processo_ids))
+    for i in range(0, len(ids), LOTE_VINCULOS):
+        lote = ids[i:i + LOTE_VINCULOS]
+        envolvidos, advogados = await _ler_grafo(session, lote)
+
+        pessoas = {}
+        documento_do_envolvido = {}
+        for e in envolvidos:
+            documento = e.cnpj_digitos or e.cpf_digitos
+            if documento:
+                pessoas.setdefault(documento, {"documento": documento, "nome": e.nome, "tipo_pessoa": e.tipo_pessoa})
+                documento_do_envolvido[e.id] = documento
+
+        cadastro_advogados = {}
+        chave_do_advogado = []
+        for adv in advogados:
+            chave = chave_advogado(adv["cpf_digitos"], adv["oabs"])
+            chave_do_advogado.append(chave)
+            if chave and chave not in cadastro_advogados:
+                uf, numero = oab_principal(adv["oabs"]) or (None, None)
+                cadastro_advogados[chave] = {
+                    "chave": chave,
+                    "nome": adv["nome"],
+                    "cpf_digitos": adv["cpf_digitos"],
+                    "oab_uf": uf,
+                    "oab_numero": numero,
+                }
+
+        pessoa_ids = await cache_pessoas.resolver(pessoas)
+        advogado_ids = await cache_advogados.resolver(cadastro_advogados)
+
+        vinculos_pessoas = set()
+        envolvido_por_id = {}
+        for e in envolvidos:
+            envolvido_por_id[e.id] = e
+            documento = documento_do_envolvido.get(e.id)
+            if documento:
+                vinculos_pessoas.add((e.fonte_id, e.processo_id, pessoa_ids[documento], e.polo, e.tipo_normalizado))
+
+        vinculos_advogados = set()
+        for adv, chave in zip(advogados, chave_do_advogado):
+            if not chave:
+                continue
+            e = envolvido_por_id[adv["envolvido_id"]]
+            documento = documento_do_envolvido.get(e.id)
+            vinculos_advogados.add(
+                (e.fonte_id, e.processo_id, advogado_ids[chave], pessoa_ids[documento] if documento else None, e.polo)
+            )
+
+        fontes_do_lote = select(Fonte.id).where(Fonte.processo_id.in_(lote)).scalar_subquery()
+        await session.execute(delete(FontePessoa).where(FontePessoa.fonte_id.in_(fontes_do_lote)))
+        await session.execute(delete(FonteAdvogado).where(FonteAdvogado.fonte_id.in_(fontes_do_lote)))
+        if vinculos_pessoas:
+            await session.execute(insert(FontePessoa), [
+                {"fonte_id": f, "processo_id": processo, "pessoa_id": p, "polo": polo, "tipo_normalizado": tipo}
+                for f, processo, p, polo, tipo in sorted(vinculos_pessoas, key=str)
+            ])
+        if vinculos_advogados:
+            await session.execute(insert(FonteAdvogado), [
+                {"fonte_id": f, "processo_id": processo, "advogado_id": a, "pessoa_id": p, "polo": polo}
+                for f, processo, a, p, polo in sorted(vinculos_advogados, key=str)
+            ])
+
+
+async def reconstruir_vinculos(tribunal_sigla: str | None = None) -> int:
+    """Refaz cadastro e vínculos de todos os processos (ou de um tribunal), um lote por transação."""
+    from app.database import AsyncSessionLocal
+
+    ultimo_id = 0
+    total = 0
+    while True:
+        async with AsyncSessionLocal() as session:
+            stmt = select(Processo.id).where(Processo.id > ultimo_id).order_by(Processo.id).limit(LOTE_VINCULOS)
+            if tribunal_sigla:
+                stmt = stmt.where(Processo.unidade_origem_tribunal_sigla == tribunal_sigla)
+            ids = (await session.execute(stmt)).scalars().all()
+            if not ids:
+                break
+            await vincular_entidades(session, ids)
+            await session.commit()
+        ultimo_id = ids[-1]
+        total += len(ids)
+        logger.info(f"Cadastro: {total} processos vinculados ({cache_advogados.metricas()})")
+    return total
+
+
+async def preencher_vinculos(de: int, ate: int) -> int:
+    """
+    Vincula ao cadastro os processos com id em (de, ate] cujas fontes ainda
+    não têm vínculo nenhum (gravados antes do cadastro existir). É o
+    preenchimento da migração 7 (app.migracoes), executado em segundo plano
+    depois do startup.
+    """
+    from app.database import AsyncSessionLocal
+
+    vinculadas = (
+        select(Fonte.processo_id)
+        .where(Fonte.processo_id == Processo.id)
+        .where(
+            select(FontePessoa.id).where(FontePessoa.fonte_id == Fonte.id).exists()
+            | select(FonteAdvogado.id).where(FonteAdvogado.fonte_id == Fonte.id).exists()
+        )
+    )
+    async with AsyncSessionLocal() as session:
+        ids = (await session.execute(
+            select(Processo.id)
+            .where(Processo.id > de, Processo.id <= ate, ~vinculadas.exists())
+            .order_by(Processo.id)
+        )).scalars().all()
+    for i in range(0, len(ids), LOTE_VINCULOS):
+        async with AsyncSessionLocal() as session:
+            await vincular_entidades(session, ids[i:i + LOTE_VINCULOS])
+            await session.commit()
+    return len(ids)
+
+
+if __name__ == "__main__":
+    # Uso: python -m app.entidades [--tribunal TJSP]  (refaz cadastro e vínculos de todos os processos, ex.: depois
+    # de mudar chave_advogado; os que não têm vínculo são preenchidos pela migração 7)
+    parser = argparse.ArgumentParser(description="Refaz o cadastro de pessoas/advogados e os vínculos das fontes.")
+    parser.add_argument("--tribunal", help="Sigla do tribunal (padrão: todos)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(f"Processos vinculados: {asyncio.run(reconstruir_vinculos(args.tribunal))}")
@@ -0,0 +1,808 @@
+"""
+Geração dos relatórios por tribunal (arquivos para download).
+
+Cada relatório é uma função assíncrona que lê o banco em partições e escreve
+o arquivo em `destino`. Elas não dependem da aplicação web: rodam nos
+processos filhos do pool de app.relatorios_jobs, que chamam
+`gerar_relatorio` com o nome do relatório em RELATORIOS.
+
+`progresso`, quando informado, é uma função assíncrona chamada com o número
+de processos já lidos a cada partição.
+"""
+import os
+import shutil
+import tempfile
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import func, select
+
+from app.database import AsyncSessionRelatorios
+from app.models import AdvogadoCadastro, FonteAdvogado, Pessoa, Processo, PrecatorioResumo, PrecatorioResumoAdvogado
+from app.offload import em_thread
+from app.relatorios import CsvIncremental, DataFramesEmDisco, opcoes_grafo, particoes
+from app.resumo import nome_de_ente_publico, tipo_precatorio_planilha
+from app.xlsx import PlanilhaStreaming
+
+MEDIA_TYPE_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class RelatorioVazio(Exception):
+    """O tribunal não tem dados para o relatório (as rotas respondem 404)."""
+
+
+async def _informar(progresso, processos_lidos: int):
+    if progresso:
+        await progresso(processos_lidos)
+
+
+# --- Lemitt (zip com dois CSVs) ---
+COLUNAS_PROCESSO_LEMITT = [
+    "Nome do Réu", "CNPJ do Réu", "UF do Precatório", "Município do Precatório",
+    "Número dos Autos do Precatório", "Tribunal de Origem", "UF relacionada ao processo originário",
+    "Tipo do Precatório", "Tipo do Regime", "Valor da Causa",
+]
+COLUNAS_CREDORES_LEMITT = ["CNPJ / CPF do Credor", "Nome do Credor", "Tipo do Credor", *COLUNAS_PROCESSO_LEMITT]
+COLUNAS_ADVOGADOS_LEMITT = [
+    "Nome do Advogado", "CPF do Advogado", "OAB", "Estado da OAB",
+    "CNPJ / CPF do Credor", "Nome do Credor", "Tipo do Credor", *COLUNAS_PROCESSO_LEMITT,
+]
+
+
+async def _advogados_do_resumo(session, processo_ids: list, *condicoes) -> dict:
+    """{processo_id: [PrecatorioResumoAdvogado]} dos processos informados, na ordem do grafo."""
+    result = await session.execute(
+        select(PrecatorioResumoAdvogado)
+        .where(PrecatorioResumoAdvogado.processo_id.in_(processo_ids), *condicoes)
+        .order_by(PrecatorioResumoAdvogado.processo_id, PrecatorioResumoAdvogado.ordem)
+    )
+    por_processo = {}
+    for a in result.scalars().all():
+        por_processo.setdefault(a.processo_id, []).append(a)
+    return por_processo
+
+
+async def _advogados_do_cadastro(session, processo_ids: list, ja_listados: set) -> dict:
+    """
+    {processo_id: [(AdvogadoCadastro, Pessoa)]} dos advogados com CPF que
+    representam, no polo ativo, uma pessoa com documento que não é Ente
+    Público. Lê o cadastro (app.entidades) por nível, como o grafo: vínculos
+    dos processos, depois só os advogados ainda não listados (`ja_listados`)
+    e as pessoas que eles representam.
+    """
+    vinculos = (await session.execute(
+        select(FonteAdvogado.processo_id, FonteAdvogado.advogado_id, FonteAdvogado.pessoa_id)
+        .where(
+            FonteAdvogado.processo_id.in_(processo_ids),
+            FonteAdvogado.polo == "ATIVO",
+            FonteAdvogado.pessoa_id.is_not(None),
+        )
+        .order_by(FonteAdvogado.processo_id, FonteAdvogado.id)
+    )).all()
+    vinculos = [v for v in vinculos if v.advogado_id not in ja_listados]
+    if not vinculos:
+        return {}
+
+    advogados = {a.id: a for a in (await session.execute(
+        select(AdvogadoCadastro).where(
+            AdvogadoCadastro.id.in_({v.advogado_id for v in vinculos}),
+            AdvogadoCadastro.cpf_digitos.is_not(None),
+        )
+    )).scalars().all()}
+    vinculos = [v for v in vinculos if v.advogado_id in advogados]
+    pessoas = {p.id: p for p in (await session.execute(
+        select(Pessoa).where(Pessoa.id.in_({v.pessoa_id for v in vinculos}))
+    )).scalars().all()} if vinculos else {}
+
+    por_processo = {}
+    for v in vinculos:
+        pessoa = pessoas[v.pessoa_id]
+        if not nome_de_ente_publico(pessoa.nome):
+            por_processo.setdefault(v.processo_id, []).append((advogados[v.advogado_id], pessoa))
+    return por_processo
+
+
+async def _gerar_zip_lemitt(tribunal_sigla: str, destino: str, data_geracao: str, progresso=None):
+    """Gera em `destino` o zip com os CSVs de credores e advogados (Lemitt) do tribunal."""
+    # Os CSVs ficam ao lado do destino até entrarem no zip
+    pasta = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(destino)))
+    try:
+        await _gerar_csvs_lemitt(tribunal_sigla, destino, data_geracao, pasta, progresso)
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+async def _gerar_csvs_lemitt(tribunal_sigla: str, destino: str, data_geracao: str, pasta: str, progresso=None):
+    credores_uniques = set()
+    advogados_uniques = set()
+    processos_lidos = 0
+
+    nome_credores = f"lista-Lemitt-precatorios_credores_{tribunal_sigla}_{data_geracao}.csv"
+    nome_advogados = f"lista-Lemitt-precatorios_advogados_{tribunal_sigla}_{data_geracao}.csv"
+    opcoes_csv = dict(sep=';', encoding='utf-8', decimal=',', quotechar='"')
+
+    csv_credores = CsvIncremental(os.path.join(pasta, nome_credores), COLUNAS_CREDORES_LEMITT, **opcoes_csv)
+    csv_advogados = CsvIncremental(os.path.join(pasta, nome_advogados), COLUNAS_ADVOGADOS_LEMITT, **opcoes_csv)
+
+    async with AsyncSessionRelatorios() as session:
+        stmt = (
+            select(PrecatorioResumo)
+            .where(PrecatorioResumo.tribunal_sigla == tribunal_sigla)
+            .order_by(PrecatorioResumo.processo_id)
+        )
+        # Lê o resumo em partições; cada partição vira linhas nos CSVs antes da próxima
+        async for resumos in particoes(session, stmt):
+            processos_lidos += len(resumos)
+            await _informar(progresso, processos_lidos)
+            advogados_por_processo = await _advogados_do_cadastro(
+                session, [r.processo_id for r in resumos], advogados_uniques
+            )
+            df_credores_list = []
+            df_advogados_list = []
+            # Percorre o resumo de cada processo
+            for r in resumos:
+                tipo_precatorio = r.tipo_precatorio
+
+                # Valor da causa (da capa; na falta, o valor deferido)
+                valor_causa = r.valor_causa
+                if not valor_causa and r.valor_deferido:
+                    valor_causa = r.valor_deferido
+
+                valor_causa_formatado = (
+                    f"R$ {valor_causa:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+                    if valor_causa is not None else ""
+                )
+
+                dados_processo = {
+                    "Nome do Réu": r.reu_nome,
+                    "CNPJ do Réu": r.reu_cnpj_digitos,
+                    "UF do Precatório": r.estado_origem,
+                    "Município do Precatório": r.reu_nome if tipo_precatorio == "Municipal" else None,
+                    "Número dos Autos do Precatório": r.numero_cnj,
+                    "Tribunal de Origem": r.tribunal_sigla,
+                    "UF relacionada ao processo originário": r.uf_origem,
+                    "Tipo do Precatório": tipo_precatorio,
+                    "Tipo do Regime": r.tipo_regime,
+                    "Valor da Causa": valor_causa_formatado,
+                }
+
+                # --- 1. Coleta dados do credor ---
+                credor_id = r.credor_documento
+                if credor_id and credor_id not in credores_uniques:
+                    tipo_credor = "Pessoa Jurídica" if r.credor_cnpj else "Pessoa Física" if r.credor_cpf else None
+                    row_credor = {
+                        "CNPJ / CPF do Credor": credor_id,
+                        "Nome do Credor": r.credor_nome,
+                        "Tipo do Credor": tipo_credor,
+                        **dados_processo,
+                    }
+                    df_credores_list.append(row_credor)
+                    credores_uniques.add(credor_id)
+
+                # --- 2. Coleta dados dos advogados ---
+                for advogado, credor in advogados_por_processo.get(r.processo_id, []):
+                    if advogado.id not in advogados_uniques:
+                        row_advogado = {
+                            "Nome do Advogado": advogado.nome,
+                            "CPF do Advogado": advogado.cpf_digitos,
+                            "OAB": advogado.oab_numero,
+                            "Estado da OAB": advogado.oab_uf,
+                            "CNPJ / CPF do Credor": credor.documento,
+                            "Nome do Credor": credor.nome,
+                            "Tipo do Credor": "Pessoa Jurídica" if len(credor.documento) == 14 else "Pessoa Física",
+                            **dados_processo,
+                        }
+                        df_advogados_list.append(row_advogado)
+                        advogados_uniques.add(advogado.id)
+
+            # CPF/CNPJ já vêm normalizados do resumo
+            df_credores = pd.DataFrame(df_credores_list, columns=COLUNAS_CREDORES_LEMITT)
+            csv_credores.escrever(df_credores)
+
+            df_advogados = pd.DataFrame(df_advogados_list, columns=COLUNAS_ADVOGADOS_LEMITT)
+            df_advogados["OAB"] = df_advogados["OAB"].astype("Int64")
+            csv_advogados.escrever(df_advogados)
+
+    if not processos_lidos:
+        raise RelatorioVazio("Nenhum processo encontrado para o tribunal fornecido.")
+    if not csv_credores.linhas and not csv_advogados.linhas:
+        raise RelatorioVazio("Nenhum dado encontrado para o tribunal fornecido.")
+
+    with zipfile.ZipFile(destino, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.write(csv_credores.caminho, nome_credores)
+        zip_file.write(csv_advogados.caminho, nome_advogados)
+
+
+# --- CSV geral ---
+COLUNAS_CSV_GERAL = [
+    "processo_numero_cnj", "envolvido_nome", "envolvido_tipo_normalizado", "envolvido_polo", "envolvido_cpf", "envolvido_cnpj", "envolvido_tipo_pessoa",
+    "advogado_nome", "advogado_tipo", "advogado_oab", "advogado_cpf", "advogado_cnpj", "advogado_tipo_pessoa",
+    "processo_titulo_polo_ativo", "processo_titulo_polo_passivo", "processo_ano_inicio", "processo_data_inicio", "processo_estado_origem",
+    "processo_unidade_origem_nome", "processo_unidade_origem_cidade", "processo_unidade_origem_estado", "processo_unidade_origem_tribunal_sigla",
+    "processo_data_ultima_movimentacao", "processo_quantidade_movimentacoes", "processo_fontes_tribunais_estao_arquivadas", "processo_data_ultima_verificacao",
+    "processo_tempo_desde_ultima_verificacao", "processo_relacionado_numero",
+    "fonte_id", "fonte_descricao", "fonte_nome", "fonte_sigla", "fonte_tipo", "fonte_data_inicio", "fonte_data_ultima_movimentacao",
+    "fonte_segredo_justica", "fonte_arquivado", "fonte_status_predito", "fonte_grau", "fonte_grau_formatado",
+    "fonte_fisico", "fonte_sistema", "fonte_quantidade_envolvidos", "fonte_url",
+    "capa_classe", "capa_assunto", "capa_orgao_julgador", "capa_situacao", "capa_valor_causa",
+]
+
+# Colunas inteiras que podem vir vazias: sem isso o pandas as escreve como float ("2020.0")
+COLUNAS_CSV_GERAL_INTEIRAS = [
+    "processo_ano_inicio", "processo_quantidade_movimentacoes", "fonte_id", "fonte_grau", "fonte_quantidade_envolvidos",
+]
+
+
+def _linhas_csv_geral(p: Processo) -> list:
+    """Linhas do CSV geral para um processo: uma por fonte/envolvido/advogado/OAB."""
+    linhas = []
+    base_data = {
+        "processo_numero_cnj": p.numero_cnj,
+        "processo_titulo_polo_ativo": p.titulo_polo_ativo,
+        "processo_titulo_polo_passivo": p.titulo_polo_passivo,
+        "processo_ano_inicio": p.ano_inicio,
+        "processo_data_inicio": p.data_inicio.isoformat() if p.data_inicio else None,
+        "processo_estado_origem": p.estado_origem,
+        "processo_unidade_origem_nome": p.unidade_origem_nome,
+        "processo_unidade_origem_cidade": p.unidade_origem_cidade,
+        "processo_unidade_origem_estado": p.unidade_origem_estado,
+        "processo_unidade_origem_tribunal_sigla": p.unidade_origem_tribunal_sigla,
+        "processo_data_ultima_movimentacao": p.data_ultima_movimentacao.isoformat() if p.data_ultima_movimentacao else None,
+        "processo_quantidade_movimentacoes": p.quantidade_movimentacoes,
+        "processo_fontes_tribunais_estao_arquivadas": p.fontes_tribunais_estao_arquivadas,
+        "processo_data_ultima_verificacao": p.data_ultima_verificacao.isoformat() if p.data_ultima_verificacao else None,
+        "processo_tempo_desde_ultima_verificacao": p.tempo_desde_ultima_verificacao,
+        "processo_relacionado_numero": ", ".join([pr.numero for pr in p.processos_relacionados]),
+    }
+
+    has_related_data = False
+    for fonte in p.fontes:
+        capa = fonte.capa
+        valor_causa = capa.valor_causa if capa else None
+
+        if not fonte.envolvidos:
+            row = base_data.copy()
+            row.update({
+                "fonte_id": fonte.id, "fonte_descricao": fonte.descricao, "fonte_nome": fonte.nome, "fonte_sigla": fonte.sigla,
+                "fonte_tipo": fonte.tipo, "fonte_data_inicio": fonte.data_inicio.isoformat() if fonte.data_inicio else None,
+                "fonte_data_ultima_movimentacao": fonte.data_ultima_movimentacao.isoformat() if fonte.data_ultima_movimentacao else None,
+                "fonte_segredo_justica": fonte.segredo_justica, "fonte_arquivado": fonte.arquivado,
+                "fonte_status_predito": fonte.status_predito, "fonte_grau": fonte.grau, "fonte_grau_formatado": fonte.grau_formatado,
+                "fonte_fisico": fonte.fisico, "fonte_sistema": fonte.sistema, "fonte_quantidade_envolvidos": fonte.quantidade_envolvidos,
+                "fonte_url": fonte.url,
+                "capa_classe": capa.classe if capa else None, "capa_assunto": capa.assunto if capa else None,
+                "capa_orgao_julgador": capa.orgao_julgador if capa else None, "capa_situacao": capa.situacao if capa else None,
+                "capa_valor_causa": valor_causa.valor_formatado if valor_causa else None,
+                "envolvido_nome": None, "envolvido_tipo_normalizado": None, "envolvido_polo": None,
+                "envolvido_cpf": None, "envolvido_cnpj": None, "envolvido_tipo_pessoa": None,
+                "advogado_nome": None, "advogado_tipo": None, "advogado_oab": None, "advogado_cpf": None, "advogado_cnpj": None, "advogado_tipo_pessoa": None,
+            })
+            linhas.append(row)
+            has_related_data = True
+            continue
+
+        for envolvido in fonte.envolvidos:
+            if not envolvido.advogados:
+                row = base_data.copy()
+                row.update({
+                    "fonte_id": fonte.id, "fonte_descricao": fonte.descricao, "fonte_nome": fonte.nome, "fonte_sigla": fonte.sigla,
+                    "fonte_tipo": fonte.tipo, "fonte_data_inicio": fonte.data_inicio.isoformat() if fonte.data_inicio else None,
+                    "fonte_data_ultima_movimentacao": fonte.data_ultima_movimentacao.isoformat() if fonte.data_ultima_movimentacao else None,
+                    "fonte_segredo_justica": fonte.segredo_justica, "fonte_arquivado": fonte.arquivado,
+                    "fonte_status_predito": fonte.status_predito, "fonte_grau": fonte.grau, "fonte_grau_formatado": fonte.grau_formatado,
+                    "fonte_fisico": fonte.fisico, "fonte_sistema": fonte.sistema, "fonte_quantidade_envolvidos": fonte.quantidade_envolvidos,
+                    "fonte_url": fonte.url,
+                    "capa_classe": capa.classe if capa else None, "capa_assunto": capa.assunto if capa else None,
+                    "capa_orgao_julgador": capa.orgao_julgador if capa else None, "capa_situacao": capa.situacao if capa else None,
+                    "capa_valor_causa": valor_causa.valor_formatado if valor_causa else None,
+                    "envolvido_nome": envolvido.nome, "envolvido_tipo_normalizado": envolvido.tipo_normalizado, "envolvido_polo": envolvido.polo,
+                    "envolvido_cpf": envolvido.cpf, "envolvido_cnpj": envolvido.cnpj, "envolvido_tipo_pessoa": envolvido.tipo_pessoa,
+                    "advogado_nome": None, "advogado_tipo": None, "advogado_oab": None, "advogado_cpf": None, "advogado_cnpj": None, "advogado_tipo_pessoa": None,
+                })
+                linhas.append(row)
+                has_related_data = True
+                continue
+
+            for advogado in envolvido.advogados:
+                if not advogado.oabs:
+                    row = base_data.copy()
+                    row.update({
+                        "fonte_id": fonte.id, "fonte_descricao": fonte.descricao, "fonte_nome": fonte.nome, "fonte_sigla": fonte.sigla,
+                        "fonte_tipo": fonte.tipo, "fonte_data_inicio": fonte.data_inicio.isoformat() if fonte.data_inicio else None,
+                        "fonte_data_ultima_movimentacao": fonte.data_ultima_movimentacao.isoformat() if fonte.data_ultima_movimentacao else None,
+                        "fonte_segredo_justica": fonte.segredo_justica, "fonte_arquivado": fonte.arquivado,
+                        "fonte_status_predito": fonte.status_predito, "fonte_grau": fonte.grau, "fonte_grau_formatado": fonte.grau_formatado,
+                        "fonte_fisico": fonte.fisico, "fonte_sistema": fonte.sistema, "fonte_quantidade_envolvidos": fonte.quantidade_envolvidos,
+                        "fonte_url": fonte.url,
+                        "capa_classe": capa.classe if capa else None, "capa_assunto": capa.assunto if capa else None,
+                        "capa_orgao_julgador": capa.orgao_julgador if capa else None, "capa_situacao": capa.situacao if capa else None,
+                        "capa_valor_causa": valor_causa.valor_formatado if valor_causa else None,
+                        "envolvido_nome": envolvido.nome, "envolvido_tipo_normalizado": envolvido.tipo_normalizado, "envolvido_polo": envolvido.polo,
+                        "envolvido_cpf": envolvido.cpf, "envolvido_cnpj": envolvido.cnpj, "envolvido_tipo_pessoa": envolvido.tipo_pessoa,
+                        "advogado_nome": advogado.nome, "advogado_tipo": advogado.tipo_normalizado, "advogado_oab": None,
+                        "advogado_cpf": advogado.cpf, "advogado_cnpj": advogado.cnpj, "advogado_tipo_pessoa": advogado.tipo_pessoa,
+                    })
+                    linhas.append(row)
+                    has_related_data = True
+                    continue
+
+                for oab in advogado.oabs:
+                    row = base_data.copy()
+                    row.update({
+                        "fonte_id": fonte.id, "fonte_descricao": fonte.descricao, "fonte_nome": fonte.nome, "fonte_sigla": fonte.sigla,
+                        "fonte_tipo": fonte.tipo, "fonte_data_inicio": fonte.data_inicio.isoformat() if fonte.data_inicio else None,
+                        "fonte_data_ultima_movimentacao": fonte.data_ultima_movimentacao.isoformat() if fonte.data_ultima_movimentacao else None,
+                        "fonte_segredo_justica": fonte.segredo_justica, "fonte_arquivado": fonte.arquivado,
+                        "fonte_status_predito": fonte.status_predito, "fonte_grau": fonte.grau, "fonte_grau_formatado": fonte.grau_formatado,
+                        "fonte_fisico": fonte.fisico, "fonte_sistema": fonte.sistema, "fonte_quantidade_envolvidos": fonte.quantidade_envolvidos,
+                        "fonte_url": fonte.url,
+                        "capa_classe": capa.classe if capa else None, "capa_assunto": capa.assunto if capa else None,
+                        "capa_orgao_julgador": capa.orgao_julgador if capa else None, "capa_situacao": capa.situacao if capa else None,
+                        "capa_valor_causa": valor_causa.valor_formatado if valor_causa else None,
+                        "envolvido_nome": envolvido.nome, "envolvido_tipo_normalizado": envolvido.tipo_normalizado, "envolvido_polo": envolvido.polo,
+                        "envolvido_cpf": envolvido.cpf, "envolvido_cnpj": envolvido.cnpj, "envolvido_tipo_pessoa": envolvido.tipo_pessoa,
+                        "advogado_nome": advogado.nome, "advogado_tipo": advogado.tipo_normalizado, "advogado_oab": f"{oab.numero}/{oab.uf}",
+                        "advogado_cpf": advogado.cpf, "advogado_cnpj": advogado.cnpj, "advogado_tipo_pessoa": advogado.tipo_pessoa,
+                    })
+                    linhas.append(row)
+                    has_related_data = True
+
+    if not has_related_data:
+        row = base_data.copy()
+        row.update({
+            "fonte_id": None, "fonte_descricao": None, "fonte_nome": None, "fonte_sigla": None, "fonte_tipo": None, "fonte_data_inicio": None,
+            "fonte_data_ultima_movimentacao": None, "fonte_segredo_justica": None, "fonte_arquivado": None, "fonte_status_predito": None,
+            "fonte_grau": None, "fonte_grau_formatado": None, "fonte_fisico": None, "fonte_sistema": None, "fonte_quantidade_envolvidos": None,
+            "fonte_url": None, "capa_classe": None, "capa_assunto": None, "capa_orgao_julgador": None, "capa_situacao": None,
+            "capa_valor_causa": None, "envolvido_nome": None, "envolvido_tipo_normalizado": None, "envolvido_polo": None,
+            "envolvido_cpf": None, "envolvido_cnpj": None, "envolvido_tipo_pessoa": None, "advogado_nome": None, "advogado_tipo": None,
+            "advogado_oab": None, "advogado_cpf": None, "advogado_cnpj": None, "advogado_tipo_pessoa": None,
+        })
+        linhas.append(row)
+
+    return linhas
+
+
+def _df_csv_geral(processos: list) -> pd.DataFrame:
+    """Linhas formatadas do CSV geral para uma partição de processos."""
+    df_export = pd.DataFrame([linha for p in processos for linha in _linhas_csv_geral(p)], columns=COLUNAS_CSV_GERAL)
+
+    # Convertendo as colunas de CPF e CNPJ para string, preenchendo nulos e adicionando o apóstrofo
+    colunas_para_formatar = ["envolvido_cpf", "envolvido_cnpj", "advogado_cpf", "advogado_cnpj"]
+    for col in colunas_para_formatar:
+        # Preenche nulos com string vazia e adiciona o apóstrofo para forçar formato de texto
+        df_export[col] = df_export[col].fillna('').astype(str).apply(lambda x: f"'{x}")
+    for col in COLUNAS_CSV_GERAL_INTEIRAS:
+        df_export[col] = pd.to_numeric(df_export[col], errors="coerce").astype("Int64")
+    return df_export
+
+
+def _csv_da_particao(processos: list) -> str:
+    return _df_csv_geral(processos).to_csv(index=False, header=False)
+
+
+async def partes_csv_geral(tribunal_sigla: str, progresso=None):
+    """
+    Cabeçalho e, depois, o CSV de cada partição de processos, à medida que são
+    lidas. A formatação (pandas) roda no pool de threads do offload para não
+    travar o event loop quando o CSV é transmitido direto pela rota.
+    """
+    yield pd.DataFrame(columns=COLUNAS_CSV_GERAL).to_csv(index=False)
+    processos_lidos = 0
+    async with AsyncSessionRelatorios() as session:
+        stmt = (
+            select(Processo)
+            .options(*opcoes_grafo(processos_relacionados=True))
+            .where(Processo.unidade_origem_tribunal_sigla == tribunal_sigla)
+            .order_by(Processo.id)
+        )
+        async for processos in particoes(session, stmt):
+            processos_lidos += len(processos)
+            await _informar(progresso, processos_lidos)
+            yield await em_thread(_csv_da_particao, processos)
+
+
+async def _gerar_csv_geral(tribunal_sigla: str, destino: str, progresso=None):
+    """Gera em `destino` o CSV geral, escrevendo cada partição de processos assim que é lida."""
+    partes = 0
+    with open(destino, "w", encoding="utf-8", newline="") as f:
+        async for parte in partes_csv_geral(tribunal_sigla, progresso):
+            f.write(parte)
+            partes += 1
+
+    # Só o cabeçalho: nenhuma partição lida
+    if partes == 1:
+        raise RelatorioVazio("Nenhum processo encontrado para o tribunal fornecido.")
+
+
+# --- Lista de precatórios (XLSX) ---
+COLUNAS_PROCESSO_LISTA = [
+    "Nome do Réu", "CNPJ do Réu", "UF do Precatório", "Município do Precatório",
+    "Número dos Autos do Precatório", "Tipo do Precatório", "Tipo do Regime", "Ano orçamentário",
+    "Natureza do Precatório", "Valor Deferido", "Data base do cálculo homologado",
+    "Data de expedição do Precatório",
+]
+COLUNAS_CREDORES_LISTA = ["CNPJ / CPF do Credor", "Nome do Credor", "Tipo do Credor", *COLUNAS_PROCESSO_LISTA]
+COLUNAS_ADVOGADOS_LISTA = ["Nome do Advogado", "CPF do Advogado", "OAB", "Estado da OAB", *COLUNAS_PROCESSO_LISTA]
+
+
+def _texto_forcado(valor) -> str:
+    """Documento com apóstrofo na frente, como a planilha sempre saiu (vazio vira só o apóstrofo)."""
+    return f"'{'' if valor is None else valor}"
+
+
+async def _gerar_lista_precatorios(tribunal_sigla: str, destino: str, progresso=None):
+    """
+    Gera em `destino` o Excel (.xlsx) com dados de precatórios do tribunal.
+
+    Lê o resumo precalculado (app.resumo) dos processos do tribunal, com o
+    credor (polo ativo) e o réu (polo passivo) de cada um, em duas abas.
+    """
+    processos_lidos = 0
+    async with AsyncSessionRelatorios() as session:
+        stmt = (
+            select(PrecatorioResumo)
+            .where(PrecatorioResumo.tribunal_sigla == tribunal_sigla)
+            .order_by(PrecatorioResumo.processo_id)
+        )
+        with PlanilhaStreaming(destino) as planilha:
+            aba_credores = planilha.aba("Credores", COLUNAS_CREDORES_LISTA, colunas_texto=["CNPJ / CPF do Credor", "CNPJ do Réu"])
+            aba_advogados = planilha.aba("Advogados", COLUNAS_ADVOGADOS_LISTA, colunas_texto=["CPF do Advogado", "CNPJ do Réu"])
+
+            async for resumos in particoes(session, stmt):
+                processos_lidos += len(resumos)
+                await _informar(progresso, processos_lidos)
+                advogados_por_processo = await _advogados_do_resumo(
+                    session, [r.processo_id for r in resumos], PrecatorioResumoAdvogado.oab_ordem.is_not(None)
+                )
+                linhas_credores = []
+                linhas_advogados = []
+                for r in resumos:
+                    tipo_precatorio = tipo_precatorio_planilha(r.tribunal_sigla, r.reu_nome)
+
+                    dados_processo = {
+                        "Nome do Réu": r.reu_nome,
+                        "CNPJ do Réu": _texto_forcado(r.reu_cnpj),
+                        "UF do Precatório": r.estado_origem,
+                        "Município do Precatório": r.unidade_origem_cidade,
+                        "Número dos Autos do Precatório": r.numero_cnj,
+                        "Tipo do Precatório": tipo_precatorio,
+                        "Tipo do Regime": r.tipo_regime,
+                        "Ano orçamentário": r.ano_orcamentario,
+                        "Natureza do Precatório": r.natureza_precatorio,
+                        "Valor Deferido": r.valor_deferido,
+                        "Data base do cálculo homologado": r.data_base_calculo,
+                        "Data de expedição do Precatório": r.data_expedicao,
+                    }
+
+                    linhas_credores.append({
+                        "CNPJ / CPF do Credor": _texto_forcado(r.ativo_cnpj if r.ativo_cnpj else r.ativo_cpf),
+                        "Nome do Credor": r.ativo_nome,
+                        "Tipo do Credor": "Pessoa Jurídica" if r.ativo_cnpj else "Pessoa Física" if r.ativo_cpf else None,
+                        **dados_processo,
+                    })
+
+                    for a in advogados_por_processo.get(r.processo_id, []):
+                        linhas_advogados.append({
+                            "Nome do Advogado": a.advogado_nome,
+                            "CPF do Advogado": _texto_forcado(a.advogado_cpf),
+                            "OAB": a.oab_numero,
+                            "Estado da OAB": a.oab_uf,
+                            **dados_processo,
+                        })
+
+                aba_credores.escrever_dicts(linhas_credores)
+                aba_advogados.escrever_dicts(linhas_advogados)
+
+    if not processos_lidos:
+        raise RelatorioVazio("Nenhum processo encontrado para o tribunal fornecido.")
+
+
+# --- Requerentes e advogados (XLSX) ---
+COLUNAS_REQUERENTES = [
+    "processo_numero_cnj", "envolvido_nome", "envolvido_tipo_normalizado",
+    "envolvido_cpf", "envolvido_cnpj", "envolvido_tipo_pessoa",
+    "processo_ano_inicio", "processo_data_inicio", "processo_estado_origem",
+    "processo_unidade_origem_nome", "processo_unidade_origem_cidade", "processo_unidade_origem_estado",
+    "processo_unidade_origem_tribunal_sigla", "processo_data_ultima_movimentacao",
+    "processo_quantidade_movimentacoes", "processo_fontes_tribunais_estao_arquivadas",
+    "processo_data_ultima_verificacao", "processo_tempo_desde_ultima_verificacao",
+    "processo_relacionado_numero",
+    "fonte_sigla", "fonte_data_inicio", "fonte_sistema", "fonte_quantidade_envolvidos",
+    "capa_classe", "capa_assunto", "capa_valor_causa",
+]
+
+COLUNAS_ADVOGADOS = [
+    "advogado_nome", "advogado_tipo", "advogado_oab", "advogado_cpf", "advogado_cnpj", "advogado_tipo_pessoa",
+    "processo_numero_cnj",
+    "processo_ano_inicio", "processo_data_inicio", "processo_estado_origem",
+    "processo_unidade_origem_nome", "processo_unidade_origem_cidade", "processo_unidade_origem_estado",
+    "processo_unidade_origem_tribunal_sigla", "processo_data_ultima_movimentacao",
+    "processo_quantidade_movimentacoes", "processo_fontes_tribunais_estao_arquivadas",
+    "processo_data_ultima_verificacao", "processo_tempo_desde_ultima_verificacao",
+    "processo_relacionado_numero",
+    "fonte_sigla", "fonte_data_inicio", "fonte_sistema", "fonte_quantidade_envolvidos",
+    "capa_classe", "capa_assunto", "capa_valor_causa",
+]
+
+
+def _linhas_requerentes_advogados(p: Processo) -> list:
+    """Linhas de um processo para a planilha de requerentes/advogados (pelo menos uma por processo)."""
+    linhas = []
+    base = {
+        "processo_numero_cnj": p.numero_cnj,
+        "processo_ano_inicio": p.ano_inicio,
+        "processo_data_inicio": p.data_inicio.isoformat() if p.data_inicio else None,
+        "processo_estado_origem": p.estado_origem,
+        "processo_unidade_origem_nome": p.unidade_origem_nome,
+        "processo_unidade_origem_cidade": p.unidade_origem_cidade,
+        "processo_unidade_origem_estado": p.unidade_origem_estado,
+        "processo_unidade_origem_tribunal_sigla": p.unidade_origem_tribunal_sigla,
+        "processo_data_ultima_movimentacao": p.data_ultima_movimentacao.isoformat() if p.data_ultima_movimentacao else None,
+        "processo_quantidade_movimentacoes": p.quantidade_movimentacoes,
+        "processo_fontes_tribunais_estao_arquivadas": p.fontes_tribunais_estao_arquivadas,
+        "processo_data_ultima_verificacao": p.data_ultima_verificacao.isoformat() if p.data_ultima_verificacao else None,
+        "processo_tempo_desde_ultima_verificacao": p.tempo_desde_ultima_verificacao,
+        "processo_relacionado_numero": ", ".join([pr.numero for pr in p.processos_relacionados]),
+    }
+
+    added_any_for_process = False  # garante pelo menos 1 linha por processo
+
+    fontes = p.fontes or []
+    if not fontes:
+        # Sem fontes: garante linha base
+        linhas.append({
+            **base,
+            "fonte_sigla": None, "fonte_data_inicio": None, "fonte_sistema": None, "fonte_quantidade_envolvidos": None,
+            "capa_classe": None, "capa_assunto": None, "capa_valor_causa": None,
+            "envolvido_nome": None, "envolvido_tipo_normalizado": None,
+            "envolvido_cpf": None, "envolvido_cnpj": None, "envolvido_tipo_pessoa": None,
+            "advogado_nome": None, "advogado_tipo": None, "advogado_oab": None,
+            "advogado_cpf": None, "advogado_cnpj": None, "advogado_tipo_pessoa": None,
+        })
+        return linhas
+
+    for fonte in fontes:
+        capa = fonte.capa
+        row_common = {
+            **base,
+            "fonte_sigla": fonte.sigla,
+            "fonte_data_inicio": fonte.data_inicio.isoformat() if fonte.data_inicio else None,
+            "fonte_sistema": fonte.sistema,
+            "fonte_quantidade_envolvidos": fonte.quantidade_envolvidos,
+            "capa_classe": getattr(capa, "classe", None) if capa else None,
+            "capa_assunto": getattr(capa, "assunto", None) if capa else None,
+            "capa_valor_causa": (capa.valor_causa.valor_formatado if (capa and capa.valor_causa) else None),
+        }
+
+        envolvidos = fonte.envolvidos or []
+        if not envolvidos:
+            # Sem envolvidos: ainda assim registra linha base da fonte
+            linhas.append({
+                **row_common,
+                "envolvido_nome": None, "envolvido_tipo_normalizado": None,
+                "envolvido_cpf": None, "envolvido_cnpj": None, "envolvido_tipo_pessoa": None,
+                "advogado_nome": None, "advogado_tipo": None, "advogado_oab": None,
+                "advogado_cpf": None, "advogado_cnpj": None, "advogado_tipo_pessoa": None,
+            })
+            added_any_for_process = True
+            continue
+
+        for envolvido in envolvidos:
+            # Aceita Requerente e Autor; demais tipos também manterão a linha base
+            if envolvido.tipo_normalizado not in ("Requerente", "Autor"):
+                linhas.append({
+                    **row_common,
+                    "envolvido_nome": None, "envolvido_tipo_normalizado": None,
+                    "envolvido_cpf": None, "envolvido_cnpj": None, "envolvido_tipo_pessoa": None,
+                    "advogado_nome": None, "advogado_tipo": None, "advogado_oab": None,
+                    "advogado_cpf": None, "advogado_cnpj": None, "advogado_tipo_pessoa": None,
+                })
+                added_any_for_process = True
+                continue
+
+            # Sem advogados → registra mesmo assim
+            if not (envolvido.advogados or []):
+                linhas.append({
+                    **row_common,
+                    "envolvido_nome": envolvido.nome,
+                    "envolvido_tipo_normalizado": envolvido.tipo_normalizado,
+                    "envolvido_cpf": envolvido.cpf,
+                    "envolvido_cpf_digitos": envolvido.cpf_digitos,
+                    "envolvido_cnpj": envolvido.cnpj,
+                    "envolvido_tipo_pessoa": envolvido.tipo_pessoa,
+                    "advogado_nome": None, "advogado_tipo": None, "advogado_oab": None,
+                    "advogado_cpf": None, "advogado_cnpj": None, "advogado_tipo_pessoa": None,
+                })
+                added_any_for_process = True
+                continue
+
+            # Com advogados
+            for advogado in envolvido.advogados:
+                oabs = advogado.oabs or [None]
+                for oab in oabs:
+                    linhas.append({
+                        **row_common,
+                        "envolvido_nome": envolvido.nome,
+                        "envolvido_tipo_normalizado": envolvido.tipo_normalizado,
+                        "envolvido_cpf": envolvido.cpf,
+                        "envolvido_cpf_digitos": envolvido.cpf_digitos,
+                        "envolvido_cnpj": envolvido.cnpj,
+                        "envolvido_tipo_pessoa": envolvido.tipo_pessoa,
+                        "advogado_nome": advogado.nome,
+                        "advogado_tipo": advogado.tipo_normalizado,
+                        "advogado_oab": (f"{getattr(oab, 'numero', None)}/{getattr(oab, 'uf', None)}"
+                                         if oab and getattr(oab, "numero", None) and getattr(oab, "uf", None) else None),
+                        "advogado_cpf": advogado.cpf,
+                        "advogado_cpf_digitos": advogado.cpf_digitos,
+                        "advogado_cnpj": advogado.cnpj,
+                        "advogado_tipo_pessoa": advogado.tipo_pessoa,
+                    })
+                    added_any_for_process = True
+
+    if not added_any_for_process:
+        # redundância de segurança
+        linhas.append({
+            **base,
+            "fonte_sigla": None, "fonte_data_inicio": None, "fonte_sistema": None, "fonte_quantidade_envolvidos": None,
+            "capa_classe": None, "capa_assunto": None, "capa_valor_causa": None,
+            "envolvido_nome": None, "envolvido_tipo_normalizado": None,
+            "envolvido_cpf": None, "envolvido_cnpj": None, "envolvido_tipo_pessoa": None,
+            "advogado_nome": None, "advogado_tipo": None, "advogado_oab": None,
+            "advogado_cpf": None, "advogado_cnpj": None, "advogado_tipo_pessoa": None,
+        })
+
+    return linhas
+
+
+def _separar_por_cpf(df: pd.DataFrame, colunas: list, coluna_chave: str) -> tuple:
+    """
+    Dedup POR PROCESSO (chave = (processo_numero_cnj, CPF)); sem CPF => não deduplica.
+    `coluna_chave` é o CPF normalizado gravado na ingestão (*_cpf_digitos).
+    Retorna (linhas com CPF deduplicadas, linhas sem CPF).
+    """
+    parte = df.reindex(columns=colunas)
+    chave = df[coluna_chave] if coluna_chave in df.columns else pd.Series(None, index=df.index, dtype=object)
+    tem_cpf = chave.notna()
+    com_cpf = parte[tem_cpf]
+    sem_cpf = parte[~tem_cpf]
+    chaves = pd.DataFrame({"cnj": com_cpf["processo_numero_cnj"], "cpf": chave[tem_cpf]})
+    com_cpf = com_cpf[~chaves.duplicated(keep="first")]
+    return com_cpf, sem_cpf
+
+
+async def _gerar_requerentes_advogados(tribunal_sigla: str, destino: str, progresso=None):
+    """
+    Gera em `destino` um XLSX com duas abas:
+      • Requerentes: dedup POR PROCESSO (chave = (processo_numero_cnj, CPF)).
+                     Sem CPF => não deduplica.
+      • Advogados  : dedup POR PROCESSO (chave = (processo_numero_cnj, CPF)).
+                     Sem CPF => não deduplica.
+
+    Mantém o processo na planilha mesmo se não houver Autor/Requerente/Advogado.
+    Os processos são lidos em partições; como a dedup é por processo, cada
+    partição é deduplicada sozinha e escrita na hora (app.xlsx), com memória
+    constante.
+    """
+    processos_lidos = 0
+
+    # Linhas com CPF vão direto para a planilha; as sem CPF ficam em disco e
+    # entram no fim de cada aba (mesma ordem da versão sem partições)
+    req_sem_cpf = DataFramesEmDisco()
+    adv_sem_cpf = DataFramesEmDisco()
+    try:
+        with PlanilhaStreaming(destino) as planilha:
+            aba_req = planilha.aba("Requerentes", COLUNAS_REQUERENTES, colunas_texto=["envolvido_cpf", "envolvido_cnpj"])
+            aba_adv = planilha.aba("Advogados", COLUNAS_ADVOGADOS, colunas_texto=["advogado_cpf", "advogado_cnpj"])
+
+            # ===== Carrega processos em partições =====
+            async with AsyncSessionRelatorios() as session:
+                stmt = (
+                    select(Processo)
+                    .options(*opcoes_grafo(processos_relacionados=True))
+                    .where(Processo.unidade_origem_tribunal_sigla == tribunal_sigla)
+                    .order_by(Processo.id)
+                )
+                async for processos in particoes(session, stmt):
+                    processos_lidos += len(processos)
+                    await _informar(progresso, processos_lidos)
+                    df = pd.DataFrame([linha for p in processos for linha in _linhas_requerentes_advogados(p)])
+
+                    com_cpf, sem_cpf = _separar_por_cpf(df, COLUNAS_REQUERENTES, "envolvido_cpf_digitos")
+                    aba_req.escrever_df(com_cpf)
+                    req_sem_cpf.guardar(sem_cpf)
+
+                    com_cpf, sem_cpf = _separar_por_cpf(df, COLUNAS_ADVOGADOS, "advogado_cpf_digitos")
+                    aba_adv.escrever_df(com_cpf)
+                    adv_sem_cpf.guardar(sem_cpf)
+
+            for parte in req_sem_cpf.ler():
+                aba_req.escrever_df(parte)
+            for parte in adv_sem_cpf.ler():
+                aba_adv.escrever_df(parte)
+    finally:
+        req_sem_cpf.fechar()
+        adv_sem_cpf.fechar()
+
+    if not processos_lidos:
+        raise RelatorioVazio("Nenhum processo encontrado para o tribunal fornecido.")
+
+
+@dataclass(frozen=True)
+class Relatorio:
+    nome: str
+    nome_arquivo: str  # modelo com {tribunal} e {data} (datetime da geração)
+    media_type: str
+    por_resumo: bool  # lê precatorios_resumo (senão, o grafo de processos)
+    gerar: object  # async (tribunal_sigla, destino, data_geracao, progresso)
+    # Gerador assíncrono de partes de texto (tribunal_sigla): se houver, as rotas
+    # transmitem o relatório direto quando ele não está no cache
+    partes: object = None
+
+    @property
+    def extensao(self) -> str:
+        return os.path.splitext(self.nome_arquivo)[1]
+
+    def arquivo(self, tribunal_sigla: str, data_geracao: datetime) -> str:
+        return self.nome_arquivo.format(tribunal=tribunal_sigla, data=data_geracao)
+
+
+RELATORIOS = {
+    r.nome: r
+    for r in [
+        Relatorio(
+            "lemitt",
+            "lista-Lemitt-precatorios_{tribunal}_{data:%Y%m%d%H%M%S}.zip",
+            "application/zip",
+            por_resumo=True,
+            gerar=lambda t, destino, data, progresso: _gerar_zip_lemitt(t, destino, f"{data:%Y%m%d%H%M%S}", progresso),
+        ),
+        Relatorio(
+            "lista",
+            "relatorio_precatorios_{tribunal}_{data:%Y%m%d%H%M%S}.xlsx",
+            MEDIA_TYPE_XLSX,
+            por_resumo=True,
+            gerar=lambda t, destino, data, progresso: _gerar_lista_precatorios(t, destino, progresso),
+        ),
+        Relatorio(
+            "csv",
+            "relatorio_{tribunal}_{data:%Y%m%d%H%M%S}.csv",
+            "text/csv",
+            por_resumo=False,
+            gerar=lambda t, destino, data, progresso: _gerar_csv_geral(t, destino, progresso),
+            partes=partes_csv_geral,
+        ),
+        Relatorio(
+            "requerentes",
+            "requerentes_advogados_{tribunal}_{data:%Y%m%d_%H%M%S}.xlsx",
+            MEDIA_TYPE_XLSX,
+            por_resumo=False,
+            gerar=lambda t, destino, data, progresso: _gerar_requerentes_advogados(t, destino, progresso),
+        ),
+    ]
+}
+
+
+async def contar_processos(session, relatorio: str, tribunal_sigla: str) -> int:
+    """Quantos processos o relatório vai ler (total do progresso)."""
+    if RELATORIOS[relatorio].por_resumo:
+        coluna = PrecatorioResumo.tribunal_sigla
+    else:
+        coluna = Processo.unidade_origem_tribunal_sigla
+    return await session.scalar(select(func.count()).where(coluna == tribunal_sigla))
+
+
+async def tem_dados(session, relatorio: str, tribunal_sigla: str) -> bool:
+    """Se o relatório terá alguma linha (LIMIT 1, sem contar tudo)."""
+    if RELATORIOS[relatorio].por_resumo:
+        coluna = PrecatorioResumo.tribunal_sigla
+    else:
+        coluna = Processo.unidade_origem_tribunal_sigla
+    return (await session.execute(select(coluna).where(coluna == tribunal_sigla).limit(1))).first() is not None
+
+
+async def gerar_relatorio(relatorio: str, tribunal_sigla: str, destino: str, data_geracao: datetime, progresso=None):
+    """Gera o relatório `relatorio` (chave de RELATORIOS) do tribunal em `destino`."""
+    await RELATORIOS[relatorio].gerar(tribunal_sigla, destino, data_geracao, progresso)
@@ -0,0 +1,117 @@
+import logging
+import os
+
+import aiohttp
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Configuração do pool de conexões com a API do Escavador
+HTTP_LIMITE_CONEXOES = int(os.getenv("ESCAVADOR_HTTP_LIMITE_CONEXOES", "100"))
+HTTP_LIMITE_POR_HOST = int(os.getenv("ESCAVADOR_HTTP_LIMITE_POR_HOST", "50"))
+HTTP_KEEPALIVE = float(os.getenv("ESCAVADOR_HTTP_KEEPALIVE", "60"))  # segundos
+HTTP_DNS_TTL = int(os.getenv("ESCAVADOR_HTTP_DNS_TTL", "300"))  # segundos
+
+
+class EstatisticasConexao:
+    """Contadores de uso do pool, alimentados pelos hooks de trace do aiohttp."""
+
+    def __init__(self):
+        self.requisicoes = 0
+        self.conexoes_novas = 0
+        self.conexoes_reusadas = 0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        async def _requisicao(session, ctx, params):
+            self.requisicoes += 1
+
+        async def _conexao_nova(session, ctx, params):
+            self.conexoes_novas += 1
+
+        async def _conexao_reusada(session, ctx, params):
+            self.conexoes_reusadas += 1
+
+        async def _dns_hit(session, ctx, params):
+            self.dns_cache_hits += 1
+
+        async def _dns_miss(session, ctx, params):
+            self.dns_cache_misses += 1
+
+        trace.on_request_start.append(_requisicao)
+        trace.on_connection_create_end.append(_conexao_nova)
+        trace.on_connection_reuseconn.append(_conexao_reusada)
+        trace.on_dns_cache_hit.append(_dns_hit)
+        trace.on_dns_cache_miss.append(_dns_miss)
+        return trace
+
+    def como_dict(self) -> dict:
+        conexoes = self.conexoes_novas + self.conexoes_reusadas
+        return {
+            "requisicoes": self.requisicoes,
+            "conexoes_novas": self.conexoes_novas,
+            "conexoes_reusadas": self.conexoes_reusadas,
+            "taxa_reuso": round(self.conexoes_reusadas / conexoes, 4) if conexoes else None,
+            "dns_cache_hits": self.dns_cache_hits,
+            "dns_cache_misses": self.dns_cache_misses,
+        }
+
+
+class ClienteHttp:
+    """
+    ClientSession compartilhada por toda a aplicação.
+
+    É aberta no lifespan do app (ou no primeiro uso) e reaproveita as conexões
+    TCP/TLS entre lotes, em vez de uma sessão nova por batch.
+    """
+
+    def __init__(
+        self,
+        limite: int = HTTP_LIMITE_CONEXOES,
+        limite_por_host: int = HTTP_LIMITE_POR_HOST,
+        keepalive: float = HTTP_KEEPALIVE,
+        dns_ttl: int = HTTP_DNS_TTL,
+    ):
+        self.limite = limite
+        self.limite_por_host = limite_por_host
+        self.keepalive = keepalive
+        self.dns_ttl = dns_ttl
+        self.estatisticas = EstatisticasConexao()
+        self._sessao: aiohttp.ClientSession | None = None
+
+    async def abrir(self) -> aiohttp.ClientSession:
+        if self._sessao is None or self._sessao.closed:
+            conector = aiohttp.TCPConnector(
+                limit=self.limite,
+                limit_per_host=self.limite_por_host,
+                keepalive_timeout=self.keepalive,
+                ttl_dns_cache=self.dns_ttl,
+            )
+            self._sessao = aiohttp.ClientSession(
+                connector=conector,
+                trace_configs=[self.estatisticas.trace_config()],
+            )
+            logger.info(
+                f"Cliente HTTP aberto (limite={self.limite}, por host={self.limite_por_host}, "
+                f"keep-alive={self.keepalive}s, DNS TTL={self.dns_ttl}s)"
+            )
+        return self._sessao
+
+    async def fechar(self):
+        if self._sessao is not None and not self._sessao.closed:
+            await self._sessao.close()
+        self._sessao = None
+
+    def metricas(self) -> dict:
+        metricas = self.estatisticas.como_dict()
+        metricas["aberto"] = self._sessao is not None and not self._sessao.closed
+        metricas["limite_conexoes"] = self.limite
+        metricas["limite_por_host"] = self.limite_por_host
+        return metricas
+
+
+cliente_escavador = ClienteHttp()
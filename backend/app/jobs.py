@@ -0,0 +1,324 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from functools import partial
+
+from sqlalchemy import and_, bindparam, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.database import AsyncSessionLocal
+from app.models import IngestaoJob, IngestaoJobItem
+from app.arquivo import carregar_ultimas_respostas
+from app.worker import processar_lote, salvar_resultados
+
+logger = logging.getLogger(__name__)
+
+# Estados de um job
+JOB_RECEBENDO = "recebendo"
+JOB_PENDENTE = "pendente"
+JOB_EXECUTANDO = "executando"
+JOB_CONCLUIDO = "concluido"
+JOB_FALHOU = "falhou"  # pipeline abortado; não é retomado automaticamente
+JOB_CANCELADO = "cancelado"  # recebimento interrompido; os itens já gravados nunca são processados
+
+# Estados de cada CNJ dentro do job
+ITEM_PENDENTE = "pendente"
+ITEM_OBTIDO = "obtido"
+ITEM_SALVO = "salvo"
+ITEM_FALHOU = "falhou"
+
+# Quantos itens pendentes são lidos da tabela por página
+LOTE_JOB = 1000
+# Quantos itens são inseridos por INSERT ao alimentar o job
+LOTE_INSERCAO = 5000
+
+# Mantém referência às tarefas em execução (evita coleta pelo GC)
+_tarefas_ativas: dict[int, asyncio.Task] = {}
+
+
+def _agora() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def criar_job(nome_arquivo: str) -> int:
+    """
+    Cria um job vazio no estado 'recebendo'. Os CNJs são acrescentados com
+    `adicionar_itens` à medida que o arquivo é lido e o job só fica elegível
+    para execução (e retomada) depois de `finalizar_recebimento`.
+    """
+    async with AsyncSessionLocal() as session:
+        job = IngestaoJob(nome_arquivo=nome_arquivo, status=JOB_RECEBENDO, total=0, criado_em=_agora())
+        session.add(job)
+        await session.commit()
+        return job.id
+
+
+async def adicionar_itens(job_id: int, numeros_cnj: list) -> int:
+    """
+    Acrescenta CNJs 'pendente' ao job e retorna quantos eram inéditos no job
+    (repetidos são descartados pela restrição única job_id + numero_cnj).
+    """
+    inseridos = 0
+    async with AsyncSessionLocal() as session:
+        for i in range(0, len(numeros_cnj), LOTE_INSERCAO):
+            result = await session.execute(
+                pg_insert(IngestaoJobItem)
+                .values([
+                    {"job_id": job_id, "numero_cnj": numero, "status": ITEM_PENDENTE}
+                    for numero in numeros_cnj[i:i + LOTE_INSERCAO]
+                ])
+                .on_conflict_do_nothing(index_elements=["job_id", "numero_cnj"])
+                .returning(IngestaoJobItem.id)
+            )
+            inseridos += len(result.all())
+        await session.commit()
+    return inseridos
+
+
+async def finalizar_recebimento(job_id: int) -> int:
+    """Fecha o recebimento do job, grava o total de itens e o deixa 'pendente' (ou 'concluido', se vazio)."""
+    async with AsyncSessionLocal() as session:
+        total = await session.scalar(
+            select(func.count()).select_from(IngestaoJobItem).where(IngestaoJobItem.job_id == job_id)
+        )
+        valores = {"total": total, "status": JOB_PENDENTE if total else JOB_CONCLUIDO}
+        if not total:
+            valores["concluido_em"] = _agora()
+        await session.execute(update(IngestaoJob).where(IngestaoJob.id == job_id).values(**valores))
+        await session.commit()
+    return total
+
+
+async def cancelar_recebimento(job_id: int):
+    """
+    Encerra como 'cancelado' um job cujo arquivo não foi lido até o fim (erro
+    de leitura, coluna ausente): os CNJs já acrescentados são só parte do
+    arquivo e não devem ser processados nem retomados.
+    """
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(IngestaoJob)
+            .where(IngestaoJob.id == job_id, IngestaoJob.status == JOB_RECEBENDO)
+            .values(status=JOB_CANCELADO, concluido_em=_agora())
+        )
+        await session.commit()
+
+
+async def _registrar_estados(job_id: int, estados: list):
+    """Atualiza o estado dos itens do job a partir das tuplas (numero_cnj, status, erro)."""
+    if not estados:
+        return
+    tabela = IngestaoJobItem.__table__
+    stmt = (
+        update(tabela)
+        .where(and_(tabela.c.job_id == bindparam("b_job_id"), tabela.c.numero_cnj == bindparam("b_numero")))
+        .values(status=bindparam("b_status"), erro=bindparam("b_erro"), atualizado_em=bindparam("b_atualizado_em"))
+    )
+    agora = _agora()
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            stmt,
+            [
+                {"b_job_id": job_id, "b_numero": numero, "b_status": status, "b_erro": erro, "b_atualizado_em": agora}
+                for numero, status, erro in estados
+            ],
+        )
+        await session.commit()
+
+
+async def _itens_a_processar(job_id: int):
+    """Percorre em ordem de id os CNJs do job ainda não concluídos, em páginas de LOTE_JOB."""
+    ultimo_id = 0
+    while True:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(IngestaoJobItem.id, IngestaoJobItem.numero_cnj)
+                .where(
+                    IngestaoJobItem.job_id == job_id,
+                    IngestaoJobItem.id > ultimo_id,
+                    IngestaoJobItem.status.in_([ITEM_PENDENTE, ITEM_OBTIDO]),
+                )
+                .order_by(IngestaoJobItem.id)
+                .limit(LOTE_JOB)
+            )
+            itens = result.all()
+
+        if not itens:
+            return
+        ultimo_id = itens[-1].id
+        for item in itens:
+            yield item.numero_cnj
+
+
+async def _recuperar_obtidos(job_id: int):
+    """
+    Grava, a partir do arquivo de respostas, os itens que já tinham sido
+    consultados ('obtido') quando o job foi interrompido, sem nova chamada à API.
+    """
+    ultimo_id = 0
+    while True:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(IngestaoJobItem.id, IngestaoJobItem.numero_cnj)
+                .where(
+                    IngestaoJobItem.job_id == job_id,
+                    IngestaoJobItem.id > ultimo_id,
+                    IngestaoJobItem.status == ITEM_OBTIDO,
+                )
+                .order_by(IngestaoJobItem.id)
+                .limit(LOTE_JOB)
+            )
+            itens = result.all()
+            if not itens:
+                return
+            payloads = await carregar_ultimas_respostas(session, [item.numero_cnj for item in itens])
+
+        ultimo_id = itens[-1].id
+        # Os que não estiverem no arquivo continuam 'obtido' e são consultados de novo
+        estados = await salvar_resultados(list(payloads.items()))
+        await _registrar_estados(job_id, estados)
+        logger.info(f"Job {job_id}: {len(payloads)} CNJs recuperados do arquivo")
+
+
+async def executar_job(job_id: int):
+    """
+    Processa os itens ainda não concluídos do job ('pendente' ou 'obtido').
+
+    Os itens são percorridos em ordem de id, então um job retomado continua
+    de onde parou em vez de reprocessar o arquivo inteiro.
+    """
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(IngestaoJob)
+            .where(IngestaoJob.id == job_id)
+            .values(status=JOB_EXECUTANDO, execucao_iniciada_em=_agora())
+        )
+        await session.commit()
+
+    try:
+        await _recuperar_obtidos(job_id)
+        await processar_lote(_itens_a_processar(job_id), registrar=partial(_registrar_estados, job_id))
+    except Exception:
+        # Ex.: banco fora do ar durante a gravação derrubou o pipeline
+        logger.exception(f"Job {job_id} falhou")
+        await _encerrar_job(job_id, JOB_FALHOU)
+        raise
+
+    await _encerrar_job(job_id, JOB_CONCLUIDO)
+    logger.info(f"Job {job_id} concluído")
+
+
+async def _encerrar_job(job_id: int, status: str):
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(IngestaoJob)
+            .where(IngestaoJob.id == job_id)
+            .values(status=status, concluido_em=_agora())
+        )
+        await session.commit()
+
+
+def iniciar_job(job_id: int) -> asyncio.Task:
+    """Agenda a execução do job no event loop atual (no máximo uma tarefa por job)."""
+    tarefa = _tarefas_ativas.get(job_id)
+    if tarefa and not tarefa.done():
+        return tarefa
+
+    tarefa = asyncio.create_task(executar_job(job_id))
+    _tarefas_ativas[job_id] = tarefa
+
+    def _finalizar(t: asyncio.Task):
+        _tarefas_ativas.pop(job_id, None)
+        if not t.cancelled() and t.exception():
+            logger.error(f"Job {job_id} interrompido: {t.exception()!r}")
+
+    tarefa.add_done_callback(_finalizar)
+    return tarefa
+
+
+async def retomar_jobs() -> list:
+    """
+    Reagenda os jobs que não terminaram (ex.: o servidor reiniciou no meio).
+
+    Jobs ainda 'recebendo' perderam o upload junto com o processo (o arquivo
+    só é lido dentro da requisição) e são encerrados como 'cancelado'.
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            update(IngestaoJob)
+            .where(IngestaoJob.status == JOB_RECEBENDO)
+            .values(status=JOB_CANCELADO, concluido_em=_agora())
+            .returning(IngestaoJob.id)
+        )
+        cancelados = result.scalars().all()
+        await session.commit()
+    if cancelados:
+        logger.warning(f"Jobs com recebimento interrompido, cancelados: {cancelados}")
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(IngestaoJob.id)
+            .where(IngestaoJob.status.in_([JOB_PENDENTE, JOB_EXECUTANDO]))
+            .order_by(IngestaoJob.id)
+        )
+        job_ids = result.scalars().all()
+
+    for job_id in job_ids:
+        logger.info(f"Retomando job {job_id}")
+        iniciar_job(job_id)
+    return job_ids
+
+
+async def obter_status(job_id: int) -> dict | None:
+    """Retorna o progresso do job, com vazão (CNJs/s) da execução atual e ETA."""
+    async with AsyncSessionLocal() as session:
+        job = await session.get(IngestaoJob, job_id)
+        if not job:
+            return None
+
+        result = await session.execute(
+            select(IngestaoJobItem.status, func.count())
+            .where(IngestaoJobItem.job_id == job_id)
+            .group_by(IngestaoJobItem.status)
+        )
+        contagens = {status: qtd for status, qtd in result.all()}
+
+        concluidos_na_execucao = 0
+        if job.execucao_iniciada_em:
+            concluidos_na_execucao = await session.scalar(
+                select(func.count())
+                .select_from(IngestaoJobItem)
+                .where(
+                    IngestaoJobItem.job_id == job_id,
+                    IngestaoJobItem.status.in_([ITEM_SALVO, ITEM_FALHOU]),
+                    IngestaoJobItem.atualizado_em >= job.execucao_iniciada_em,
+                )
+            )
+
+    concluidos = contagens.get(ITEM_SALVO, 0) + contagens.get(ITEM_FALHOU, 0)
+    restantes = job.total - concluidos
+
+    vazao = None
+    eta_segundos = None
+    if job.execucao_iniciada_em and concluidos_na_execucao:
+        fim = job.concluido_em or _agora()
+        decorrido = (fim - job.execucao_iniciada_em).total_seconds()
+        if decorrido > 0:
+            vazao = concluidos_na_execucao / decorrido
+            eta_segundos = round(restantes / vazao) if job.status != JOB_CONCLUIDO else 0
+
+    return {
+        "job_id": job.id,
+        "arquivo": job.nome_arquivo,
+        "status": job.status,
+        "total": job.total,
+        "pendentes": contagens.get(ITEM_PENDENTE, 0),
+        "obtidos": contagens.get(ITEM_OBTIDO, 0),
+        "salvos": contagens.get(ITEM_SALVO, 0),
+        "falhas": contagens.get(ITEM_FALHOU, 0),
+        "criado_em": job.criado_em,
+        "execucao_iniciada_em": job.execucao_iniciada_em,
+        "concluido_em": job.concluido_em,
+        "cnjs_por_segundo": round(vazao, 3) if vazao else None,
+        "eta_segundos": eta_segundos,
+    }
@@ -0,0 +1,150 @@
+import csv
+import io
+import logging
+
+import chardet
+import openpyxl
+import pandas as pd
+
+from app.offload import em_thread
+
+logger = logging.getLogger(__name__)
+
+# Bytes lidos do upload por vez ao gravar em disco
+TAMANHO_BLOCO_UPLOAD = 1024 * 1024
+# Prefixo do arquivo usado para detectar encoding e separador
+TAMANHO_AMOSTRA = 64 * 1024
+# Linhas por DataFrame entregue ao chamador
+LINHAS_POR_CHUNK = 20_000
+
+SEPARADORES_ACEITOS = ";,\t|"
+
+
+async def salvar_upload(file, destino: str) -> int:
+    """
+    Grava o UploadFile em disco em blocos, sem carregar o arquivo inteiro na
+    memória; a escrita de cada bloco vai para o pool de threads.
+    """
+    total = 0
+    with open(destino, "wb") as f:
+        while True:
+            bloco = await file.read(TAMANHO_BLOCO_UPLOAD)
+            if not bloco:
+                break
+            await em_thread(f.write, bloco)
+            total += len(bloco)
+    return total
+
+
+def detectar_formato_csv(caminho: str) -> tuple[str, str]:
+    """Detecta encoding e separador a partir de um prefixo do arquivo. Retorna (encoding, separador)."""
+    with open(caminho, "rb") as f:
+        amostra = f.read(TAMANHO_AMOSTRA)
+
+    try:
+        # A amostra pode terminar no meio de um caractere multibyte
+        texto = amostra.decode("utf-8-sig") if len(amostra) < TAMANHO_AMOSTRA else amostra[:-4].decode("utf-8-sig")
+        encoding = "utf-8-sig" if amostra.startswith(b"\xef\xbb\xbf") else "utf-8"
+    except UnicodeDecodeError:
+        encoding = chardet.detect(amostra)["encoding"] or "latin-1"
+        texto = amostra.decode(encoding, errors="ignore")
+
+    # Só linhas completas vão para o sniffer
+    linhas = texto.splitlines()
+    if len(amostra) == TAMANHO_AMOSTRA and len(linhas) > 1:
+        linhas = linhas[:-1]
+    try:
+        separador = csv.Sniffer().sniff("\n".join(linhas), delimiters=SEPARADORES_ACEITOS).delimiter
+    except csv.Error:
+        separador = ","
+
+    logger.info(f"CSV {caminho}: encoding={encoding}, separador={separador!r}")
+    return encoding, separador
+
+
+def _normalizar_colunas(df: pd.DataFrame) -> pd.DataFrame:
+    df.columns = df.columns.astype(str).str.strip().str.lower()
+    return df
+
+
+def ler_csv_em_chunks(caminho: str, linhas_por_chunk: int = LINHAS_POR_CHUNK):
+    """Lê o CSV com o parser C do pandas, em DataFrames de até `linhas_por_chunk` linhas (tudo str)."""
+    encoding, separador = detectar_formato_csv(caminho)
+    leitor = pd.read_csv(
+        caminho,
+        dtype=str,
+        encoding=encoding,
+        encoding_errors="replace",
+        sep=separador,
+        chunksize=linhas_por_chunk,
+        skip_blank_lines=True,
+    )
+    with leitor:
+        for df in leitor:
+            yield _normalizar_colunas(df)
+
+
+def _celula_como_texto(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def ler_xlsx_em_chunks(caminho: str, linhas_por_chunk: int = LINHAS_POR_CHUNK):
+    """Lê a primeira aba do XLSX em modo read-only, em DataFrames de até `linhas_por_chunk` linhas."""
+    wb = openpyxl.load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        linhas = wb.worksheets[0].iter_rows(values_only=True)
+        cabecalho = next(linhas, None)
+        if cabecalho is None:
+            return
+        colunas = ["" if c is None else str(c) for c in cabecalho]
+
+        bloco = []
+        for linha in linhas:
+            if all(v is None for v in linha):
+                continue
+            valores = list(linha[:len(colunas)]) + [None] * (len(colunas) - len(linha))
+            bloco.append([_celula_como_texto(v) for v in valores])
+            if len(bloco) >= linhas_por_chunk:
+                yield _normalizar_colunas(pd.DataFrame(bloco, columns=colunas, dtype=object))
+                bloco = []
+        if bloco:
+            yield _normalizar_colunas(pd.DataFrame(bloco, columns=colunas, dtype=object))
+    finally:
+        wb.close()
+
+
+def ler_tabela_em_chunks(caminho: str, nome_arquivo: str, linhas_por_chunk: int = LINHAS_POR_CHUNK):
+    """Escolhe o leitor pelo nome do arquivo (.csv ou .xlsx). As colunas vêm em minúsculas e sem espaços."""
+    if nome_arquivo.endswith(".csv"):
+        return ler_csv_em_chunks(caminho, linhas_por_chunk)
+    return ler_xlsx_em_chunks(caminho, linhas_por_chunk)
+
+
+def deduplicar_arquivo(origem: str, destino: str) -> bool:
+    """
+    Regrava `origem` em `destino` sem linhas repetidas na coluna 'numero'
+    (fica a primeira), no formato indicado pela extensão de cada um. Retorna
+    False, sem gravar, se não houver a coluna 'numero'.
+
+    Lê o arquivo inteiro: roda num processo do offload (app.offload.em_processo).
+    """
+    if origem.endswith((".xlsx", ".xls")):
+        df = pd.read_excel(origem)
+    else:
+        with open(origem, "rb") as f:
+            conteudo = f.read()
+        encoding = chardet.detect(conteudo)["encoding"]
+        df = pd.read_csv(io.BytesIO(conteudo), dtype=str, sep=None, engine="python", encoding=encoding)
+
+    if "numero" not in df.columns:
+        return False
+    df = df.drop_duplicates(subset=["numero"], keep="first")
+    if destino.endswith(".csv"):
+        df.to_csv(destino, index=False, encoding="utf-8")
+    else:
+        df.to_excel(destino, index=False)
+    return True
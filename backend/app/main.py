@@ -1,26 +1,69 @@
+import asyncio
 import os
 import pandas as pd
-import chardet
-from fastapi import BackgroundTasks, FastAPI, UploadFile, File, HTTPException
+from fastapi import BackgroundTasks, FastAPI, UploadFile, File, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, StreamingResponse
-from app.worker import processar_lote
-from app.database import AsyncSessionLocal
-from sqlalchemy import select, delete
-from sqlalchemy.orm import joinedload
-from sqlalchemy.dialects.postgresql import insert
-from app.models import Processo, Fonte, Capa, Envolvido, InformacaoComplementar, Advogado, OAB, DadosPrecatorio
-
-import openpyxl 
+from app.database import AsyncSessionLocal, AsyncSessionRelatorios, fechar_engines, init_db, preencher_dados
+from app.arquivo import reprocessar_arquivo
+from app.atualizacao import ATUALIZACAO_AUTOMATICA, atualizar_processos, loop_atualizacao, selecionar_desatualizados
+from app.http_client import cliente_escavador
+from app.rate_limit import limitador_escavador
+from app.jobs import adicionar_itens, cancelar_recebimento, criar_job, finalizar_recebimento, iniciar_job, obter_status, retomar_jobs
+from app.leitura import deduplicar_arquivo, ler_tabela_em_chunks, salvar_upload
+from app.monitor_loop import MonitorLoopMiddleware, monitor_loop
+from app.offload import em_processo, em_thread, encerrar as encerrar_offload, iterar_em_thread
+from sqlalchemy import select
+from app.models import Processo
+from app.cache_relatorios import cache_relatorios, etag, etag_confere
+from app.busca import BUSCA_TAMANHO_MINIMO, TIPOS as TIPOS_BUSCA, buscar_nomes
+from app.dados_complementares import gravar_dados_precatorios, somar_rejeicoes
+from app.exportacoes import RELATORIOS, tem_dados
+from app.relatorios_jobs import (
+    JOB_CONCLUIDO,
+    JOB_FALHOU,
+    JOB_SEM_DADOS,
+    aguardar_job,
+    carregar_job,
+    descrever_job,
+    encerrar_pool,
+    solicitar_relatorio,
+    vigiar_relatorios,
+)
+from app.versoes import confirmar, publicar_versoes, versao_tribunal
+
 from datetime import datetime
-import csv
-import io
 import logging
-import re
-import zipfile
-from io import BytesIO, StringIO
-
-app = FastAPI(title="API de Processamento de Precatórios - RECALL")
+from contextlib import asynccontextmanager
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    monitor_loop.iniciar()
+    await init_db()
+    # Versões que um processo anterior deixou de publicar (app.versoes)
+    await publicar_versoes()
+    # Backfills das migrações em lotes, sem segurar o startup
+    tarefa_preenchimentos = asyncio.create_task(preencher_dados())
+    await cliente_escavador.abrir()
+    # Retoma jobs de ingestão interrompidos por um restart
+    await retomar_jobs()
+    # E os relatórios abandonados na fila ou gerando (agora e periodicamente: o dono pode cair depois)
+    tarefa_relatorios = asyncio.create_task(vigiar_relatorios())
+    tarefa_atualizacao = asyncio.create_task(loop_atualizacao()) if ATUALIZACAO_AUTOMATICA else None
+    yield
+    if tarefa_atualizacao:
+        tarefa_atualizacao.cancel()
+    tarefa_preenchimentos.cancel()
+    tarefa_relatorios.cancel()
+    encerrar_pool()
+    encerrar_offload()
+    monitor_loop.parar()
+    await cliente_escavador.fechar()
+    await fechar_engines()
+
+
+app = FastAPI(title="API de Processamento de Precatórios - RECALL", lifespan=lifespan)
 
 # Configuração do CORS
 origins = ["http://localhost:3000", "http://127.0.0.1:3000"]
@@ -31,6 +74,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Requisições em andamento, para os avisos de event loop bloqueado
+app.add_middleware(MonitorLoopMiddleware)
 
 # Pasta para arquivos temporários
 UPLOAD_DIR = "uploads"
@@ -57,6 +102,24 @@ def formatar_cnj(numero: str) -> str:
         return numero  # Retorna como está se não tiver 20 dígitos
     return f"{numero[:7]}-{numero[7:9]}.{numero[9:13]}.{numero[13]}.{numero[14:16]}.{numero[16:]}"
 
+def _cnjs_do_chunk(df: pd.DataFrame) -> list:
+    """Extrai, limpa e formata os CNJs da coluna 'numero' de um chunk."""
+    if "numero" not in df.columns:
+        logger.error("Coluna 'numero' não encontrada no arquivo")
+        raise HTTPException(status_code=400, detail="O arquivo deve conter a coluna 'numero'")
+    return df["numero"].dropna().str.strip().map(formatar_cnj).tolist()
+
+
+async def _cnjs_existentes(numeros_cnj) -> set:
+    """CNJs da lista já gravados em processos, numa sessão curta (sem transação aberta entre chunks)."""
+    existentes = set()
+    async with AsyncSessionLocal() as session:
+        for cnj_chunk in chunks(list(numeros_cnj), 1000):
+            result = await session.execute(select(Processo.numero_cnj).where(Processo.numero_cnj.in_(cnj_chunk)))
+            existentes.update(result.scalars())
+    return existentes
+
+
 @app.post("/upload-lista-precatorios", tags=["Popular DB"])
 async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
    
@@ -67,79 +130,53 @@ async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File
         raise HTTPException(status_code=400, detail="Arquivo deve ser CSV ou XLSX")
     
     file_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
- 
+    await salvar_upload(file, file_path)
 
     # Agenda exclusão do arquivo após envio
     background_tasks.add_task(delete_file, file_path)
 
-    df = None
-    if file.filename.endswith(".csv"):
-        with open(file_path, "rb") as f:
-            rawdata = f.read()
-            result = chardet.detect(rawdata)
-        encoding = result["encoding"] or "utf-8"
-        logger.info(f"Encoding detectado: {encoding}")
-
-        try:
-            df = pd.read_csv(file_path, dtype=str, encoding=encoding, sep=None, engine='python')
-            logger.info(f"CSV lido com sucesso. Total de linhas: {len(df)}")
-        except Exception as e:
-            logger.error(f"Erro ao ler CSV: {e}")
-            raise HTTPException(status_code=500, detail=f"Erro ao ler CSV: {e}")
-    
-    elif file.filename.endswith(".xlsx"):
-        try:
-            df = pd.read_excel(file_path, dtype=str, engine="openpyxl")
-            logger.info(f"XLSX lido com sucesso. Total de linhas: {len(df)}")
-        except Exception as e:
-            logger.error(f"Erro ao ler XLSX: {e}")
-            raise HTTPException(status_code=500, detail=f"Erro ao ler XLSX: {e}")
-
-    df.columns = df.columns.str.strip().str.lower()
-    if "numero" not in df.columns:
-        logger.error("Coluna 'numero' não encontrada no arquivo")
-        raise HTTPException(status_code=400, detail="O arquivo deve conter a coluna 'numero'")
-    
-    total_linhas_originais = len(df)
-
-    # Remove espaços, aplica formatação e remove duplicatas
-    df['numero'] = df['numero'].str.strip().apply(formatar_cnj)
-    df_deduplicado = df.drop_duplicates(subset=['numero'], keep='first')
-    
-    total_deduplicado_interno = total_linhas_originais - len(df_deduplicado)
-    df = df_deduplicado # Atribui o DataFrame limpo de volta
-
-    numeros_cnj_csv = df["numero"].dropna().tolist()
-    logger.info(f"Total de CNJs após remover duplicatas internas: {len(numeros_cnj_csv)}")
-    logger.info(f"Duplicatas internas removidas. Total de linhas únicas: {len(df)}")
-    # Consulta CNJs existentes no banco
-    existing_cnjs = set()
-    # Usa o 'async with' aqui para garantir que a sessão é fechada (como já está)
-    # Consulta CNJs existentes no banco
-    async with AsyncSessionLocal() as session:
-        # APLICAR O CHUNKING AQUI
-        for cnj_chunk in chunks(numeros_cnj_csv, 1000): # O tamanho do chunk pode ser ajustado
-            existing_processos = await session.execute(
-                select(Processo.numero_cnj).where(Processo.numero_cnj.in_(cnj_chunk))
-            )
-            # Adiciona os CNJs existentes do chunk ao nosso set
-            existing_cnjs.update({p[0] for p in existing_processos})
+    # Lê o arquivo em chunks: cada chunk é filtrado contra o banco e já
+    # alimenta o job, sem carregar o arquivo inteiro na memória
+    job_id = await criar_job(file.filename)
+    total_linhas_originais = 0
+    total_novos = 0
+    # CNJs do arquivo já consultados no banco e, entre eles, os já gravados, de
+    # todos os chunks: um CNJ repetido em chunks diferentes é consultado e
+    # contado uma vez só
+    cnjs_vistos = set()
+    cnjs_existentes = set()
+    try:
+        # Leitura e parse de cada chunk no pool de threads, fora do event loop
+        async for df in iterar_em_thread(ler_tabela_em_chunks(file_path, file.filename)):
+            numeros_cnj_csv = await em_thread(_cnjs_do_chunk, df)
+            total_linhas_originais += len(df)
+
+            ineditos = set(numeros_cnj_csv) - cnjs_vistos
+            cnjs_vistos |= ineditos
+            cnjs_existentes |= await _cnjs_existentes(ineditos)
+
+            # Duplicatas internas do arquivo são descartadas pelo próprio job
+            numeros_cnj_para_processar = [cnj for cnj in numeros_cnj_csv if cnj not in cnjs_existentes]
+            total_novos += await adicionar_itens(job_id, numeros_cnj_para_processar)
+    except HTTPException:
+        await cancelar_recebimento(job_id)
+        raise
+    except Exception as e:
+        await cancelar_recebimento(job_id)
+        logger.error(f"Erro ao ler arquivo: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro ao ler arquivo: {e}")
 
-    logger.info(f"CNJs já existentes no banco: {len(existing_cnjs)}")
+    await finalizar_recebimento(job_id)
+    logger.info(f"Arquivo lido. Total de linhas: {total_linhas_originais}")
 
-    # Filtra CNJs que serão processados
-    numeros_cnj_para_processar = [cnj for cnj in numeros_cnj_csv if cnj not in existing_cnjs]
-    total_novos = len(numeros_cnj_para_processar)
-    total_existentes = len(existing_cnjs)
-    
-    # --- NOVO: Soma o total geral de deduplicação ---
-    total_deduplicado_geral = total_deduplicado_interno + total_existentes
+    total_existentes = len(cnjs_existentes)
+    total_deduplicado_geral = total_linhas_originais - total_novos
+    total_deduplicado_interno = total_deduplicado_geral - total_existentes
 
+    logger.info(f"CNJs já existentes no banco: {total_existentes}")
     logger.info(f"CNJs a processar: {total_novos}")
 
-    if not numeros_cnj_para_processar:
+    if not total_novos:
         aviso = (
             f"Nenhum novo precatório para processar. "
             f"{total_existentes} já existem no banco de dados. "
@@ -148,52 +185,105 @@ async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File
         logger.info(aviso)
         return {"detail": aviso}
 
-    # Processa em lotes
-    batch_size = 200
-    for start in range(0, total_novos, batch_size):
-        batch = numeros_cnj_para_processar[start:start + batch_size]
-        await processar_lote(batch)
-        logger.info(f"Lote processado: {start} a {start + len(batch)}")
+    # Processa o job em segundo plano
+    iniciar_job(job_id)
 
     aviso_final = (
-        f"Arquivo processado com sucesso! "
-        f"{total_novos} novos precatórios processados. "
+        f"Arquivo recebido com sucesso! "
+        f"{total_novos} novos precatórios enviados para processamento (job {job_id}). "
         f"{total_existentes} já existiam no DB e foram ignorados. "
         f"{total_deduplicado_interno} duplicatas internas do arquivo foram removidas. "
         f"Total de processos ignorados: {total_deduplicado_geral}."
     )
     logger.info(aviso_final)
     
-    return {"detail": aviso_final}
+    return {"detail": aviso_final, "job_id": job_id}
 
 
-def chunks(lst, n):
-    """Divide uma lista em pedaços (chunks) de tamanho 'n'."""
-    for i in range(0, len(lst), n):
-        yield lst[i:i + n]
-def auto_ajustar_colunas(worksheet, dataframe):
-    """Ajusta a largura das colunas de uma planilha Excel ao conteúdo do DataFrame."""
-    for i, col in enumerate(dataframe.columns):
-        column_letter = openpyxl.utils.get_column_letter(i + 1)
-        max_length = 0
-        
-        # Pega o tamanho do cabeçalho da coluna
-        header_length = len(str(col))
-        max_length = max(max_length, header_length)
-        
-        # Pega o tamanho máximo do conteúdo da coluna
-        for cell in worksheet[column_letter]:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except (TypeError, ValueError):
-                pass
-        
-        # Define a largura da coluna com uma margem extra para melhor visualização
-        adjusted_width = max_length + 2
-        worksheet.column_dimensions[column_letter].width = adjusted_width
+@app.post("/replay-arquivo", tags=["Popular DB"])
+async def replay_arquivo(background_tasks: BackgroundTasks, tribunal_sigla: str | None = None, somente_novos: bool = False):
+    """
+    Reconstrói as tabelas a partir das respostas brutas arquivadas do Escavador,
+    sem consumir a API. Útil após corrigir o mapeamento ou adicionar colunas.
+    """
+    background_tasks.add_task(reprocessar_arquivo, tribunal_sigla, not somente_novos)
+    alvo = tribunal_sigla or "todos os tribunais"
+    return {"detail": f"Replay do arquivo iniciado em segundo plano ({alvo})."}
+
+
+@app.post("/atualizar-processos", tags=["Popular DB"])
+async def atualizar_processos_desatualizados(
+    background_tasks: BackgroundTasks,
+    limiar_dias: int = 30,
+    limite: int = 200,
+    tribunal_sigla: str | None = None,
+):
+    """
+    Consulta de novo os processos cuja última verificação/movimentação é mais
+    antiga que `limiar_dias` e regrava os dados em segundo plano.
+    """
+    numeros = await selecionar_desatualizados(limiar_dias, limite, tribunal_sigla)
+    if not numeros:
+        return {"detail": "Nenhum processo desatualizado encontrado."}
+    background_tasks.add_task(atualizar_processos, numeros)
+    return {"detail": f"{len(numeros)} processos enviados para atualização."}
+
+
+@app.get("/metricas/http", tags=["Popular DB"])
+async def metricas_http():
+    """Estatísticas do pool HTTP do Escavador (conexões novas x reaproveitadas) e do limitador."""
+    return {**cliente_escavador.metricas(), "limitador": limitador_escavador.metricas()}
+
+
+@app.get("/metricas/loop", tags=["Popular DB"])
+async def metricas_loop():
+    """Bloqueios do event loop acima de LOOP_LAG_LIMITE_MS desde o início (ver app.monitor_loop)."""
+    return monitor_loop.metricas()
+
+
+@app.get("/jobs/{job_id}", tags=["Popular DB"])
+async def status_job(job_id: int):
+    """Retorna o progresso de um job de ingestão: contagem por estado, vazão e ETA."""
+    status = await obter_status(job_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Job não encontrado.")
+    return status
+
+
+@app.get("/busca/nomes", tags=["Busca"])
+async def busca_nomes(
+    q: str,
+    tipo: str | None = None,
+    polo: str | None = None,
+    tribunal_sigla: str | None = None,
+    limite: int = 50,
+    cursor: str | None = None,
+):
+    """
+    Busca envolvidos e/ou advogados pelo nome no cadastro de pessoas e
+    advogados (só quem tem CPF/CNPJ ou OAB), sem diferenciar acentos e
+    maiúsculas, e retorna os processos onde aparecem, do mais parecido para o
+    menos parecido. Para a próxima página, repita a chamada com `cursor=proximo`.
+    """
+    if len(q.strip()) < BUSCA_TAMANHO_MINIMO:
+        raise HTTPException(status_code=400, detail=f"O termo deve ter pelo menos {BUSCA_TAMANHO_MINIMO} caracteres.")
+    if tipo and tipo not in TIPOS_BUSCA:
+        raise HTTPException(status_code=400, detail=f"tipo deve ser um de: {', '.join(TIPOS_BUSCA)}")
+
+    async with AsyncSessionRelatorios() as session:
+        try:
+            return await buscar_nomes(
+                session,
+                q,
+                tipos=(tipo,) if tipo else TIPOS_BUSCA,
+                cursor=cursor,
+                limite=limite,
+                polo=polo.upper() if polo else None,
+                tribunal_sigla=tribunal_sigla,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-#--------------------------------------uploadlistacomplementar------
 
 def chunks(lst, n):
     """Divide uma lista em pedaços (chunks) de tamanho 'n'."""
@@ -201,6 +291,17 @@ def chunks(lst, n):
         yield lst[i:i + n]
 
 
+#--------------------------------------uploadlistacomplementar------
+
+def _novos_do_chunk(df: pd.DataFrame, cnjs_vistos: set) -> pd.DataFrame:
+    """Formata os CNJs do chunk e descarta os repetidos no chunk ou em chunks anteriores (atualiza `cnjs_vistos`)."""
+    df = df.dropna(subset=['numero'])
+    df['numero'] = df['numero'].str.strip().map(formatar_cnj)
+    df = df.drop_duplicates(subset=['numero'], keep='first')
+    df = df[~df['numero'].isin(cnjs_vistos)]
+    cnjs_vistos.update(df['numero'])
+    return df
+
 
 @app.post("/upload-dados-complementares-precatorios", tags=["Popular DB"])
 async def upload_dados_precatorios(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
@@ -209,486 +310,127 @@ async def upload_dados_precatorios(background_tasks: BackgroundTasks, file: Uplo
 
     os.makedirs(UPLOAD_DIR, exist_ok=True)
     file_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+    await salvar_upload(file, file_path)
     background_tasks.add_task(delete_file, file_path)
     logger.info(f"Arquivo salvo temporariamente em: {file_path}")
 
-    # Lê o arquivo e normaliza os dados
-    if file.filename.endswith(".csv"):
-        with open(file_path, "rb") as f:
-            rawdata = f.read()
-            result = chardet.detect(rawdata)
-        encoding = result["encoding"] or "utf-8"
-        df = pd.read_csv(file_path, dtype=str, encoding=encoding, sep=None, engine='python')
-    else:
-        df = pd.read_excel(file_path, dtype=str, engine="openpyxl")
-
-    df.columns = df.columns.str.strip().str.lower()
-    if "numero" not in df.columns:
-        raise HTTPException(status_code=400, detail="O arquivo deve conter a coluna 'numero'")
-    
-    df['numero'] = df['numero'].str.strip().apply(formatar_cnj)
-    df = df.drop_duplicates(subset=['numero'], keep='first')
-    
-    cnj_list = df['numero'].tolist()
     total_processados = 0
+    rejeicoes = {}
+    cnjs_vistos = set()
 
     async with AsyncSessionLocal() as session:
-        # Mapeia CNJ -> processo_id existentes
-        processos_map = {}
-        for cnj_chunk in chunks(cnj_list, 1000):
-            existing_processos = await session.execute(
-                select(Processo.numero_cnj, Processo.id).where(Processo.numero_cnj.in_(cnj_chunk))
-            )
-            processos_map.update({p.numero_cnj: p.id for p in existing_processos.all()})
-
-        # Prepara a lista de dados para inserção
-        dados_precatorios_a_inserir = []
-        processo_ids_a_excluir = []
-
-        for _, row in df.iterrows():
-            numero_cnj = row['numero']
-            processo_id = processos_map.get(numero_cnj)
-
-            if not processo_id:
-                logger.warning(f"Processo com CNJ {numero_cnj} não encontrado. Ignorando linha.")
-                continue
-
-            # Parsear e tratar os dados
-            valor_deferido = None
-            valor_deferido_str = row.get("valor_deferido")
-            if valor_deferido_str:
-                try:
-                    valor_deferido = float(valor_deferido_str.replace("R$", "").replace(".", "").replace(",", ".").strip())
-                except (ValueError, TypeError):
-                    logger.warning(f"Valor deferido inválido para CNJ {numero_cnj}: '{valor_deferido_str}'.")
-
-            data_base = None
-            if row.get("data_base_calculo"):
-                try:
-                    data_base = datetime.strptime(row["data_base_calculo"], "%m/%Y").date().replace(day=1)
-                except Exception:
-                    logger.warning(f"Data base inválida para CNJ {numero_cnj}: {row['data_base_calculo']}")
-            
-            # Adicionar o ID à lista de IDs a serem excluídos e o objeto à lista de inserção
-            processo_ids_a_excluir.append(processo_id)
-            dados_precatorios_a_inserir.append(DadosPrecatorio(
-                processo_id=processo_id,
-                tipo_regime=row.get("tipo_regime"),
-                ano_orcamentario=int(row["ano_orcamentario"]) if row.get("ano_orcamentario") else None,
-                natureza_precatorio=row.get("natureza_precatorio"),
-                valor_deferido=valor_deferido,
-                data_base_calculo=data_base,
-                data_expedicao=pd.to_datetime(row.get("data_expedicao"), errors="coerce").date() if row.get("data_expedicao") else None,
-            ))
-            total_processados += 1
-
-        # Excluir registros existentes em massa
-        if processo_ids_a_excluir:
-            await session.execute(
-                delete(DadosPrecatorio).where(DadosPrecatorio.processo_id.in_(processo_ids_a_excluir))
-            )
-        
-        # Inserir novos registros em massa
-        if dados_precatorios_a_inserir:
-            session.add_all(dados_precatorios_a_inserir)
-        
-        await session.commit()
-
-    return {"detail": f"Upload finalizado. {total_processados} registros inseridos."}
-
-def _digits(x, length=11) -> str:
-    """Normaliza CPF/CNPJ como string, removendo caracteres não numéricos e completando zeros à esquerda."""
-    if pd.isna(x): 
-        return ""
-    s = str(x).strip()
-    s = re.sub(r"\D+", "", s)  # Remove tudo que não é dígito
-    return s.zfill(length) 
-
-# Lista de palavras-chave para identificar Entes Públicos
-ENTE_PUBLICO_KEYWORDS = ["estado", "municipio", "autarquia", "união", "federal", "fundação pública", "empresa pública"]
-
-def is_ente_publico(envolvido: Envolvido) -> bool:
-    """Verifica se um envolvido é provável de ser um Ente Público."""
-    if envolvido.nome:
-        nome_lower = envolvido.nome.lower()
-        for keyword in ENTE_PUBLICO_KEYWORDS:
-            if keyword in nome_lower:
-                return True
-    
-    # Heurística: CNPJ geralmente indica Pessoa Jurídica, mas entes públicos também usam CNPJ.
-    # Vamos focar na análise do nome e do tipo normalizado, se disponível.
-    return False
-
-def extract_uf_processo_originario(fontes) -> str | None:
-    """Busca nas informações complementares das fontes o valor da UF do processo originário."""
-    for fonte in fontes:
-        if fonte.capa and hasattr(fonte.capa, "informacoes_complementares"):
-            for info in fonte.capa.informacoes_complementares:
-                if info.tipo == "Processos originários" and info.valor:
-                    match = re.search(r'/([A-Z]{2})$', info.valor.strip())
-                    if match:
-                        return match.group(1)
-    return None
+        # Lê o arquivo em chunks e grava cada um assim que é lido
+        async for df in iterar_em_thread(ler_tabela_em_chunks(file_path, file.filename)):
+            if "numero" not in df.columns:
+                raise HTTPException(status_code=400, detail="O arquivo deve conter a coluna 'numero'")
+            df = await em_thread(_novos_do_chunk, df, cnjs_vistos)
 
+            gravados, rejeicoes_chunk = await gravar_dados_precatorios(session, df)
+            total_processados += gravados
+            somar_rejeicoes(rejeicoes, rejeicoes_chunk)
+            await confirmar(session)
 
-@app.post("/download-lista-precatorios-4-buy-lemitt/{tribunal_sigla}", tags=["Relatórios"])
-async def download_precatorios_zip(tribunal_sigla: str, background_tasks: BackgroundTasks):
-    df_credores_list = []
-    df_advogados_list = []
-    credores_uniques = set()
-    advogados_uniques = set()
-
-    # Carrega relações necessárias de forma otimizada
-    relations_to_load = [
-        joinedload(Processo.fontes)
-            .joinedload(Fonte.capa)
-            .joinedload(Capa.valor_causa),
-        joinedload(Processo.fontes)
-            .joinedload(Fonte.capa)
-            .joinedload(Capa.informacoes_complementares),
-        joinedload(Processo.fontes)
-            .joinedload(Fonte.envolvidos)
-            .joinedload(Envolvido.advogados)
-            .joinedload(Advogado.oabs),
-        joinedload(Processo.dados_precatorios),
-    ]
+    return {"detail": f"Upload finalizado. {total_processados} registros inseridos.", "rejeicoes": rejeicoes}
 
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Processo)
-            .options(*relations_to_load)
-            .where(Processo.unidade_origem_tribunal_sigla == tribunal_sigla)
-        )
-        processos = result.scalars().unique().all()
-
-    if not processos:
-        raise HTTPException(status_code=404, detail="Nenhum processo encontrado para o tribunal fornecido.")
-
-    # Percorre cada processo
-    for p in processos:
-        dados_precatorios = p.dados_precatorios
-        tipo_regime = dados_precatorios.tipo_regime if dados_precatorios else None
-
-        # Réu é o PASSIVO
-        reu = next((e for f in p.fontes for e in f.envolvidos if e.polo == "PASSIVO"), None)
-
-        # Credor é o ATIVO que NÃO é Advogado e NÃO é Ente Público
-        credor = next((e for f in p.fontes for e in f.envolvidos 
-                       if e.polo == "ATIVO" and 
-                          not e.tipo_normalizado == "Advogado" and 
-                          not is_ente_publico(e)), None)
-
-        # Extrair UF do Processo Originário
-        uf_origem = extract_uf_processo_originario(p.fontes)
-
-        # Determina tipo do precatório
-        tipo_precatorio = None
-        if p.unidade_origem_tribunal_sigla and p.unidade_origem_tribunal_sigla.startswith("TRF"):
-            tipo_precatorio = "Federal"
-        elif reu and reu.nome and "estado" in reu.nome.lower():
-            tipo_precatorio = "Estadual"
-        elif reu and reu.nome and ("município" in reu.nome.lower() or "municipio de" in reu.nome.lower() or "municipal" in reu.nome.lower()):
-            tipo_precatorio = "Municipal"
-
-        # Valor da causa
-        valor_causa = None
-        for fonte in p.fontes:
-            if fonte.capa and fonte.capa.valor_causa:
-                valor_causa = fonte.capa.valor_causa.valor
-                break
-        if not valor_causa and dados_precatorios and dados_precatorios.valor_deferido:
-            valor_causa = dados_precatorios.valor_deferido
-
-        valor_causa_formatado = (
-            f"R$ {valor_causa:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-            if valor_causa is not None else ""
-        )
-
-        # --- 1. Coleta dados do credor ---
-        if credor:
-            credor_id = credor.cnpj if credor.cnpj else credor.cpf
-            if credor_id and credor_id not in credores_uniques:
-                tipo_credor = "Pessoa Jurídica" if credor.cnpj else "Pessoa Física" if credor.cpf else None
-                row_credor = {
-                    "CNPJ / CPF do Credor": credor_id,
-                    "Nome do Credor": credor.nome,
-                    "Tipo do Credor": tipo_credor,
-                    "Nome do Réu": reu.nome if reu else None,
-                    "CNPJ do Réu": reu.cnpj if reu else None,
-                    "UF do Precatório": p.estado_origem,
-                    "Município do Precatório": reu.nome if tipo_precatorio == "Municipal" else None,
-                    "Número dos Autos do Precatório": p.numero_cnj,
-                    "Tribunal de Origem": p.unidade_origem_tribunal_sigla,
-                    "UF relacionada ao processo originário": uf_origem,
-                    "Tipo do Precatório": tipo_precatorio,
-                    "Tipo do Regime": tipo_regime,
-                    "Valor da Causa": valor_causa_formatado,
-                }
-                df_credores_list.append(row_credor)
-                credores_uniques.add(credor_id)
-
-        # --- 2. Coleta dados dos advogados ---
-        for fonte in p.fontes:
-            for envolvido in fonte.envolvidos:
-                if envolvido.polo == "ATIVO" and not is_ente_publico(envolvido) and envolvido.advogados:
-                    credor_envolvido_id = envolvido.cnpj if envolvido.cnpj else envolvido.cpf
-                    tipo_credor_envolvido = "Pessoa Jurídica" if envolvido.cnpj else "Pessoa Física" if envolvido.cpf else None
-                    if not credor_envolvido_id:
-                        continue
-                    for advogado in envolvido.advogados:
-                        advogado_id = advogado.cpf
-                        if advogado_id and advogado_id not in advogados_uniques:
-                            oab_numero, oab_uf = (None, None)
-                            if advogado.oabs:
-                                oab = advogado.oabs[0]
-                                oab_numero = oab.numero
-                                oab_uf = oab.uf
-                            row_advogado = {
-                                "Nome do Advogado": advogado.nome,
-                                "CPF do Advogado": advogado.cpf,
-                                "OAB": oab_numero,
-                                "Estado da OAB": oab_uf,
-                                "CNPJ / CPF do Credor": credor_envolvido_id,
-                                "Nome do Credor": envolvido.nome,
-                                "Tipo do Credor": tipo_credor_envolvido,
-                                "Nome do Réu": reu.nome if reu else None,
-                                "CNPJ do Réu": reu.cnpj if reu else None,
-                                "UF do Precatório": p.estado_origem,
-                                "Município do Precatório": reu.nome if tipo_precatorio == "Municipal" else None,
-                                "Número dos Autos do Precatório": p.numero_cnj,
-                                "Tribunal de Origem": p.unidade_origem_tribunal_sigla,
-                                "UF relacionada ao processo originário": uf_origem,
-                                "Tipo do Precatório": tipo_precatorio,
-                                "Tipo do Regime": tipo_regime,
-                                "Valor da Causa": valor_causa_formatado,
-                            }
-                            df_advogados_list.append(row_advogado)
-                            advogados_uniques.add(advogado_id)
-
-    if not df_credores_list and not df_advogados_list:
-        raise HTTPException(status_code=404, detail="Nenhum dado encontrado para o tribunal fornecido.")
-
-    # Criar DataFrames
-    df_credores = pd.DataFrame(df_credores_list)
-    df_advogados = pd.DataFrame(df_advogados_list)
-
-    # Formatar CPF/CNPJ
-    if "CNPJ / CPF do Credor" in df_credores.columns:
-        df_credores["CNPJ / CPF do Credor"] = df_credores["CNPJ / CPF do Credor"].apply(
-            lambda x: _digits(x, 11) if x and len(str(x).replace('.', '').replace('-', '').replace('/', '')) <= 11 else _digits(x, 14)
-        )
-    if "CNPJ do Réu" in df_credores.columns:
-        df_credores["CNPJ do Réu"] = df_credores["CNPJ do Réu"].apply(
-            lambda x: _digits(x, 11) if x and len(str(x).replace('.', '').replace('-', '').replace('/', '')) <= 11 else _digits(x, 14)
-        )
-    if "CPF do Advogado" in df_advogados.columns:
-        df_advogados["CPF do Advogado"] = df_advogados["CPF do Advogado"].apply(lambda x: _digits(x, 11))
-
-    # Data de geração
-    data_geracao = datetime.now().strftime("%Y%m%d%H%M%S")
-
-    # Criar ZIP
-    zip_buffer = BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-        zip_file.writestr(
-            f"lista-Lemitt-precatorios_credores_{tribunal_sigla}_{data_geracao}.csv",
-            df_credores.to_csv(index=False, sep=';', encoding='utf-8-sig', decimal=',', quotechar='"')
-        )
-        zip_file.writestr(
-            f"lista-Lemitt-precatorios_advogados_{tribunal_sigla}_{data_geracao}.csv",
-            df_advogados.to_csv(index=False, sep=';', encoding='utf-8-sig', decimal=',', quotechar='"')
-        )
 
-    zip_buffer.seek(0)
-    zip_filename = f"lista-Lemitt-precatorios_{tribunal_sigla}_{data_geracao}.zip"
+async def _relatorio_em_cache(request: Request, relatorio: str, tribunal_sigla: str):
+    """
+    Responde com o relatório do cache (app.cache_relatorios). Fora do cache,
+    relatórios que saem em partes (o CSV geral) são transmitidos direto e
+    guardados no cache ao final; os demais são pedidos ao pool de processos
+    (app.relatorios_jobs) e esperados sem ocupar o event loop. Com
+    If-None-Match igual ao ETag atual responde 304 sem corpo.
+    """
+    async with AsyncSessionRelatorios() as session:
+        versao = await versao_tribunal(session, tribunal_sigla)
+    tag = etag(relatorio, tribunal_sigla, versao)
+    if etag_confere(request.headers.get("if-none-match"), tag):
+        return Response(status_code=304, headers={"ETag": tag})
+
+    entrada = cache_relatorios.obter(relatorio, tribunal_sigla, versao)
+    if entrada is not None:
+        return FileResponse(entrada.caminho, media_type=entrada.media_type, filename=entrada.nome_arquivo, headers={"ETag": entrada.etag})
+    if RELATORIOS[relatorio].partes:
+        return await _transmitir_relatorio(relatorio, tribunal_sigla, versao)
+    job = await aguardar_job(await solicitar_relatorio(relatorio, tribunal_sigla))
+    return _arquivo_do_job(job)
+
+
+async def _transmitir_relatorio(relatorio: str, tribunal_sigla: str, versao: int):
+    """
+    Transmite o relatório parte a parte (o primeiro byte sai antes de qualquer
+    consulta ao grafo) e grava uma cópia no cache; se o envio for até o fim,
+    a cópia vira a entrada da versão `versao`.
+    """
+    # Depois que o streaming começa não dá mais para responder 404
+    async with AsyncSessionRelatorios() as session:
+        if not await tem_dados(session, relatorio, tribunal_sigla):
+            raise HTTPException(status_code=404, detail="Nenhum processo encontrado para o tribunal fornecido.")
 
+    definicao = RELATORIOS[relatorio]
+    nome_arquivo = definicao.arquivo(tribunal_sigla, datetime.now())
     return StreamingResponse(
-        zip_buffer,
-        media_type="application/zip",
-        headers={"Content-Disposition": f"attachment; filename={zip_filename}"}
+        _partes_com_copia(definicao, tribunal_sigla, versao, nome_arquivo),
+        media_type=definicao.media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{nome_arquivo}"',
+            "ETag": etag(relatorio, tribunal_sigla, versao),
+        },
     )
 
 
-# --- Download CSV geral ---
-@app.post("/download-csv/{tribunal_sigla}")
-async def download_csv(tribunal_sigla: str, background_tasks: BackgroundTasks):
-    df_list = []
-
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Processo)
-            .options(
-                joinedload(Processo.fontes).joinedload(Fonte.capa).joinedload(Capa.valor_causa),
-                joinedload(Processo.fontes).joinedload(Fonte.envolvidos).joinedload(Envolvido.advogados).joinedload(Advogado.oabs),
-                joinedload(Processo.processos_relacionados)
-            )
-            .where(Processo.unidade_origem_tribunal_sigla == tribunal_sigla)
+async def _partes_com_copia(definicao, tribunal_sigla: str, versao: int, nome_arquivo: str):
+    temporario = cache_relatorios.arquivo_temporario(definicao.extensao)
+    try:
+        with open(temporario, "w", encoding="utf-8", newline="") as f:
+            async for parte in definicao.partes(tribunal_sigla):
+                await em_thread(f.write, parte)
+                yield parte
+        try:
+            cache_relatorios.guardar(definicao.nome, tribunal_sigla, versao, temporario, nome_arquivo, definicao.media_type)
+        except Exception:
+            # O cliente já recebeu o arquivo inteiro; só a cópia no cache se perde
+            logger.exception(f"Falha ao guardar {definicao.nome} de {tribunal_sigla} no cache")
+    finally:
+        # Envio interrompido (cliente desconectou, erro): a cópia parcial não entra no cache
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+def _arquivo_do_job(job):
+    """Resposta com o arquivo de um job de relatório, ou o erro que corresponde ao estado dele."""
+    if job.status == JOB_SEM_DADOS:
+        raise HTTPException(status_code=404, detail=job.erro)
+    if job.status == JOB_FALHOU:
+        raise HTTPException(status_code=500, detail=f"Falha ao gerar o relatório: {job.erro}")
+    if job.status != JOB_CONCLUIDO:
+        raise HTTPException(status_code=409, detail=f"Relatório ainda em geração ({job.status}).")
+
+    entrada = cache_relatorios.obter(job.relatorio, job.tribunal_sigla, job.versao)
+    if entrada is None:
+        raise HTTPException(
+            status_code=410,
+            detail="O arquivo deste job saiu do cache (os dados do tribunal mudaram ou o cache encheu). Peça o relatório de novo.",
         )
-        processos = result.scalars().unique().all()
-        if not processos:
-            raise HTTPException(status_code=404, detail="Nenhum processo encontrado para o tribunal fornecido.")
-      
-        for p in processos:
-            base_data = {
-                "processo_numero_cnj": p.numero_cnj,
-                "processo_titulo_polo_ativo": p.titulo_polo_ativo,
-                "processo_titulo_polo_passivo": p.titulo_polo_passivo,
-                "processo_ano_inicio": p.ano_inicio,
-                "processo_data_inicio": p.data_inicio.isoformat() if p.data_inicio else None,
-                "processo_estado_origem": p.estado_origem,
-                "processo_unidade_origem_nome": p.unidade_origem_nome,
-                "processo_unidade_origem_cidade": p.unidade_origem_cidade,
-                "processo_unidade_origem_estado": p.unidade_origem_estado,
-                "processo_unidade_origem_tribunal_sigla": p.unidade_origem_tribunal_sigla,
-                "processo_data_ultima_movimentacao": p.data_ultima_movimentacao.isoformat() if p.data_ultima_movimentacao else None,
-                "processo_quantidade_movimentacoes": p.quantidade_movimentacoes,
-                "processo_fontes_tribunais_estao_arquivadas": p.fontes_tribunais_estao_arquivadas,
-                "processo_data_ultima_verificacao": p.data_ultima_verificacao.isoformat() if p.data_ultima_verificacao else None,
-                "processo_tempo_desde_ultima_verificacao": p.tempo_desde_ultima_verificacao,
-                "processo_relacionado_numero": ", ".join([pr.numero for pr in p.processos_relacionados]),
-            }
-
-            has_related_data = False
-            for fonte in p.fontes:
-                capa = fonte.capa
-                valor_causa = capa.valor_causa if capa else None
-                
-                if not fonte.envolvidos:
-                    row = base_data.copy()
-                    row.update({
-                        "fonte_id": fonte.id, "fonte_descricao": fonte.descricao, "fonte_nome": fonte.nome, "fonte_sigla": fonte.sigla,
-                        "fonte_tipo": fonte.tipo, "fonte_data_inicio": fonte.data_inicio.isoformat() if fonte.data_inicio else None,
-                        "fonte_data_ultima_movimentacao": fonte.data_ultima_movimentacao.isoformat() if fonte.data_ultima_movimentacao else None,
-                        "fonte_segredo_justica": fonte.segredo_justica, "fonte_arquivado": fonte.arquivado,
-                        "fonte_status_predito": fonte.status_predito, "fonte_grau": fonte.grau, "fonte_grau_formatado": fonte.grau_formatado,
-                        "fonte_fisico": fonte.fisico, "fonte_sistema": fonte.sistema, "fonte_quantidade_envolvidos": fonte.quantidade_envolvidos,
-                        "fonte_url": fonte.url,
-                        "capa_classe": capa.classe if capa else None, "capa_assunto": capa.assunto if capa else None,
-                        "capa_orgao_julgador": capa.orgao_julgador if capa else None, "capa_situacao": capa.situacao if capa else None,
-                        "capa_valor_causa": valor_causa.valor_formatado if valor_causa else None,
-                        "envolvido_nome": None, "envolvido_tipo_normalizado": None, "envolvido_polo": None,
-                        "envolvido_cpf": None, "envolvido_cnpj": None, "envolvido_tipo_pessoa": None,
-                        "advogado_nome": None, "advogado_tipo": None, "advogado_oab": None, "advogado_cpf": None, "advogado_cnpj": None, "advogado_tipo_pessoa": None,
-                    })
-                    df_list.append(row)
-                    has_related_data = True
-                    continue
-
-                for envolvido in fonte.envolvidos:
-                    if not envolvido.advogados:
-                        row = base_data.copy()
-                        row.update({
-                            "fonte_id": fonte.id, "fonte_descricao": fonte.descricao, "fonte_nome": fonte.nome, "fonte_sigla": fonte.sigla,
-                            "fonte_tipo": fonte.tipo, "fonte_data_inicio": fonte.data_inicio.isoformat() if fonte.data_inicio else None,
-                            "fonte_data_ultima_movimentacao": fonte.data_ultima_movimentacao.isoformat() if fonte.data_ultima_movimentacao else None,
-                            "fonte_segredo_justica": fonte.segredo_justica, "fonte_arquivado": fonte.arquivado,
-                            "fonte_status_predito": fonte.status_predito, "fonte_grau": fonte.grau, "fonte_grau_formatado": fonte.grau_formatado,
-                            "fonte_fisico": fonte.fisico, "fonte_sistema": fonte.sistema, "fonte_quantidade_envolvidos": fonte.quantidade_envolvidos,
-                            "fonte_url": fonte.url,
-                            "capa_classe": capa.classe if capa else None, "capa_assunto": capa.assunto if capa else None,
-                            "capa_orgao_julgador": capa.orgao_julgador if capa else None, "capa_situacao": capa.situacao if capa else None,
-                            "capa_valor_causa": valor_causa.valor_formatado if valor_causa else None,
-                            "envolvido_nome": envolvido.nome, "envolvido_tipo_normalizado": envolvido.tipo_normalizado, "envolvido_polo": envolvido.polo,
-                            "envolvido_cpf": envolvido.cpf, "envolvido_cnpj": envolvido.cnpj, "envolvido_tipo_pessoa": envolvido.tipo_pessoa,
-                            "advogado_nome": None, "advogado_tipo": None, "advogado_oab": None, "advogado_cpf": None, "advogado_cnpj": None, "advogado_tipo_pessoa": None,
-                        })
-                        df_list.append(row)
-                        has_related_data = True
-                        continue
-
-                    for advogado in envolvido.advogados:
-                        if not advogado.oabs:
-                            row = base_data.copy()
-                            row.update({
-                                "fonte_id": fonte.id, "fonte_descricao": fonte.descricao, "fonte_nome": fonte.nome, "fonte_sigla": fonte.sigla,
-                                "fonte_tipo": fonte.tipo, "fonte_data_inicio": fonte.data_inicio.isoformat() if fonte.data_inicio else None,
-                                "fonte_data_ultima_movimentacao": fonte.data_ultima_movimentacao.isoformat() if fonte.data_ultima_movimentacao else None,
-                                "fonte_segredo_justica": fonte.segredo_justica, "fonte_arquivado": fonte.arquivado,
-                                "fonte_status_predito": fonte.status_predito, "fonte_grau": fonte.grau, "fonte_grau_formatado": fonte.grau_formatado,
-                                "fonte_fisico": fonte.fisico, "fonte_sistema": fonte.sistema, "fonte_quantidade_envolvidos": fonte.quantidade_envolvidos,
-                                "fonte_url": fonte.url,
-                                "capa_classe": capa.classe if capa else None, "capa_assunto": capa.assunto if capa else None,
-                                "capa_orgao_julgador": capa.orgao_julgador if capa else None, "capa_situacao": capa.situacao if capa else None,
-                                "capa_valor_causa": valor_causa.valor_formatado if valor_causa else None,
-                                "envolvido_nome": envolvido.nome, "envolvido_tipo_normalizado": envolvido.tipo_normalizado, "envolvido_polo": envolvido.polo,
-                                "envolvido_cpf": envolvido.cpf, "envolvido_cnpj": envolvido.cnpj, "envolvido_tipo_pessoa": envolvido.tipo_pessoa,
-                                "advogado_nome": advogado.nome, "advogado_tipo": advogado.tipo_normalizado, "advogado_oab": None,
-                                "advogado_cpf": advogado.cpf, "advogado_cnpj": advogado.cnpj, "advogado_tipo_pessoa": advogado.tipo_pessoa,
-                            })
-                            df_list.append(row)
-                            has_related_data = True
-                            continue
-
-                        for oab in advogado.oabs:
-                            row = base_data.copy()
-                            row.update({
-                                "fonte_id": fonte.id, "fonte_descricao": fonte.descricao, "fonte_nome": fonte.nome, "fonte_sigla": fonte.sigla,
-                                "fonte_tipo": fonte.tipo, "fonte_data_inicio": fonte.data_inicio.isoformat() if fonte.data_inicio else None,
-                                "fonte_data_ultima_movimentacao": fonte.data_ultima_movimentacao.isoformat() if fonte.data_ultima_movimentacao else None,
-                                "fonte_segredo_justica": fonte.segredo_justica, "fonte_arquivado": fonte.arquivado,
-                                "fonte_status_predito": fonte.status_predito, "fonte_grau": fonte.grau, "fonte_grau_formatado": fonte.grau_formatado,
-                                "fonte_fisico": fonte.fisico, "fonte_sistema": fonte.sistema, "fonte_quantidade_envolvidos": fonte.quantidade_envolvidos,
-                                "fonte_url": fonte.url,
-                                "capa_classe": capa.classe if capa else None, "capa_assunto": capa.assunto if capa else None,
-                                "capa_orgao_julgador": capa.orgao_julgador if capa else None, "capa_situacao": capa.situacao if capa else None,
-                                "capa_valor_causa": valor_causa.valor_formatado if valor_causa else None,
-                                "envolvido_nome": envolvido.nome, "envolvido_tipo_normalizado": envolvido.tipo_normalizado, "envolvido_polo": envolvido.polo,
-                                "envolvido_cpf": envolvido.cpf, "envolvido_cnpj": envolvido.cnpj, "envolvido_tipo_pessoa": envolvido.tipo_pessoa,
-                                "advogado_nome": advogado.nome, "advogado_tipo": advogado.tipo_normalizado, "advogado_oab": f"{oab.numero}/{oab.uf}",
-                                "advogado_cpf": advogado.cpf, "advogado_cnpj": advogado.cnpj, "advogado_tipo_pessoa": advogado.tipo_pessoa,
-                            })
-                            df_list.append(row)
-                            has_related_data = True
-
-            if not has_related_data:
-                row = base_data.copy()
-                row.update({
-                    "fonte_id": None, "fonte_descricao": None, "fonte_nome": None, "fonte_sigla": None, "fonte_tipo": None, "fonte_data_inicio": None,
-                    "fonte_data_ultima_movimentacao": None, "fonte_segredo_justica": None, "fonte_arquivado": None, "fonte_status_predito": None,
-                    "fonte_grau": None, "fonte_grau_formatado": None, "fonte_fisico": None, "fonte_sistema": None, "fonte_quantidade_envolvidos": None,
-                    "fonte_url": None, "capa_classe": None, "capa_assunto": None, "capa_orgao_julgador": None, "capa_situacao": None,
-                    "capa_valor_causa": None, "envolvido_nome": None, "envolvido_tipo_normalizado": None, "envolvido_polo": None,
-                    "envolvido_cpf": None, "envolvido_cnpj": None, "envolvido_tipo_pessoa": None, "advogado_nome": None, "advogado_tipo": None,
-                    "advogado_oab": None, "advogado_cpf": None, "advogado_cnpj": None, "advogado_tipo_pessoa": None,
-                })
-                df_list.append(row)
-
-    if not df_list:
-        raise HTTPException(status_code=404, detail="Nenhum processo encontrado para o tribunal fornecido.")
-
-    df_export = pd.DataFrame(df_list)
-
-    # Convertendo as colunas de CPF e CNPJ para string, preenchendo nulos e adicionando o apóstrofo
-    colunas_para_formatar = ["envolvido_cpf", "envolvido_cnpj", "advogado_cpf", "advogado_cnpj"]
-    for col in colunas_para_formatar:
-        if col in df_export.columns:
-            # Preenche nulos com string vazia e adiciona o apóstrofo para forçar formato de texto
-            df_export[col] = df_export[col].fillna('').astype(str).apply(lambda x: f"'{x}")
-
-    colunas_ordenadas = [
-        "processo_numero_cnj", "envolvido_nome", "envolvido_tipo_normalizado", "envolvido_polo", "envolvido_cpf", "envolvido_cnpj", "envolvido_tipo_pessoa",
-        "advogado_nome", "advogado_tipo", "advogado_oab", "advogado_cpf", "advogado_cnpj", "advogado_tipo_pessoa",
-        "processo_titulo_polo_ativo", "processo_titulo_polo_passivo", "processo_ano_inicio", "processo_data_inicio", "processo_estado_origem",
-        "processo_unidade_origem_nome", "processo_unidade_origem_cidade", "processo_unidade_origem_estado", "processo_unidade_origem_tribunal_sigla",
-        "processo_data_ultima_movimentacao", "processo_quantidade_movimentacoes", "processo_fontes_tribunais_estao_arquivadas", "processo_data_ultima_verificacao",
-        "processo_tempo_desde_ultima_verificacao", "processo_relacionado_numero",
-        "fonte_id", "fonte_descricao", "fonte_nome", "fonte_sigla", "fonte_tipo", "fonte_data_inicio", "fonte_data_ultima_movimentacao",
-        "fonte_segredo_justica", "fonte_arquivado", "fonte_status_predito", "fonte_grau", "fonte_grau_formatado",
-        "fonte_fisico", "fonte_sistema", "fonte_quantidade_envolvidos", "fonte_url",
-        "capa_classe", "capa_assunto", "capa_orgao_julgador", "capa_situacao", "capa_valor_causa",
-    ]
-    df_export = df_export.reindex(columns=colunas_ordenadas, fill_value=None)
-    
-    file_name = f"relatorio_{tribunal_sigla}_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
-    file_path = os.path.join(UPLOAD_DIR, file_name)
-    
-    df_export.to_csv(file_path, index=False)
+    return FileResponse(entrada.caminho, media_type=entrada.media_type, filename=entrada.nome_arquivo, headers={"ETag": entrada.etag})
+
+
+@app.post("/download-lista-precatorios-4-buy-lemitt/{tribunal_sigla}", tags=["Relatórios"])
+async def download_precatorios_zip(tribunal_sigla: str, request: Request):
+    """Zip com os CSVs de credores e advogados no layout da Lemitt (ver app.exportacoes)."""
+    return await _relatorio_em_cache(request, "lemitt", tribunal_sigla)
+
+
+@app.post("/download-csv/{tribunal_sigla}")
+async def download_csv(tribunal_sigla: str, request: Request):
+    """
+    CSV com uma linha por (fonte, envolvido, advogado, OAB) dos processos do
+    tribunal. Fora do cache é enviado em streaming, partição a partição, e a
+    cópia fica no cache (app.cache_relatorios) até a próxima gravação no
+    tribunal.
+    """
+    return await _relatorio_em_cache(request, "csv", tribunal_sigla)
 
-    background_tasks.add_task(delete_file, file_path)
-    
-    return FileResponse(file_path, media_type="text/csv", filename=file_name)
 
 # Diretório para salvar os arquivos CSV
 UPLOAD_DIR = "/tmp"
@@ -701,152 +443,10 @@ def delete_file(file_path: str):
     os.remove(file_path)
 
 
-# --- Download XLSX de Precatórios ---
 @app.post("/download-lista-precatorios/{tribunal_sigla}", tags=["Relatórios"])
-async def download_precatorios_csv(tribunal_sigla: str, background_tasks: BackgroundTasks):
-    """
-    Gera e retorna um arquivo Excel (.xlsx) com dados de precatórios para um tribunal específico.
-
-    O endpoint busca todos os processos de um tribunal e extrai informações
-    de precatórios dos envolvidos no polo ativo (credor) e passivo (réu).
-    As informações são organizadas em duas abas separadas na mesma planilha.
-    """
-    df_credores_list = []
-    df_advogados_list = []
-    
-    # A consulta agora busca os dados diretamente da tabela DadosPrecatorio
-    # A consulta agora busca os dados diretamente da tabela DadosPrecatorio
-    relations_to_load = [
-        # Carrega Advogados e OABs
-        joinedload(Processo.fontes).joinedload(Fonte.envolvidos).joinedload(Envolvido.advogados).joinedload(Advogado.oabs),
-        
-        # Carrega Dados Precatórios
-        joinedload(Processo.dados_precatorios),
-        
-        # Carrega Valor da Causa
-        joinedload(Processo.fontes).joinedload(Fonte.capa).joinedload(Capa.valor_causa),
-        
-        # >>> CRÍTICO: Carrega INFORMAÇÕES COMPLEMENTARES <<<
-        joinedload(Processo.fontes).joinedload(Fonte.capa).joinedload(Capa.informacoes_complementares),
-        # CRÍTICO: Carregamento da Capa, Valor da Causa
-    joinedload(Processo.fontes).joinedload(Fonte.capa)
-        .joinedload(Capa.valor_causa),
-    
-    # USAR SELECTINLOAD para resolver MissingGreenlet em relacionamentos to-many
-    joinedload(Processo.fontes).joinedload(Fonte.capa)
-        .selectinload(Capa.informacoes_complementares),
-    ]
-
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Processo)
-            .options(*relations_to_load)
-            .where(Processo.unidade_origem_tribunal_sigla == tribunal_sigla)
-        )
-        processos = result.scalars().unique().all()
-
-        if not processos:
-            raise HTTPException(status_code=404, detail="Nenhum processo encontrado para o tribunal fornecido.")
-
-        for p in processos:
-            # Novo: Acessa os dados diretamente da nova relação `dados_precatorios`
-            dados_precatorios = p.dados_precatorios
-            
-            tipo_regime = dados_precatorios.tipo_regime if dados_precatorios else None
-            ano_orcamentario = dados_precatorios.ano_orcamentario if dados_precatorios else None
-            natureza_precatorio = dados_precatorios.natureza_precatorio if dados_precatorios else None
-            valor_deferido = dados_precatorios.valor_deferido if dados_precatorios else None
-            data_base_calculo = dados_precatorios.data_base_calculo if dados_precatorios else None
-            data_expedicao = dados_precatorios.data_expedicao if dados_precatorios else None
-
-            # Encontra o réu e o credor (lógica mantida)
-            reu = next((e for f in p.fontes for e in f.envolvidos if e.polo == "PASSIVO"), None)
-            credor = next((e for f in p.fontes for e in f.envolvidos if e.polo == "ATIVO" and not e.tipo_normalizado == "Advogado"), None)
-            
-            # Lógica de classificação do tipo de precatório (lógica mantida)
-            tipo_precatorio = None
-            if p.unidade_origem_tribunal_sigla and p.unidade_origem_tribunal_sigla.startswith("TRF"):
-                tipo_precatorio = "Federal"
-            elif reu and reu.nome and "estado" in reu.nome.lower():
-                tipo_precatorio = "Estadual"
-            elif reu and reu.nome and "município" in reu.nome.lower():
-                tipo_precatorio = "Municipal"
-
-            row_credor = {
-                "CNPJ / CPF do Credor": credor.cnpj if credor and credor.cnpj else credor.cpf if credor else None,
-                "Nome do Credor": credor.nome if credor else None,
-                "Tipo do Credor": "Pessoa Jurídica" if credor and credor.cnpj else "Pessoa Física" if credor and credor.cpf else None,
-                "Nome do Réu": reu.nome if reu else None,
-                "CNPJ do Réu": reu.cnpj if reu else None,
-                "UF do Precatório": p.estado_origem,
-                "Município do Precatório": p.unidade_origem_cidade,
-                "Número dos Autos do Precatório": p.numero_cnj,
-                "Tipo do Precatório": tipo_precatorio,
-                "Tipo do Regime": tipo_regime,
-                "Ano orçamentário": ano_orcamentario,
-                "Natureza do Precatório": natureza_precatorio,
-                "Valor Deferido": valor_deferido,
-                "Data base do cálculo homologado": data_base_calculo,
-                "Data de expedição do Precatório": data_expedicao,
-            }
-            df_credores_list.append(row_credor)
-
-            for fonte in p.fontes:
-                for envolvido in fonte.envolvidos:
-                    if envolvido.polo == "ATIVO" and envolvido.advogados:
-                        for advogado in envolvido.advogados:
-                            if advogado and advogado.oabs:
-                                for oab in advogado.oabs:
-                                    row_advogado = {
-                                        "Nome do Advogado": advogado.nome,
-                                        "CPF do Advogado": advogado.cpf,
-                                        "OAB": oab.numero,
-                                        "Estado da OAB": oab.uf,
-                                        "Nome do Réu": reu.nome if reu else None,
-                                        "CNPJ do Réu": reu.cnpj if reu else None,
-                                        "UF do Precatório": p.estado_origem,
-                                        "Município do Precatório": p.unidade_origem_cidade,
-                                        "Número dos Autos do Precatório": p.numero_cnj,
-                                        "Tipo do Precatório": tipo_precatorio,
-                                        "Tipo do Regime": tipo_regime,
-                                        "Ano orçamentário": ano_orcamentario,
-                                        "Natureza do Precatório": natureza_precatorio,
-                                        "Valor Deferido": valor_deferido,
-                                        "Data base do cálculo homologado": data_base_calculo,
-                                        "Data de expedição do Precatório": data_expedicao,
-                                    }
-                                    df_advogados_list.append(row_advogado)
-
-    if not df_credores_list and not df_advogados_list:
-        raise HTTPException(status_code=404, detail="Nenhum dado de precatório ou advogado encontrado para o tribunal fornecido.")
-
-    df_credores = pd.DataFrame(df_credores_list)
-    df_advogados = pd.DataFrame(df_advogados_list)
-
-    colunas_formatar_credores = ["CNPJ / CPF do Credor", "CNPJ do Réu"]
-    for col in colunas_formatar_credores:
-        if col in df_credores.columns:
-            df_credores[col] = df_credores[col].fillna('').astype(str).apply(lambda x: f"'{x}")
-
-    colunas_formatar_advogados = ["CPF do Advogado", "CNPJ do Réu"]
-    for col in colunas_formatar_advogados:
-        if col in df_advogados.columns:
-            df_advogados[col] = df_advogados[col].fillna('').astype(str).apply(lambda x: f"'{x}")
-
-    file_name = f"relatorio_precatorios_{tribunal_sigla}_{datetime.now().strftime('%Y%m%d%H%M%S')}.xlsx"
-    file_path = os.path.join(UPLOAD_DIR, file_name)
-
-    with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-        df_credores.to_excel(writer, sheet_name='Credores', index=False)
-        df_advogados.to_excel(writer, sheet_name='Advogados', index=False)
-
-    background_tasks.add_task(delete_file, file_path)
-
-    return FileResponse(
-        file_path,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        filename=file_name,
-    )
+async def download_precatorios_csv(tribunal_sigla: str, request: Request):
+    """Excel (.xlsx) com credores e advogados dos precatórios de um tribunal (ver app.exportacoes)."""
+    return await _relatorio_em_cache(request, "lista", tribunal_sigla)
 
 
 
@@ -863,32 +463,22 @@ async def remover_duplicatas(
     if not filename.endswith(('.xlsx', '.xls', '.csv')):
         raise HTTPException(status_code=400, detail="Formato de arquivo inválido. Envie .xlsx, .xls ou .csv.")
 
-    conteudo_arquivo = await file.read()
-    buffer = io.BytesIO(conteudo_arquivo)
-
-    # Lê arquivo original
     if filename.endswith(('.xlsx', '.xls')):
-        df = pd.read_excel(buffer)
         media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         novo_filename = f"arquivo_sem_duplicatas_{datetime.now().strftime('%Y%m%d%H%M%S')}.xlsx"
     else:
-        detected_encoding = chardet.detect(conteudo_arquivo)['encoding']
-        buffer.seek(0)
-        df = pd.read_csv(buffer, dtype=str, sep=None, engine='python', encoding=detected_encoding)
         media_type = "text/csv"
         novo_filename = f"arquivo_sem_duplicatas_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
 
-    # Remove duplicatas
-    if "numero" not in df.columns:
-        raise HTTPException(status_code=400, detail="Coluna 'numero' não encontrada.")
-    df_sem_duplicatas = df.drop_duplicates(subset=['numero'], keep='first')
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    original_path = os.path.join(UPLOAD_DIR, filename)
+    await salvar_upload(file, original_path)
+    background_tasks.add_task(delete_file, original_path)
 
-    # Salva em arquivo temporário
+    # Leitura (chardet, parse), remoção das duplicatas e escrita num processo do offload
     file_path = os.path.join(UPLOAD_DIR, novo_filename)
-    if novo_filename.endswith(".csv"):
-        df_sem_duplicatas.to_csv(file_path, index=False, encoding='utf-8')
-    else:
-        df_sem_duplicatas.to_excel(file_path, index=False)
+    if not await em_processo(deduplicar_arquivo, original_path, file_path):
+        raise HTTPException(status_code=400, detail="Coluna 'numero' não encontrada.")
 
     # Agenda a exclusão após o envio
     background_tasks.add_task(delete_file, file_path)
@@ -897,288 +487,47 @@ async def remover_duplicatas(
 
 
 # ---------------------------wesley-------------------------------
-def _only_digits(value):
-    """
-    Remove todos os caracteres que não sejam dígitos de uma string.
-    """
-    if isinstance(value, str):
-        return re.sub(r'\D', '', value)
-    return value
-
-
 
 # se não existir no teu app, define um default:
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./exports")
 
-@app.post("/download-requerentes-advogados-xlsx/{tribunal_sigla}", tags=["Relatórios"])
-async def download_requerentes_advogados_xlsx(tribunal_sigla: str):
-    """
-    Gera e retorna um XLSX com duas abas:
-      • Requerentes: dedup POR PROCESSO (chave = (processo_numero_cnj, CPF)).
-                     Sem CPF => não deduplica.
-      • Advogados  : dedup POR PROCESSO (chave = (processo_numero_cnj, CPF)).
-                     Sem CPF => não deduplica.
-
-    Mantém o processo na planilha mesmo se não houver Autor/Requerente/Advogado.
-    """
-
-    df_list = []
-
-    # ===== Carrega processos com tudo que precisamos =====
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Processo)
-            .options(
-                joinedload(Processo.fontes)
-                    .joinedload(Fonte.capa)
-                    .joinedload(Capa.valor_causa),
-                joinedload(Processo.fontes)
-                    .joinedload(Fonte.envolvidos)
-                    .joinedload(Envolvido.advogados)
-                    .joinedload(Advogado.oabs),
-                joinedload(Processo.processos_relacionados),
-            )
-            .where(Processo.unidade_origem_tribunal_sigla == tribunal_sigla)
-        )
-        processos = result.scalars().unique().all()
-
-    if not processos:
-        raise HTTPException(status_code=404, detail="Nenhum processo encontrado para o tribunal fornecido.")
-
-    # ===== Monta linhas =====
-    for p in processos:
-        base = {
-            "processo_numero_cnj": p.numero_cnj,
-            "processo_ano_inicio": p.ano_inicio,
-            "processo_data_inicio": p.data_inicio.isoformat() if p.data_inicio else None,
-            "processo_estado_origem": p.estado_origem,
-            "processo_unidade_origem_nome": p.unidade_origem_nome,
-            "processo_unidade_origem_cidade": p.unidade_origem_cidade,
-            "processo_unidade_origem_estado": p.unidade_origem_estado,
-            "processo_unidade_origem_tribunal_sigla": p.unidade_origem_tribunal_sigla,
-            "processo_data_ultima_movimentacao": p.data_ultima_movimentacao.isoformat() if p.data_ultima_movimentacao else None,
-            "processo_quantidade_movimentacoes": p.quantidade_movimentacoes,
-            "processo_fontes_tribunais_estao_arquivadas": p.fontes_tribunais_estao_arquivadas,
-            "processo_data_ultima_verificacao": p.data_ultima_verificacao.isoformat() if p.data_ultima_verificacao else None,
-            "processo_tempo_desde_ultima_verificacao": p.tempo_desde_ultima_verificacao,
-            "processo_relacionado_numero": ", ".join([pr.numero for pr in p.processos_relacionados]),
-        }
-
-        added_any_for_process = False  # garante pelo menos 1 linha por processo
-
-        fontes = p.fontes or []
-        if not fontes:
-            # Sem fontes: garante linha base
-            df_list.append({
-                **base,
-                "fonte_sigla": None, "fonte_data_inicio": None, "fonte_sistema": None, "fonte_quantidade_envolvidos": None,
-                "capa_classe": None, "capa_assunto": None, "capa_valor_causa": None,
-                "envolvido_nome": None, "envolvido_tipo_normalizado": None,
-                "envolvido_cpf": None, "envolvido_cnpj": None, "envolvido_tipo_pessoa": None,
-                "advogado_nome": None, "advogado_tipo": None, "advogado_oab": None,
-                "advogado_cpf": None, "advogado_cnpj": None, "advogado_tipo_pessoa": None,
-            })
-            continue
-
-        for fonte in fontes:
-            capa = fonte.capa
-            row_common = {
-                **base,
-                "fonte_sigla": fonte.sigla,
-                "fonte_data_inicio": fonte.data_inicio.isoformat() if fonte.data_inicio else None,
-                "fonte_sistema": fonte.sistema,
-                "fonte_quantidade_envolvidos": fonte.quantidade_envolvidos,
-                "capa_classe": getattr(capa, "classe", None) if capa else None,
-                "capa_assunto": getattr(capa, "assunto", None) if capa else None,
-                "capa_valor_causa": (capa.valor_causa.valor_formatado if (capa and capa.valor_causa) else None),
-            }
-
-            envolvidos = fonte.envolvidos or []
-            if not envolvidos:
-                # Sem envolvidos: ainda assim registra linha base da fonte
-                df_list.append({
-                    **row_common,
-                    "envolvido_nome": None, "envolvido_tipo_normalizado": None,
-                    "envolvido_cpf": None, "envolvido_cnpj": None, "envolvido_tipo_pessoa": None,
-                    "advogado_nome": None, "advogado_tipo": None, "advogado_oab": None,
-                    "advogado_cpf": None, "advogado_cnpj": None, "advogado_tipo_pessoa": None,
-                })
-                added_any_for_process = True
-                continue
-
-            for envolvido in envolvidos:
-                # Aceita Requerente e Autor; demais tipos também manterão a linha base
-                if envolvido.tipo_normalizado not in ("Requerente", "Autor"):
-                    df_list.append({
-                        **row_common,
-                        "envolvido_nome": None, "envolvido_tipo_normalizado": None,
-                        "envolvido_cpf": None, "envolvido_cnpj": None, "envolvido_tipo_pessoa": None,
-                        "advogado_nome": None, "advogado_tipo": None, "advogado_oab": None,
-                        "advogado_cpf": None, "advogado_cnpj": None, "advogado_tipo_pessoa": None,
-                    })
-                    added_any_for_process = True
-                    continue
-
-                # Sem advogados → registra mesmo assim
-                if not (envolvido.advogados or []):
-                    df_list.append({
-                        **row_common,
-                        "envolvido_nome": envolvido.nome,
-                        "envolvido_tipo_normalizado": envolvido.tipo_normalizado,
-                        "envolvido_cpf": envolvido.cpf,
-                        "envolvido_cnpj": envolvido.cnpj,
-                        "envolvido_tipo_pessoa": envolvido.tipo_pessoa,
-                        "advogado_nome": None, "advogado_tipo": None, "advogado_oab": None,
-                        "advogado_cpf": None, "advogado_cnpj": None, "advogado_tipo_pessoa": None,
-                    })
-                    added_any_for_process = True
-                    continue
-
-                # Com advogados
-                for advogado in envolvido.advogados:
-                    oabs = advogado.oabs or [None]
-                    for oab in oabs:
-                        df_list.append({
-                            **row_common,
-                            "envolvido_nome": envolvido.nome,
-                            "envolvido_tipo_normalizado": envolvido.tipo_normalizado,
-                            "envolvido_cpf": envolvido.cpf,
-                            "envolvido_cnpj": envolvido.cnpj,
-                            "envolvido_tipo_pessoa": envolvido.tipo_pessoa,
-                            "advogado_nome": advogado.nome,
-                            "advogado_tipo": advogado.tipo_normalizado,
-                            "advogado_oab": (f"{getattr(oab, 'numero', None)}/{getattr(oab, 'uf', None)}"
-                                             if oab and getattr(oab, "numero", None) and getattr(oab, "uf", None) else None),
-                            "advogado_cpf": advogado.cpf,
-                            "advogado_cnpj": advogado.cnpj,
-                            "advogado_tipo_pessoa": advogado.tipo_pessoa,
-                        })
-                        added_any_for_process = True
-
-        if not added_any_for_process:
-            # redundância de segurança
-            df_list.append({
-                **base,
-                "fonte_sigla": None, "fonte_data_inicio": None, "fonte_sistema": None, "fonte_quantidade_envolvidos": None,
-                "capa_classe": None, "capa_assunto": None, "capa_valor_causa": None,
-                "envolvido_nome": None, "envolvido_tipo_normalizado": None,
-                "envolvido_cpf": None, "envolvido_cnpj": None, "envolvido_tipo_pessoa": None,
-                "advogado_nome": None, "advogado_tipo": None, "advogado_oab": None,
-                "advogado_cpf": None, "advogado_cnpj": None, "advogado_tipo_pessoa": None,
-            })
-
-    if not df_list:
-        raise HTTPException(status_code=404, detail="Nada a exportar.")
-
-    df = pd.DataFrame(df_list)
-
-    # =========================
-    # Requerentes — DEDUP (CNJ+CPF). SEM CPF = NÃO DEDUP
-    # =========================
-    req_cols = [
-        "processo_numero_cnj", "envolvido_nome", "envolvido_tipo_normalizado",
-        "envolvido_cpf", "envolvido_cnpj", "envolvido_tipo_pessoa",
-        "processo_ano_inicio", "processo_data_inicio", "processo_estado_origem",
-        "processo_unidade_origem_nome", "processo_unidade_origem_cidade", "processo_unidade_origem_estado",
-        "processo_unidade_origem_tribunal_sigla", "processo_data_ultima_movimentacao",
-        "processo_quantidade_movimentacoes", "processo_fontes_tribunais_estao_arquivadas",
-        "processo_data_ultima_verificacao", "processo_tempo_desde_ultima_verificacao",
-        "processo_relacionado_numero",
-        "fonte_sigla", "fonte_data_inicio", "fonte_sistema", "fonte_quantidade_envolvidos",
-        "capa_classe", "capa_assunto", "capa_valor_causa",
-    ]
-    req = df.reindex(columns=req_cols).copy()
-
-    req["cpf_clean"] = (
-        req["envolvido_cpf"]
-        .astype(str)
-        .str.replace(r"\D+", "", regex=True)
-    )
-
-    req_com_cpf = req[req["cpf_clean"].str.len() > 0]
-    req_sem_cpf = req[req["cpf_clean"].str.len() == 0]
-
-    req_com_cpf = req_com_cpf.drop_duplicates(
-        subset=["processo_numero_cnj", "cpf_clean"],
-        keep="first"
-    )
 
-    req_final = pd.concat([req_com_cpf, req_sem_cpf], ignore_index=True)
-    req_final = req_final.drop(columns=["cpf_clean"])
-
-    # =========================
-    # Advogados — DEDUP (CNJ+CPF). SEM CPF = NÃO DEDUP
-    # =========================
-    adv_cols_keep = [
-        "advogado_nome", "advogado_tipo", "advogado_oab", "advogado_cpf", "advogado_cnpj", "advogado_tipo_pessoa",
-        "processo_numero_cnj",
-        "processo_ano_inicio", "processo_data_inicio", "processo_estado_origem",
-        "processo_unidade_origem_nome", "processo_unidade_origem_cidade", "processo_unidade_origem_estado",
-        "processo_unidade_origem_tribunal_sigla", "processo_data_ultima_movimentacao",
-        "processo_quantidade_movimentacoes", "processo_fontes_tribunais_estao_arquivadas",
-        "processo_data_ultima_verificacao", "processo_tempo_desde_ultima_verificacao",
-        "processo_relacionado_numero",
-        "fonte_sigla", "fonte_data_inicio", "fonte_sistema", "fonte_quantidade_envolvidos",
-        "capa_classe", "capa_assunto", "capa_valor_causa",
-    ]
-    adv = df.reindex(columns=adv_cols_keep).copy()
-
-    adv["cpf_clean"] = (
-        adv["advogado_cpf"]
-        .astype(str)
-        .str.replace(r"\D+", "", regex=True)
-    )
-
-    adv_com_cpf = adv[adv["cpf_clean"].str.len() > 0]
-    adv_sem_cpf = adv[adv["cpf_clean"].str.len() == 0]
+@app.post("/download-requerentes-advogados-xlsx/{tribunal_sigla}", tags=["Relatórios"])
+async def download_requerentes_advogados_xlsx(tribunal_sigla: str, request: Request):
+    """XLSX de requerentes e advogados do tribunal (ver app.exportacoes)."""
+    return await _relatorio_em_cache(request, "requerentes", tribunal_sigla)
 
-    adv_com_cpf = adv_com_cpf.drop_duplicates(
-        subset=["processo_numero_cnj", "cpf_clean"],
-        keep="first"
-    )
 
-    adv_final = pd.concat([adv_com_cpf, adv_sem_cpf], ignore_index=True)
-    adv_final = adv_final.drop(columns=["cpf_clean"])
+# --- Relatórios em segundo plano (app.relatorios_jobs) ---
 
-    # =========================
-    # Escreve XLSX (duas abas)
-    # =========================
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    file_name = f"requerentes_advogados_{tribunal_sigla}_{datetime.now():%Y%m%d_%H%M%S}.xlsx"
-    file_path = os.path.join(UPLOAD_DIR, file_name)
-
-    with pd.ExcelWriter(file_path, engine="xlsxwriter") as writer:
-        req_final.to_excel(writer, index=False, sheet_name="Requerentes")
-        adv_final.to_excel(writer, index=False, sheet_name="Advogados")
-
-        wb = writer.book
-        fmt_text = wb.add_format({"num_format": "@", "text_wrap": False})
-
-        # Requerentes
-        ws_req = writer.sheets["Requerentes"]
-        ws_req.set_column(0, len(req_final.columns) - 1, 18)
-        # formata como texto se as colunas existirem
-        col_map_req = {c: i for i, c in enumerate(req_final.columns)}
-        if "envolvido_cpf" in col_map_req:
-            ws_req.set_column(col_map_req["envolvido_cpf"], col_map_req["envolvido_cpf"], 18, fmt_text)
-        if "envolvido_cnpj" in col_map_req:
-            ws_req.set_column(col_map_req["envolvido_cnpj"], col_map_req["envolvido_cnpj"], 18, fmt_text)
-        ws_req.autofilter(0, 0, max(len(req_final), 1), len(req_final.columns) - 1)
-        ws_req.freeze_panes(1, 0)
-
-        # Advogados
-        ws_adv = writer.sheets["Advogados"]
-        ws_adv.set_column(0, len(adv_final.columns) - 1, 18)
-        col_map_adv = {c: i for i, c in enumerate(adv_final.columns)}
-        if "advogado_cpf" in col_map_adv:
-            ws_adv.set_column(col_map_adv["advogado_cpf"], col_map_adv["advogado_cpf"], 18, fmt_text)
-        if "advogado_cnpj" in col_map_adv:
-            ws_adv.set_column(col_map_adv["advogado_cnpj"], col_map_adv["advogado_cnpj"], 18, fmt_text)
-        ws_adv.autofilter(0, 0, max(len(adv_final), 1), len(adv_final.columns) - 1)
-        ws_adv.freeze_panes(1, 0)
-
-    return FileResponse(
-        file_path,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        filename=file_name,
-    )
+@app.post("/relatorios/{relatorio}/{tribunal_sigla}", status_code=202, tags=["Relatórios"])
+async def criar_job_relatorio(relatorio: str, tribunal_sigla: str):
+    """
+    Pede a geração de um relatório (lemitt, lista, csv ou requerentes) e
+    retorna o job na hora. Acompanhe por /relatorios/jobs/{job_id} e baixe
+    por /relatorios/jobs/{job_id}/download quando o status for 'concluido'.
+    """
+    if relatorio not in RELATORIOS:
+        raise HTTPException(status_code=400, detail=f"relatorio deve ser um de: {', '.join(RELATORIOS)}")
+    job_id = await solicitar_relatorio(relatorio, tribunal_sigla)
+    return descrever_job(await carregar_job(job_id))
+
+
+@app.get("/relatorios/jobs/{job_id}", tags=["Relatórios"])
+async def status_job_relatorio(job_id: int):
+    """Estado e progresso (processos lidos / total) de um job de relatório."""
+    job = await carregar_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado.")
+    return descrever_job(job)
+
+
+@app.get("/relatorios/jobs/{job_id}/download", tags=["Relatórios"])
+async def download_job_relatorio(job_id: int, request: Request):
+    """Arquivo de um job concluído (409 enquanto estiver na fila ou gerando)."""
+    job = await carregar_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado.")
+    if job.status == JOB_CONCLUIDO and etag_confere(request.headers.get("if-none-match"), etag(job.relatorio, job.tribunal_sigla, job.versao)):
+        return Response(status_code=304, headers={"ETag": etag(job.relatorio, job.tribunal_sigla, job.versao)})
+    return _arquivo_do_job(job)
@@ -0,0 +1,468 @@
+"""
+Migrações versionadas do schema.
+
+`create_all` só cria tabelas que ainda não existem; colunas e índices novos em
+tabelas já populadas entram aqui. Cada migração tem um número de versão e uma
+lista de comandos idempotentes (IF NOT EXISTS), de modo que uma migração
+interrompida no meio pode simplesmente ser executada de novo.
+
+Índices são criados com CREATE INDEX CONCURRENTLY, que não bloqueia escritas
+na tabela, mas não pode rodar dentro de transação: por isso cada comando é
+executado em autocommit e a versão só é registrada depois de todos terem
+terminado. Um advisory lock garante que só um processo migra por vez.
+
+Preencher colunas novas em tabelas grandes (backfill) não entra nos
+comandos: as migrações rodam no startup, segurando o lock, e um UPDATE na
+tabela inteira atrasaria a subida de todos os workers. Esse trabalho vai em
+`preenchimentos`, executados depois, em segundo plano (`preencher`, chamado
+pelo startup sem esperar, ou `python -m app.migracoes --preencher`), em
+lotes por faixa da chave, cada lote na sua transação. O progresso fica em
+schema_preenchimentos, então um preenchimento interrompido continua de onde
+parou.
+"""
+import argparse
+import asyncio
+import logging
+from dataclasses import dataclass
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Chave do pg_advisory_lock usado durante as migrações
+CHAVE_LOCK_MIGRACOES = 7_210_301
+# E durante os preenchimentos (só um processo preenche; os outros seguem sem esperar)
+CHAVE_LOCK_PREENCHIMENTOS = 7_210_302
+# Faixa de chaves percorrida por transação nos preenchimentos
+LOTE_PREENCHIMENTO = 5000
+
+
+@dataclass(frozen=True)
+class Indice:
+    nome: str
+    tabela: str
+    colunas: str
+    unico: bool = False
+    metodo: str = "btree"
+
+
+@dataclass(frozen=True)
+class Preenchimento:
+    nome: str
+    tabela: str
+    # UPDATE restrito à faixa (:de, :ate] da chave; ou, para preenchimentos em Python, `funcao`
+    comando: str | None = None
+    funcao: object = None  # async (de, ate)
+    chave: str = "id"
+    # Muda o conteúdo dos relatórios: ao terminar, invalida o cache de todos os tribunais
+    invalida_relatorios: bool = False
+
+
+@dataclass(frozen=True)
+class Migracao:
+    versao: int
+    descricao: str
+    comandos: tuple = ()
+    indices: tuple = ()
+    preenchimentos: tuple = ()
+
+
+def _digitos_sql(coluna: str, tamanho: int) -> str:
+    """Equivalente SQL de persistencia.documento_digitos (lpad trunca, por isso o CASE)."""
+    digitos = f"NULLIF(regexp_replace({coluna}, '\\D', '', 'g'), '')"
+    return f"CASE WHEN length({digitos}) < {tamanho} THEN lpad({digitos}, {tamanho}, '0') ELSE {digitos} END"
+
+
+async def _preencher_resumos(de: int, ate: int):
+    from app.resumo import preencher_resumos
+
+    await preencher_resumos(de, ate)
+
+
+async def _preencher_vinculos(de: int, ate: int):
+    from app.entidades import preencher_vinculos
+
+    await preencher_vinculos(de, ate)
+
+
+# Os nomes dos índices seguem o padrão do SQLAlchemy (ix_<tabela>_<coluna>),
+# assim bancos novos (criados pelo create_all) e antigos (migrados) ficam iguais.
+MIGRACOES = [
+    Migracao(
+        1,
+        "processos.sincronizado_em",
+        comandos=("ALTER TABLE processos ADD COLUMN IF NOT EXISTS sincronizado_em TIMESTAMPTZ",),
+    ),
+    Migracao(
+        2,
+        "índices das chaves estrangeiras e do filtro por tribunal",
+        indices=(
+            Indice("ix_processos_unidade_origem_tribunal_sigla", "processos", "unidade_origem_tribunal_sigla"),
+            Indice("ix_processos_relacionados_processo_id", "processos_relacionados", "processo_id"),
+            Indice("ix_fontes_processo_id", "fontes", "processo_id"),
+            Indice("ix_fontes_capas_fonte_id", "fontes_capas", "fonte_id"),
+            Indice("ix_capa_valores_causa_capa_id", "capa_valores_causa", "capa_id"),
+            Indice("ix_capa_informacoes_complementares_capa_id", "capa_informacoes_complementares", "capa_id"),
+            Indice("ix_fontes_envolvidos_fonte_id", "fontes_envolvidos", "fonte_id"),
+            Indice("ix_envolvidos_advogados_envolvido_id", "envolvidos_advogados", "envolvido_id"),
+            Indice("ix_advogados_oabs_advogado_id", "advogados_oabs", "advogado_id"),
+            Indice("ix_audiencias_fonte_id", "audiencias", "fonte_id"),
+        ),
+    ),
+    Migracao(
+        3,
+        "busca por nome de envolvidos e advogados (pg_trgm + unaccent)",
+        comandos=(
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            "CREATE EXTENSION IF NOT EXISTS unaccent",
+            # unaccent() é STABLE e não pode ir num índice; com o dicionário fixo o resultado é imutável
+            """
+            CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+            LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+            AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+            """,
+        ),
+        indices=(
+            Indice("ix_fontes_envolvidos_nome_trgm", "fontes_envolvidos", "lower(f_unaccent(nome)) gin_trgm_ops", metodo="gin"),
+            Indice("ix_envolvidos_advogados_nome_trgm", "envolvidos_advogados", "lower(f_unaccent(nome)) gin_trgm_ops", metodo="gin"),
+        ),
+    ),
+    Migracao(
+        4,
+        "CPF/CNPJ normalizados (só dígitos) em envolvidos, advogados e no resumo",
+        comandos=(
+            "ALTER TABLE fontes_envolvidos ADD COLUMN IF NOT EXISTS cpf_digitos VARCHAR(11)",
+            "ALTER TABLE fontes_envolvidos ADD COLUMN IF NOT EXISTS cnpj_digitos VARCHAR(14)",
+            "ALTER TABLE envolvidos_advogados ADD COLUMN IF NOT EXISTS cpf_digitos VARCHAR(11)",
+            "ALTER TABLE envolvidos_advogados ADD COLUMN IF NOT EXISTS cnpj_digitos VARCHAR(14)",
+            "ALTER TABLE precatorios_resumo ADD COLUMN IF NOT EXISTS reu_cnpj_digitos VARCHAR(14)",
+            "ALTER TABLE precatorios_resumo ADD COLUMN IF NOT EXISTS credor_documento VARCHAR(14)",
+            "ALTER TABLE precatorios_resumo_advogados ADD COLUMN IF NOT EXISTS advogado_cpf_digitos VARCHAR(11)",
+        ),
+        indices=(
+            Indice("ix_fontes_envolvidos_cpf_digitos", "fontes_envolvidos", "cpf_digitos"),
+            Indice("ix_fontes_envolvidos_cnpj_digitos", "fontes_envolvidos", "cnpj_digitos"),
+            Indice("ix_envolvidos_advogados_cpf_digitos", "envolvidos_advogados", "cpf_digitos"),
+            Indice("ix_envolvidos_advogados_cnpj_digitos", "envolvidos_advogados", "cnpj_digitos"),
+        ),
+        # Só linhas ainda sem valor: as gravações novas já chegam preenchidas (app.persistencia)
+        preenchimentos=(
+            Preenchimento(
+                "fontes_envolvidos.cpf_cnpj_digitos",
+                "fontes_envolvidos",
+                f"""
+                UPDATE fontes_envolvidos SET cpf_digitos = {_digitos_sql("cpf", 11)}, cnpj_digitos = {_digitos_sql("cnpj", 14)}
+                WHERE id > :de AND id <= :ate
+                  AND ((cpf IS NOT NULL AND cpf_digitos IS NULL) OR (cnpj IS NOT NULL AND cnpj_digitos IS NULL))
+                """,
+            ),
+            Preenchimento(
+                "envolvidos_advogados.cpf_cnpj_digitos",
+                "envolvidos_advogados",
+                f"""
+                UPDATE envolvidos_advogados SET cpf_digitos = {_digitos_sql("cpf", 11)}, cnpj_digitos = {_digitos_sql("cnpj", 14)}
+                WHERE id > :de AND id <= :ate
+                  AND ((cpf IS NOT NULL AND cpf_digitos IS NULL) OR (cnpj IS NOT NULL AND cnpj_digitos IS NULL))
+                """,
+            ),
+            Preenchimento(
+                "precatorios_resumo.documentos_digitos",
+                "precatorios_resumo",
+                f"""
+                UPDATE precatorios_resumo SET
+                    reu_cnpj_digitos = {_digitos_sql("reu_cnpj", 14)},
+                    credor_documento = CASE WHEN credor_cnpj IS NOT NULL AND credor_cnpj <> ''
+                        THEN {_digitos_sql("credor_cnpj", 14)} ELSE {_digitos_sql("credor_cpf", 11)} END
+                WHERE processo_id > :de AND processo_id <= :ate
+                  AND ((reu_cnpj IS NOT NULL AND reu_cnpj_digitos IS NULL)
+                       OR (coalesce(credor_cnpj, credor_cpf) IS NOT NULL AND credor_documento IS NULL))
+                """,
+                chave="processo_id",
+                invalida_relatorios=True,
+            ),
+            Preenchimento(
+                "precatorios_resumo_advogados.advogado_cpf_digitos",
+                "precatorios_resumo_advogados",
+                f"""
+                UPDATE precatorios_resumo_advogados SET advogado_cpf_digitos = {_digitos_sql("advogado_cpf", 11)}
+                WHERE id > :de AND id <= :ate AND advogado_cpf IS NOT NULL AND advogado_cpf_digitos IS NULL
+                """,
+                invalida_relatorios=True,
+            ),
+        ),
+    ),
+    Migracao(
+        5,
+        "tentativas de atualização dos processos (backoff de falhas)",
+        comandos=(
+            "ALTER TABLE processos ADD COLUMN IF NOT EXISTS sincronizacao_tentativa_em TIMESTAMPTZ",
+            # Com DEFAULT constante o ADD COLUMN não reescreve a tabela
+            "ALTER TABLE processos ADD COLUMN IF NOT EXISTS sincronizacao_falhas INTEGER NOT NULL DEFAULT 0",
+        ),
+    ),
+    Migracao(
+        6,
+        "resumo dos precatórios dos processos gravados antes dele",
+        # As tabelas do resumo vêm do create_all; falta o resumo dos processos antigos.
+        # Cada lote publica as versões dos tribunais que mudaram (app.versoes.confirmar)
+        preenchimentos=(Preenchimento("precatorios_resumo.processos_antigos", "processos", funcao=_preencher_resumos),),
+    ),
+    Migracao(
+        7,
+        "busca por nome e advogados do Lemitt pelo cadastro de pessoas/advogados",
+        comandos=(
+            # Busca e Lemitt leem os vínculos por processo, sem passar por `fontes`
+            "ALTER TABLE fontes_pessoas ADD COLUMN IF NOT EXISTS processo_id INTEGER REFERENCES processos (id) ON DELETE CASCADE",
+            "ALTER TABLE fontes_advogados ADD COLUMN IF NOT EXISTS processo_id INTEGER REFERENCES processos (id) ON DELETE CASCADE",
+            # A busca passou para o cadastro: os índices de trigramas da migração 3 só
+            # encareciam a escrita das duas maiores tabelas do grafo
+            "DROP INDEX CONCURRENTLY IF EXISTS ix_fontes_envolvidos_nome_trgm",
+            "DROP INDEX CONCURRENTLY IF EXISTS ix_envolvidos_advogados_nome_trgm",
+        ),
+        indices=(
+            Indice("ix_fontes_pessoas_processo_id", "fontes_pessoas", "processo_id"),
+            Indice("ix_fontes_advogados_processo_id", "fontes_advogados", "processo_id"),
+            Indice("ix_pessoas_nome_trgm", "pessoas", "lower(f_unaccent(nome)) gin_trgm_ops", metodo="gin"),
+            Indice("ix_advogados_nome_trgm", "advogados", "lower(f_unaccent(nome)) gin_trgm_ops", metodo="gin"),
+        ),
+        # Vínculos gravados antes da coluna processo_id e, depois, os dos processos
+        # gravados antes do cadastro existir; o Lemitt lê deles
+        preenchimentos=(
+            Preenchimento(
+                "fontes_pessoas.processo_id",
+                "fontes_pessoas",
+                """
+                UPDATE fontes_pessoas v SET processo_id = f.processo_id FROM fontes f
+                WHERE f.id = v.fonte_id AND v.id > :de AND v.id <= :ate AND v.processo_id IS NULL
+                """,
+            ),
+            Preenchimento(
+                "fontes_advogados.processo_id",
+                "fontes_advogados",
+                """
+                UPDATE fontes_advogados v SET processo_id = f.processo_id FROM fontes f
+                WHERE f.id = v.fonte_id AND v.id > :de AND v.id <= :ate AND v.processo_id IS NULL
+                """,
+            ),
+            Preenchimento("fontes_vinculos.processos_antigos", "processos", funcao=_preencher_vinculos, invalida_relatorios=True),
+        ),
+    ),
+    Migracao(
+        8,
+        "dono e heartbeat dos jobs de relatório (retomada só dos abandonados)",
+        comandos=(
+            "ALTER TABLE relatorios_jobs ADD COLUMN IF NOT EXISTS dono VARCHAR",
+            "ALTER TABLE relatorios_jobs ADD COLUMN IF NOT EXISTS heartbeat_em TIMESTAMPTZ",
+        ),
+    ),
+]
+
+
+async def _criar_tabela_versoes(conn):
+    await conn.execute(text(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migracoes (
+            versao INTEGER PRIMARY KEY,
+            descricao TEXT NOT NULL,
+            aplicada_em TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """
+    ))
+
+
+async def _versoes_aplicadas(conn) -> set:
+    result = await conn.execute(text("SELECT versao FROM schema_migracoes"))
+    return set(result.scalars().all())
+
+
+async def _criar_indice(conn, indice: Indice):
+    # Um CREATE INDEX CONCURRENTLY que falhou deixa o índice marcado como
+    # inválido; o IF NOT EXISTS pularia esse índice, então ele é removido antes.
+    invalido = await conn.execute(
+        text(
+            """
+            SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = :nome AND NOT i.indisvalid
+            """
+        ),
+        {"nome": indice.nome},
+    )
+    if invalido.first():
+        logger.warning(f"Removendo índice inválido {indice.nome}")
+        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {indice.nome}"))
+
+    unico = "UNIQUE " if indice.unico else ""
+    await conn.execute(text(
+        f"CREATE {unico}INDEX CONCURRENTLY IF NOT EXISTS {indice.nome} "
+        f"ON {indice.tabela} USING {indice.metodo} ({indice.colunas})"
+    ))
+
+
+async def _aplicar(conn, migracao: Migracao):
+    logger.info(f"Aplicando migração {migracao.versao}: {migracao.descricao}")
+    for comando in migracao.comandos:
+        await conn.execute(text(comando))
+    for indice in migracao.indices:
+        await _criar_indice(conn, indice)
+    await conn.execute(
+        text("INSERT INTO schema_migracoes (versao, descricao) VALUES (:versao, :descricao) ON CONFLICT DO NOTHING"),
+        {"versao": migracao.versao, "descricao": migracao.descricao},
+    )
+
+
+async def migrar(engine) -> list:
+    """Aplica, em ordem, as migrações ainda não registradas. Retorna as versões aplicadas."""
+    aplicadas = []
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        # Índices em tabelas grandes passam do statement_timeout da engine de ingestão
+        await conn.execute(text("SET statement_timeout = 0"))
+        await conn.execute(text("SELECT pg_advisory_lock(:chave)"), {"chave": CHAVE_LOCK_MIGRACOES})
+        try:
+            await _criar_tabela_versoes(conn)
+            ja_aplicadas = await _versoes_aplicadas(conn)
+            for migracao in sorted(MIGRACOES, key=lambda m: m.versao):
+                if migracao.versao in ja_aplicadas:
+                    continue
+                await _aplicar(conn, migracao)
+                aplicadas.append(migracao.versao)
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:chave)"), {"chave": CHAVE_LOCK_MIGRACOES})
+            await conn.execute(text("RESET statement_timeout"))
+    return aplicadas
+
+
+async def _criar_tabela_preenchimentos(conn):
+    await conn.execute(text(
+        """
+        CREATE TABLE IF NOT EXISTS schema_preenchimentos (
+            nome TEXT PRIMARY KEY,
+            ultimo_id BIGINT NOT NULL DEFAULT 0,
+            concluido_em TIMESTAMPTZ
+        )
+        """
+    ))
+
+
+async def _progresso_preenchimentos(conn) -> dict:
+    """{nome: (última chave preenchida, concluído?)}"""
+    result = await conn.execute(text("SELECT nome, ultimo_id, concluido_em FROM schema_preenchimentos"))
+    return {nome: (ultimo_id, concluido_em is not None) for nome, ultimo_id, concluido_em in result.all()}
+
+
+async def _invalidar_relatorios(conn):
+    from app.versoes import incrementar_versoes
+
+    result = await conn.execute(text(
+        "SELECT DISTINCT unidade_origem_tribunal_sigla FROM processos WHERE unidade_origem_tribunal_sigla IS NOT NULL"
+    ))
+    # Conexão em autocommit: o incremento é um comando só, publicado na hora
+    await incrementar_versoes(conn, result.scalars().all())
+
+
+async def _preencher(conn, preenchimento: Preenchimento, ultimo_id: int):
+    maximo = (await conn.execute(text(f"SELECT max({preenchimento.chave}) FROM {preenchimento.tabela}"))).scalar() or 0
+    if ultimo_id < maximo:
+        logger.info(f"Preenchendo {preenchimento.nome}: {preenchimento.tabela} de {ultimo_id} até {maximo}")
+    # Linhas acima do máximo são gravadas depois da migração e já chegam preenchidas
+    while ultimo_id < maximo:
+        ate = min(ultimo_id + LOTE_PREENCHIMENTO, maximo)
+        if preenchimento.comando:
+            await conn.execute(text(preenchimento.comando), {"de": ultimo_id, "ate": ate})
+        else:
+            await preenchimento.funcao(ultimo_id, ate)
+        await conn.execute(
+            text(
+                """
+                INSERT INTO schema_preenchimentos (nome, ultimo_id) VALUES (:nome, :ate)
+                ON CONFLICT (nome) DO UPDATE SET ultimo_id = EXCLUDED.ultimo_id
+                """
+            ),
+            {"nome": preenchimento.nome, "ate": ate},
+        )
+        ultimo_id = ate
+
+    if preenchimento.invalida_relatorios:
+        await _invalidar_relatorios(conn)
+    await conn.execute(
+        text(
+            """
+            INSERT INTO schema_preenchimentos (nome, ultimo_id, concluido_em) VALUES (:nome, :ultimo_id, now())
+            ON CONFLICT (nome) DO UPDATE SET ultimo_id = EXCLUDED.ultimo_id, concluido_em = now()
+            """
+        ),
+        {"nome": preenchimento.nome, "ultimo_id": ultimo_id},
+    )
+    logger.info(f"Preenchimento {preenchimento.nome} concluído")
+
+
+async def preencher(engine) -> list:
+    """
+    Executa os preenchimentos pendentes das migrações já aplicadas. Retorna os
+    nomes concluídos agora (vazio se outro processo já estiver preenchendo).
+    """
+    concluidos = []
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        livre = (await conn.execute(text("SELECT pg_try_advisory_lock(:chave)"), {"chave": CHAVE_LOCK_PREENCHIMENTOS})).scalar()
+        if not livre:
+            logger.info("Preenchimentos em andamento em outro processo")
+            return concluidos
+        try:
+            await _criar_tabela_versoes(conn)
+            await _criar_tabela_preenchimentos(conn)
+            ja_aplicadas = await _versoes_aplicadas(conn)
+            progresso = await _progresso_preenchimentos(conn)
+            for migracao in sorted(MIGRACOES, key=lambda m: m.versao):
+                if migracao.versao not in ja_aplicadas:
+                    continue
+                for preenchimento in migracao.preenchimentos:
+                    ultimo_id, concluido = progresso.get(preenchimento.nome, (0, False))
+                    if concluido:
+                        continue
+                    await _preencher(conn, preenchimento, ultimo_id)
+                    concluidos.append(preenchimento.nome)
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:chave)"), {"chave": CHAVE_LOCK_PREENCHIMENTOS})
+    return concluidos
+
+
+async def _status(engine):
+    async with engine.connect() as conn:
+        await _criar_tabela_versoes(conn)
+        await _criar_tabela_preenchimentos(conn)
+        ja_aplicadas = await _versoes_aplicadas(conn)
+        progresso = await _progresso_preenchimentos(conn)
+        await conn.commit()
+    for migracao in MIGRACOES:
+        marca = "x" if migracao.versao in ja_aplicadas else " "
+        print(f"[{marca}] {migracao.versao:>3}  {migracao.descricao}")
+        for preenchimento in migracao.preenchimentos:
+            ultimo_id, concluido = progresso.get(preenchimento.nome, (0, False))
+            situacao = "concluído" if concluido else f"até {preenchimento.chave} {ultimo_id}"
+            print(f"         preenchimento {preenchimento.nome}: {situacao}")
+
+
+if __name__ == "__main__":
+    # Uso: python -m app.migracoes [--status | --preencher]
+    from app.database import engine
+
+    parser = argparse.ArgumentParser(description="Aplica as migrações pendentes do schema.")
+    parser.add_argument("--status", action="store_true", help="Só lista as migrações e se já foram aplicadas")
+    parser.add_argument("--preencher", action="store_true", help="Depois de migrar, executa os preenchimentos pendentes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def _main():
+        try:
+            if args.status:
+                await _status(engine)
+            else:
+                print(f"Migrações aplicadas: {await migrar(engine) or 'nenhuma'}")
+                if args.preencher:
+                    print(f"Preenchimentos concluídos: {await preencher(engine) or 'nenhum'}")
+        finally:
+            await engine.dispose()
+
+    asyncio.run(_main())
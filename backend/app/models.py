@@ -8,6 +8,9 @@ from sqlalchemy import (
     ForeignKey,
     Float,
     Text,
+    LargeBinary,
+    UniqueConstraint,
+    Index,
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
@@ -35,7 +38,13 @@ class Processo(Base):
     unidade_origem_nome = Column(String)
     unidade_origem_cidade = Column(String)
     unidade_origem_estado = Column(String)
-    unidade_origem_tribunal_sigla = Column(String)
+    unidade_origem_tribunal_sigla = Column(String, index=True)
+
+    # Última vez que o processo foi obtido da API por esta aplicação
+    sincronizado_em = Column(DateTime(timezone=True))
+    # Última tentativa de atualização (app.atualizacao) e falhas seguidas até ela
+    sincronizacao_tentativa_em = Column(DateTime(timezone=True))
+    sincronizacao_falhas = Column(Integer, nullable=False, default=0, server_default="0")
 
     # Relações existentes
     processos_relacionados = relationship("ProcessoRelacionado", back_populates="processo")
@@ -49,7 +58,7 @@ class Processo(Base):
 class ProcessoRelacionado(Base):
     __tablename__ = "processos_relacionados"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    processo_id = Column(Integer, ForeignKey("processos.id"))
+    processo_id = Column(Integer, ForeignKey("processos.id"), index=True)
     numero = Column(String)
     
     processo = relationship("Processo", back_populates="processos_relacionados")
@@ -59,7 +68,7 @@ class ProcessoRelacionado(Base):
 class Fonte(Base):
     __tablename__ = "fontes"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    processo_id = Column(Integer, ForeignKey("processos.id"))
+    processo_id = Column(Integer, ForeignKey("processos.id"), index=True)
     fonte_id = Column(Integer)
     processo_fonte_id = Column(Integer)
     descricao = Column(String)
@@ -91,7 +100,7 @@ class Fonte(Base):
 class Capa(Base):
     __tablename__ = "fontes_capas"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    fonte_id = Column(Integer, ForeignKey("fontes.id"))
+    fonte_id = Column(Integer, ForeignKey("fontes.id"), index=True)
     classe = Column(String)
     assunto = Column(Text)
     area = Column(String)
@@ -112,7 +121,7 @@ class Capa(Base):
 class ValorCausa(Base):
     __tablename__ = "capa_valores_causa"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    capa_id = Column(Integer, ForeignKey("fontes_capas.id"))
+    capa_id = Column(Integer, ForeignKey("fontes_capas.id"), index=True)
     valor = Column(Float)
     moeda = Column(String)
     valor_formatado = Column(String)
@@ -124,7 +133,7 @@ class ValorCausa(Base):
 class InformacaoComplementar(Base):
     __tablename__ = "capa_informacoes_complementares"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    capa_id = Column(Integer, ForeignKey("fontes_capas.id"))
+    capa_id = Column(Integer, ForeignKey("fontes_capas.id"), index=True)
     tipo = Column(String)
     valor = Column(Text)
 
@@ -135,7 +144,7 @@ class InformacaoComplementar(Base):
 class Envolvido(Base):
     __tablename__ = "fontes_envolvidos"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    fonte_id = Column(Integer, ForeignKey("fontes.id"))
+    fonte_id = Column(Integer, ForeignKey("fontes.id"), index=True)
     nome = Column(String)
     quantidade_processos = Column(Integer)
     tipo_pessoa = Column(String)
@@ -146,6 +155,9 @@ class Envolvido(Base):
     polo = Column(String)
     cpf = Column(String)
     cnpj = Column(String)
+    # Só dígitos, com zeros à esquerda (11/14); preenchidos na gravação
+    cpf_digitos = Column(String(11), index=True)
+    cnpj_digitos = Column(String(14), index=True)
 
     fonte = relationship("Fonte", back_populates="envolvidos")
     advogados = relationship("Advogado", back_populates="envolvido")
@@ -155,7 +167,7 @@ class Envolvido(Base):
 class Advogado(Base):
     __tablename__ = "envolvidos_advogados"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    envolvido_id = Column(Integer, ForeignKey("fontes_envolvidos.id"))
+    envolvido_id = Column(Integer, ForeignKey("fontes_envolvidos.id"), index=True)
     nome = Column(String)
     quantidade_processos = Column(Integer)
     tipo_pessoa = Column(String)
@@ -166,6 +178,8 @@ class Advogado(Base):
     polo = Column(String)
     cpf = Column(String)
     cnpj = Column(String)
+    cpf_digitos = Column(String(11), index=True)
+    cnpj_digitos = Column(String(14), index=True)
 
     envolvido = relationship("Envolvido", back_populates="advogados")
     oabs = relationship("OAB", back_populates="advogado")
@@ -175,7 +189,7 @@ class Advogado(Base):
 class OAB(Base):
     __tablename__ = "advogados_oabs"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    advogado_id = Column(Integer, ForeignKey("envolvidos_advogados.id"))
+    advogado_id = Column(Integer, ForeignKey("envolvidos_advogados.id"), index=True)
     uf = Column(String)
     tipo = Column(String)
     numero = Column(Integer)
@@ -187,7 +201,7 @@ class OAB(Base):
 class Audiencia(Base):
     __tablename__ = "audiencias"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    fonte_id = Column(Integer, ForeignKey("fontes.id"), nullable=False)
+    fonte_id = Column(Integer, ForeignKey("fontes.id"), nullable=False, index=True)
     data_audiencia = Column(Date)
     descricao = Column(String)
     json_completo = Column(JSONB)
@@ -208,3 +222,187 @@ class DadosPrecatorio(Base):
     data_expedicao = Column(Date)
 
     processo = relationship("Processo", back_populates="dados_precatorios", uselist=False)
+
+
+## 12. Jobs de ingestão (upload de listas de CNJs)
+class IngestaoJob(Base):
+    __tablename__ = "ingestao_jobs"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    nome_arquivo = Column(String)
+    status = Column(String, nullable=False, default="pendente")
+    total = Column(Integer, nullable=False, default=0)
+    criado_em = Column(DateTime(timezone=True), nullable=False)
+    execucao_iniciada_em = Column(DateTime(timezone=True))
+    concluido_em = Column(DateTime(timezone=True))
+
+    itens = relationship("IngestaoJobItem", back_populates="job")
+
+
+## 13. Estado de cada CNJ dentro de um job (pendente/obtido/salvo/falhou)
+class IngestaoJobItem(Base):
+    __tablename__ = "ingestao_jobs_itens"
+    __table_args__ = (UniqueConstraint("job_id", "numero_cnj", name="uq_ingestao_jobs_itens_job_cnj"),)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(Integer, ForeignKey("ingestao_jobs.id"), nullable=False, index=True)
+    numero_cnj = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pendente", index=True)
+    erro = Column(Text)
+    atualizado_em = Column(DateTime(timezone=True))
+
+    job = relationship("IngestaoJob", back_populates="itens")
+
+
+## 14. Arquivo das respostas brutas do Escavador (JSON compactado com zstd)
+class RespostaEscavador(Base):
+    __tablename__ = "escavador_respostas"
+    __table_args__ = (UniqueConstraint("numero_cnj", "hash_conteudo", name="uq_escavador_respostas_cnj_hash"),)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    numero_cnj = Column(String, nullable=False, index=True)
+    tribunal_sigla = Column(String, index=True)
+    obtido_em = Column(DateTime(timezone=True), nullable=False)
+    hash_conteudo = Column(String(64), nullable=False)  # sha256 do JSON canônico
+    tamanho_original = Column(Integer)
+    payload_zstd = Column(LargeBinary, nullable=False)
+
+
+## 15. Resumo por processo usado pelos relatórios (recalculado a cada gravação do processo)
+class PrecatorioResumo(Base):
+    __tablename__ = "precatorios_resumo"
+    processo_id = Column(Integer, ForeignKey("processos.id", ondelete="CASCADE"), primary_key=True)
+    numero_cnj = Column(String, nullable=False)
+    tribunal_sigla = Column(String, index=True)
+    estado_origem = Column(String)
+    unidade_origem_cidade = Column(String)
+
+    # Réu: primeiro envolvido do polo PASSIVO
+    reu_nome = Column(String)
+    reu_cnpj = Column(String)
+    reu_cnpj_digitos = Column(String(14))
+    # Credor: primeiro ATIVO que não é advogado nem ente público
+    credor_nome = Column(String)
+    credor_cpf = Column(String)
+    credor_cnpj = Column(String)
+    credor_documento = Column(String(14))  # cnpj_digitos ou, na falta, cpf_digitos do credor
+    # Primeiro ATIVO que não é advogado (critério da planilha de precatórios)
+    ativo_nome = Column(String)
+    ativo_cpf = Column(String)
+    ativo_cnpj = Column(String)
+
+    uf_origem = Column(String)  # UF do processo originário (informações complementares)
+    tipo_precatorio = Column(String)
+    valor_causa = Column(Float)
+
+    # Copiados de dados_precatorios
+    tipo_regime = Column(String)
+    ano_orcamentario = Column(Integer)
+    natureza_precatorio = Column(String)
+    valor_deferido = Column(Float)
+    data_base_calculo = Column(Date)
+    data_expedicao = Column(Date)
+
+    atualizado_em = Column(DateTime(timezone=True))
+
+
+## 16. Advogados do polo ATIVO de cada processo, na ordem do grafo (abas de advogados)
+class PrecatorioResumoAdvogado(Base):
+    __tablename__ = "precatorios_resumo_advogados"
+    __table_args__ = (
+        Index("ix_precatorios_resumo_advogados_tribunal_ordem", "tribunal_sigla", "processo_id", "ordem"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    processo_id = Column(Integer, ForeignKey("processos.id", ondelete="CASCADE"), nullable=False, index=True)
+    tribunal_sigla = Column(String)
+    ordem = Column(Integer, nullable=False)  # posição da linha dentro do processo
+
+    envolvido_nome = Column(String)
+    envolvido_cpf = Column(String)
+    envolvido_cnpj = Column(String)
+    envolvido_ente_publico = Column(Boolean)
+
+    advogado_nome = Column(String)
+    advogado_cpf = Column(String)
+    advogado_cpf_digitos = Column(String(11))
+    oab_numero = Column(Integer)
+    oab_uf = Column(String)
+    oab_ordem = Column(Integer)  # posição da OAB no advogado; nulo se ele não tem OAB
+
+
+## 17. Pessoa (credor, réu...) única por documento (cnpj_digitos ou cpf_digitos)
+class Pessoa(Base):
+    __tablename__ = "pessoas"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    documento = Column(String(14), nullable=False, unique=True)
+    nome = Column(String)
+    tipo_pessoa = Column(String)
+
+
+## 18. Advogado único, identificado por CPF ou, na falta, pela primeira OAB ("cpf:<dígitos>" / "oab:<UF>:<número>")
+class AdvogadoCadastro(Base):
+    __tablename__ = "advogados"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    chave = Column(String, nullable=False, unique=True)
+    nome = Column(String)
+    cpf_digitos = Column(String(11))
+    oab_uf = Column(String)
+    oab_numero = Column(Integer)
+
+
+## 19. Pessoas de cada fonte (vínculo enxuto; reconstruído quando os envolvidos do processo mudam)
+class FontePessoa(Base):
+    __tablename__ = "fontes_pessoas"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    fonte_id = Column(Integer, ForeignKey("fontes.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Processo da fonte, copiado: leitores por processo/tribunal não passam por `fontes`
+    processo_id = Column(Integer, ForeignKey("processos.id", ondelete="CASCADE"), index=True)
+    pessoa_id = Column(Integer, ForeignKey("pessoas.id"), nullable=False, index=True)
+    polo = Column(String)
+    tipo_normalizado = Column(String)
+
+
+## 20. Advogados de cada fonte, com a pessoa representada (quando identificada)
+class FonteAdvogado(Base):
+    __tablename__ = "fontes_advogados"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    fonte_id = Column(Integer, ForeignKey("fontes.id", ondelete="CASCADE"), nullable=False, index=True)
+    processo_id = Column(Integer, ForeignKey("processos.id", ondelete="CASCADE"), index=True)
+    advogado_id = Column(Integer, ForeignKey("advogados.id"), nullable=False, index=True)
+    pessoa_id = Column(Integer, ForeignKey("pessoas.id"), index=True)
+    polo = Column(String)
+
+
+## 21. Versão dos dados de cada tribunal (incrementada a cada gravação que muda os relatórios)
+class TribunalVersao(Base):
+    __tablename__ = "tribunais_versoes"
+    tribunal_sigla = Column(String, primary_key=True)
+    versao = Column(Integer, nullable=False, default=0)
+    atualizado_em = Column(DateTime(timezone=True))
+
+
+# Incrementos ainda não aplicados em tribunais_versoes: gravados na transação dos
+# dados, um por tribunal alterado; app.versoes os aplica e apaga
+class TribunalVersaoPendente(Base):
+    __tablename__ = "tribunais_versoes_pendentes"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    tribunal_sigla = Column(String, nullable=False, index=True)
+
+
+## 22. Jobs de geração de relatórios (executados no pool de processos de app.relatorios_jobs)
+class RelatorioJob(Base):
+    __tablename__ = "relatorios_jobs"
+    __table_args__ = (Index("ix_relatorios_jobs_chave", "relatorio", "tribunal_sigla", "versao"),)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    relatorio = Column(String, nullable=False)  # lemitt, lista, csv, requerentes
+    tribunal_sigla = Column(String, nullable=False)
+    versao = Column(Integer, nullable=False)  # versão dos dados do tribunal (app.versoes) pedida
+    status = Column(String, nullable=False, default="pendente", index=True)
+    processados = Column(Integer, nullable=False, default=0)
+    total = Column(Integer)
+    nome_arquivo = Column(String, nullable=False)
+    arquivo_temporario = Column(String)  # onde o processo filho escreve antes de ir para o cache
+    erro = Column(Text)
+    criado_em = Column(DateTime(timezone=True), nullable=False)
+    iniciado_em = Column(DateTime(timezone=True))
+    concluido_em = Column(DateTime(timezone=True))
+    # Processo da API que acompanha o job e o último sinal de vida dele (app.relatorios_jobs)
+    dono = Column(String)
+    heartbeat_em = Column(DateTime(timezone=True))
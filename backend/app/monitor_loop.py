@@ -0,0 +1,123 @@
+"""
+Monitor de bloqueio do event loop.
+
+Uma tarefa no loop marca um batimento a cada LOOP_MONITOR_INTERVALO_MS e
+uma thread vigia o batimento. Se ele atrasa mais que LOOP_LAG_LIMITE_MS, o
+loop está preso em código síncrono: a thread registra, naquele momento, a
+pilha do loop (onde ele está preso) e as requisições em andamento. Quando o
+loop volta, a tarefa registra quanto tempo ele ficou parado.
+
+As requisições em andamento vêm do MonitorLoopMiddleware (ASGI puro, sem
+custo além de um dicionário). LOOP_LAG_LIMITE_MS=0 desliga o monitor.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_LIMITE_MS = int(os.getenv("LOOP_LAG_LIMITE_MS", "200"))
+LOOP_MONITOR_INTERVALO_MS = int(os.getenv("LOOP_MONITOR_INTERVALO_MS", "50"))
+# Quadros da pilha do loop incluídos no log
+LOOP_PILHA_QUADROS = 15
+
+
+class MonitorLoop:
+    def __init__(self, limite_ms: int = LOOP_LAG_LIMITE_MS, intervalo_ms: int = LOOP_MONITOR_INTERVALO_MS):
+        self.limite = limite_ms / 1000
+        self.intervalo = intervalo_ms / 1000
+        self.em_andamento = {}  # id da requisição -> (descrição, início)
+        self.bloqueios = 0
+        self.maior_bloqueio_ms = 0.0
+        self._batimento = time.monotonic()
+        self._avisado = False
+        self._thread_loop = None
+        self._tarefa = None
+        self._parar = threading.Event()
+        self._vigia = None
+
+    def requisicoes(self) -> list:
+        agora = time.monotonic()
+        return [f"{descricao} ({(agora - inicio) * 1000:.0f} ms)" for descricao, inicio in list(self.em_andamento.values())]
+
+    async def _bater(self):
+        while True:
+            antes = time.monotonic()
+            self._batimento = antes
+            await asyncio.sleep(self.intervalo)
+            atraso = time.monotonic() - antes - self.intervalo
+            if atraso > self.limite:
+                self.bloqueios += 1
+                self.maior_bloqueio_ms = max(self.maior_bloqueio_ms, atraso * 1000)
+                logger.warning(
+                    f"Event loop ficou bloqueado por {atraso * 1000:.0f} ms "
+                    f"(requisições em andamento: {self.requisicoes() or 'nenhuma'})"
+                )
+            self._avisado = False
+
+    def _vigiar(self):
+        while not self._parar.wait(self.intervalo):
+            parado = time.monotonic() - self._batimento - self.intervalo
+            if parado <= self.limite or self._avisado:
+                continue
+            # Um aviso por bloqueio: o próximo batimento libera o seguinte
+            self._avisado = True
+            quadro = sys._current_frames().get(self._thread_loop)
+            pilha = "".join(traceback.format_stack(quadro, limit=LOOP_PILHA_QUADROS)) if quadro else "(indisponível)"
+            logger.warning(
+                f"Event loop bloqueado há {parado * 1000:.0f} ms; "
+                f"requisições em andamento: {self.requisicoes() or 'nenhuma'}\n{pilha}"
+            )
+
+    def iniciar(self):
+        """Liga o monitor no event loop atual (nada a fazer se LOOP_LAG_LIMITE_MS=0)."""
+        if self.limite <= 0 or self._tarefa:
+            return
+        self._thread_loop = threading.get_ident()
+        self._batimento = time.monotonic()
+        self._parar.clear()
+        self._tarefa = asyncio.create_task(self._bater())
+        self._vigia = threading.Thread(target=self._vigiar, name="monitor-loop", daemon=True)
+        self._vigia.start()
+
+    def parar(self):
+        if self._tarefa:
+            self._tarefa.cancel()
+            self._tarefa = None
+        self._parar.set()
+
+    def metricas(self) -> dict:
+        return {
+            "limite_ms": self.limite * 1000,
+            "bloqueios": self.bloqueios,
+            "maior_bloqueio_ms": round(self.maior_bloqueio_ms, 1),
+            "requisicoes_em_andamento": len(self.em_andamento),
+        }
+
+
+monitor_loop = MonitorLoop()
+
+
+class MonitorLoopMiddleware:
+    """Registra no monitor as requisições HTTP em andamento (método, rota e há quanto tempo)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        chave = id(scope)
+        monitor_loop.em_andamento[chave] = (f"{scope['method']} {scope['path']}", time.monotonic())
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            monitor_loop.em_andamento.pop(chave, None)
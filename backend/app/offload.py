@@ -0,0 +1,105 @@
+"""
+Execução de trabalho bloqueante fora do event loop.
+
+Tudo que roda direto numa rota `async def` trava todas as outras requisições
+enquanto não termina. Duas saídas, conforme o tipo de trabalho:
+
+- `em_thread` / `iterar_em_thread`: pool de threads (OFFLOAD_THREADS) para
+  I/O e bibliotecas que soltam o GIL (leitura de arquivo, parser C do pandas
+  lendo em chunks). Os objetos não precisam ser serializados.
+- `em_processo`: pool de processos (OFFLOAD_PROCESSOS) para CPU em Python
+  puro ou pandas em lote (parse e conversão de planilhas). Função e
+  argumentos vão por pickle, então a função precisa ser de nível de módulo.
+
+Os relatórios têm um pool de processos próprio (app.relatorios_jobs), com
+fila e progresso; este aqui é para trabalho curto dentro das requisições.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OFFLOAD_THREADS = int(os.getenv("OFFLOAD_THREADS", "8"))
+OFFLOAD_PROCESSOS = int(os.getenv("OFFLOAD_PROCESSOS", "2"))
+
+_threads: ThreadPoolExecutor | None = None
+_processos: ProcessPoolExecutor | None = None
+
+# Marca de fim do iterador (StopIteration não atravessa um Future)
+_FIM = object()
+
+
+def _pool_threads() -> ThreadPoolExecutor:
+    global _threads
+    if _threads is None:
+        _threads = ThreadPoolExecutor(max_workers=OFFLOAD_THREADS, thread_name_prefix="offload")
+    return _threads
+
+
+def _pool_processos() -> ProcessPoolExecutor:
+    global _processos
+    if _processos is None:
+        # spawn: o filho não herda o event loop nem as conexões abertas da API
+        _processos = ProcessPoolExecutor(max_workers=OFFLOAD_PROCESSOS, mp_context=multiprocessing.get_context("spawn"))
+    return _processos
+
+
+async def em_thread(funcao, *args, **kwargs):
+    """Executa `funcao(*args, **kwargs)` no pool de threads e retorna o resultado."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool_threads(), partial(funcao, *args, **kwargs))
+
+
+async def em_processo(funcao, *args, **kwargs):
+    """Executa `funcao(*args, **kwargs)` no pool de processos e retorna o resultado."""
+    global _processos
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_pool_processos(), partial(funcao, *args, **kwargs))
+    except BrokenProcessPool:
+        # Um filho morreu e levou o pool junto: a próxima chamada cria outro
+        logger.error("Pool de processos do offload quebrado; será recriado")
+        _processos = None
+        raise
+
+
+def _proximo(iterador):
+    return next(iterador, _FIM)
+
+
+async def iterar_em_thread(iteravel):
+    """
+    Percorre um iterador síncrono (ex.: um gerador de chunks do pandas) com
+    cada passo no pool de threads. O gerador é fechado ao final, mesmo se quem
+    itera parar antes.
+    """
+    iterador = iter(iteravel)
+    try:
+        while True:
+            item = await em_thread(_proximo, iterador)
+            if item is _FIM:
+                return
+            yield item
+    finally:
+        fechar = getattr(iterador, "close", None)
+        if fechar:
+            await em_thread(fechar)
+
+
+def encerrar():
+    global _threads, _processos
+    if _threads is not None:
+        _threads.shutdown(wait=False, cancel_futures=True)
+        _threads = None
+    if _processos is not None:
+        _processos.shutdown(wait=False, cancel_futures=True)
+        _processos = None
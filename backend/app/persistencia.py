@@ -0,0 +1,642 @@
+"""
+Escrita em massa dos payloads do Escavador.
+
+Em vez de um flush por objeto para descobrir ids, os ids das tabelas que têm
+filhos (fontes, capas, envolvidos, advogados) são reservados de uma vez nas
+sequences, e cada tabela é gravada com INSERTs multi-linha. Um lote de 200
+CNJs custa poucas instruções, independentemente do tamanho dos grafos.
+"""
+import re
+from datetime import date, datetime, timezone
+
+from sqlalchemy import bindparam, delete, insert, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.models import (
+    Processo,
+    ProcessoRelacionado,
+    Fonte,
+    Capa,
+    ValorCausa,
+    InformacaoComplementar,
+    Envolvido,
+    Advogado,
+    OAB,
+    Audiencia,
+)
+from app.entidades import vincular_entidades
+from app.relatorios import opcoes_grafo
+from app.resumo import recalcular_resumos
+
+LINHAS_POR_INSERT = 1000
+
+
+# ---------------------------------------------------------------------------
+# Conversões de campos do payload
+# ---------------------------------------------------------------------------
+
+def _data(valor) -> date | None:
+    """Converte 'YYYY-MM-DD' em date (None se inválido)."""
+    if valor and isinstance(valor, str):
+        try:
+            return datetime.strptime(valor, "%Y-%m-%d").date()
+        except ValueError:
+            return None
+    return valor or None
+
+
+def _data_hora(valor) -> datetime | None:
+    """Converte um timestamp ISO 8601 em datetime (None se inválido)."""
+    if valor and isinstance(valor, str):
+        try:
+            return datetime.fromisoformat(valor)
+        except ValueError:
+            return None
+    return valor or None
+
+
+def _float(valor) -> float | None:
+    # A API retorna valores decimais como string
+    if valor in (None, ""):
+        return None
+    try:
+        return float(valor)
+    except (ValueError, TypeError):
+        return None
+
+
+def _inteiro(valor) -> int | None:
+    """Valor de coluna Integer (ex.: número da OAB): aceita int ou texto só com dígitos."""
+    if valor in (None, ""):
+        return None
+    try:
+        return int(valor)
+    except (ValueError, TypeError):
+        return None
+
+
+def documento_digitos(valor, tamanho: int) -> str | None:
+    """CPF/CNPJ só com dígitos e zeros à esquerda até `tamanho` (None se não houver dígitos)."""
+    if valor is None:
+        return None
+    digitos = re.sub(r"\D", "", str(valor))
+    return digitos.zfill(tamanho) if digitos else None
+
+
+# ---------------------------------------------------------------------------
+# Payload -> linhas (dicts com as colunas de cada tabela)
+# ---------------------------------------------------------------------------
+
+def linha_processo(data: dict) -> dict:
+    unidade_origem = data.get("unidade_origem") or {}
+    estado_origem = data.get("estado_origem")
+    return {
+        "numero_cnj": data.get("numero_cnj"),
+        "titulo_polo_ativo": data.get("titulo_polo_ativo"),
+        "titulo_polo_passivo": data.get("titulo_polo_passivo"),
+        "ano_inicio": data.get("ano_inicio"),
+        "data_inicio": _data(data.get("data_inicio")),
+        "estado_origem": estado_origem.get("sigla") if isinstance(estado_origem, dict) else estado_origem,
+        "data_ultima_movimentacao": _data(data.get("data_ultima_movimentacao")),
+        "quantidade_movimentacoes": data.get("quantidade_movimentacoes"),
+        "fontes_tribunais_estao_arquivadas": data.get("fontes_tribunais_estao_arquivadas"),
+        "tempo_desde_ultima_verificacao": data.get("tempo_desde_ultima_verificacao"),
+        "data_ultima_verificacao": _data_hora(data.get("data_ultima_verificacao")),
+        "unidade_origem_nome": unidade_origem.get("nome"),
+        "unidade_origem_cidade": unidade_origem.get("cidade"),
+        "unidade_origem_estado": unidade_origem.get("estado"),
+        "unidade_origem_tribunal_sigla": unidade_origem.get("tribunal_sigla"),
+    }
+
+
+def linha_processo_relacionado(rel: dict) -> dict:
+    return {"numero": rel.get("numero")}
+
+
+def linha_fonte(f: dict) -> dict:
+    return {
+        "fonte_id": f.get("id"),
+        "processo_fonte_id": f.get("processo_fonte_id"),
+        "descricao": f.get("descricao"),
+        "nome": f.get("nome"),
+        "sigla": f.get("sigla"),
+        "tipo": f.get("tipo"),
+        "data_inicio": _data(f.get("data_inicio")),
+        "data_ultima_movimentacao": _data(f.get("data_ultima_movimentacao")),
+        "segredo_justica": f.get("segredo_justica"),
+        "arquivado": f.get("arquivado"),
+        "status_predito": f.get("status_predito"),
+        "grau": f.get("grau"),
+        "grau_formatado": f.get("grau_formatado"),
+        "fisico": f.get("fisico"),
+        "sistema": f.get("sistema"),
+        "url": f.get("url"),
+        "quantidade_envolvidos": f.get("quantidade_envolvidos"),
+        "data_ultima_verificacao": _data_hora(f.get("data_ultima_verificacao")),
+        "quantidade_movimentacoes": f.get("quantidade_movimentacoes"),
+        "outros_numeros": f.get("outros_numeros"),
+    }
+
+
+def linha_capa(capa: dict) -> dict:
+    return {
+        "classe": capa.get("classe"),
+        "assunto": capa.get("assunto"),
+        "assuntos_normalizados": capa.get("assuntos_normalizados"),
+        "assunto_principal_normalizado": capa.get("assunto_principal_normalizado"),
+        "area": capa.get("area"),
+        "orgao_julgador": capa.get("orgao_julgador"),
+        "situacao": capa.get("situacao"),
+        "data_distribuicao": _data(capa.get("data_distribuicao")),
+        "data_arquivamento": _data(capa.get("data_arquivamento")),
+    }
+
+
+def linha_valor_causa(valor_causa: dict) -> dict:
+    return {
+        "valor": _float(valor_causa.get("valor")),
+        "moeda": valor_causa.get("moeda"),
+        "valor_formatado": valor_causa.get("valor_formatado"),
+    }
+
+
+def linha_informacao_complementar(info: dict) -> dict:
+    return {"tipo": info.get("tipo"), "valor": info.get("valor")}
+
+
+def linha_audiencia(aud: dict) -> dict:
+    data_audiencia = _data_hora(aud.get("data_audiencia"))
+    return {
+        "data_audiencia": data_audiencia.date() if isinstance(data_audiencia, datetime) else data_audiencia,
+        "descricao": aud.get("descricao"),
+    }
+
+
+def linha_envolvido(env: dict) -> dict:
+    return {
+        "nome": env.get("nome"),
+        "quantidade_processos": env.get("quantidade_processos"),
+        "tipo_pessoa": env.get("tipo_pessoa"),
+        "tipo": env.get("tipo"),
+        "tipo_normalizado": env.get("tipo_normalizado"),
+        "polo": env.get("polo"),
+        "cpf": env.get("cpf"),
+        "cnpj": env.get("cnpj"),
+        "cpf_digitos": documento_digitos(env.get("cpf"), 11),
+        "cnpj_digitos": documento_digitos(env.get("cnpj"), 14),
+        "prefixo": env.get("prefixo"),
+        "sufixo": env.get("sufixo"),
+    }
+
+
+def linha_advogado(adv: dict) -> dict:
+    return {
+        "nome": adv.get("nome"),
+        "quantidade_processos": adv.get("quantidade_processos"),
+        "tipo_pessoa": adv.get("tipo_pessoa"),
+        "tipo": adv.get("tipo"),
+        "tipo_normalizado": adv.get("tipo_normalizado"),
+        "polo": adv.get("polo"),
+        "cpf": adv.get("cpf"),
+        "cnpj": adv.get("cnpj"),
+        "cpf_digitos": documento_digitos(adv.get("cpf"), 11),
+        "cnpj_digitos": documento_digitos(adv.get("cnpj"), 14),
+        "prefixo": adv.get("prefixo"),
+        "sufixo": adv.get("sufixo"),
+    }
+
+
+def linha_oab(oab: dict) -> dict:
+    return {"uf": oab.get("uf"), "tipo": oab.get("tipo"), "numero": _inteiro(oab.get("numero"))}
+
+
+# ---------------------------------------------------------------------------
+# Plano de escrita
+# ---------------------------------------------------------------------------
+
+class PlanoEscrita:
+    """
+    Acumula as linhas de todas as tabelas filhas de um lote de processos.
+
+    Cada linha filha guarda uma referência à linha pai; os ids dos pais são
+    reservados em bloco nas sequences e propagados aos filhos antes da escrita.
+    """
+
+    # Ordem de escrita (pais antes dos filhos) e chave estrangeira de cada tabela
+    TABELAS = [
+        (ProcessoRelacionado, "processo_id"),
+        (Fonte, "processo_id"),
+        (Capa, "fonte_id"),
+        (ValorCausa, "capa_id"),
+        (InformacaoComplementar, "capa_id"),
+        (Audiencia, "fonte_id"),
+        (Envolvido, "fonte_id"),
+        (Advogado, "envolvido_id"),
+        (OAB, "advogado_id"),
+    ]
+    # Tabelas cujos ids precisam ser conhecidos antes do INSERT (têm filhos)
+    COM_FILHOS = (Fonte, Capa, Envolvido, Advogado)
+
+    def __init__(self):
+        self.linhas = {modelo: [] for modelo, _ in self.TABELAS}
+        # id(linha filha) -> linha pai (ou id do processo, para filhos diretos)
+        self._pais = {}
+
+    def _adicionar(self, modelo, linha: dict, pai) -> dict:
+        self.linhas[modelo].append(linha)
+        self._pais[id(linha)] = pai
+        return linha
+
+    def adicionar_linha(self, modelo, linha: dict, pai) -> dict:
+        """Adiciona uma linha de tabela folha (sem filhos) sob um pai já gravado ou do plano."""
+        return self._adicionar(modelo, linha, pai)
+
+    def adicionar_processo(self, processo_id: int, data: dict):
+        """Adiciona ao plano todo o grafo de filhos do payload de um processo."""
+        for rel in data.get("processos_relacionados") or []:
+            self._adicionar(ProcessoRelacionado, linha_processo_relacionado(rel), processo_id)
+        for f in data.get("fontes") or []:
+            self.adicionar_fonte(processo_id, f)
+
+    def adicionar_fonte(self, processo_id: int, f: dict):
+        fonte = self._adicionar(Fonte, linha_fonte(f), processo_id)
+        if f.get("capa"):
+            self.adicionar_capa(fonte, f["capa"])
+        for aud in f.get("audiencias") or []:
+            self._adicionar(Audiencia, linha_audiencia(aud), fonte)
+        for env in f.get("envolvidos") or []:
+            self.adicionar_envolvido(fonte, env)
+
+    def adicionar_capa(self, fonte, capa_data: dict):
+        capa = self._adicionar(Capa, linha_capa(capa_data), fonte)
+        if capa_data.get("valor_causa"):
+            self._adicionar(ValorCausa, linha_valor_causa(capa_data["valor_causa"]), capa)
+        for info in capa_data.get("informacoes_complementares") or []:
+            self._adicionar(InformacaoComplementar, linha_informacao_complementar(info), capa)
+
+    def adicionar_envolvido(self, fonte, env_data: dict):
+        env = self._adicionar(Envolvido, linha_envolvido(env_data), fonte)
+        for adv_data in env_data.get("advogados") or []:
+            self.adicionar_advogado(env, adv_data)
+
+    def adicionar_advogado(self, env, adv_data: dict):
+        adv = self._adicionar(Advogado, linha_advogado(adv_data), env)
+        for oab_data in adv_data.get("oabs") or []:
+            self._adicionar(OAB, linha_oab(oab_data), adv)
+
+    def vazio(self) -> bool:
+        return not any(self.linhas.values())
+
+    async def aplicar(self, session):
+        """Reserva os ids necessários e grava cada tabela com INSERTs multi-linha."""
+        for modelo in self.COM_FILHOS:
+            linhas = self.linhas[modelo]
+            if linhas:
+                ids = await reservar_ids(session, modelo.__tablename__, len(linhas))
+                for linha, novo_id in zip(linhas, ids):
+                    linha["id"] = novo_id
+
+        for modelo, fk in self.TABELAS:
+            linhas = self.linhas[modelo]
+            for linha in linhas:
+                pai = self._pais[id(linha)]
+                # o pai pode ser um id (int) ou uma linha do próprio plano (dict)
+                linha[fk] = pai["id"] if isinstance(pai, dict) else pai
+            if linhas:
+                await session.execute(insert(modelo.__table__), linhas)
+
+
+async def reservar_ids(session, tabela: str, quantidade: int) -> list:
+    """Reserva `quantidade` ids da sequence da tabela em uma única instrução."""
+    result = await session.execute(
+        text(f"SELECT nextval(pg_get_serial_sequence('{tabela}', 'id')) FROM generate_series(1, :n)"),
+        {"n": quantidade},
+    )
+    return result.scalars().all()
+
+
+# ---------------------------------------------------------------------------
+# Upsert com comparação do grafo de filhos
+# ---------------------------------------------------------------------------
+
+def _normalizar(valor):
+    # timestamps sem fuso são gravados como UTC
+    if isinstance(valor, datetime) and valor.tzinfo is None:
+        return valor.replace(tzinfo=timezone.utc)
+    return valor
+
+
+def _igual(armazenado, novo) -> bool:
+    # As linhas (linha_*) já chegam com os tipos das colunas
+    return _normalizar(armazenado) == _normalizar(novo)
+
+
+def _diferencas(obj, linha: dict) -> dict:
+    """Colunas de `linha` cujo valor difere do gravado em `obj`."""
+    return {coluna: valor for coluna, valor in linha.items() if not _igual(getattr(obj, coluna), valor)}
+
+
+def _chave(*valores) -> tuple:
+    return tuple(None if v is None else str(v) for v in valores)
+
+
+def _parear(armazenados: list, novos: list, chave_obj, chave_novo):
+    """
+    Casa objetos gravados com itens do payload pela chave informada (chaves
+    repetidas são casadas em ordem). Retorna (pares, sobras gravadas, sobras novas).
+    """
+    por_chave = {}
+    for obj in armazenados:
+        por_chave.setdefault(chave_obj(obj), []).append(obj)
+    pares, sobras_novas = [], []
+    for item in novos:
+        candidatos = por_chave.get(chave_novo(item))
+        if candidatos:
+            pares.append((candidatos.pop(0), item))
+        else:
+            sobras_novas.append(item)
+    sobras_armazenadas = [obj for objs in por_chave.values() for obj in objs]
+    return pares, sobras_armazenadas, sobras_novas
+
+
+class DiffProcessos:
+    """
+    Compara processos já gravados com os payloads recebidos e acumula só as
+    escritas necessárias: UPDATE das colunas alteradas, DELETE do que sumiu e
+    INSERT (via PlanoEscrita) do que é novo.
+
+    Fontes são casadas pelos ids estáveis do Escavador (fonte_id,
+    processo_fonte_id). Envolvidos e advogados são casados pela identidade
+    (nome, polo, documento) e as tabelas folha pelo conteúdo completo.
+
+    `sincronizado_em` muda em todo processo consultado, então fica fora da
+    comparação: é gravado num único UPDATE para o lote inteiro, e um processo
+    sem mudanças não gera outra escrita.
+
+    `alterados` guarda os processos com alguma escrita no grafo: só eles têm
+    o resumo dos relatórios recalculado (e a versão do tribunal publicada).
+    `revinculados`, os que tiveram envolvidos, advogados ou OABs escritos:
+    só eles têm os vínculos com o cadastro (app.entidades) refeitos.
+    """
+
+    # Relações percorridas ao apagar uma subárvore
+    FILHOS = {
+        Fonte: ("capa", "audiencias", "envolvidos"),
+        Capa: ("valor_causa", "informacoes_complementares"),
+        Envolvido: ("advogados",),
+        Advogado: ("oabs",),
+    }
+    # Tabelas de onde saem os vínculos com o cadastro de pessoas/advogados
+    CADASTRO = (Envolvido, Advogado, OAB)
+
+    def __init__(self, sincronizado_em: datetime | None = None):
+        self.plano = PlanoEscrita()
+        self.atualizacoes = {modelo: [] for modelo in (Processo,) + tuple(m for m, _ in PlanoEscrita.TABELAS)}
+        self.remocoes = {modelo: [] for modelo, _ in PlanoEscrita.TABELAS}
+        self.sincronizado_em = sincronizado_em
+        self.sincronizados = []  # ids dos processos que recebem sincronizado_em
+        self.alterados = []  # ids dos processos com alguma linha escrita
+        self.revinculados = []  # ids dos processos com envolvidos/advogados/OABs escritos
+
+    def _pendentes(self, modelos=None) -> int:
+        """Escritas acumuladas até aqui nas tabelas informadas (padrão: todas)."""
+        modelos = modelos or self.atualizacoes
+        return sum(
+            len(self.atualizacoes.get(m, ())) + len(self.remocoes.get(m, ())) + len(self.plano.linhas.get(m, ()))
+            for m in modelos
+        )
+
+    def _atualizar(self, obj, linha: dict, ignorar=()):
+        diff = _diferencas(obj, {k: v for k, v in linha.items() if k not in ignorar})
+        if diff:
+            self.atualizacoes[type(obj)].append({"id": obj.id, **diff})
+
+    def _remover(self, obj):
+        for atributo in self.FILHOS.get(type(obj), ()):
+            filhos = getattr(obj, atributo)
+            for filho in (filhos if isinstance(filhos, list) else [filhos] if filhos else []):
+                self._remover(filho)
+        self.remocoes[type(obj)].append(obj.id)
+
+    def _folhas(self, modelo, armazenados: list, linhas: list, pai_id: int):
+        """Tabelas sem filhos: casa pelo conteúdo, apaga o que sumiu e insere o que é novo."""
+        colunas = list(linhas[0]) if linhas else []
+        pares, sobras, novas = _parear(
+            armazenados, linhas,
+            lambda obj: _chave(*(_normalizar(getattr(obj, c)) for c in colunas)) if colunas else None,
+            lambda linha: _chave(*(_normalizar(linha[c]) for c in colunas)),
+        )
+        for obj in sobras:
+            self._remover(obj)
+        for linha in novas:
+            self.plano.adicionar_linha(modelo, linha, pai_id)
+
+    def processo(self, processo: Processo, data: dict):
+        antes, antes_cadastro = self._pendentes(), self._pendentes(self.CADASTRO)
+        self._grafo(processo, data)
+        if self._pendentes() > antes:
+            self.alterados.append(processo.id)
+        if self._pendentes(self.CADASTRO) > antes_cadastro:
+            self.revinculados.append(processo.id)
+        if self.sincronizado_em:
+            self.sincronizados.append(processo.id)
+
+    def _grafo(self, processo: Processo, data: dict):
+        self._atualizar(processo, linha_processo(data), ignorar=("numero_cnj",))
+
+        self._folhas(
+            ProcessoRelacionado, processo.processos_relacionados,
+            [linha_processo_relacionado(rel) for rel in data.get("processos_relacionados") or []],
+            processo.id,
+        )
+
+        pares, sobras, novas = _parear(
+            processo.fontes, data.get("fontes") or [],
+            lambda fonte: _chave(fonte.fonte_id, fonte.processo_fonte_id),
+            lambda f: _chave(f.get("id"), f.get("processo_fonte_id")),
+        )
+        for fonte in sobras:
+            self._remover(fonte)
+        for f in novas:
+            self.plano.adicionar_fonte(processo.id, f)
+        for fonte, f in pares:
+            self._fonte(fonte, f)
+
+    def _fonte(self, fonte: Fonte, f: dict):
+        self._atualizar(fonte, linha_fonte(f))
+
+        capa_data = f.get("capa")
+        if fonte.capa and not capa_data:
+            self._remover(fonte.capa)
+        elif capa_data and not fonte.capa:
+            self.plano.adicionar_capa(fonte.id, capa_data)
+        elif capa_data:
+            self._capa(fonte.capa, capa_data)
+
+        self._folhas(
+            Audiencia, fonte.audiencias,
+            [linha_audiencia(aud) for aud in f.get("audiencias") or []],
+            fonte.id,
+        )
+
+        pares, sobras, novos = _parear(
+            fonte.envolvidos, f.get("envolvidos") or [],
+            lambda env: _chave(env.nome, env.polo, env.tipo_normalizado, env.cpf, env.cnpj),
+            lambda e: _chave(e.get("nome"), e.get("polo"), e.get("tipo_normalizado"), e.get("cpf"), e.get("cnpj")),
+        )
+        for env in sobras:
+            self._remover(env)
+        for e in novos:
+            self.plano.adicionar_envolvido(fonte.id, e)
+        for env, e in pares:
+            self._envolvido(env, e)
+
+    def _capa(self, capa: Capa, capa_data: dict):
+        self._atualizar(capa, linha_capa(capa_data))
+
+        valor_causa = capa_data.get("valor_causa")
+        if capa.valor_causa and not valor_causa:
+            self._remover(capa.valor_causa)
+        elif valor_causa and not capa.valor_causa:
+            self.plano.adicionar_linha(ValorCausa, linha_valor_causa(valor_causa), capa.id)
+        elif valor_causa:
+            self._atualizar(capa.valor_causa, linha_valor_causa(valor_causa))
+
+        self._folhas(
+            InformacaoComplementar, capa.informacoes_complementares,
+            [linha_informacao_complementar(info) for info in capa_data.get("informacoes_complementares") or []],
+            capa.id,
+        )
+
+    def _envolvido(self, env: Envolvido, e: dict):
+        self._atualizar(env, linha_envolvido(e))
+
+        pares, sobras, novos = _parear(
+            env.advogados, e.get("advogados") or [],
+            lambda adv: _chave(adv.nome, adv.cpf, adv.cnpj),
+            lambda a: _chave(a.get("nome"), a.get("cpf"), a.get("cnpj")),
+        )
+        for adv in sobras:
+            self._remover(adv)
+        for a in novos:
+            self.plano.adicionar_advogado(env.id, a)
+        for adv, a in pares:
+            self._atualizar(adv, linha_advogado(a))
+            self._folhas(OAB, adv.oabs, [linha_oab(oab) for oab in a.get("oabs") or []], adv.id)
+
+    async def aplicar(self, session) -> list:
+        """Grava as escritas acumuladas e retorna os ids dos processos alterados."""
+        # Remoções dos filhos para os pais, por causa das chaves estrangeiras
+        for modelo, _ in reversed(PlanoEscrita.TABELAS):
+            ids = self.remocoes[modelo]
+            if ids:
+                await session.execute(delete(modelo.__table__).where(modelo.__table__.c.id.in_(ids)))
+
+        if not self.plano.vazio():
+            await self.plano.aplicar(session)
+
+        for modelo, linhas in self.atualizacoes.items():
+            await _atualizar_por_id(session, modelo.__table__, linhas)
+
+        if self.sincronizados:
+            tabela = Processo.__table__
+            await session.execute(
+                update(tabela).where(tabela.c.id.in_(self.sincronizados)).values(sincronizado_em=self.sincronizado_em)
+            )
+        return self.alterados
+
+
+async def _atualizar_por_id(session, tabela, linhas: list):
+    """UPDATE em executemany, agrupando as linhas pelo conjunto de colunas alteradas."""
+    grupos = {}
+    for linha in linhas:
+        grupos.setdefault(tuple(sorted(k for k in linha if k != "id")), []).append(linha)
+    for colunas, grupo in grupos.items():
+        stmt = (
+            update(tabela)
+            .where(tabela.c.id == bindparam("p_id"))
+            .values({coluna: bindparam(f"p_{coluna}") for coluna in colunas})
+        )
+        await session.execute(stmt, [{f"p_{k}": v for k, v in linha.items()} for linha in grupo])
+
+
+def _opcoes_grafo():
+    return opcoes_grafo(informacoes_complementares=True, audiencias=True, processos_relacionados=True)
+
+
+async def salvar_processos_em_lote(
+    session, payloads: list, atualizar_existentes: bool = False, sincronizado_em: datetime | None = None
+) -> dict:
+    """
+    Grava um lote de payloads do Escavador e retorna {numero_cnj: processo_id}
+    dos processos gravados.
+
+    Por padrão CNJs que já existem no banco são ignorados. Com
+    `atualizar_existentes=True` o grafo gravado é comparado com o payload e
+    só as linhas que mudaram são escritas. `sincronizado_em` registra quando
+    o payload foi obtido da API (usado pela atualização incremental).
+    O resumo dos relatórios (app.resumo) é refeito só para os processos
+    inseridos ou alterados: um payload igual ao gravado não muda a versão do
+    tribunal nem invalida o cache de relatórios. Os vínculos com o cadastro
+    de pessoas/advogados (app.entidades) são refeitos só para os inseridos e
+    para os que tiveram envolvidos ou advogados alterados.
+
+    Não faz commit: a transação pertence a quem chama, que deve usar
+    app.versoes.confirmar para publicar a versão dos tribunais alterados.
+    """
+    por_cnj = {}
+    for data in payloads:
+        if data and data.get("numero_cnj"):
+            por_cnj.setdefault(data["numero_cnj"], data)
+    if not por_cnj:
+        return {}
+
+    gravados = {}
+    alterados, revinculados = [], []
+    if atualizar_existentes:
+        result = await session.execute(
+            select(Processo).options(*_opcoes_grafo()).where(Processo.numero_cnj.in_(list(por_cnj)))
+        )
+        diff = DiffProcessos(sincronizado_em)
+        for processo in result.scalars().all():
+            diff.processo(processo, por_cnj.pop(processo.numero_cnj))
+            gravados[processo.numero_cnj] = processo.id
+        alterados = list(await diff.aplicar(session))
+        revinculados = list(diff.revinculados)
+
+    if por_cnj:
+        inseridos = await _inserir_novos(session, por_cnj, sincronizado_em)
+        gravados.update(inseridos)
+        alterados.extend(inseridos.values())
+        revinculados.extend(inseridos.values())
+
+    # Mantém o resumo dos relatórios e os vínculos do cadastro em dia na mesma transação
+    await recalcular_resumos(session, alterados)
+    await vincular_entidades(session, revinculados)
+    return gravados
+
+
+async def _inserir_novos(session, por_cnj: dict, sincronizado_em: datetime | None) -> dict:
+    """Insere os processos que ainda não existem, com todo o grafo. Retorna {numero_cnj: processo_id}."""
+    tabela = Processo.__table__
+    linhas = [linha_processo(data) for data in por_cnj.values()]
+    if sincronizado_em:
+        for linha in linhas:
+            linha["sincronizado_em"] = sincronizado_em
+    inseridos = {}
+    # INSERT multi-linha em blocos para respeitar o limite de parâmetros do asyncpg
+    for i in range(0, len(linhas), LINHAS_POR_INSERT):
+        result = await session.execute(
+            pg_insert(tabela)
+            .values(linhas[i:i + LINHAS_POR_INSERT])
+            .on_conflict_do_nothing(index_elements=["numero_cnj"])
+            .returning(tabela.c.id, tabela.c.numero_cnj)
+        )
+        inseridos.update({numero_cnj: processo_id for processo_id, numero_cnj in result.all()})
+
+    plano = PlanoEscrita()
+    for numero_cnj, processo_id in inseridos.items():
+        plano.adicionar_processo(processo_id, por_cnj[numero_cnj])
+    if not plano.vazio():
+        await plano.aplicar(session)
+    return inseridos
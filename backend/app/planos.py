@@ -0,0 +1,177 @@
+"""
+Verificação dos planos de execução das consultas dos relatórios.
+
+Roda EXPLAIN em cada consulta e aponta qualquer Seq Scan numa das tabelas do
+grafo de processos: índice faltando, consulta que deixou de usá-lo ou
+estatística que levou o planejador a ler a tabela inteira. O plano depende
+dos dados, então a verificação vale contra um banco com volume realista
+(tests/test_planos.py monta um) ou de produção. Sai com código 1 se achar:
+
+    python -m app.planos --tribunal TJSP
+
+Num banco pequeno (desenvolvimento) o Seq Scan é a escolha certa do
+planejador; `--forcar-indices` liga `enable_seqscan = off`, e aí só aparece
+Seq Scan onde não existe índice que sirva.
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+
+from app.busca import consulta_busca
+from app.models import (
+    OAB,
+    Advogado,
+    AdvogadoCadastro,
+    Audiencia,
+    Capa,
+    DadosPrecatorio,
+    Envolvido,
+    Fonte,
+    FonteAdvogado,
+    FontePessoa,
+    InformacaoComplementar,
+    Pessoa,
+    PrecatorioResumo,
+    PrecatorioResumoAdvogado,
+    Processo,
+    ProcessoRelacionado,
+    ValorCausa,
+)
+
+# Tabelas que nunca devem ser lidas por inteiro nas consultas dos relatórios
+TABELAS_MONITORADAS = {
+    Processo.__tablename__,
+    ProcessoRelacionado.__tablename__,
+    Fonte.__tablename__,
+    Capa.__tablename__,
+    ValorCausa.__tablename__,
+    InformacaoComplementar.__tablename__,
+    Envolvido.__tablename__,
+    Advogado.__tablename__,
+    OAB.__tablename__,
+    Audiencia.__tablename__,
+    DadosPrecatorio.__tablename__,
+    PrecatorioResumo.__tablename__,
+    PrecatorioResumoAdvogado.__tablename__,
+    Pessoa.__tablename__,
+    AdvogadoCadastro.__tablename__,
+    FontePessoa.__tablename__,
+    FonteAdvogado.__tablename__,
+}
+
+# Ids de exemplo para as consultas por chave estrangeira (os valores não importam para o plano)
+IDS_EXEMPLO = list(range(1, 501))
+
+
+def consultas_relatorio(tribunal_sigla: str) -> dict:
+    """
+    Consultas emitidas pelos relatórios por tribunal: {nome: statement}.
+
+    O grafo é carregado com selectinload (app.relatorios), então cada nível
+    vira uma consulta `WHERE <fk> IN (...)`, representada aqui pelas
+    consultas *_por_*.
+    """
+    return {
+        "processos_por_tribunal": select(Processo).where(Processo.unidade_origem_tribunal_sigla == tribunal_sigla),
+        "resumo_por_tribunal": (
+            select(PrecatorioResumo)
+            .where(PrecatorioResumo.tribunal_sigla == tribunal_sigla)
+            .order_by(PrecatorioResumo.processo_id)
+        ),
+        "resumo_advogados_por_tribunal": (
+            select(PrecatorioResumoAdvogado)
+            .where(PrecatorioResumoAdvogado.tribunal_sigla == tribunal_sigla)
+            .order_by(PrecatorioResumoAdvogado.processo_id, PrecatorioResumoAdvogado.ordem)
+        ),
+        "fontes_por_processo": select(Fonte).where(Fonte.processo_id.in_(IDS_EXEMPLO)),
+        "relacionados_por_processo": select(ProcessoRelacionado).where(ProcessoRelacionado.processo_id.in_(IDS_EXEMPLO)),
+        "dados_por_processo": select(DadosPrecatorio).where(DadosPrecatorio.processo_id.in_(IDS_EXEMPLO)),
+        "capas_por_fonte": select(Capa).where(Capa.fonte_id.in_(IDS_EXEMPLO)),
+        "envolvidos_por_fonte": select(Envolvido).where(Envolvido.fonte_id.in_(IDS_EXEMPLO)),
+        "audiencias_por_fonte": select(Audiencia).where(Audiencia.fonte_id.in_(IDS_EXEMPLO)),
+        "valores_por_capa": select(ValorCausa).where(ValorCausa.capa_id.in_(IDS_EXEMPLO)),
+        "informacoes_por_capa": select(InformacaoComplementar).where(InformacaoComplementar.capa_id.in_(IDS_EXEMPLO)),
+        "advogados_por_envolvido": select(Advogado).where(Advogado.envolvido_id.in_(IDS_EXEMPLO)),
+        "oabs_por_advogado": select(OAB).where(OAB.advogado_id.in_(IDS_EXEMPLO)),
+        "vinculos_advogados_por_processo": select(FonteAdvogado).where(FonteAdvogado.processo_id.in_(IDS_EXEMPLO)),
+        "advogados_do_cadastro_por_id": select(AdvogadoCadastro).where(AdvogadoCadastro.id.in_(IDS_EXEMPLO)),
+        "pessoas_por_id": select(Pessoa).where(Pessoa.id.in_(IDS_EXEMPLO)),
+        "busca_por_nome": consulta_busca("banco do brasil", tribunal_sigla=tribunal_sigla),
+    }
+
+
+def _sql(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def varreduras_sequenciais(plano: dict) -> list:
+    """Nomes das tabelas monitoradas lidas com Seq Scan em qualquer nó do plano."""
+    encontradas = []
+    pendentes = [plano]
+    while pendentes:
+        no = pendentes.pop()
+        if no.get("Node Type") == "Seq Scan" and no.get("Relation Name") in TABELAS_MONITORADAS:
+            encontradas.append(no["Relation Name"])
+        pendentes.extend(no.get("Plans", []))
+    return encontradas
+
+
+def indices_usados(plano: dict) -> set:
+    """Nomes dos índices lidos em qualquer nó do plano."""
+    encontrados = set()
+    pendentes = [plano]
+    while pendentes:
+        no = pendentes.pop()
+        if "Index Name" in no:
+            encontrados.add(no["Index Name"])
+        pendentes.extend(no.get("Plans", []))
+    return encontrados
+
+
+async def plano(conn, stmt) -> dict:
+    """Nó raiz do EXPLAIN (FORMAT JSON) do statement."""
+    explain = await conn.execute(text(f"EXPLAIN (FORMAT JSON) {_sql(stmt)}"))
+    resultado = explain.scalar()
+    if isinstance(resultado, str):
+        resultado = json.loads(resultado)
+    return resultado[0]["Plan"]
+
+
+async def verificar_planos(engine, tribunal_sigla: str, forcar_indices: bool = False) -> dict:
+    """Retorna {nome_da_consulta: [tabelas com Seq Scan]} (lista vazia = plano ok)."""
+    resultado = {}
+    async with engine.connect() as conn:
+        if forcar_indices:
+            await conn.execute(text("SET LOCAL enable_seqscan = off"))
+        for nome, stmt in consultas_relatorio(tribunal_sigla).items():
+            resultado[nome] = varreduras_sequenciais(await plano(conn, stmt))
+        await conn.rollback()
+    return resultado
+
+
+if __name__ == "__main__":
+    from app.database import engine_relatorios as engine
+
+    parser = argparse.ArgumentParser(description="Falha se alguma consulta de relatório cair em Seq Scan.")
+    parser.add_argument("--tribunal", default="TJSP")
+    parser.add_argument("--forcar-indices", action="store_true", help="enable_seqscan = off (bancos pequenos)")
+    args = parser.parse_args()
+
+    async def _main():
+        try:
+            return await verificar_planos(engine, args.tribunal, args.forcar_indices)
+        finally:
+            await engine.dispose()
+
+    falhas = 0
+    for nome, tabelas in asyncio.run(_main()).items():
+        if tabelas:
+            falhas += 1
+            print(f"FALHOU  {nome}: Seq Scan em {', '.join(sorted(set(tabelas)))}")
+        else:
+            print(f"ok      {nome}")
+    sys.exit(1 if falhas else 0)
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Limites de requisições por segundo à API do Escavador
+RATE_INICIAL = float(os.getenv("ESCAVADOR_RATE_INICIAL", "10"))
+RATE_MINIMO = float(os.getenv("ESCAVADOR_RATE_MINIMO", "0.5"))
+RATE_MAXIMO = float(os.getenv("ESCAVADOR_RATE_MAXIMO", "20"))
+RATE_RAJADA = float(os.getenv("ESCAVADOR_RATE_RAJADA", "10"))  # capacidade do balde
+RATE_INCREMENTO = float(os.getenv("ESCAVADOR_RATE_INCREMENTO", "0.05"))  # req/s somados por sucesso
+RATE_FATOR_REDUCAO = float(os.getenv("ESCAVADOR_RATE_FATOR_REDUCAO", "0.5"))  # multiplicador a cada 429
+
+
+class LimitadorAdaptativo:
+    """
+    Token bucket com taxa adaptativa (aumento aditivo, redução multiplicativa).
+
+    Cada sucesso aumenta a taxa em `incremento` até `taxa_maxima`; um 429
+    multiplica a taxa por `fator_reducao`, esvazia o balde e, se a API mandar
+    `Retry-After`, suspende todas as requisições até o prazo indicado.
+
+    Uma rajada de 429 de requisições concorrentes é uma resposta só ao excesso
+    de antes da redução: `adquirir` numera as requisições, e o 429 de uma
+    requisição emitida antes da última redução não reduz a taxa de novo (a
+    pausa do Retry-After vale do mesmo jeito).
+    """
+
+    def __init__(
+        self,
+        taxa_inicial: float = RATE_INICIAL,
+        taxa_minima: float = RATE_MINIMO,
+        taxa_maxima: float = RATE_MAXIMO,
+        capacidade: float = RATE_RAJADA,
+        incremento: float = RATE_INCREMENTO,
+        fator_reducao: float = RATE_FATOR_REDUCAO,
+    ):
+        self.taxa = taxa_inicial
+        self.taxa_minima = taxa_minima
+        self.taxa_maxima = taxa_maxima
+        self.capacidade = capacidade
+        self.incremento = incremento
+        self.fator_reducao = fator_reducao
+        self._tokens = capacidade
+        self._ultima_reposicao = None
+        self._pausado_ate = 0.0
+        self._lock = None
+        self._emitidas = 0  # número da última requisição liberada por `adquirir`
+        self._reduzida_apos = 0  # número da última requisição emitida antes da última redução
+        self.total_limitado = 0  # quantos 429 recebidos
+
+    def _relogio(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    def _repor(self, agora: float):
+        if self._ultima_reposicao is not None:
+            decorrido = agora - self._ultima_reposicao
+            self._tokens = min(self.capacidade, self._tokens + decorrido * self.taxa)
+        self._ultima_reposicao = agora
+
+    async def adquirir(self) -> int:
+        """
+        Aguarda até haver um token disponível (e nenhuma pausa em vigor).
+        Retorna o número da requisição, para `registrar_limite`.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # O lock garante ordem de chegada entre os workers que aguardam
+        async with self._lock:
+            while True:
+                agora = self._relogio()
+                if agora < self._pausado_ate:
+                    await asyncio.sleep(self._pausado_ate - agora)
+                    continue
+                self._repor(agora)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self._emitidas += 1
+                    return self._emitidas
+                await asyncio.sleep((1 - self._tokens) / self.taxa)
+
+    def registrar_sucesso(self):
+        self.taxa = min(self.taxa_maxima, self.taxa + self.incremento)
+
+    def registrar_limite(self, retry_after: float | None = None, requisicao: int | None = None):
+        """
+        Reage a um 429 da requisição de número `requisicao` (o retorno de
+        `adquirir`): reduz a taxa, salvo se a requisição saiu antes da última
+        redução, e respeita o Retry-After, se houver.
+        """
+        self.total_limitado += 1
+        if requisicao is None or requisicao > self._reduzida_apos:
+            self.taxa = max(self.taxa_minima, self.taxa * self.fator_reducao)
+            self._tokens = 0
+            self._reduzida_apos = self._emitidas
+            logger.warning(f"429 recebido: taxa reduzida para {self.taxa:.2f} req/s (Retry-After={retry_after})")
+        if retry_after:
+            self._pausado_ate = max(self._pausado_ate, self._relogio() + retry_after)
+
+    def metricas(self) -> dict:
+        return {
+            "taxa_atual": round(self.taxa, 3),
+            "taxa_maxima": self.taxa_maxima,
+            "total_429": self.total_limitado,
+        }
+
+
+limitador_escavador = LimitadorAdaptativo()
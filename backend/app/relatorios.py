@@ -0,0 +1,161 @@
+"""
+Carregamento do grafo processo -> fontes -> envolvidos -> advogados -> oabs.
+
+Cada coleção é carregada com selectinload: uma consulta por nível, com
+`WHERE <fk> IN (...)` sobre os ids do nível anterior (em blocos de 500). O
+número de consultas depende só dos níveis pedidos e as linhas trafegadas
+crescem linearmente com o tamanho do grafo, ao contrário do joinedload
+encadeado, cujo resultado é o produto cartesiano de todas as coleções.
+
+Os relatórios leem o resultado com cursor do servidor (`particoes`), em
+partições de tamanho fixo: o pico de memória depende do tamanho da partição,
+não do tribunal.
+"""
+import os
+import pickle
+import tempfile
+
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy.orm import selectinload
+
+from app.models import Advogado, Capa, Envolvido, Fonte, Processo
+
+load_dotenv()
+
+# Pais por consulta do selectinload (tamanho de bloco fixo do SQLAlchemy)
+BLOCO_SELECTIN = 500
+
+# Objetos (processos ou linhas de resumo) por partição lida do cursor
+TAMANHO_PARTICAO = int(os.getenv("RELATORIOS_TAMANHO_PARTICAO", "500"))
+
+
+def opcoes_grafo(
+    *,
+    valor_causa: bool = True,
+    informacoes_complementares: bool = False,
+    envolvidos: bool = True,
+    audiencias: bool = False,
+    processos_relacionados: bool = False,
+    dados_precatorios: bool = False,
+) -> tuple:
+    """Opções de carregamento para `select(Processo)` com os níveis pedidos."""
+    fontes = selectinload(Processo.fontes)
+    opcoes = []
+    if valor_causa:
+        opcoes.append(fontes.selectinload(Fonte.capa).selectinload(Capa.valor_causa))
+    if informacoes_complementares:
+        opcoes.append(fontes.selectinload(Fonte.capa).selectinload(Capa.informacoes_complementares))
+    if envolvidos:
+        opcoes.append(
+            fontes.selectinload(Fonte.envolvidos).selectinload(Envolvido.advogados).selectinload(Advogado.oabs)
+        )
+    if audiencias:
+        opcoes.append(fontes.selectinload(Fonte.audiencias))
+    if processos_relacionados:
+        opcoes.append(selectinload(Processo.processos_relacionados))
+    if dados_precatorios:
+        opcoes.append(selectinload(Processo.dados_precatorios))
+    if not opcoes:
+        opcoes.append(fontes)
+    return tuple(opcoes)
+
+
+def _blocos(pais: int) -> int:
+    return -(-pais // BLOCO_SELECTIN)
+
+
+def consultas_esperadas(processos: list, **niveis) -> int:
+    """
+    Consultas que `opcoes_grafo(**niveis)` emite para carregar `processos`
+    (já carregados): a de processos mais, em cada nível, uma por bloco de
+    BLOCO_SELECTIN pais. Cresce com o grafo, nunca com o produto dele.
+    """
+    niveis = {
+        "valor_causa": True,
+        "informacoes_complementares": False,
+        "envolvidos": True,
+        "audiencias": False,
+        "processos_relacionados": False,
+        "dados_precatorios": False,
+        **niveis,
+    }
+    fontes = [f for p in processos for f in p.fontes]
+    total = 1 + _blocos(len(processos))  # processos + fontes
+    if niveis["valor_causa"] or niveis["informacoes_complementares"]:
+        capas = [f.capa for f in fontes if f.capa]
+        total += _blocos(len(fontes))  # capas
+        total += (niveis["valor_causa"] + niveis["informacoes_complementares"]) * _blocos(len(capas))
+    if niveis["envolvidos"]:
+        envolvidos = [e for f in fontes for e in f.envolvidos]
+        advogados = [a for e in envolvidos for a in e.advogados]
+        total += _blocos(len(fontes)) + _blocos(len(envolvidos)) + _blocos(len(advogados))
+    total += niveis["audiencias"] * _blocos(len(fontes))
+    total += (niveis["processos_relacionados"] + niveis["dados_precatorios"]) * _blocos(len(processos))
+    return total
+
+
+async def particoes(session, stmt, tamanho: int = TAMANHO_PARTICAO):
+    """
+    Executa `stmt` com cursor do servidor e entrega listas de até `tamanho` objetos.
+
+    Os níveis com selectinload são carregados partição a partição. Depois que
+    o chamador processa cada partição os objetos saem da sessão, então a
+    memória não acumula ao longo do tribunal.
+    """
+    result = await session.stream(stmt.execution_options(yield_per=tamanho))
+    async for particao in result.scalars().partitions():
+        yield particao
+        # Objeto a objeto: expunge_all troca o identity map, e o cursor ainda aberto
+        # não conseguiria mais carregar a partição seguinte
+        for objeto in list(session.identity_map.values()):
+            if objeto in session:
+                session.expunge(objeto)
+
+
+class CsvIncremental:
+    """Acrescenta DataFrames a um CSV em disco; o cabeçalho é escrito uma vez, na criação."""
+
+    def __init__(self, caminho: str, colunas: list, **opcoes_csv):
+        self.caminho = caminho
+        self.colunas = colunas
+        self.linhas = 0
+        pd.DataFrame(columns=colunas).to_csv(caminho, index=False, **opcoes_csv)
+        # O BOM do utf-8-sig só pode sair no começo do arquivo
+        if opcoes_csv.get("encoding") == "utf-8-sig":
+            opcoes_csv = {**opcoes_csv, "encoding": "utf-8"}
+        self.opcoes_csv = opcoes_csv
+
+    def escrever(self, df: pd.DataFrame):
+        if df.empty:
+            return
+        df.reindex(columns=self.colunas).to_csv(self.caminho, mode="a", header=False, index=False, **self.opcoes_csv)
+        self.linhas += len(df)
+
+
+class DataFramesEmDisco:
+    """
+    Guarda DataFrames num arquivo temporário (pickle, tipos preservados) para
+    relê-los depois na mesma ordem, sem mantê-los em memória.
+    """
+
+    def __init__(self):
+        self._arquivo = tempfile.TemporaryFile()
+        self.linhas = 0
+
+    def guardar(self, df: pd.DataFrame):
+        if df.empty:
+            return
+        pickle.dump(df, self._arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+        self.linhas += len(df)
+
+    def ler(self):
+        self._arquivo.seek(0)
+        while True:
+            try:
+                yield pickle.load(self._arquivo)
+            except EOFError:
+                return
+
+    def fechar(self):
+        self._arquivo.close()
@@ -0,0 +1,390 @@
+"""
+Jobs de geração de relatórios num pool de processos.
+
+Montar um relatório (linhas do grafo, pandas, xlsxwriter) é CPU pura: no
+event loop da API, um relatório grande travava todas as outras rotas,
+ingestão incluída. Aqui cada relatório roda num processo filho do pool, com
+event loop e engines próprios (app.exportacoes); o processo da API só
+registra o job, espera o resultado sem bloquear e move o arquivo pronto para
+o cache (app.cache_relatorios).
+
+O pool tem RELATORIOS_WORKERS processos; jobs além disso esperam na fila
+como 'pendente'. Estado e progresso ficam na tabela relatorios_jobs, que o
+processo filho atualiza a cada partição lida.
+
+Pedidos repetidos reaproveitam o trabalho: o mesmo relatório/tribunal/versão
+já na fila ou rodando devolve o job existente, e um relatório já em cache
+vira um job concluído na hora.
+
+Cada job tem um dono, o processo da API que o acompanha, que renova
+`heartbeat_em` enquanto o job está na fila ou rodando. Com várias
+réplicas/workers da API, um processo que sobe (e depois, periodicamente,
+`vigiar_relatorios`) só assume os jobs cujo dono parou de dar sinal de vida:
+os de outro processo vivo continuam com ele. A tomada trava as linhas com
+FOR UPDATE SKIP LOCKED, então dois processos nunca assumem o mesmo job.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import socket
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from functools import partial
+
+from dotenv import load_dotenv
+from sqlalchemy import func, or_, select, update
+
+from app.cache_relatorios import cache_relatorios
+from app.exportacoes import RELATORIOS, RelatorioVazio, contar_processos, gerar_relatorio
+from app.models import RelatorioJob
+from app.versoes import versao_tribunal
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Relatórios gerados ao mesmo tempo (processos filhos do pool)
+RELATORIOS_WORKERS = int(os.getenv("RELATORIOS_WORKERS", "2"))
+# Segundos entre consultas ao esperar um job acompanhado por outro processo da API
+INTERVALO_ESPERA = 1.0
+# Segundos entre renovações do heartbeat dos jobs acompanhados por este processo
+INTERVALO_HEARTBEAT = float(os.getenv("RELATORIOS_INTERVALO_HEARTBEAT", "30"))
+# Sem heartbeat há mais que isso, o job é dado como abandonado e outro processo o assume
+PRAZO_HEARTBEAT = float(os.getenv("RELATORIOS_PRAZO_HEARTBEAT", "120"))
+
+# Identifica este processo da API como dono dos jobs que acompanha
+DONO = f"{socket.gethostname()}:{os.getpid()}"
+
+# Estados de um job de relatório
+JOB_PENDENTE = "pendente"
+JOB_EXECUTANDO = "executando"
+JOB_CONCLUIDO = "concluido"
+JOB_SEM_DADOS = "sem_dados"
+JOB_FALHOU = "falhou"
+ESTADOS_ATIVOS = (JOB_PENDENTE, JOB_EXECUTANDO)
+
+_pool: ProcessPoolExecutor | None = None
+# Mantém referência às tarefas que acompanham os jobs (evita coleta pelo GC)
+_tarefas_ativas: dict[int, asyncio.Task] = {}
+_travas: dict[tuple, asyncio.Lock] = {}
+
+
+class FalhaRelatorio(Exception):
+    """Erro no processo filho, trazido como texto (nem toda exceção do driver volta pelo pickle)."""
+
+
+def _agora() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def _atualizar(job_id: int, **valores):
+    from app.database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(RelatorioJob).where(RelatorioJob.id == job_id).values(**valores))
+        await session.commit()
+
+
+def _remover(caminho: str | None):
+    if caminho and os.path.exists(caminho):
+        os.remove(caminho)
+
+
+# --- Processo filho ---
+
+def _iniciar_processo():
+    logging.basicConfig(level=logging.INFO)
+
+
+async def _gerar_no_processo(job_id: int, relatorio: str, tribunal_sigla: str, destino: str, data_geracao: datetime):
+    from app.database import AsyncSessionRelatorios, fechar_engines
+
+    try:
+        async with AsyncSessionRelatorios() as session:
+            total = await contar_processos(session, relatorio, tribunal_sigla)
+        await _atualizar(job_id, status=JOB_EXECUTANDO, total=total, processados=0, iniciado_em=_agora())
+        await gerar_relatorio(
+            relatorio, tribunal_sigla, destino, data_geracao,
+            progresso=lambda processados: _atualizar(job_id, processados=processados),
+        )
+    finally:
+        # As conexões do pool pertencem ao event loop deste job, que termina aqui
+        await fechar_engines()
+
+
+def _executar_no_processo(job_id: int, relatorio: str, tribunal_sigla: str, destino: str, data_geracao: datetime):
+    """Ponto de entrada no processo filho: gera o relatório em `destino`."""
+    try:
+        asyncio.run(_gerar_no_processo(job_id, relatorio, tribunal_sigla, destino, data_geracao))
+    except RelatorioVazio:
+        raise
+    except Exception as e:
+        logger.exception(f"Job de relatório {job_id} ({relatorio}/{tribunal_sigla}) falhou")
+        raise FalhaRelatorio(f"{type(e).__name__}: {e}") from None
+
+
+# --- Processo da API ---
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: o filho não herda o event loop nem as conexões abertas da API
+        _pool = ProcessPoolExecutor(
+            max_workers=RELATORIOS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_iniciar_processo,
+        )
+    return _pool
+
+
+def encerrar_pool():
+    """Descarta a fila e encerra o pool (jobs interrompidos são retomados no próximo início)."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def _manter_heartbeat(job_id: int):
+    """Renova o heartbeat do job enquanto este processo o acompanha."""
+    from app.database import AsyncSessionLocal
+
+    while True:
+        await asyncio.sleep(INTERVALO_HEARTBEAT)
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    update(RelatorioJob)
+                    .where(RelatorioJob.id == job_id, RelatorioJob.dono == DONO)
+                    .values(heartbeat_em=func.now())
+                )
+                await session.commit()
+            if result.rowcount == 0:
+                logger.warning(f"Job de relatório {job_id} foi assumido por outro processo")
+        except Exception:
+            # Um heartbeat perdido não derruba o job; só os seguidos o dão como abandonado
+            logger.exception(f"Falha ao renovar o heartbeat do job de relatório {job_id}")
+
+
+async def _acompanhar(job_id: int):
+    """Manda o job para o pool, espera sem bloquear o loop e guarda o arquivo no cache."""
+    global _pool
+    from app.database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as session:
+        job = await session.get(RelatorioJob, job_id)
+
+    loop = asyncio.get_running_loop()
+    executar = partial(
+        _executar_no_processo,
+        job.id, job.relatorio, job.tribunal_sigla, job.arquivo_temporario, job.criado_em.astimezone(),
+    )
+    heartbeat = asyncio.create_task(_manter_heartbeat(job_id))
+    try:
+        await loop.run_in_executor(_executor(), executar)
+        media_type = RELATORIOS[job.relatorio].media_type
+        cache_relatorios.guardar(job.relatorio, job.tribunal_sigla, job.versao, job.arquivo_temporario, job.nome_arquivo, media_type)
+    except RelatorioVazio as e:
+        _remover(job.arquivo_temporario)
+        await _atualizar(job_id, status=JOB_SEM_DADOS, erro=str(e), arquivo_temporario=None, concluido_em=_agora())
+        return
+    except BrokenProcessPool as e:
+        # Um filho morreu (ex.: falta de memória) e levou o pool junto: o próximo job cria outro
+        _pool = None
+        _remover(job.arquivo_temporario)
+        await _atualizar(job_id, status=JOB_FALHOU, erro=repr(e), arquivo_temporario=None, concluido_em=_agora())
+        logger.error(f"Job de relatório {job_id}: pool de processos quebrado ({e!r})")
+        return
+    except FalhaRelatorio as e:
+        _remover(job.arquivo_temporario)
+        await _atualizar(job_id, status=JOB_FALHOU, erro=str(e), arquivo_temporario=None, concluido_em=_agora())
+        return
+    except Exception as e:
+        # Qualquer outra falha (pickle, exceção inesperada do filho, disco cheio ao guardar no cache):
+        # sem isso o job ficaria 'executando' para sempre e aguardar_job não voltaria
+        logger.exception(f"Job de relatório {job_id} falhou")
+        _remover(job.arquivo_temporario)
+        await _atualizar(
+            job_id, status=JOB_FALHOU, erro=f"{type(e).__name__}: {e}", arquivo_temporario=None, concluido_em=_agora()
+        )
+        return
+    finally:
+        heartbeat.cancel()
+
+    await _atualizar(job_id, status=JOB_CONCLUIDO, arquivo_temporario=None, concluido_em=_agora())
+    logger.info(f"Job de relatório {job_id} concluído ({job.relatorio}/{job.tribunal_sigla} v{job.versao})")
+
+
+def iniciar_relatorio(job_id: int) -> asyncio.Task:
+    """Agenda o acompanhamento do job no event loop atual (no máximo uma tarefa por job)."""
+    tarefa = _tarefas_ativas.get(job_id)
+    if tarefa and not tarefa.done():
+        return tarefa
+
+    tarefa = asyncio.create_task(_acompanhar(job_id))
+    _tarefas_ativas[job_id] = tarefa
+
+    def _finalizar(t: asyncio.Task):
+        _tarefas_ativas.pop(job_id, None)
+        if not t.cancelled() and t.exception():
+            logger.error(f"Job de relatório {job_id} interrompido: {t.exception()!r}")
+
+    tarefa.add_done_callback(_finalizar)
+    return tarefa
+
+
+async def solicitar_relatorio(relatorio: str, tribunal_sigla: str) -> int:
+    """
+    Retorna o id do job que entrega o relatório na versão atual dos dados do
+    tribunal: um job já na fila/rodando/concluído para a mesma versão, ou um
+    novo (já concluído, se o arquivo estiver no cache).
+    """
+    from app.database import AsyncSessionLocal
+
+    definicao = RELATORIOS[relatorio]
+    async with _travas.setdefault((relatorio, tribunal_sigla), asyncio.Lock()):
+        async with AsyncSessionLocal() as session:
+            versao = await versao_tribunal(session, tribunal_sigla)
+            existente = (await session.execute(
+                select(RelatorioJob)
+                .where(
+                    RelatorioJob.relatorio == relatorio,
+                    RelatorioJob.tribunal_sigla == tribunal_sigla,
+                    RelatorioJob.versao == versao,
+                    RelatorioJob.status.in_([*ESTADOS_ATIVOS, JOB_CONCLUIDO]),
+                )
+                .order_by(RelatorioJob.id.desc())
+                .limit(1)
+            )).scalar()
+            if existente and existente.status in ESTADOS_ATIVOS:
+                return existente.id
+
+            entrada = cache_relatorios.obter(relatorio, tribunal_sigla, versao)
+            if entrada and existente:
+                return existente.id
+
+            agora = _agora()
+            job = RelatorioJob(
+                relatorio=relatorio,
+                tribunal_sigla=tribunal_sigla,
+                versao=versao,
+                nome_arquivo=definicao.arquivo(tribunal_sigla, agora.astimezone()),
+                criado_em=agora,
+            )
+            if entrada:
+                job.status = JOB_CONCLUIDO
+                job.nome_arquivo = entrada.nome_arquivo
+                job.concluido_em = agora
+            else:
+                job.status = JOB_PENDENTE
+                job.arquivo_temporario = cache_relatorios.arquivo_temporario(definicao.extensao)
+                job.dono = DONO
+                job.heartbeat_em = func.now()
+            session.add(job)
+            await session.commit()
+
+    if job.status == JOB_PENDENTE:
+        iniciar_relatorio(job.id)
+    return job.id
+
+
+async def retomar_relatorios(job_ids: list | None = None) -> list:
+    """
+    Assume e devolve ao pool os jobs que não terminaram e cujo dono parou de
+    renovar o heartbeat (ex.: o servidor reiniciou no meio); com `job_ids`,
+    só entre esses. Retorna os ids assumidos.
+    """
+    from app.database import AsyncSessionLocal
+
+    expirado = or_(
+        RelatorioJob.heartbeat_em.is_(None),
+        RelatorioJob.heartbeat_em < func.now() - func.make_interval(0, 0, 0, 0, 0, 0, PRAZO_HEARTBEAT),
+    )
+    stmt = (
+        select(RelatorioJob)
+        .where(RelatorioJob.status.in_(ESTADOS_ATIVOS), expirado)
+        .order_by(RelatorioJob.id)
+        .with_for_update(skip_locked=True)
+    )
+    if job_ids is not None:
+        stmt = stmt.where(RelatorioJob.id.in_(job_ids))
+
+    async with AsyncSessionLocal() as session:
+        jobs = (await session.execute(stmt)).scalars().all()
+        parciais = [job.arquivo_temporario for job in jobs]
+        for job in jobs:
+            logger.info(f"Retomando job de relatório {job.id} (dono anterior: {job.dono})")
+            job.status = JOB_PENDENTE
+            job.processados = 0
+            job.arquivo_temporario = cache_relatorios.arquivo_temporario(RELATORIOS[job.relatorio].extensao)
+            job.dono = DONO
+            job.heartbeat_em = func.now()
+        await session.commit()
+
+    for job, parcial in zip(jobs, parciais):
+        # O arquivo parcial da execução anterior não serve: recomeça do zero
+        _remover(parcial)
+        iniciar_relatorio(job.id)
+    return [job.id for job in jobs]
+
+
+async def vigiar_relatorios():
+    """Retoma os jobs abandonados no startup e, depois, a cada PRAZO_HEARTBEAT segundos."""
+    while True:
+        try:
+            await retomar_relatorios()
+        except Exception:
+            logger.exception("Falha ao retomar os jobs de relatório abandonados")
+        await asyncio.sleep(PRAZO_HEARTBEAT)
+
+
+async def carregar_job(job_id: int) -> RelatorioJob | None:
+    from app.database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as session:
+        return await session.get(RelatorioJob, job_id)
+
+
+async def aguardar_job(job_id: int) -> RelatorioJob:
+    """
+    Espera o job sair da fila/execução. Cancelar a espera não cancela o job.
+
+    Se o job é acompanhado por este processo e a tarefa terminou sem tirá-lo
+    de 'pendente'/'executando' (ex.: o banco caiu ao registrar a falha), ele
+    é devolvido como está, em vez de esperar para sempre.
+    """
+    while True:
+        tarefa = _tarefas_ativas.get(job_id)
+        if tarefa:
+            await asyncio.wait({tarefa})
+        job = await carregar_job(job_id)
+        if job.status not in ESTADOS_ATIVOS or tarefa:
+            return job
+        # Acompanhado por outro processo da API: consulta o estado de tempos em tempos
+        await asyncio.sleep(INTERVALO_ESPERA)
+
+
+def descrever_job(job: RelatorioJob) -> dict:
+    percentual = None
+    if job.status == JOB_CONCLUIDO:
+        percentual = 100.0
+    elif job.total:
+        percentual = round(100 * job.processados / job.total, 1)
+    return {
+        "job_id": job.id,
+        "relatorio": job.relatorio,
+        "tribunal_sigla": job.tribunal_sigla,
+        "versao": job.versao,
+        "status": job.status,
+        "processados": job.processados,
+        "total": job.total,
+        "percentual": percentual,
+        "erro": job.erro,
+        "arquivo": job.nome_arquivo,
+        "criado_em": job.criado_em,
+        "iniciado_em": job.iniciado_em,
+        "concluido_em": job.concluido_em,
+        "download": f"/relatorios/jobs/{job.id}/download" if job.status == JOB_CONCLUIDO else None,
+    }
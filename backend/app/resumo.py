@@ -0,0 +1,278 @@
+"""
+Resumo desnormalizado dos precatórios usado pelos relatórios.
+
+Réu, credor, tipo do precatório, UF do processo originário e valor da causa
+são calculados uma vez, quando o processo é gravado, e ficam em
+`precatorios_resumo` (uma linha por processo) e `precatorios_resumo_advogados`
+(uma linha por advogado/OAB do polo ativo). Os relatórios leem só essas
+tabelas, filtradas por tribunal, sem percorrer o grafo de fontes e envolvidos.
+"""
+import argparse
+import asyncio
+import logging
+import re
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, insert, select, text
+
+from app.models import Envolvido, PrecatorioResumo, PrecatorioResumoAdvogado, Processo
+from app.relatorios import opcoes_grafo
+from app.versoes import confirmar, registrar_alteracoes
+
+logger = logging.getLogger(__name__)
+
+# Processos recalculados por consulta
+LOTE_RESUMO = 500
+
+# Lista de palavras-chave para identificar Entes Públicos
+ENTE_PUBLICO_KEYWORDS = ["estado", "municipio", "autarquia", "união", "federal", "fundação pública", "empresa pública"]
+
+
+def is_ente_publico(envolvido: Envolvido) -> bool:
+    """Verifica se um envolvido é provável de ser um Ente Público."""
+    # Heurística: CNPJ geralmente indica Pessoa Jurídica, mas entes públicos também usam CNPJ.
+    # Vamos focar na análise do nome e do tipo normalizado, se disponível.
+    return nome_de_ente_publico(envolvido.nome)
+
+
+def nome_de_ente_publico(nome: str | None) -> bool:
+    """O nome tem alguma das palavras-chave de Ente Público (vale também para o cadastro de pessoas)."""
+    if nome:
+        nome_lower = nome.lower()
+        for keyword in ENTE_PUBLICO_KEYWORDS:
+            if keyword in nome_lower:
+                return True
+    return False
+
+
+def extract_uf_processo_originario(fontes) -> str | None:
+    """Busca nas informações complementares das fontes o valor da UF do processo originário."""
+    for fonte in fontes:
+        if fonte.capa and hasattr(fonte.capa, "informacoes_complementares"):
+            for info in fonte.capa.informacoes_complementares:
+                if info.tipo == "Processos originários" and info.valor:
+                    match = re.search(r'/([A-Z]{2})$', info.valor.strip())
+                    if match:
+                        return match.group(1)
+    return None
+
+
+def tipo_precatorio(tribunal_sigla: str | None, reu_nome: str | None) -> str | None:
+    """Federal (TRF), Estadual ou Municipal a partir do tribunal e do nome do réu."""
+    if tribunal_sigla and tribunal_sigla.startswith("TRF"):
+        return "Federal"
+    nome = (reu_nome or "").lower()
+    if "estado" in nome:
+        return "Estadual"
+    if "município" in nome or "municipio de" in nome or "municipal" in nome:
+        return "Municipal"
+    return None
+
+
+def tipo_precatorio_planilha(tribunal_sigla: str | None, reu_nome: str | None) -> str | None:
+    """Variante da planilha de precatórios, que só reconhece "município" para o tipo Municipal."""
+    if tribunal_sigla and tribunal_sigla.startswith("TRF"):
+        return "Federal"
+    nome = (reu_nome or "").lower()
+    if "estado" in nome:
+        return "Estadual"
+    if "município" in nome:
+        return "Municipal"
+    return None
+
+
+def resumir_processo(p: Processo, agora: datetime) -> tuple[dict, list]:
+    """Calcula a linha de precatorios_resumo e as linhas de advogados de um processo carregado."""
+    envolvidos = [e for f in p.fontes for e in f.envolvidos]
+    reu = next((e for e in envolvidos if e.polo == "PASSIVO"), None)
+    ativo = next((e for e in envolvidos if e.polo == "ATIVO" and not e.tipo_normalizado == "Advogado"), None)
+    credor = next(
+        (e for e in envolvidos if e.polo == "ATIVO" and not e.tipo_normalizado == "Advogado" and not is_ente_publico(e)),
+        None,
+    )
+
+    valor_causa = None
+    for fonte in p.fontes:
+        if fonte.capa and fonte.capa.valor_causa:
+            valor_causa = fonte.capa.valor_causa.valor
+            break
+
+    dados = p.dados_precatorios
+    resumo = {
+        "processo_id": p.id,
+        "numero_cnj": p.numero_cnj,
+        "tribunal_sigla": p.unidade_origem_tribunal_sigla,
+        "estado_origem": p.estado_origem,
+        "unidade_origem_cidade": p.unidade_origem_cidade,
+        "reu_nome": reu.nome if reu else None,
+        "reu_cnpj": reu.cnpj if reu else None,
+        "reu_cnpj_digitos": reu.cnpj_digitos if reu else None,
+        "credor_nome": credor.nome if credor else None,
+        "credor_cpf": credor.cpf if credor else None,
+        "credor_cnpj": credor.cnpj if credor else None,
+        "credor_documento": (credor.cnpj_digitos if credor.cnpj else credor.cpf_digitos) if credor else None,
+        "ativo_nome": ativo.nome if ativo else None,
+        "ativo_cpf": ativo.cpf if ativo else None,
+        "ativo_cnpj": ativo.cnpj if ativo else None,
+        "uf_origem": extract_uf_processo_originario(p.fontes),
+        "tipo_precatorio": tipo_precatorio(p.unidade_origem_tribunal_sigla, reu.nome if reu else None),
+        "valor_causa": valor_causa,
+        "tipo_regime": dados.tipo_regime if dados else None,
+        "ano_orcamentario": dados.ano_orcamentario if dados else None,
+        "natureza_precatorio": dados.natureza_precatorio if dados else None,
+        "valor_deferido": dados.valor_deferido if dados else None,
+        "data_base_calculo": dados.data_base_calculo if dados else None,
+        "data_expedicao": dados.data_expedicao if dados else None,
+        "atualizado_em": agora,
+    }
+
+    advogados = []
+    for envolvido in envolvidos:
+        if envolvido.polo != "ATIVO":
+            continue
+        ente_publico = is_ente_publico(envolvido)
+        for advogado in envolvido.advogados:
+            for oab_ordem, oab in enumerate(advogado.oabs or [None]):
+                advogados.append({
+                    "processo_id": p.id,
+                    "tribunal_sigla": p.unidade_origem_tribunal_sigla,
+                    "ordem": len(advogados),
+                    "envolvido_nome": envolvido.nome,
+                    "envolvido_cpf": envolvido.cpf,
+                    "envolvido_cnpj": envolvido.cnpj,
+                    "envolvido_ente_publico": ente_publico,
+                    "advogado_nome": advogado.nome,
+                    "advogado_cpf": advogado.cpf,
+                    "advogado_cpf_digitos": advogado.cpf_digitos,
+                    "oab_numero": oab.numero if oab else None,
+                    "oab_uf": oab.uf if oab else None,
+                    "oab_ordem": oab_ordem if oab else None,
+                })
+    return resumo, advogados
+
+
+def _opcoes_resumo():
+    return opcoes_grafo(informacoes_complementares=True, dados_precatorios=True)
+
+
+async def recalcular_resumos(session, processo_ids: list):
+    """
+    Recalcula o resumo dos processos informados a partir do grafo gravado.
+
+    Roda na transação de quem chama (não faz commit), logo depois da escrita
+    do grafo, para que relatório e dados nunca fiquem fora de sincronia.
+    Os tribunais afetados ficam anotados na sessão: quem chama faz o commit
+    com app.versoes.confirmar, que publica as versões novas.
+    """
+    ids = sorted(set(processo_ids))
+    agora = datetime.now(timezone.utc)
+    for i in range(0, len(ids), LOTE_RESUMO):
+        lote = ids[i:i + LOTE_RESUMO]
+        # populate_existing: o grafo pode ter sido alterado por statements Core na mesma sessão
+        result = await session.execute(
+            select(Processo)
+            .options(*_opcoes_resumo())
+            .where(Processo.id.in_(lote))
+            .execution_options(populate_existing=True)
+        )
+        resumos, advogados = [], []
+        for p in result.scalars().all():
+            resumo, linhas_advogados = resumir_processo(p, agora)
+            resumos.append(resumo)
+            advogados.extend(linhas_advogados)
+
+        await session.execute(delete(PrecatorioResumoAdvogado).where(PrecatorioResumoAdvogado.processo_id.in_(lote)))
+        removidos = await session.execute(
+            delete(PrecatorioResumo)
+            .where(PrecatorioResumo.processo_id.in_(lote))
+            .returning(PrecatorioResumo.tribunal_sigla)
+        )
+        # Tribunal antigo e novo: um processo que mudou de tribunal altera os relatórios dos dois
+        registrar_alteracoes(session, [*removidos.scalars().all(), *(r["tribunal_sigla"] for r in resumos)])
+        if resumos:
+            await session.execute(insert(PrecatorioResumo), resumos)
+        if advogados:
+            await session.execute(insert(PrecatorioResumoAdvogado), advogados)
+
+
+async def atualizar_dados_resumo(session, processo_ids: list):
+    """Copia os dados complementares (dados_precatorios) para o resumo dos processos informados."""
+    if not processo_ids:
+        return
+    result = await session.execute(
+        text(
+            """
+            UPDATE precatorios_resumo r SET
+                tipo_regime = d.tipo_regime,
+                ano_orcamentario = d.ano_orcamentario,
+                natureza_precatorio = d.natureza_precatorio,
+                valor_deferido = d.valor_deferido,
+                data_base_calculo = d.data_base_calculo,
+                data_expedicao = d.data_expedicao,
+                atualizado_em = now()
+            FROM dados_precatorios d
+            WHERE d.processo_id = r.processo_id AND r.processo_id = ANY(:ids)
+            RETURNING r.tribunal_sigla
+            """
+        ),
+        {"ids": list(processo_ids)},
+    )
+    registrar_alteracoes(session, result.scalars().all())
+
+
+async def reconstruir_resumos(tribunal_sigla: str | None = None) -> int:
+    """Recalcula o resumo de todos os processos (ou de um tribunal), um lote por transação."""
+    from app.database import AsyncSessionLocal
+
+    ultimo_id = 0
+    total = 0
+    while True:
+        async with AsyncSessionLocal() as session:
+            stmt = select(Processo.id).where(Processo.id > ultimo_id).order_by(Processo.id).limit(LOTE_RESUMO)
+            if tribunal_sigla:
+                stmt = stmt.where(Processo.unidade_origem_tribunal_sigla == tribunal_sigla)
+            ids = (await session.execute(stmt)).scalars().all()
+            if not ids:
+                break
+            await recalcular_resumos(session, ids)
+            await confirmar(session)
+        ultimo_id = ids[-1]
+        total += len(ids)
+        logger.info(f"Resumo: {total} processos recalculados")
+    return total
+
+
+async def preencher_resumos(de: int, ate: int) -> int:
+    """
+    Calcula o resumo dos processos com id em (de, ate] que ainda não têm um
+    (gravados antes do resumo existir). É o preenchimento da migração 6
+    (app.migracoes), executado em segundo plano depois do startup.
+    """
+    from app.database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as session:
+        ids = (await session.execute(
+            select(Processo.id)
+            .where(
+                Processo.id > de,
+                Processo.id <= ate,
+                ~select(PrecatorioResumo.processo_id).where(PrecatorioResumo.processo_id == Processo.id).exists(),
+            )
+            .order_by(Processo.id)
+        )).scalars().all()
+    for i in range(0, len(ids), LOTE_RESUMO):
+        async with AsyncSessionLocal() as session:
+            await recalcular_resumos(session, ids[i:i + LOTE_RESUMO])
+            await confirmar(session)
+    return len(ids)
+
+
+if __name__ == "__main__":
+    # Uso: python -m app.resumo [--tribunal TJSP]  (recalcula o resumo de todos os processos, ex.: depois
+    # de mudar as regras de resumir_processo; os que não têm resumo são preenchidos pela migração 6)
+    parser = argparse.ArgumentParser(description="Recalcula o resumo dos precatórios usado pelos relatórios.")
+    parser.add_argument("--tribunal", help="Sigla do tribunal (padrão: todos)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(f"Processos recalculados: {asyncio.run(reconstruir_resumos(args.tribunal))}")
@@ -0,0 +1,131 @@
+"""
+Versão (watermark) dos dados de cada tribunal.
+
+Toda gravação que muda o que os relatórios de um tribunal mostram incrementa
+a versão desse tribunal. O cache de relatórios (app.cache_relatorios) usa a
+versão na chave: enquanto ela não muda, o arquivo gerado antes continua
+valendo.
+
+Incrementar `tribunais_versoes.versao` na transação da gravação travaria a
+linha do tribunal até o commit do lote, e todas as gravações do mesmo
+tribunal (workers de persistência, atualização periódica, dados
+complementares) fariam fila atrás dela. Por isso a gravação só anota os
+tribunais alterados na sessão (`registrar_alteracoes`) e `confirmar`, antes
+do commit, insere um incremento pendente por tribunal em
+`tribunais_versoes_pendentes` (só INSERT, nada fica travado). Depois do
+commit, `publicar_versoes` aplica os pendentes em `tribunais_versoes` e os
+apaga, numa transação própria e curta.
+
+A versão lida (`versao_tribunal`) é a de `tribunais_versoes` mais os
+incrementos pendentes, num comando só: os pendentes são gravados com os
+dados e a publicação troca pendente por incremento atomicamente, então a
+versão muda no mesmo commit que os dados, e dados novos nunca ficam atrás de
+um cache antigo válido. Se a publicação falhar (ou o processo cair antes
+dela), os pendentes continuam no banco e são aplicados pelo próximo
+`confirmar` de qualquer processo ou no startup.
+
+As gravações do grafo sempre passam por app.resumo (recalcular_resumos e
+atualizar_dados_resumo), então é lá que as alterações são anotadas.
+"""
+import logging
+
+from sqlalchemy import func, select, text
+
+from app.models import TribunalVersao, TribunalVersaoPendente
+
+logger = logging.getLogger(__name__)
+
+# Chave em session.info com as siglas alteradas ainda não publicadas
+CHAVE_ALTERADOS = "tribunais_alterados"
+
+
+def registrar_alteracoes(session, tribunais) -> None:
+    """Anota na sessão os tribunais alterados (None é ignorado); `confirmar` publica as versões."""
+    session.info.setdefault(CHAVE_ALTERADOS, set()).update(t for t in tribunais if t)
+
+
+async def incrementar_versoes(session, tribunais) -> None:
+    """
+    Incrementa a versão dos tribunais informados, uma vez por ocorrência na
+    lista (None é ignorado). Não faz commit.
+    """
+    siglas = [t for t in tribunais if t]
+    if not siglas:
+        return
+    # Ordem fixa: incrementos concorrentes travam as linhas na mesma ordem, sem deadlock
+    await session.execute(
+        text(
+            """
+            INSERT INTO tribunais_versoes (tribunal_sigla, versao, atualizado_em)
+            SELECT sigla, count(*), now() FROM unnest(CAST(:siglas AS text[])) AS sigla
+            GROUP BY sigla ORDER BY sigla
+            ON CONFLICT (tribunal_sigla) DO UPDATE SET
+                versao = tribunais_versoes.versao + EXCLUDED.versao,
+                atualizado_em = now()
+            """
+        ),
+        {"siglas": siglas},
+    )
+
+
+async def anotar_pendentes(session, tribunais) -> None:
+    """Grava, na transação da sessão, um incremento pendente por tribunal. Não faz commit."""
+    siglas = sorted({t for t in tribunais if t})
+    if not siglas:
+        return
+    await session.execute(
+        text("INSERT INTO tribunais_versoes_pendentes (tribunal_sigla) SELECT unnest(CAST(:siglas AS text[]))"),
+        {"siglas": siglas},
+    )
+
+
+async def publicar_versoes() -> None:
+    """
+    Aplica e apaga os incrementos pendentes já commitados, de qualquer processo,
+    numa transação própria e curta. Pendentes que outro processo está
+    publicando no momento ficam para ele (SKIP LOCKED).
+    """
+    from app.database import AsyncSessionLocal
+
+    try:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(text(
+                """
+                DELETE FROM tribunais_versoes_pendentes
+                WHERE id IN (SELECT id FROM tribunais_versoes_pendentes FOR UPDATE SKIP LOCKED)
+                RETURNING tribunal_sigla
+                """
+            ))
+            await incrementar_versoes(session, result.scalars().all())
+            await session.commit()
+    except Exception:
+        # Os pendentes ficam no banco: o próximo confirmar (ou o startup) tenta de novo
+        logger.exception("Falha ao publicar as versões pendentes dos tribunais")
+
+
+async def confirmar(session) -> None:
+    """Commit da sessão, com os incrementos pendentes dos tribunais anotados nela, e publicação das versões."""
+    # Anotações de um lote desfeito antes podem sobrar aqui: incremento a mais só invalida o cache
+    tribunais = session.info.pop(CHAVE_ALTERADOS, set())
+    await anotar_pendentes(session, tribunais)
+    await session.commit()
+    if tribunais:
+        await publicar_versoes()
+
+
+async def versao_tribunal(session, tribunal_sigla: str) -> int:
+    """
+    Versão atual dos dados do tribunal, contando os incrementos pendentes (0 se
+    nada foi gravado desde que as versões existem).
+    """
+    # Um comando só: a versão e os pendentes vêm do mesmo snapshot
+    versao = (await session.execute(
+        select(
+            func.coalesce(
+                select(TribunalVersao.versao).where(TribunalVersao.tribunal_sigla == tribunal_sigla).scalar_subquery(),
+                0,
+            )
+            + select(func.count()).where(TribunalVersaoPendente.tribunal_sigla == tribunal_sigla).scalar_subquery()
+        )
+    )).scalar()
+    return versao or 0
@@ -1,294 +1,223 @@
 import pandas as pd
 import asyncio
 import aiohttp
+import os
 import traceback
-from datetime import datetime, date
+from datetime import datetime, timezone
 from app.database import AsyncSessionLocal
-from app.models import (
-    Processo,
-    ProcessoRelacionado,
-    Fonte,
-    Capa,
-    ValorCausa,
-    InformacaoComplementar,
-    Envolvido,
-    Advogado,
-    OAB,
-    Audiencia,
-)
+from app.arquivo import arquivar_respostas
 from app.consultas import consultar_numero
-from sqlalchemy.future import select
-
-BATCH_SIZE = 200
-
-async def salvar_processo(session, data):
+from app.http_client import cliente_escavador
+from app.persistencia import salvar_processos_em_lote
+from app.versoes import confirmar
+
+# Configuração do pipeline de ingestão
+FETCH_WORKERS = int(os.getenv("INGESTAO_FETCH_WORKERS", "50"))  # consultas em voo
+PERSIST_WORKERS = int(os.getenv("INGESTAO_PERSIST_WORKERS", "2"))
+TAMANHO_FILA = int(os.getenv("INGESTAO_TAMANHO_FILA", "500"))
+LOTE_PERSISTENCIA = int(os.getenv("INGESTAO_LOTE_PERSISTENCIA", "100"))
+ESPERA_LOTE = float(os.getenv("INGESTAO_ESPERA_LOTE", "0.5"))  # segundos
+
+async def salvar_processo(session, data, atualizar_existentes: bool = False):
     """Salva o processo e seus relacionamentos no banco."""
-    q = await session.execute(select(Processo).where(Processo.numero_cnj == data["numero_cnj"]))
-    processo = q.scalar_one_or_none()
-
-    if not processo:
-        # CONVERSÕES DE DATAS E TIMESTAMPS PARA O MODELO PROCESSO
-        data_inicio = data.get("data_inicio")
-        if data_inicio and isinstance(data_inicio, str):
-            try:
-                data_inicio = datetime.strptime(data_inicio, "%Y-%m-%d").date()
-            except ValueError:
-                data_inicio = None
-        
-        data_ultima_movimentacao = data.get("data_ultima_movimentacao")
-        if data_ultima_movimentacao and isinstance(data_ultima_movimentacao, str):
+    await salvar_processos_em_lote(session, [data], atualizar_existentes=atualizar_existentes, sincronizado_em=datetime.now(timezone.utc))
+    await confirmar(session)
+
+
+async def salvar_resultados(resultados: list, atualizar_existentes: bool = False) -> list:
+    """
+    Grava os payloads obtidos [(numero_cnj, payload)] em uma única transação.
+
+    Se o lote falhar, regrava CNJ a CNJ para isolar os payloads problemáticos.
+    Com `atualizar_existentes=True` processos já existentes são atualizados.
+    Retorna as tuplas (numero_cnj, status, erro) de cada CNJ.
+    """
+    if not resultados:
+        return []
+
+    async with AsyncSessionLocal() as db_session:
+        try:
+            await salvar_processos_em_lote(
+                db_session, [r for _, r in resultados],
+                atualizar_existentes=atualizar_existentes, sincronizado_em=datetime.now(timezone.utc),
+            )
+            await confirmar(db_session)
+            return [(numero, "salvo", None) for numero, _ in resultados]
+        except Exception as e:
+            await db_session.rollback()
+            print(f"💾 Erro ao salvar lote de {len(resultados)} CNJs, gravando individualmente: {e}")
+
+        estados = []
+        for numero, r in resultados:
             try:
-                data_ultima_movimentacao = datetime.strptime(data_ultima_movimentacao, "%Y-%m-%d").date()
-            except ValueError:
-                data_ultima_movimentacao = None
-
-        data_ultima_verificacao = data.get("data_ultima_verificacao")
-        if data_ultima_verificacao and isinstance(data_ultima_verificacao, str):
+                await salvar_processo(db_session, r, atualizar_existentes=atualizar_existentes)
+                estados.append((numero, "salvo", None))
+            except Exception as e:
+                await db_session.rollback()
+                print(f"💾 Erro ao salvar CNJ {r.get('numero_cnj')}: {e}")
+                estados.append((numero, "falhou", f"Erro ao salvar: {e}"))
+        return estados
+
+
+class PipelineIngestao:
+    """
+    Pipeline produtor/consumidor de ingestão.
+
+    Os CNJs entram em uma fila limitada, são consultados por `fetch_workers`
+    tarefas (o limite de requisições em voo) e os payloads seguem por uma
+    segunda fila limitada até `persist_workers` tarefas, que gravam em lotes de
+    até `lote_persistencia` assim que chegam. Consulta e gravação se sobrepõem
+    e um CNJ lento ocupa apenas um worker, sem travar os demais.
+    """
+
+    def __init__(
+        self,
+        http_session: aiohttp.ClientSession,
+        registrar=None,
+        atualizar_existentes: bool = False,
+        fetch_workers: int = FETCH_WORKERS,
+        persist_workers: int = PERSIST_WORKERS,
+        tamanho_fila: int = TAMANHO_FILA,
+        lote_persistencia: int = LOTE_PERSISTENCIA,
+        espera_lote: float = ESPERA_LOTE,
+    ):
+        self.http_session = http_session
+        self.registrar = registrar
+        self.atualizar_existentes = atualizar_existentes
+        self.fetch_workers = fetch_workers
+        self.persist_workers = persist_workers
+        self.lote_persistencia = lote_persistencia
+        self.espera_lote = espera_lote
+        self.entrada = asyncio.Queue(maxsize=tamanho_fila)
+        self.resultados = asyncio.Queue(maxsize=tamanho_fila)
+
+    async def executar(self, numeros_cnj):
+        """
+        Processa uma lista (ou iterável assíncrono) de CNJs até o fim.
+
+        Alimentação e workers são supervisionados juntos: se qualquer um deles
+        morre com exceção, os demais são cancelados e a exceção sobe. Sem
+        isso, um gravador morto deixaria os buscadores presos na fila cheia
+        de resultados, e o job parado em 'executando' sem erro.
+        """
+        buscadores = [asyncio.create_task(self._buscar()) for _ in range(self.fetch_workers)]
+        gravadores = [asyncio.create_task(self._gravar()) for _ in range(self.persist_workers)]
+        alimentador = asyncio.create_task(self._alimentar(numeros_cnj, buscadores))
+        pendentes = {alimentador, *buscadores, *gravadores}
+        try:
+            while pendentes:
+                concluidas, pendentes = await asyncio.wait(pendentes, return_when=asyncio.FIRST_EXCEPTION)
+                for tarefa in concluidas:
+                    if not tarefa.cancelled() and tarefa.exception():
+                        raise tarefa.exception()
+        finally:
+            for tarefa in pendentes:
+                tarefa.cancel()
+            await asyncio.gather(*pendentes, return_exceptions=True)
+
+    async def _alimentar(self, numeros_cnj, buscadores: list):
+        if hasattr(numeros_cnj, "__aiter__"):
+            async for numero in numeros_cnj:
+                await self.entrada.put(numero)
+        else:
+            for numero in numeros_cnj:
+                await self.entrada.put(numero)
+
+        # Um sentinela por worker encerra cada estágio
+        for _ in buscadores:
+            await self.entrada.put(None)
+        # Só espera: se um buscador falhar, quem trata é a supervisão em `executar`
+        await asyncio.wait(buscadores)
+        for _ in range(self.persist_workers):
+            await self.resultados.put(None)
+
+    async def _buscar(self):
+        while True:
+            numero = await self.entrada.get()
+            if numero is None:
+                return
             try:
-                data_ultima_verificacao = datetime.fromisoformat(data_ultima_verificacao)
-            except ValueError:
-                data_ultima_verificacao = None
-        
-        processo = Processo(
-    numero_cnj=data.get("numero_cnj"),
-    titulo_polo_ativo=data.get("titulo_polo_ativo"),
-    titulo_polo_passivo=data.get("titulo_polo_passivo"),
-    ano_inicio=data.get("ano_inicio"),
-    data_inicio=data_inicio,
-    estado_origem=(
-        data.get("estado_origem", {}).get("sigla")
-        if isinstance(data.get("estado_origem"), dict)
-        else data.get("estado_origem")
-    ),
-    data_ultima_movimentacao=data_ultima_movimentacao,
-    quantidade_movimentacoes=data.get("quantidade_movimentacoes"),
-    fontes_tribunais_estao_arquivadas=data.get("fontes_tribunais_estao_arquivadas"),
-    tempo_desde_ultima_verificacao=data.get("tempo_desde_ultima_verificacao"),
-    data_ultima_verificacao=data_ultima_verificacao,
-
-    unidade_origem_nome=data.get("unidade_origem", {}).get("nome"),
-    unidade_origem_cidade=data.get("unidade_origem", {}).get("cidade"),
-    unidade_origem_estado=data.get("unidade_origem", {}).get("estado"),
-    unidade_origem_tribunal_sigla=data.get("unidade_origem", {}).get("tribunal_sigla"),
-)
-
-        session.add(processo)
-        await session.flush()
-
-        # Processos relacionados
-        for rel in data.get("processos_relacionados") or []:
-            session.add(ProcessoRelacionado(
-                processo_id=processo.id,
-                numero=rel.get("numero")
-            ))
-
-        # Fontes
-        for f in data.get("fontes") or []:
-            fonte_data_inicio = f.get("data_inicio")
-            if fonte_data_inicio and isinstance(fonte_data_inicio, str):
+                r = await consultar_numero(self.http_session, numero)
+            except Exception as e:
+                causa = getattr(e, "__cause__", None)
+                print(f"❌ Erro ao consultar CNJ {numero}: {repr(e)}")
+                if causa:
+                    print(f"   ↳ Causa raiz: {repr(causa)}")
+                    print("   Traceback:")
+                    traceback.print_exception(type(causa), causa, causa.__traceback__)
+                await self.resultados.put((numero, None, repr(causa or e)))
+                continue
+            if r:
+                await self.resultados.put((numero, r, None))
+            else:
+                await self.resultados.put((numero, None, "Resposta vazia da API"))
+
+    async def _gravar(self):
+        fim = False
+        while not fim:
+            item = await self.resultados.get()
+            if item is None:
+                return
+            lote = [item]
+
+            # Completa o lote com o que chegar em até `espera_lote` segundos
+            limite = asyncio.get_running_loop().time() + self.espera_lote
+            while len(lote) < self.lote_persistencia:
+                restante = limite - asyncio.get_running_loop().time()
+                if restante <= 0:
+                    break
                 try:
-                    fonte_data_inicio = datetime.strptime(fonte_data_inicio, "%Y-%m-%d").date()
-                except ValueError:
-                    fonte_data_inicio = None
-
-            fonte_data_ultima_movimentacao = f.get("data_ultima_movimentacao")
-            if fonte_data_ultima_movimentacao and isinstance(fonte_data_ultima_movimentacao, str):
-                try:
-                    fonte_data_ultima_movimentacao = datetime.strptime(fonte_data_ultima_movimentacao, "%Y-%m-%d").date()
-                except ValueError:
-                    fonte_data_ultima_movimentacao = None
-            
-            fonte_data_ultima_verificacao = f.get("data_ultima_verificacao")
-            if fonte_data_ultima_verificacao and isinstance(fonte_data_ultima_verificacao, str):
-                try:
-                    fonte_data_ultima_verificacao = datetime.fromisoformat(fonte_data_ultima_verificacao)
-                except ValueError:
-                    fonte_data_ultima_verificacao = None
-            
-            fonte = Fonte(
-                processo_id=processo.id,
-                fonte_id=f.get("id"),
-                processo_fonte_id=f.get("processo_fonte_id"),
-                descricao=f.get("descricao"),
-                nome=f.get("nome"),
-                sigla=f.get("sigla"),
-                tipo=f.get("tipo"),
-                data_inicio=fonte_data_inicio,
-                data_ultima_movimentacao=fonte_data_ultima_movimentacao,
-                segredo_justica=f.get("segredo_justica"),
-                arquivado=f.get("arquivado"),
-                status_predito=f.get("status_predito"),
-                grau=f.get("grau"),
-                grau_formatado=f.get("grau_formatado"),
-                fisico=f.get("fisico"),
-                sistema=f.get("sistema"),
-                url=f.get("url"),
-                quantidade_envolvidos=f.get("quantidade_envolvidos"),
-                data_ultima_verificacao=fonte_data_ultima_verificacao,
-                quantidade_movimentacoes=f.get("quantidade_movimentacoes"),
-                outros_numeros=f.get("outros_numeros"),
-            )
-            session.add(fonte)
-            await session.flush()
+                    item = await asyncio.wait_for(self.resultados.get(), timeout=restante)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    fim = True
+                    break
+                lote.append(item)
+
+            await self._persistir(lote)
+
+    async def _persistir(self, lote: list):
+        falhas = [(numero, "falhou", erro) for numero, r, erro in lote if r is None]
+        salvaveis = [(numero, r) for numero, r, _ in lote if r is not None]
+
+        try:
+            await arquivar_respostas(salvaveis)
+        except Exception as e:
+            # O arquivo é um extra: não impede a gravação do lote
+            print(f"⚠️ Erro ao arquivar {len(salvaveis)} respostas: {e}")
+        await self._registrar([(numero, "obtido", None) for numero, _ in salvaveis])
+        estados = falhas + await salvar_resultados(salvaveis, atualizar_existentes=self.atualizar_existentes)
+        await self._registrar(estados)
+        print(f"Lote gravado: {len(salvaveis)} obtidos, {len(falhas)} falhas de consulta")
+
+    async def _registrar(self, estados: list):
+        if not self.registrar or not estados:
+            return
+        try:
+            await self.registrar(estados)
+        except Exception as e:
+            # Falha ao registrar estado não deve derrubar o pipeline
+            print(f"⚠️ Erro ao registrar estado de {len(estados)} CNJs: {e}")
+
+
+async def processar_lote(numeros_cnj, registrar=None, atualizar_existentes: bool = False, fetch_workers: int = FETCH_WORKERS):
+    """
+    Processa uma lista (ou iterável assíncrono) de CNJs pelo PipelineIngestao.
+
+    Se `registrar` for informado, ele é aguardado com uma lista de tuplas
+    (numero_cnj, status, erro) a cada mudança de estado dos CNJs
+    ("obtido" após a consulta, "salvo" ou "falhou" ao final).
+    Com `atualizar_existentes=True` os processos já existentes são atualizados.
+    """
+    if isinstance(numeros_cnj, list):
+        print(f"Total de CNJs a processar: {len(numeros_cnj)}")
+
+    session = await cliente_escavador.abrir()
+    pipeline = PipelineIngestao(session, registrar=registrar, atualizar_existentes=atualizar_existentes, fetch_workers=fetch_workers)
+    await pipeline.executar(numeros_cnj)
 
-            # Capa
-            if f.get("capa"):
-                capa_data = f["capa"]
-                
-                data_distribuicao = capa_data.get("data_distribuicao")
-                if data_distribuicao and isinstance(data_distribuicao, str):
-                    try:
-                        data_distribuicao = datetime.strptime(data_distribuicao, "%Y-%m-%d").date()
-                    except ValueError:
-                        data_distribuicao = None
-                
-                data_arquivamento = capa_data.get("data_arquivamento")
-                if data_arquivamento and isinstance(data_arquivamento, str):
-                    try:
-                        data_arquivamento = datetime.strptime(data_arquivamento, "%Y-%m-%d").date()
-                    except ValueError:
-                        data_arquivamento = None
-
-                capa = Capa(
-                    fonte_id=fonte.id,
-                    classe=capa_data.get("classe"),
-                    assunto=capa_data.get("assunto"),
-                    assuntos_normalizados=capa_data.get("assuntos_normalizados"),
-                    assunto_principal_normalizado=capa_data.get("assunto_principal_normalizado"),
-                    area=capa_data.get("area"),
-                    orgao_julgador=capa_data.get("orgao_julgador"),
-                    situacao=capa_data.get("situacao"),
-                    data_distribuicao=data_distribuicao,
-                    data_arquivamento=data_arquivamento,
-                )
-                session.add(capa)
-                await session.flush()
-
-                # Valor da Causa
-                if capa_data.get("valor_causa"):
-                    valor_causa_data = capa_data["valor_causa"]
-                    
-                    valor_float = None
-                    valor_str = valor_causa_data.get("valor")
-                    if valor_str:
-                        try:
-                            # A API retorna um valor decimal como string,
-                            # por isso a conversão para float é necessária.
-                            valor_float = float(valor_str)
-                        except (ValueError, TypeError):
-                            # Em caso de valor inválido ou nulo,
-                            # o valor será salvo como None no banco.
-                            valor_float = None
-
-                    session.add(ValorCausa(
-                        capa_id=capa.id,
-                        valor=valor_float,
-                        moeda=valor_causa_data.get("moeda"),
-                        valor_formatado=valor_causa_data.get("valor_formatado"),
-                    ))
-
-                # Informações Complementares
-                for info in capa_data.get("informacoes_complementares") or []:
-                    session.add(InformacaoComplementar(
-                        capa_id=capa.id,
-                        tipo=info.get("tipo"),
-                        valor=info.get("valor"),
-                    ))
-
-            # Audiências
-            for aud in f.get("audiencias") or []:
-                data_audiencia = aud.get("data_audiencia")
-                if data_audiencia and isinstance(data_audiencia, str):
-                    try:
-                        data_audiencia = datetime.fromisoformat(data_audiencia)
-                    except ValueError:
-                        data_audiencia = None
-                
-                session.add(Audiencia(
-                    fonte_id=fonte.id,
-                    data_audiencia=data_audiencia,
-                    descricao=aud.get("descricao")
-                ))
-
-            # Envolvidos
-            for envolvido_data in f.get("envolvidos") or []:
-                env = Envolvido(
-                    fonte_id=fonte.id,
-                    nome=envolvido_data.get("nome"),
-                    quantidade_processos=envolvido_data.get("quantidade_processos"),
-                    tipo_pessoa=envolvido_data.get("tipo_pessoa"),
-                    tipo=envolvido_data.get("tipo"),
-                    tipo_normalizado=envolvido_data.get("tipo_normalizado"),
-                    polo=envolvido_data.get("polo"),
-                    cpf=envolvido_data.get("cpf"),
-                    cnpj=envolvido_data.get("cnpj"),
-                    prefixo=envolvido_data.get("prefixo"),
-                    sufixo=envolvido_data.get("sufixo"),
-                )
-                session.add(env)
-                await session.flush()
-
-                # Advogados
-                for adv_data in envolvido_data.get("advogados") or []:
-                    adv = Advogado(
-                        envolvido_id=env.id,
-                        nome=adv_data.get("nome"),
-                        quantidade_processos=adv_data.get("quantidade_processos"),
-                        tipo=adv_data.get("tipo"),
-                        tipo_normalizado=adv_data.get("tipo_normalizado"),
-                        polo=adv_data.get("polo"),
-                        cpf=adv_data.get("cpf"),
-                        cnpj=adv_data.get("cnpj"),
-                        prefixo=adv_data.get("prefixo"),
-                        sufixo=adv_data.get("sufixo"),
-                    )
-                    session.add(adv)
-                    await session.flush()
-
-                    # OABs do advogado
-                    for oab_data in adv_data.get("oabs") or []:
-                        session.add(OAB(
-                            advogado_id=adv.id,
-                            uf=oab_data.get("uf"),
-                            tipo=oab_data.get("tipo"),
-                            numero=oab_data.get("numero")
-                        ))
-    
-    await session.commit()
-
-
-async def processar_lote(numeros_cnj: list):
-    """Processa uma lista de CNJs em batches de BATCH_SIZE."""
-    total = len(numeros_cnj)
-    print(f"Total de CNJs a processar: {total}")
-
-    for i in range(0, total, BATCH_SIZE):
-        batch = numeros_cnj[i:i + BATCH_SIZE]
-        print(f"Processando batch {i//BATCH_SIZE + 1} ({len(batch)} CNJs)")
-
-        async with aiohttp.ClientSession() as session:
-            # manter referência do número + tarefa
-            tasks = [(numero, consultar_numero(session, numero)) for numero in batch]
-            resultados = await asyncio.gather(
-                *[t for _, t in tasks], return_exceptions=True
-            )
 
-        async with AsyncSessionLocal() as db_session:
-            for (numero, _), r in zip(tasks, resultados):
-                if isinstance(r, Exception):
-                    causa = getattr(r, "__cause__", None)
-                    print(f"❌ Erro ao consultar CNJ {numero}: {repr(r)}")
-                    if causa:
-                        print(f"   ↳ Causa raiz: {repr(causa)}")
-                        print("   Traceback:")
-                        traceback.print_exception(type(causa), causa, causa.__traceback__)
-                elif r:
-                    try:
-                        await salvar_processo(db_session, r)
-                    except Exception as e:
-                        await db_session.rollback()
-                        print(f"💾 Erro ao salvar CNJ {r.get('numero_cnj')}: {e}")
-            
 async def processar_csv(file_path: str):
     """Lê CSV e processa os CNJs chamando processar_lote."""
     df = pd.read_csv(file_path, dtype=str)
@@ -0,0 +1,96 @@
+"""
+Escrita de XLSX linha a linha, com memória constante.
+
+Usa o modo `constant_memory` do xlsxwriter: cada linha vai para o arquivo
+temporário da aba assim que a próxima começa, então o tamanho da planilha
+não pesa na memória. A contrapartida é que as linhas de cada aba precisam ser
+escritas em ordem (abas diferentes podem ser intercaladas) e as strings saem
+inline, sem tabela compartilhada.
+
+Toda aba sai com cabeçalho em negrito congelado, autofiltro e as colunas de
+documento (CPF/CNPJ) formatadas como texto, para o Excel não comer zeros à
+esquerda nem converter o número em notação científica.
+"""
+from datetime import date, datetime
+
+import pandas as pd
+import xlsxwriter
+
+LARGURA_COLUNA = 18
+
+
+class AbaStreaming:
+    """Uma aba do PlanilhaStreaming. Use `escrever_df`/`escrever_linhas` na ordem das linhas."""
+
+    def __init__(self, planilha: "PlanilhaStreaming", nome: str, colunas: list, colunas_texto=()):
+        self.colunas = list(colunas)
+        self.linhas = 0
+        self._ws = planilha.workbook.add_worksheet(nome)
+        self._fmt_data = planilha.fmt_data
+        self._texto = [c in colunas_texto for c in self.colunas]
+
+        self._ws.set_column(0, len(self.colunas) - 1, LARGURA_COLUNA)
+        for i, texto in enumerate(self._texto):
+            if texto:
+                self._ws.set_column(i, i, LARGURA_COLUNA, planilha.fmt_texto)
+        self._ws.write_row(0, 0, self.colunas, planilha.fmt_cabecalho)
+        self._ws.freeze_panes(1, 0)
+
+    def escrever_linhas(self, linhas):
+        """Escreve sequências de valores na ordem de `colunas`."""
+        ws = self._ws
+        for valores in linhas:
+            self.linhas += 1
+            for coluna, valor in enumerate(valores):
+                if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+                    continue
+                if self._texto[coluna]:
+                    ws.write_string(self.linhas, coluna, str(valor))
+                elif isinstance(valor, (date, datetime)):
+                    ws.write_datetime(self.linhas, coluna, valor, self._fmt_data)
+                else:
+                    ws.write(self.linhas, coluna, valor)
+
+    def escrever_df(self, df: pd.DataFrame):
+        self.escrever_linhas(df.reindex(columns=self.colunas).itertuples(index=False, name=None))
+
+    def escrever_dicts(self, linhas: list):
+        self.escrever_linhas([linha.get(c) for c in self.colunas] for linha in linhas)
+
+    def fechar(self):
+        self._ws.autofilter(0, 0, max(self.linhas, 1), len(self.colunas) - 1)
+
+
+class PlanilhaStreaming:
+    """
+    Arquivo XLSX escrito aos poucos:
+
+        with PlanilhaStreaming(caminho) as planilha:
+            aba = planilha.aba("Credores", COLUNAS, colunas_texto=["CPF"])
+            for df in partes:
+                aba.escrever_df(df)
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self.workbook = xlsxwriter.Workbook(caminho, {"constant_memory": True})
+        self.fmt_cabecalho = self.workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+        self.fmt_texto = self.workbook.add_format({"num_format": "@"})
+        self.fmt_data = self.workbook.add_format({"num_format": "yyyy-mm-dd"})
+        self.abas = []
+
+    def aba(self, nome: str, colunas: list, colunas_texto=()) -> AbaStreaming:
+        aba = AbaStreaming(self, nome, colunas, colunas_texto)
+        self.abas.append(aba)
+        return aba
+
+    def fechar(self):
+        for aba in self.abas:
+            aba.fechar()
+        self.workbook.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
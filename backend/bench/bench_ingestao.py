@@ -0,0 +1,177 @@
+"""
+Benchmark de ingestão contra o servidor local de bench.escavador_fake.
+
+Roda `processar_lote` (modo lote) ou o mesmo caminho de `upload_file`
+(modo upload: CSV em disco -> job -> executar_job) contra o Postgres de
+DATABASE_URL e reporta CNJs/s, latência por CNJ (p50/p99, da primeira
+tentativa de consulta até o estado final) e statements SQL por CNJ.
+
+Uso (a partir de backend/, com o servidor fake no ar):
+
+    python -m bench.escavador_fake --porta 8765 &
+    python -m bench.bench_ingestao --cnjs 2000 --modo lote
+    INGESTAO_FETCH_WORKERS=100 python -m bench.bench_ingestao --cnjs 2000 --modo upload
+
+No modo upload o número de consultas em voo vem de INGESTAO_FETCH_WORKERS,
+como na aplicação; --fetch-workers vale só para o modo lote.
+
+Use um banco descartável: os processos sintéticos ficam gravados.
+"""
+import argparse
+import asyncio
+import csv
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+# Precisa estar no ambiente antes de importar app.*: as configurações são lidas no import
+os.environ.setdefault("ESCAVADOR_API_KEY", "bench")
+os.environ.setdefault("ESCAVADOR_API_BASE", "http://127.0.0.1:8765/api/v2/processos/numero_cnj")
+os.environ.setdefault("ESCAVADOR_RATE_INICIAL", "1000")
+os.environ.setdefault("ESCAVADOR_RATE_MAXIMO", "5000")
+os.environ.setdefault("ESCAVADOR_RATE_RAJADA", "200")
+
+from sqlalchemy import event  # noqa: E402
+
+from app import jobs, worker  # noqa: E402
+from app.database import engine, fechar_engines, init_db  # noqa: E402
+from app.http_client import cliente_escavador  # noqa: E402
+from app.leitura import ler_tabela_em_chunks  # noqa: E402
+
+
+def gerar_cnjs(n: int, semente: int) -> list:
+    """CNJs sintéticos no formato NNNNNNN-DD.AAAA.J.TR.OOOO, únicos por semente."""
+    rnd = random.Random(semente)
+    numeros = set()
+    while len(numeros) < n:
+        numeros.add(
+            f"{rnd.randint(0, 9999999):07d}-{rnd.randint(0, 99):02d}.{rnd.randint(2000, 2024)}"
+            f".8.26.{rnd.randint(0, 9999):04d}"
+        )
+    return sorted(numeros)
+
+
+class Medidor:
+    """Conta statements SQL e guarda os instantes de início e fim de cada CNJ."""
+
+    def __init__(self):
+        self.statements = 0
+        self.inicio = {}
+        self.fim = {}
+        self.estados = Counter()
+
+    def contar_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements += 1
+
+    def consultar(self, original):
+        async def consultar_medindo(session, numero):
+            self.inicio.setdefault(numero, time.perf_counter())
+            return await original(session, numero)
+        return consultar_medindo
+
+    def registrar_estados(self, estados: list):
+        agora = time.perf_counter()
+        for numero, status, _ in estados:
+            if status in (jobs.ITEM_SALVO, jobs.ITEM_FALHOU):
+                self.fim[numero] = agora
+                self.estados[status] += 1
+
+    def latencias(self) -> list:
+        return sorted(self.fim[n] - self.inicio[n] for n in self.fim if n in self.inicio)
+
+
+def _percentil(valores: list, p: float) -> float:
+    if not valores:
+        return 0.0
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+async def _rodar_lote(numeros: list, medidor: Medidor, fetch_workers: int):
+    async def registrar(estados):
+        medidor.registrar_estados(estados)
+
+    await worker.processar_lote(numeros, registrar=registrar, fetch_workers=fetch_workers)
+
+
+async def _rodar_upload(numeros: list, medidor: Medidor, fetch_workers: int):
+    # Mesmo caminho do endpoint /upload-file, sem a camada HTTP
+    from app.main import _cnjs_do_chunk
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "bench.csv")
+        with open(caminho, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.writer(f, delimiter=";")
+            escritor.writerow(["numero_cnj"])
+            escritor.writerows([n] for n in numeros)
+
+        job_id = await jobs.criar_job("bench.csv")
+        for df in ler_tabela_em_chunks(caminho, "bench.csv"):
+            await jobs.adicionar_itens(job_id, _cnjs_do_chunk(df))
+        await jobs.finalizar_recebimento(job_id)
+
+    registrar_original = jobs._registrar_estados
+
+    async def registrar(job_id, estados):
+        medidor.registrar_estados(estados)
+        await registrar_original(job_id, estados)
+
+    jobs._registrar_estados = registrar
+    try:
+        await jobs.executar_job(job_id)
+    finally:
+        jobs._registrar_estados = registrar_original
+
+
+async def executar(n: int, modo: str, fetch_workers: int, semente: int) -> dict:
+    await init_db()
+    await cliente_escavador.abrir()
+
+    numeros = gerar_cnjs(n, semente)
+    medidor = Medidor()
+    event.listen(engine.sync_engine, "before_cursor_execute", medidor.contar_statement)
+    consultar_original = worker.consultar_numero
+    worker.consultar_numero = medidor.consultar(consultar_original)
+
+    inicio = time.perf_counter()
+    try:
+        if modo == "upload":
+            await _rodar_upload(numeros, medidor, fetch_workers)
+        else:
+            await _rodar_lote(numeros, medidor, fetch_workers)
+    finally:
+        duracao = time.perf_counter() - inicio
+        worker.consultar_numero = consultar_original
+        event.remove(engine.sync_engine, "before_cursor_execute", medidor.contar_statement)
+        metricas_http = cliente_escavador.metricas()
+        await cliente_escavador.fechar()
+        await fechar_engines()
+
+    latencias = medidor.latencias()
+    return {
+        "modo": modo,
+        "cnjs": n,
+        "fetch_workers": fetch_workers,
+        "duracao_segundos": round(duracao, 2),
+        "cnjs_por_segundo": round(n / duracao, 1) if duracao else None,
+        "latencia_p50_ms": round(_percentil(latencias, 50) * 1000, 1),
+        "latencia_p99_ms": round(_percentil(latencias, 99) * 1000, 1),
+        "statements_sql": medidor.statements,
+        "statements_por_cnj": round(medidor.statements / n, 2) if n else None,
+        "estados": dict(medidor.estados),
+        "http": metricas_http,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede a vazão da ingestão contra o Escavador local.")
+    parser.add_argument("--cnjs", type=int, default=1000)
+    parser.add_argument("--modo", choices=["lote", "upload"], default="lote")
+    parser.add_argument("--fetch-workers", type=int, default=worker.FETCH_WORKERS)
+    parser.add_argument("--semente", type=int, default=42, help="Semente dos CNJs gerados")
+    args = parser.parse_args()
+
+    resultado = asyncio.run(executar(args.cnjs, args.modo, args.fetch_workers, args.semente))
+    for chave, valor in resultado.items():
+        print(f"{chave:>20}: {valor}")
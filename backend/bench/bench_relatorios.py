@@ -0,0 +1,115 @@
+"""
+Mede o carregamento do grafo dos relatórios (app.relatorios) em vários tamanhos.
+
+Para cada tamanho N carrega os N primeiros processos do tribunal e compara:
+  - consultas emitidas com as esperadas (por nível, uma por bloco de 500 pais);
+  - linhas recebidas do banco com os objetos efetivamente carregados.
+
+Com carregamento por nível as duas contagens de linhas são iguais (cada
+linha vira um objeto), ou seja, as linhas crescem linearmente com o grafo. Com
+--joinedload roda a estratégia antiga para comparação, onde as linhas são o
+produto das coleções. Sai com código 1 se a estratégia atual divergir.
+
+    python -m bench.bench_relatorios --tribunal TJSP --tamanhos 100 200 400 800
+"""
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import joinedload
+
+from app.database import AsyncSessionRelatorios, engine_relatorios, fechar_engines
+from app.models import Advogado, Capa, Envolvido, Fonte, Processo
+from app.relatorios import consultas_esperadas, opcoes_grafo
+
+NIVEIS = {"processos_relacionados": True}
+
+
+def _opcoes_joinedload():
+    return (
+        joinedload(Processo.fontes).joinedload(Fonte.capa).joinedload(Capa.valor_causa),
+        joinedload(Processo.fontes).joinedload(Fonte.envolvidos).joinedload(Envolvido.advogados).joinedload(Advogado.oabs),
+        joinedload(Processo.processos_relacionados),
+    )
+
+
+def contar_objetos(processos: list) -> int:
+    total = 0
+    for p in processos:
+        total += 1 + len(p.processos_relacionados)
+        for f in p.fontes:
+            total += 1
+            if f.capa:
+                total += 1 + (1 if f.capa.valor_causa else 0)
+            for e in f.envolvidos:
+                total += 1
+                for a in e.advogados:
+                    total += 1 + len(a.oabs)
+    return total
+
+
+class Contador:
+    def __init__(self):
+        self.consultas = 0
+        self.linhas = 0
+
+    def depois_de_executar(self, conn, cursor, statement, parameters, context, executemany):
+        self.consultas += 1
+        if cursor.rowcount and cursor.rowcount > 0:
+            self.linhas += cursor.rowcount
+
+
+async def medir(tribunal_sigla: str, n: int, usar_joinedload: bool) -> dict:
+    async with AsyncSessionRelatorios() as session:
+        ids = (await session.execute(
+            select(Processo.id)
+            .where(Processo.unidade_origem_tribunal_sigla == tribunal_sigla)
+            .order_by(Processo.id)
+            .limit(n)
+        )).scalars().all()
+
+    contador = Contador()
+    event.listen(engine_relatorios.sync_engine, "after_cursor_execute", contador.depois_de_executar)
+    try:
+        async with AsyncSessionRelatorios() as session:
+            opcoes = _opcoes_joinedload() if usar_joinedload else opcoes_grafo(**NIVEIS)
+            result = await session.execute(select(Processo).options(*opcoes).where(Processo.id.in_(ids)))
+            processos = result.scalars().unique().all()
+            objetos = contar_objetos(processos)
+    finally:
+        event.remove(engine_relatorios.sync_engine, "after_cursor_execute", contador.depois_de_executar)
+
+    return {
+        "processos": len(processos),
+        "objetos": objetos,
+        "linhas": contador.linhas,
+        "consultas": contador.consultas,
+        "consultas_esperadas": consultas_esperadas(processos, **NIVEIS),
+    }
+
+
+async def executar(tribunal_sigla: str, tamanhos: list, usar_joinedload: bool) -> bool:
+    ok = True
+    print(f"{'N':>7} {'objetos':>9} {'linhas':>10} {'linhas/obj':>10} {'consultas':>9} {'esperadas':>9}")
+    try:
+        for n in tamanhos:
+            m = await medir(tribunal_sigla, n, usar_joinedload)
+            razao = m["linhas"] / m["objetos"] if m["objetos"] else 0
+            print(f"{m['processos']:>7} {m['objetos']:>9} {m['linhas']:>10} {razao:>10.2f} "
+                  f"{m['consultas']:>9} {m['consultas_esperadas']:>9}")
+            if not usar_joinedload and (m["linhas"] != m["objetos"] or m["consultas"] > m["consultas_esperadas"]):
+                ok = False
+    finally:
+        await fechar_engines()
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verifica se o carregamento dos relatórios cresce linearmente.")
+    parser.add_argument("--tribunal", default="TJSP")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[100, 200, 400, 800])
+    parser.add_argument("--joinedload", action="store_true", help="Mede a estratégia antiga (joinedload encadeado)")
+    args = parser.parse_args()
+
+    sys.exit(0 if asyncio.run(executar(args.tribunal, args.tamanhos, args.joinedload)) else 1)
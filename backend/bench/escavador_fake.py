@@ -0,0 +1,230 @@
+"""
+Servidor local que imita GET /api/v2/processos/numero_cnj/{numero} do Escavador.
+
+Gera payloads sintéticos (determinísticos por CNJ) com o formato consumido por
+app.persistencia, com latência, taxa de erro e comportamento de 429
+configuráveis. Uso (a partir de backend/):
+
+    python -m bench.escavador_fake --porta 8765 --latencia-ms 150 --taxa-erro 0.02 --max-rps 50
+
+e, na aplicação ou no benchmark:
+
+    ESCAVADOR_API_BASE=http://127.0.0.1:8765/api/v2/processos/numero_cnj
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from aiohttp import web
+
+UFS = ["SP", "RJ", "MG", "PR", "RS", "SC", "BA", "PE", "ES", "GO"]
+TRIBUNAIS = ["TJSP", "TJRJ", "TJMG", "TJPR", "TJES", "TRF1", "TRF3"]
+REUS = ["Estado de São Paulo", "Município de Curitiba", "União Federal", "Estado do Espírito Santo", "INSS"]
+NOMES = ["Maria", "José", "Ana", "João", "Antônio", "Francisca", "Carlos", "Paulo", "Lucas", "Juliana"]
+SOBRENOMES = ["Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima", "Gomes"]
+
+
+def _nome(rnd: random.Random) -> str:
+    return f"{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)} {rnd.choice(SOBRENOMES)}"
+
+
+def _digitos(rnd: random.Random, n: int) -> str:
+    return "".join(str(rnd.randint(0, 9)) for _ in range(n))
+
+
+def _data(rnd: random.Random, ano_min: int = 2005, ano_max: int = 2024) -> str:
+    return f"{rnd.randint(ano_min, ano_max)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}"
+
+
+def _advogado(rnd: random.Random, polo: str) -> dict:
+    return {
+        "nome": _nome(rnd),
+        "quantidade_processos": rnd.randint(1, 5000),
+        "tipo_pessoa": "FISICA",
+        "tipo": "ADVOGADO",
+        "tipo_normalizado": "Advogado",
+        "polo": polo,
+        "cpf": _digitos(rnd, 11),
+        "cnpj": None,
+        "prefixo": None,
+        "sufixo": None,
+        "oabs": [
+            {"uf": rnd.choice(UFS), "tipo": "ADVOGADO", "numero": rnd.randint(1000, 499999)}
+            for _ in range(rnd.randint(1, 2))
+        ],
+    }
+
+
+def _envolvido(rnd: random.Random, polo: str) -> dict:
+    if polo == "PASSIVO":
+        return {
+            "nome": rnd.choice(REUS), "quantidade_processos": rnd.randint(1000, 900000),
+            "tipo_pessoa": "JURIDICA", "tipo": "EXECUTADO", "tipo_normalizado": "Executado",
+            "polo": polo, "cpf": None, "cnpj": _digitos(rnd, 14), "prefixo": None, "sufixo": None,
+            "advogados": [_advogado(rnd, polo) for _ in range(rnd.randint(0, 1))],
+        }
+    return {
+        "nome": _nome(rnd), "quantidade_processos": rnd.randint(1, 20),
+        "tipo_pessoa": "FISICA", "tipo": "REQUERENTE", "tipo_normalizado": rnd.choice(["Requerente", "Autor"]),
+        "polo": polo, "cpf": _digitos(rnd, 11), "cnpj": None, "prefixo": None, "sufixo": None,
+        "advogados": [_advogado(rnd, polo) for _ in range(rnd.randint(0, 3))],
+    }
+
+
+def gerar_payload(numero: str, envolvidos_max: int = 40) -> dict:
+    """Payload sintético e determinístico para o CNJ informado."""
+    rnd = random.Random(numero)
+    tribunal = rnd.choice(TRIBUNAIS)
+    uf = rnd.choice(UFS)
+    fontes = []
+    for i in range(rnd.randint(1, 3)):
+        envolvidos = [_envolvido(rnd, "PASSIVO")]
+        envolvidos += [_envolvido(rnd, "ATIVO") for _ in range(rnd.randint(1, envolvidos_max))]
+        valor = round(rnd.uniform(1_000, 5_000_000), 2)
+        fontes.append({
+            "id": rnd.randint(1, 10_000_000),
+            "processo_fonte_id": rnd.randint(1, 10_000_000),
+            "descricao": f"Precatório - {tribunal}",
+            "nome": f"Tribunal de Justiça {uf}",
+            "sigla": tribunal,
+            "tipo": "TRIBUNAL",
+            "data_inicio": _data(rnd),
+            "data_ultima_movimentacao": _data(rnd, 2020),
+            "segredo_justica": False,
+            "arquivado": rnd.random() < 0.1,
+            "status_predito": "ATIVO",
+            "grau": i + 1,
+            "grau_formatado": f"{i + 1}º Grau",
+            "fisico": False,
+            "sistema": "ESAJ",
+            "url": f"https://example.invalid/{numero}/{i}",
+            "quantidade_envolvidos": len(envolvidos),
+            "data_ultima_verificacao": f"{_data(rnd, 2023)}T10:00:00+00:00",
+            "quantidade_movimentacoes": rnd.randint(1, 300),
+            "outros_numeros": [],
+            "capa": {
+                "classe": "Precatório",
+                "assunto": "Requisição de Pequeno Valor",
+                "assuntos_normalizados": [{"nome": "Precatório"}],
+                "assunto_principal_normalizado": {"nome": "Precatório"},
+                "area": "Cível",
+                "orgao_julgador": "DEPRE",
+                "situacao": "Em andamento",
+                "data_distribuicao": _data(rnd),
+                "data_arquivamento": None,
+                "valor_causa": {
+                    "valor": f"{valor:.2f}",
+                    "moeda": "R$",
+                    "valor_formatado": f"R$ {valor:,.2f}",
+                },
+                "informacoes_complementares": [
+                    {"tipo": "Processos originários", "valor": f"{_digitos(rnd, 7)}-{_digitos(rnd, 2)}/{uf}"},
+                    {"tipo": "Natureza", "valor": rnd.choice(["Alimentar", "Comum"])},
+                ],
+            },
+            "audiencias": [
+                {"data_audiencia": f"{_data(rnd, 2021)}T14:00:00", "descricao": "Audiência de conciliação"}
+                for _ in range(rnd.randint(0, 2))
+            ],
+            "envolvidos": envolvidos,
+        })
+
+    return {
+        "numero_cnj": numero,
+        "titulo_polo_ativo": fontes[0]["envolvidos"][1]["nome"],
+        "titulo_polo_passivo": fontes[0]["envolvidos"][0]["nome"],
+        "ano_inicio": int(fontes[0]["data_inicio"][:4]),
+        "data_inicio": fontes[0]["data_inicio"],
+        "estado_origem": {"nome": uf, "sigla": uf},
+        "data_ultima_movimentacao": fontes[0]["data_ultima_movimentacao"],
+        "quantidade_movimentacoes": sum(f["quantidade_movimentacoes"] for f in fontes),
+        "fontes_tribunais_estao_arquivadas": all(f["arquivado"] for f in fontes),
+        "tempo_desde_ultima_verificacao": "há 3 dias",
+        "data_ultima_verificacao": fontes[0]["data_ultima_verificacao"],
+        "unidade_origem": {
+            "nome": "Diretoria de Execuções de Precatórios",
+            "cidade": "Capital",
+            "estado": uf,
+            "tribunal_sigla": tribunal,
+        },
+        "processos_relacionados": [{"numero": f"{_digitos(rnd, 7)}-{_digitos(rnd, 2)}"} for _ in range(rnd.randint(0, 2))],
+        "fontes": fontes,
+    }
+
+
+class EscavadorFake:
+    def __init__(self, latencia_ms: float, jitter_ms: float, taxa_erro: float, taxa_404: float,
+                 max_rps: float | None, retry_after: int, envolvidos_max: int):
+        self.latencia = latencia_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.taxa_erro = taxa_erro
+        self.taxa_404 = taxa_404
+        self.max_rps = max_rps
+        self.retry_after = retry_after
+        self.envolvidos_max = envolvidos_max
+        self._janela = []  # instantes das requisições do último segundo
+        self.contagem = {"200": 0, "404": 0, "429": 0, "500": 0}
+
+    def _excede_limite(self) -> bool:
+        if not self.max_rps:
+            return False
+        agora = time.monotonic()
+        self._janela = [t for t in self._janela if agora - t < 1]
+        if len(self._janela) >= self.max_rps:
+            return True
+        self._janela.append(agora)
+        return False
+
+    async def consultar(self, request: web.Request) -> web.Response:
+        numero = request.match_info["numero"]
+        if self._excede_limite():
+            self.contagem["429"] += 1
+            return web.json_response({"error": "Too Many Requests"}, status=429,
+                                     headers={"Retry-After": str(self.retry_after)})
+
+        await asyncio.sleep(max(0.0, random.gauss(self.latencia, self.jitter)))
+
+        sorteio = random.random()
+        if sorteio < self.taxa_erro:
+            self.contagem["500"] += 1
+            return web.json_response({"error": "Internal Server Error"}, status=500)
+        if sorteio < self.taxa_erro + self.taxa_404:
+            self.contagem["404"] += 1
+            return web.json_response({"error": "Not Found"}, status=404)
+
+        self.contagem["200"] += 1
+        return web.json_response(gerar_payload(numero, self.envolvidos_max))
+
+    async def estatisticas(self, request: web.Request) -> web.Response:
+        return web.json_response(self.contagem)
+
+
+def criar_app(**config) -> web.Application:
+    fake = EscavadorFake(**config)
+    app = web.Application()
+    app.router.add_get("/api/v2/processos/numero_cnj/{numero}", fake.consultar)
+    app.router.add_get("/estatisticas", fake.estatisticas)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local que imita a API de processos do Escavador.")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--latencia-ms", type=float, default=150, help="Latência média por resposta")
+    parser.add_argument("--jitter-ms", type=float, default=50, help="Desvio padrão da latência")
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="Fração de respostas 500")
+    parser.add_argument("--taxa-404", type=float, default=0.0, help="Fração de respostas 404")
+    parser.add_argument("--max-rps", type=float, default=None, help="Acima disso responde 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Valor do cabeçalho Retry-After nos 429")
+    parser.add_argument("--envolvidos-max", type=int, default=40, help="Máximo de envolvidos ativos por fonte")
+    args = parser.parse_args()
+
+    web.run_app(
+        criar_app(
+            latencia_ms=args.latencia_ms, jitter_ms=args.jitter_ms, taxa_erro=args.taxa_erro,
+            taxa_404=args.taxa_404, max_rps=args.max_rps, retry_after=args.retry_after,
+            envolvidos_max=args.envolvidos_max,
+        ),
+        port=args.porta,
+    )
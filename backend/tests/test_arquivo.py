@@ -0,0 +1,94 @@
+"""Arquivo de respostas do Escavador (app.arquivo) e sua releitura, no banco da fixture `banco`."""
+import asyncio
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app import arquivo, database, jobs, worker
+from app.arquivo import _linhas_arquivo, arquivar_respostas, carregar_ultimas_respostas, descompactar
+from app.jobs import ITEM_OBTIDO, ITEM_SALVO
+
+TRIBUNAL = "TARQ"
+
+
+def _payload(numero_cnj: str, titulo: str) -> dict:
+    return {"numero_cnj": numero_cnj, "titulo_polo_ativo": titulo, "unidade_origem": {"tribunal_sigla": TRIBUNAL}}
+
+
+def _sessao(banco, monkeypatch):
+    sessao = sessionmaker(banco, expire_on_commit=False, class_=AsyncSession)
+    for modulo in (arquivo, database, jobs, worker):
+        monkeypatch.setattr(modulo, "AsyncSessionLocal", sessao)
+    return sessao
+
+
+async def _ultimas(sessao, numeros):
+    async with sessao() as session:
+        return await carregar_ultimas_respostas(session, numeros)
+
+
+async def _consultar(engine, sql, **parametros):
+    async with engine.connect() as conn:
+        return (await conn.execute(text(sql), parametros)).all()
+
+
+def test_linhas_do_lote_sem_repetidos():
+    a, b = _payload("CNJ-1", "A"), _payload("CNJ-1", "B")
+    linhas = _linhas_arquivo([("CNJ-1", a), ("CNJ-1", b), ("CNJ-1", a)], datetime.now(timezone.utc))
+
+    # Uma linha por conteúdo; a repetida fica na posição da última ocorrência
+    assert [descompactar(linha["payload_zstd"]) for linha in linhas] == [b, a]
+    assert linhas[0]["tribunal_sigla"] == TRIBUNAL
+
+
+def test_resposta_repetida_volta_a_ser_a_mais_recente(banco, monkeypatch):
+    sessao = _sessao(banco, monkeypatch)
+    a, b = _payload("CNJ-ARQ-1", "A"), _payload("CNJ-ARQ-1", "B")
+
+    for payload in (a, b, a):
+        asyncio.run(arquivar_respostas([("CNJ-ARQ-1", payload)]))
+
+    assert asyncio.run(_ultimas(sessao, ["CNJ-ARQ-1"])) == {"CNJ-ARQ-1": a}
+    linhas = asyncio.run(_consultar(banco, "SELECT count(*) FROM escavador_respostas WHERE numero_cnj = 'CNJ-ARQ-1'"))
+    assert linhas == [(2,)]
+
+
+def test_lote_com_a_mesma_resposta_duas_vezes(banco, monkeypatch):
+    sessao = _sessao(banco, monkeypatch)
+    a, b = _payload("CNJ-ARQ-2", "A"), _payload("CNJ-ARQ-2", "B")
+
+    asyncio.run(arquivar_respostas([("CNJ-ARQ-2", a), ("CNJ-ARQ-2", b), ("CNJ-ARQ-2", a)]))
+
+    # Mesmo obtido_em para as duas: vale a última do lote
+    assert asyncio.run(_ultimas(sessao, ["CNJ-ARQ-2", "CNJ-SEM-ARQUIVO"])) == {"CNJ-ARQ-2": a}
+
+
+def test_job_retomado_grava_os_obtidos_pelo_arquivo(banco, monkeypatch):
+    _sessao(banco, monkeypatch)
+    arquivado = _payload("CNJ-ARQ-3", "Arquivado")
+    asyncio.run(arquivar_respostas([("CNJ-ARQ-3", arquivado)]))
+
+    async def criar_job() -> int:
+        async with banco.begin() as conn:
+            job_id = (await conn.execute(text(
+                "INSERT INTO ingestao_jobs (nome_arquivo, status, total, criado_em) "
+                "VALUES ('lista.csv', 'executando', 2, now()) RETURNING id"
+            ))).scalar()
+            await conn.execute(text(
+                "INSERT INTO ingestao_jobs_itens (job_id, numero_cnj, status) "
+                "VALUES (:job, 'CNJ-ARQ-3', :obtido), (:job, 'CNJ-ARQ-4', :obtido)"
+            ), {"job": job_id, "obtido": ITEM_OBTIDO})
+        return job_id
+
+    job_id = asyncio.run(criar_job())
+    asyncio.run(jobs._recuperar_obtidos(job_id))
+
+    itens = asyncio.run(_consultar(
+        banco, "SELECT numero_cnj, status FROM ingestao_jobs_itens WHERE job_id = :job ORDER BY numero_cnj", job=job_id
+    ))
+    # O que não está no arquivo continua 'obtido' e volta a ser consultado
+    assert itens == [("CNJ-ARQ-3", ITEM_SALVO), ("CNJ-ARQ-4", ITEM_OBTIDO)]
+    processos = asyncio.run(_consultar(banco, "SELECT titulo_polo_ativo FROM processos WHERE numero_cnj = 'CNJ-ARQ-3'"))
+    assert processos == [("Arquivado",)]
@@ -0,0 +1,50 @@
+"""Seleção dos processos desatualizados (app.atualizacao) no banco da fixture `banco`."""
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app import atualizacao
+
+# Processos do tribunal T01 na carga de teste (id % 20 == 1)
+FALHOU_AGORA, FALHOU_UMA_VEZ, FALHOU_DUAS_VEZES, SINCRONIZADO = 1, 21, 41, 61
+
+
+async def _executar(engine, *comandos):
+    async with engine.begin() as conn:
+        for comando in comandos:
+            await conn.execute(text(comando))
+
+
+@pytest.fixture
+def tentativas(banco, monkeypatch):
+    monkeypatch.setattr(atualizacao, "AsyncSessionLocal", sessionmaker(banco, expire_on_commit=False, class_=AsyncSession))
+    monkeypatch.setattr(atualizacao, "BACKOFF_HORAS", 6)
+    asyncio.run(_executar(
+        banco,
+        f"UPDATE processos SET sincronizacao_falhas = 3, sincronizacao_tentativa_em = now() WHERE id = {FALHOU_AGORA}",
+        # 7 h depois da tentativa: passou a espera de 1 falha (6 h), não a de 2 (12 h)
+        f"""UPDATE processos SET sincronizacao_falhas = 1, sincronizacao_tentativa_em = now() - interval '7 hours'
+            WHERE id = {FALHOU_UMA_VEZ}""",
+        f"""UPDATE processos SET sincronizacao_falhas = 2, sincronizacao_tentativa_em = now() - interval '7 hours'
+            WHERE id = {FALHOU_DUAS_VEZES}""",
+        f"UPDATE processos SET sincronizado_em = now() - interval '40 days' WHERE id = {SINCRONIZADO}",
+    ))
+    yield
+    asyncio.run(_executar(
+        banco,
+        "UPDATE processos SET sincronizado_em = NULL, sincronizacao_tentativa_em = NULL, sincronizacao_falhas = 0 "
+        f"WHERE id IN ({FALHOU_AGORA}, {FALHOU_UMA_VEZ}, {FALHOU_DUAS_VEZES}, {SINCRONIZADO})",
+    ))
+
+
+def test_falhas_recentes_esperam_e_tentados_vao_para_o_fim(tentativas):
+    selecionados = asyncio.run(atualizacao.selecionar_desatualizados(limite=10_000, tribunal_sigla="T01"))
+
+    assert f"CNJ-{FALHOU_AGORA}" not in selecionados
+    assert f"CNJ-{FALHOU_DUAS_VEZES}" not in selecionados
+    # Nunca tentados primeiro; depois o sincronizado há 40 dias e, por último, a tentativa de 7 h atrás
+    assert selecionados[-2:] == [f"CNJ-{SINCRONIZADO}", f"CNJ-{FALHOU_UMA_VEZ}"]
+    assert len(selecionados) == 1000 - 2
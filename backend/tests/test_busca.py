@@ -0,0 +1,120 @@
+"""Busca por nome (app.busca) no banco da fixture `banco`."""
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app import database
+from app.busca import buscar_nomes, consulta_busca, decodificar_cursor
+from app.persistencia import salvar_processos_em_lote
+from app.planos import indices_usados, plano
+from app.versoes import confirmar
+
+TRIBUNAL = "TBUS"
+PROCESSOS = 5
+
+
+def _payload(indice: int) -> dict:
+    # A mesma credora e o mesmo advogado em todos: nomes iguais sem acento e caixa
+    return {
+        "numero_cnj": f"CNJ-BUS-{indice}",
+        "unidade_origem": {"tribunal_sigla": TRIBUNAL},
+        "fontes": [{
+            "id": 9100 + indice,
+            "processo_fonte_id": 9100 + indice,
+            "envolvidos": [{
+                "nome": "Zulêica Quixabeira",
+                "polo": "ATIVO",
+                "cpf": "222.333.444-55",
+                "advogados": [{"nome": "ZULEICA QUIXABEIRA", "cpf": "666.777.888-99", "oabs": [{"uf": "SP", "numero": "3000"}]}],
+            }],
+        }],
+    }
+
+
+@pytest.fixture(scope="module")
+def sessao(banco):
+    sessao = sessionmaker(banco, expire_on_commit=False, class_=AsyncSession)
+    original = database.AsyncSessionLocal
+    database.AsyncSessionLocal = sessao
+
+    async def salvar():
+        async with sessao() as session:
+            await salvar_processos_em_lote(session, [_payload(i) for i in range(PROCESSOS)])
+            await confirmar(session)
+
+    try:
+        asyncio.run(salvar())
+    finally:
+        database.AsyncSessionLocal = original
+    return sessao
+
+
+def _buscar(sessao, termo, **opcoes):
+    async def buscar():
+        async with sessao() as session:
+            return await buscar_nomes(session, termo, tribunal_sigla=TRIBUNAL, **opcoes)
+    return asyncio.run(buscar())
+
+
+def _paginas(sessao, termo, limite):
+    resultados, cursor = [], None
+    while True:
+        pagina = _buscar(sessao, termo, limite=limite, cursor=cursor)
+        resultados.extend(pagina["resultados"])
+        cursor = pagina["proximo"]
+        if not cursor:
+            return resultados
+
+
+def _chaves(resultados) -> list:
+    return [(r["tipo"], r["id"]) for r in resultados]
+
+
+def test_sem_acento_e_caixa(sessao):
+    for termo in ("zuleica quixabeira", "ZULÊICA QUIXABEIRA", "Zuleica Quíxabeira"):
+        resultados = _buscar(sessao, termo)["resultados"]
+        assert sorted({(r["tipo"], r["nome"]) for r in resultados}) == [
+            ("advogado", "ZULEICA QUIXABEIRA"),
+            ("envolvido", "Zulêica Quixabeira"),
+        ], termo
+
+
+def test_empate_entre_envolvido_e_advogado(sessao):
+    resultados = _buscar(sessao, "zuleica quixabeira")["resultados"]
+
+    # Um resultado por vínculo, todos com a mesma similaridade: envolvidos antes, cada tipo por id decrescente
+    assert len({r["similaridade"] for r in resultados}) == 1
+    assert [r["tipo"] for r in resultados] == ["envolvido"] * PROCESSOS + ["advogado"] * PROCESSOS
+    for tipo in ("envolvido", "advogado"):
+        ids = [r["id"] for r in resultados if r["tipo"] == tipo]
+        assert ids == sorted(ids, reverse=True)
+    assert {r["numero_cnj"] for r in resultados} == {f"CNJ-BUS-{i}" for i in range(PROCESSOS)}
+    assert {r["oab"] for r in resultados if r["tipo"] == "advogado"} == {"3000/SP"}
+
+
+@pytest.mark.parametrize("limite", [1, 3, 4])
+def test_paginas_sem_repetir_nem_pular(sessao, limite):
+    tudo = _buscar(sessao, "zuleica quixabeira")["resultados"]
+    paginado = _paginas(sessao, "zuleica quixabeira", limite)
+
+    assert _chaves(paginado) == _chaves(tudo)
+    assert len(set(_chaves(paginado))) == 2 * PROCESSOS
+
+
+def test_cursor_ida_e_volta(sessao):
+    pagina = _buscar(sessao, "zuleica quixabeira", limite=PROCESSOS)
+    ultimo = pagina["resultados"][-1]
+
+    assert decodificar_cursor(pagina["proximo"]) == (ultimo["similaridade"], ultimo["tipo"], ultimo["id"])
+    with pytest.raises(ValueError):
+        decodificar_cursor("não é um cursor")
+
+
+def test_filtro_de_similaridade_usa_os_indices_de_trigramas(banco, sessao):
+    async def indices():
+        async with banco.connect() as conn:
+            return indices_usados(await plano(conn, consulta_busca("banco do brasil")))
+
+    assert {"ix_pessoas_nome_trgm", "ix_advogados_nome_trgm"} <= asyncio.run(indices())
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from app.cache_relatorios import CacheRelatorios, etag, etag_confere
+
+
+def _gerar(cache, conteudo="x"):
+    caminho = cache.arquivo_temporario(".csv")
+    with open(caminho, "w") as f:
+        f.write(conteudo)
+    return caminho
+
+
+def _guardar(cache, versao):
+    return cache.guardar("csv", "TJSP", versao, _gerar(cache), "relatorio.csv", "text/csv")
+
+
+def test_guardar_remove_versoes_anteriores(tmp_path):
+    cache = CacheRelatorios(str(tmp_path), max_bytes=10**6)
+    _guardar(cache, 1)
+    _guardar(cache, 2)
+
+    assert cache.obter("csv", "TJSP", 1) is None
+    assert cache.obter("csv", "TJSP", 2) is not None
+
+
+def test_guardar_versao_antiga_nao_remove_a_mais_nova(tmp_path):
+    cache = CacheRelatorios(str(tmp_path), max_bytes=10**6)
+    _guardar(cache, 4)
+    # Geração da versão 3 que terminou depois da 4
+    _guardar(cache, 3)
+
+    assert cache.obter("csv", "TJSP", 4) is not None
+
+
+def test_guardar_nao_toca_outro_tribunal_nem_temporarios(tmp_path):
+    cache = CacheRelatorios(str(tmp_path), max_bytes=10**6)
+    _guardar(cache, 1)
+    outro = cache.guardar("csv", "TJRJ", 1, _gerar(cache), "relatorio.csv", "text/csv")
+    gerando = _gerar(cache)
+    _guardar(cache, 2)
+
+    assert os.path.exists(outro.caminho)
+    assert os.path.exists(gerando)
+
+
+@pytest.mark.parametrize("cabecalho, confere", [
+    (None, False),
+    ("", False),
+    ('"csv-TJSP-3"', True),
+    ('W/"csv-TJSP-3"', True),
+    ('"csv-TJSP-2", "csv-TJSP-3"', True),
+    ("*", True),
+    ('"csv-TJSP-2"', False),
+    ('"csv-TJSP-30"', False),
+    ("csv-TJSP-3", False),
+])
+def test_etag_confere(cabecalho, confere):
+    assert etag_confere(cabecalho, etag("csv", "TJSP", 3)) is confere
@@ -0,0 +1,154 @@
+import asyncio
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app import dados_complementares, database
+from app.dados_complementares import (
+    COLUNAS_CARGA,
+    MAX_EXEMPLOS_REJEITADOS,
+    converter_planilha,
+    gravar_dados_precatorios,
+    preparar_carga,
+    somar_rejeicoes,
+)
+from app.persistencia import salvar_processos_em_lote
+from app.versoes import confirmar, versao_tribunal
+
+
+def _planilha(**colunas):
+    linhas = len(next(iter(colunas.values())))
+    return pd.DataFrame({"numero": [f"CNJ-{i}" for i in range(linhas)], **colunas}, dtype=str)
+
+
+def test_converte_as_colunas_tipadas():
+    df = _planilha(
+        tipo_regime=[" Especial ", ""],
+        ano_orcamentario=["2024", "2025.0"],
+        valor_deferido=["R$ 1.234,56", "10"],
+        data_base_calculo=["03/2021", "12/2020"],
+        data_expedicao=["2021-05-10", "10/05/2021"],
+    )
+
+    tipado, rejeicoes = converter_planilha(df)
+
+    assert list(tipado.columns) == COLUNAS_CARGA
+    assert rejeicoes == {}
+    assert tipado["tipo_regime"].tolist()[0] == "Especial"
+    assert pd.isna(tipado["tipo_regime"].iloc[1])
+    assert tipado["ano_orcamentario"].tolist() == [2024, 2025]
+    assert tipado["valor_deferido"].tolist() == [1234.56, 10.0]
+    assert tipado["data_base_calculo"].iloc[0] == pd.Timestamp(2021, 3, 1)
+
+
+def test_valor_que_nao_converte_vira_nulo_e_entra_no_relatorio():
+    df = _planilha(
+        ano_orcamentario=["2024", "dois mil", "2024.5", ""],
+        valor_deferido=["R$ 10,00", "abc", "", None],
+    )
+
+    tipado, rejeicoes = converter_planilha(df)
+
+    assert tipado["ano_orcamentario"].isna().tolist() == [False, True, True, True]
+    assert rejeicoes == {
+        "ano_orcamentario": {
+            "rejeitados": 2,
+            "exemplos": [{"numero": "CNJ-1", "valor": "dois mil"}, {"numero": "CNJ-2", "valor": "2024.5"}],
+        },
+        "valor_deferido": {"rejeitados": 1, "exemplos": [{"numero": "CNJ-1", "valor": "abc"}]},
+    }
+
+
+def test_colunas_ausentes_ficam_nulas_sem_rejeicao():
+    tipado, rejeicoes = converter_planilha(_planilha(tipo_regime=["Comum"]))
+
+    assert rejeicoes == {}
+    assert tipado[["ano_orcamentario", "valor_deferido", "data_expedicao"]].isna().all().all()
+
+
+def test_registros_usam_tipos_python():
+    df = _planilha(ano_orcamentario=["2024", ""], data_expedicao=["2021-05-10", ""])
+
+    registros, _ = preparar_carga(df)
+
+    assert registros[0] == ("CNJ-0", None, 2024, None, None, None, date(2021, 5, 10))
+    assert registros[1] == ("CNJ-1", None, None, None, None, None, None)
+    assert type(registros[0][2]) is int
+
+
+def test_somar_rejeicoes_acumula_e_limita_os_exemplos():
+    exemplos = [{"numero": f"CNJ-{i}", "valor": "x"} for i in range(MAX_EXEMPLOS_REJEITADOS)]
+    total = somar_rejeicoes({}, {"valor_deferido": {"rejeitados": 3, "exemplos": exemplos[:3]}})
+    total = somar_rejeicoes(total, {
+        "valor_deferido": {"rejeitados": 4, "exemplos": exemplos},
+        "data_expedicao": {"rejeitados": 1, "exemplos": exemplos[:1]},
+    })
+
+    assert total["valor_deferido"]["rejeitados"] == 7
+    assert total["valor_deferido"]["exemplos"] == exemplos[:3] + exemplos[:MAX_EXEMPLOS_REJEITADOS - 3]
+    assert total["data_expedicao"] == {"rejeitados": 1, "exemplos": exemplos[:1]}
+
+
+async def _executar_aqui(funcao, *args):
+    return funcao(*args)
+
+
+def test_carga_por_copy_grava_atualiza_e_ignora_cnj_sem_processo(banco, monkeypatch):
+    sessao = sessionmaker(banco, expire_on_commit=False, class_=AsyncSession)
+    monkeypatch.setattr(database, "AsyncSessionLocal", sessao)
+    # A conversão roda no pool de processos; aqui, no próprio processo
+    monkeypatch.setattr(dados_complementares, "em_processo", _executar_aqui)
+
+    async def carregar(df):
+        async with sessao() as session:
+            resultado = await gravar_dados_precatorios(session, df)
+            await confirmar(session)
+            return resultado
+
+    async def preparar():
+        async with sessao() as session:
+            await salvar_processos_em_lote(session, [
+                {"numero_cnj": numero, "unidade_origem": {"tribunal_sigla": "TDCP"}} for numero in ("CNJ-DCP-1", "CNJ-DCP-2")
+            ])
+            await confirmar(session)
+        # CNJ-DCP-1 já tem dados complementares: a carga os substitui
+        await carregar(pd.DataFrame({"numero": ["CNJ-DCP-1"], "tipo_regime": ["Comum"], "valor_deferido": ["1,00"]}, dtype=str))
+        async with sessao() as session:
+            return await versao_tribunal(session, "TDCP")
+
+    versao_antes = asyncio.run(preparar())
+    df = pd.DataFrame({
+        "numero": ["CNJ-DCP-1", "CNJ-DCP-2", "CNJ-DCP-SEM-PROCESSO", "CNJ-DCP-2"],
+        "tipo_regime": ["Especial", "Comum", "Comum", "Comum"],
+        "valor_deferido": ["R$ 1.234,56", "10", "5", "10"],
+        "data_expedicao": ["2021-05-10", "", "", ""],
+    }, dtype=str)
+
+    gravados, rejeicoes = asyncio.run(carregar(df))
+
+    # CNJ repetido no chunk vira uma linha só (DISTINCT ON), sem erro no ON CONFLICT
+    assert (gravados, rejeicoes) == (2, {})
+
+    async def consultar():
+        async with banco.connect() as conn:
+            dados = (await conn.execute(text(
+                """
+                SELECT p.numero_cnj, d.tipo_regime, d.valor_deferido, d.data_expedicao, r.valor_deferido
+                FROM dados_precatorios d JOIN processos p ON p.id = d.processo_id
+                LEFT JOIN precatorios_resumo r ON r.processo_id = d.processo_id
+                WHERE p.numero_cnj LIKE 'CNJ-DCP-%' ORDER BY 1
+                """
+            ))).all()
+        async with sessao() as session:
+            return dados, await versao_tribunal(session, "TDCP")
+
+    dados, versao = asyncio.run(consultar())
+    assert dados == [
+        ("CNJ-DCP-1", "Especial", 1234.56, date(2021, 5, 10), 1234.56),
+        ("CNJ-DCP-2", "Comum", 10.0, None, 10.0),
+    ]
+    # O resumo mudou: a versão do tribunal também
+    assert versao > versao_antes
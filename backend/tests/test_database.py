@@ -0,0 +1,53 @@
+import asyncio
+
+from sqlalchemy import text
+
+from app.database import PerfilEngine, criar_engine
+
+PADROES = dict(
+    pool_size=10,
+    max_overflow=10,
+    pool_timeout=30.0,
+    pool_recycle=1800,
+    pool_pre_ping=True,
+    statement_timeout_ms=60_000,
+    cache_prepared_statements=500,
+)
+
+
+def test_perfil_le_o_ambiente_com_o_tipo_do_padrao(monkeypatch):
+    monkeypatch.setenv("DB_TESTE_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_TESTE_POOL_TIMEOUT", "2.5")
+    monkeypatch.setenv("DB_TESTE_POOL_PRE_PING", "nao")
+    monkeypatch.setenv("DB_OUTRO_POOL_SIZE", "99")
+
+    perfil = PerfilEngine.do_ambiente("teste", **PADROES)
+
+    assert perfil.nome == "teste"
+    assert (perfil.pool_size, perfil.pool_timeout, perfil.pool_pre_ping) == (3, 2.5, False)
+    # Sem variável, vale o padrão; a de outro perfil não vaza
+    assert (perfil.max_overflow, perfil.statement_timeout_ms) == (10, 60_000)
+
+
+def test_booleano_do_ambiente(monkeypatch):
+    for bruto, esperado in (("1", True), ("true", True), ("Sim", True), ("0", False), ("false", False)):
+        monkeypatch.setenv("DB_TESTE_POOL_PRE_PING", bruto)
+        assert PerfilEngine.do_ambiente("teste", **PADROES).pool_pre_ping is esperado, bruto
+
+
+def test_engine_aplica_o_perfil_na_conexao(banco):
+    perfil = PerfilEngine.do_ambiente("teste", **{**PADROES, "pool_size": 2, "statement_timeout_ms": 1234})
+    engine = criar_engine(perfil, banco.url)
+
+    async def configuracao():
+        try:
+            async with engine.connect() as conn:
+                result = await conn.execute(text(
+                    "SELECT current_setting('application_name'), current_setting('statement_timeout')"
+                ))
+                return result.one()
+        finally:
+            await engine.dispose()
+
+    assert engine.pool.size() == 2
+    assert asyncio.run(configuracao()) == ("recall-teste", "1234ms")
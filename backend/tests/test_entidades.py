@@ -0,0 +1,142 @@
+"""Cadastro de pessoas/advogados (app.entidades) e seus leitores, no banco da fixture `banco`."""
+import asyncio
+import csv
+import io
+import zipfile
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app import database, exportacoes
+from app.entidades import chave_advogado, oab_principal, preencher_vinculos
+from app.persistencia import salvar_processos_em_lote
+from app.versoes import confirmar
+
+TRIBUNAL = "TENT"
+CREDOR_CPF = "111.222.333-44"
+ADVOGADO_CPF = "555.666.777-88"
+
+
+def test_chave_do_advogado_e_o_cpf_ou_a_primeira_oab():
+    assert chave_advogado("55566677788", [("SP", 1)]) == "cpf:55566677788"
+    assert chave_advogado(None, [("sp", 9), ("RJ", 3), (None, 1)]) == "oab:RJ:3"
+    assert chave_advogado(None, [("SP", None)]) is None
+    assert oab_principal([]) is None
+
+
+def _payload(numero_cnj: str, fonte_id: int) -> dict:
+    return {
+        "numero_cnj": numero_cnj,
+        "unidade_origem": {"tribunal_sigla": TRIBUNAL},
+        "fontes": [{
+            "id": fonte_id,
+            "processo_fonte_id": fonte_id,
+            "envolvidos": [
+                {
+                    "nome": "Maria Credora",
+                    "polo": "ATIVO",
+                    "cpf": CREDOR_CPF,
+                    "advogados": [
+                        {"nome": "Advogado Repetido", "cpf": ADVOGADO_CPF, "oabs": [{"uf": "SP", "numero": "1000"}]},
+                        {"nome": "Advogada Sem CPF", "oabs": [{"uf": "RJ", "numero": "2000"}]},
+                    ],
+                },
+                {"nome": "Sem Documento", "polo": "ATIVO"},
+                {"nome": "Estado de São Paulo", "polo": "PASSIVO", "cnpj": "46.379.400/0001-50"},
+            ],
+        }],
+    }
+
+
+async def _salvar(sessao, payloads):
+    async with sessao() as session:
+        await salvar_processos_em_lote(session, payloads)
+        await confirmar(session)
+
+
+async def _consultar(engine, sql, **parametros):
+    async with engine.connect() as conn:
+        return (await conn.execute(text(sql), parametros)).all()
+
+
+async def _executar(engine, sql, **parametros):
+    async with engine.begin() as conn:
+        await conn.execute(text(sql), parametros)
+
+
+@pytest.fixture(scope="module")
+def gravados(banco):
+    """Dois processos do TRIBUNAL com a mesma credora e o mesmo advogado."""
+    sessao = sessionmaker(banco, expire_on_commit=False, class_=AsyncSession)
+    original = database.AsyncSessionLocal
+    database.AsyncSessionLocal = sessao
+    try:
+        asyncio.run(_salvar(sessao, [_payload("CNJ-ENT-1", 9001), _payload("CNJ-ENT-2", 9002)]))
+    finally:
+        database.AsyncSessionLocal = original
+    return sessao
+
+
+def test_pessoas_e_advogados_repetidos_viram_uma_linha(banco, gravados):
+    pessoas = asyncio.run(_consultar(banco, "SELECT documento FROM pessoas WHERE documento IN ('11122233344', '46379400000150')"))
+    advogados = asyncio.run(_consultar(banco, "SELECT chave FROM advogados WHERE chave IN ('cpf:55566677788', 'oab:RJ:2000')"))
+
+    assert sorted(d for d, in pessoas) == ["11122233344", "46379400000150"]
+    assert sorted(c for c, in advogados) == ["cpf:55566677788", "oab:RJ:2000"]
+
+
+def test_vinculos_apontam_para_o_mesmo_cadastro(banco, gravados):
+    vinculos = asyncio.run(_consultar(banco, """
+        SELECT p.numero_cnj, v.polo, pe.documento FROM fontes_pessoas v
+        JOIN processos p ON p.id = v.processo_id JOIN pessoas pe ON pe.id = v.pessoa_id
+        WHERE p.numero_cnj IN ('CNJ-ENT-1', 'CNJ-ENT-2') ORDER BY 1, 2
+    """))
+    advogados = asyncio.run(_consultar(banco, """
+        SELECT p.numero_cnj, a.chave, pe.documento FROM fontes_advogados v
+        JOIN processos p ON p.id = v.processo_id JOIN advogados a ON a.id = v.advogado_id
+        JOIN pessoas pe ON pe.id = v.pessoa_id
+        WHERE p.numero_cnj IN ('CNJ-ENT-1', 'CNJ-ENT-2') ORDER BY 1, 2
+    """))
+
+    # O envolvido sem documento não tem vínculo
+    assert [tuple(v) for v in vinculos] == [
+        ("CNJ-ENT-1", "ATIVO", "11122233344"), ("CNJ-ENT-1", "PASSIVO", "46379400000150"),
+        ("CNJ-ENT-2", "ATIVO", "11122233344"), ("CNJ-ENT-2", "PASSIVO", "46379400000150"),
+    ]
+    assert [tuple(a) for a in advogados] == [
+        ("CNJ-ENT-1", "cpf:55566677788", "11122233344"), ("CNJ-ENT-1", "oab:RJ:2000", "11122233344"),
+        ("CNJ-ENT-2", "cpf:55566677788", "11122233344"), ("CNJ-ENT-2", "oab:RJ:2000", "11122233344"),
+    ]
+
+
+def test_preenchimento_vincula_so_processos_sem_vinculo(banco, gravados, monkeypatch):
+    monkeypatch.setattr(database, "AsyncSessionLocal", gravados)
+    ids = asyncio.run(_consultar(banco, "SELECT id FROM processos WHERE numero_cnj IN ('CNJ-ENT-1', 'CNJ-ENT-2') ORDER BY id"))
+    sem_vinculo, vinculado = (i for i, in ids)
+    asyncio.run(_executar(banco, "DELETE FROM fontes_pessoas WHERE processo_id = :id", id=sem_vinculo))
+    asyncio.run(_executar(banco, "DELETE FROM fontes_advogados WHERE processo_id = :id", id=sem_vinculo))
+    antes = asyncio.run(_consultar(banco, "SELECT id FROM fontes_pessoas WHERE processo_id = :id", id=vinculado))
+
+    assert asyncio.run(preencher_vinculos(sem_vinculo - 1, vinculado)) == 1
+
+    contagem = "SELECT count(*) FROM {} WHERE processo_id = :id"
+    assert asyncio.run(_consultar(banco, contagem.format("fontes_pessoas"), id=sem_vinculo))[0][0] == 2
+    assert asyncio.run(_consultar(banco, contagem.format("fontes_advogados"), id=sem_vinculo))[0][0] == 2
+    assert asyncio.run(_consultar(banco, "SELECT id FROM fontes_pessoas WHERE processo_id = :id", id=vinculado)) == antes
+
+
+def test_lemitt_lista_cada_advogado_do_cadastro_uma_vez(banco, gravados, monkeypatch, tmp_path):
+    monkeypatch.setattr(exportacoes, "AsyncSessionRelatorios", gravados)
+    destino = tmp_path / "lemitt.zip"
+
+    asyncio.run(exportacoes.gerar_relatorio("lemitt", TRIBUNAL, str(destino), datetime(2026, 10, 1)))
+
+    with zipfile.ZipFile(destino) as arquivo:
+        nome = next(n for n in arquivo.namelist() if "advogados" in n)
+        linhas = list(csv.DictReader(io.TextIOWrapper(arquivo.open(nome), encoding="utf-8"), delimiter=";"))
+    assert [(l["CPF do Advogado"], l["OAB"], l["Estado da OAB"], l["CNPJ / CPF do Credor"], l["Tipo do Credor"])
+            for l in linhas] == [("55566677788", "1000", "SP", "11122233344", "Pessoa Física")]
+    assert linhas[0]["Número dos Autos do Precatório"] == "CNJ-ENT-1"
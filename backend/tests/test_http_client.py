@@ -0,0 +1,65 @@
+import asyncio
+import socket
+
+from aiohttp import web
+
+from app.http_client import ClienteHttp
+
+
+async def _com_servidor(teste):
+    """Sobe um servidor HTTP local (com keep-alive) e roda `teste(url)` contra ele."""
+    async def ok(request):
+        return web.json_response({"ok": True})
+
+    aplicacao = web.Application()
+    aplicacao.router.add_get("/", ok)
+    runner = web.AppRunner(aplicacao)
+    await runner.setup()
+    soquete = socket.socket()
+    soquete.bind(("127.0.0.1", 0))
+    porta = soquete.getsockname()[1]
+    await web.SockSite(runner, soquete).start()
+    try:
+        return await teste(f"http://127.0.0.1:{porta}/")
+    finally:
+        await runner.cleanup()
+
+
+def test_requisicoes_em_sequencia_reusam_a_conexao():
+    cliente = ClienteHttp(limite=10, limite_por_host=5)
+
+    async def teste(url):
+        sessao = await cliente.abrir()
+        # Aberto uma vez só: o segundo abrir devolve a mesma sessão
+        assert await cliente.abrir() is sessao
+        for _ in range(3):
+            async with sessao.get(url) as resposta:
+                assert (await resposta.json()) == {"ok": True}
+        metricas = cliente.metricas()
+        await cliente.fechar()
+        return metricas
+
+    metricas = asyncio.run(_com_servidor(teste))
+
+    assert metricas["requisicoes"] == 3
+    assert (metricas["conexoes_novas"], metricas["conexoes_reusadas"]) == (1, 2)
+    assert metricas["taxa_reuso"] == round(2 / 3, 4)
+    assert metricas["aberto"] is True
+    assert (metricas["limite_conexoes"], metricas["limite_por_host"]) == (10, 5)
+    assert cliente.metricas()["aberto"] is False
+
+
+def test_abrir_depois_de_fechar_cria_outra_sessao():
+    cliente = ClienteHttp()
+
+    async def teste():
+        primeira = await cliente.abrir()
+        await cliente.fechar()
+        segunda = await cliente.abrir()
+        await cliente.fechar()
+        return primeira, segunda
+
+    primeira, segunda = asyncio.run(teste())
+
+    assert primeira is not segunda and primeira.closed
+    assert cliente.metricas()["taxa_reuso"] is None
@@ -0,0 +1,36 @@
+"""Retomada dos jobs de ingestão (app.jobs) no banco da fixture `banco`."""
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app import jobs
+from app.jobs import JOB_CANCELADO, JOB_PENDENTE, JOB_RECEBENDO
+
+
+async def _criar_jobs(engine, *estados) -> list:
+    async with engine.begin() as conn:
+        result = await conn.execute(text(
+            "INSERT INTO ingestao_jobs (nome_arquivo, status, total, criado_em) "
+            "SELECT 'lista.csv', estado, 0, now() FROM unnest(CAST(:estados AS text[])) AS estado RETURNING id"
+        ), {"estados": list(estados)})
+        return result.scalars().all()
+
+
+async def _estados(engine, ids) -> list:
+    async with engine.connect() as conn:
+        result = await conn.execute(text("SELECT status FROM ingestao_jobs WHERE id = ANY(:ids) ORDER BY id"), {"ids": ids})
+        return result.scalars().all()
+
+
+def test_retomada_cancela_recebimentos_interrompidos(banco, monkeypatch):
+    monkeypatch.setattr(jobs, "AsyncSessionLocal", sessionmaker(banco, expire_on_commit=False, class_=AsyncSession))
+    iniciados = []
+    monkeypatch.setattr(jobs, "iniciar_job", iniciados.append)
+    recebendo, pendente = asyncio.run(_criar_jobs(banco, JOB_RECEBENDO, JOB_PENDENTE))
+
+    asyncio.run(jobs.retomar_jobs())
+
+    assert asyncio.run(_estados(banco, [recebendo, pendente])) == [JOB_CANCELADO, JOB_PENDENTE]
+    assert recebendo not in iniciados and pendente in iniciados
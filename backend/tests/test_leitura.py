@@ -0,0 +1,58 @@
+import pytest
+
+from app.leitura import TAMANHO_AMOSTRA, _celula_como_texto, detectar_formato_csv, ler_csv_em_chunks
+
+
+def _arquivo(tmp_path, conteudo: bytes):
+    caminho = tmp_path / "planilha.csv"
+    caminho.write_bytes(conteudo)
+    return str(caminho)
+
+
+@pytest.mark.parametrize("separador", [";", ",", "\t", "|"])
+def test_detecta_separador(tmp_path, separador):
+    texto = separador.join(["numero", "nome", "valor"]) + "\n" + separador.join(["1", "José", "10"]) + "\n"
+
+    assert detectar_formato_csv(_arquivo(tmp_path, texto.encode())) == ("utf-8", separador)
+
+
+def test_detecta_bom_utf8(tmp_path):
+    caminho = _arquivo(tmp_path, b"\xef\xbb\xbfnumero;nome\n1;Jo\xc3\xa3o\n")
+
+    assert detectar_formato_csv(caminho) == ("utf-8-sig", ";")
+    df = next(ler_csv_em_chunks(caminho))
+    assert list(df.columns) == ["numero", "nome"]
+
+
+def test_arquivo_que_nao_e_utf8_usa_o_encoding_detectado(tmp_path):
+    texto = "numero;nome;cidade\n" + "1;Conceição;São João\n" * 50
+    caminho = _arquivo(tmp_path, texto.encode("latin-1"))
+
+    assert detectar_formato_csv(caminho)[1] == ";"
+    assert next(ler_csv_em_chunks(caminho))["nome"].iloc[0] == "Conceição"
+
+
+def test_amostra_cortada_no_meio_de_um_caractere_continua_utf8(tmp_path):
+    cabecalho = b"numero;nome\n"
+    linha = "1;Ação\n".encode()
+    conteudo = cabecalho + linha * (TAMANHO_AMOSTRA // len(linha) + 10)
+    # Garante que o byte TAMANHO_AMOSTRA cai dentro de um "ç" ou "ã"
+    while conteudo[TAMANHO_AMOSTRA - 1] < 0x80 or conteudo[TAMANHO_AMOSTRA] >= 0xc0 or conteudo[TAMANHO_AMOSTRA] < 0x80:
+        conteudo = b"x" + conteudo
+
+    assert detectar_formato_csv(_arquivo(tmp_path, conteudo)) == ("utf-8", ";")
+
+
+def test_separador_indetectavel_usa_virgula(tmp_path):
+    assert detectar_formato_csv(_arquivo(tmp_path, b"numero\n1\n2\n"))[1] == ","
+
+
+@pytest.mark.parametrize("valor, texto", [
+    (None, None),
+    (12345678901234.0, "12345678901234"),
+    (1.5, "1.5"),
+    (42, "42"),
+    ("0001", "0001"),
+])
+def test_celula_como_texto(valor, texto):
+    assert _celula_como_texto(valor) == texto
@@ -0,0 +1,80 @@
+import asyncio
+
+from app import migracoes
+from app.migracoes import MIGRACOES, Preenchimento
+
+
+class _Resultado:
+    def __init__(self, valor=None):
+        self.valor = valor
+
+    def scalar(self):
+        return self.valor
+
+
+class _ConexaoFalsa:
+    """Registra os comandos executados; `max(...)` devolve o máximo informado."""
+
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self.comandos = []
+
+    async def execute(self, comando, parametros=None):
+        sql = str(comando)
+        self.comandos.append((sql, parametros))
+        return _Resultado(self.maximo if sql.startswith("SELECT max(") else None)
+
+    def faixas(self):
+        return [(p["de"], p["ate"]) for sql, p in self.comandos if sql.lstrip().startswith("UPDATE")]
+
+
+PREENCHIMENTO = Preenchimento("teste", "tabela", "UPDATE tabela SET x = 1 WHERE id > :de AND id <= :ate")
+
+
+def test_preenchimento_percorre_a_chave_em_lotes(monkeypatch):
+    monkeypatch.setattr(migracoes, "LOTE_PREENCHIMENTO", 5000)
+    conn = _ConexaoFalsa(maximo=12_000)
+    asyncio.run(migracoes._preencher(conn, PREENCHIMENTO, 0))
+
+    assert conn.faixas() == [(0, 5000), (5000, 10_000), (10_000, 12_000)]
+    assert "concluido_em" in conn.comandos[-1][0]
+
+
+def test_preenchimento_interrompido_continua_de_onde_parou(monkeypatch):
+    monkeypatch.setattr(migracoes, "LOTE_PREENCHIMENTO", 5000)
+    conn = _ConexaoFalsa(maximo=12_000)
+    asyncio.run(migracoes._preencher(conn, PREENCHIMENTO, 10_000))
+
+    assert conn.faixas() == [(10_000, 12_000)]
+
+
+def test_migracoes_nao_tem_update_nos_comandos():
+    # Backfill em tabela inteira no startup seguraria o lock das migrações
+    for migracao in MIGRACOES:
+        for comando in migracao.comandos:
+            assert not comando.lstrip().upper().startswith("UPDATE"), migracao.versao
+
+
+def test_comandos_dos_preenchimentos_usam_a_faixa():
+    for migracao in MIGRACOES:
+        for preenchimento in migracao.preenchimentos:
+            if preenchimento.comando:
+                assert f"{preenchimento.chave} > :de" in preenchimento.comando
+                assert f"{preenchimento.chave} <= :ate" in preenchimento.comando
+
+
+def test_preenchimento_em_python_recebe_as_faixas(monkeypatch):
+    monkeypatch.setattr(migracoes, "LOTE_PREENCHIMENTO", 5000)
+    faixas = []
+
+    async def funcao(de, ate):
+        faixas.append((de, ate))
+
+    asyncio.run(migracoes._preencher(_ConexaoFalsa(maximo=7000), Preenchimento("teste", "processos", funcao=funcao), 0))
+
+    assert faixas == [(0, 5000), (5000, 7000)]
+
+
+def test_resumo_dos_processos_antigos_e_preenchido_por_migracao():
+    nomes = [p.nome for m in MIGRACOES for p in m.preenchimentos]
+    assert "precatorios_resumo.processos_antigos" in nomes
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import time
+
+from app import monitor_loop as modulo
+from app.monitor_loop import MonitorLoop, MonitorLoopMiddleware
+
+
+def _bloquear_o_loop(monitor, segundos):
+    async def teste():
+        monitor.iniciar()
+        await asyncio.sleep(0.1)
+        time.sleep(segundos)  # código síncrono no loop
+        await asyncio.sleep(0.1)
+        monitor.parar()
+
+    asyncio.run(teste())
+
+
+def test_bloqueio_e_registrado_com_a_pilha_do_loop(caplog):
+    monitor = MonitorLoop(limite_ms=100, intervalo_ms=20)
+
+    with caplog.at_level(logging.WARNING, logger="app.monitor_loop"):
+        _bloquear_o_loop(monitor, 0.5)
+
+    assert monitor.bloqueios >= 1
+    assert monitor.maior_bloqueio_ms >= 300
+    # A thread vigia avisa durante o bloqueio, com a pilha de onde o loop está preso
+    durante = [r.getMessage() for r in caplog.records if "bloqueado há" in r.getMessage()]
+    assert durante and "_bloquear_o_loop" in durante[0]
+
+
+def test_sem_bloqueio_nada_e_registrado():
+    monitor = MonitorLoop(limite_ms=200, intervalo_ms=20)
+    _bloquear_o_loop(monitor, 0)
+
+    assert monitor.metricas()["bloqueios"] == 0
+
+
+def test_limite_zero_desliga_o_monitor():
+    monitor = MonitorLoop(limite_ms=0)
+
+    async def teste():
+        monitor.iniciar()
+        return monitor._tarefa, monitor._vigia
+
+    assert asyncio.run(teste()) == (None, None)
+
+
+def test_middleware_registra_a_requisicao_em_andamento(monkeypatch):
+    monitor = MonitorLoop()
+    monkeypatch.setattr(modulo, "monitor_loop", monitor)
+    durante = []
+
+    async def app(scope, receive, send):
+        durante.extend(monitor.requisicoes())
+
+    asyncio.run(MonitorLoopMiddleware(app)({"type": "http", "method": "GET", "path": "/relatorios"}, None, None))
+
+    assert len(durante) == 1 and durante[0].startswith("GET /relatorios (")
+    assert monitor.em_andamento == {}
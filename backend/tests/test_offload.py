@@ -0,0 +1,63 @@
+import asyncio
+import os
+import threading
+import time
+
+from app import offload
+from app.offload import em_processo, em_thread, iterar_em_thread
+
+
+def test_em_thread_nao_trava_o_loop():
+    batimentos = []
+
+    async def bater():
+        while True:
+            batimentos.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def teste():
+        tarefa = asyncio.create_task(bater())
+        await asyncio.sleep(0)
+        thread = await em_thread(lambda: (time.sleep(0.2), threading.get_ident())[1])
+        tarefa.cancel()
+        return thread
+
+    thread = asyncio.run(teste())
+
+    assert thread != threading.get_ident()
+    # O loop continuou batendo enquanto a thread dormia
+    assert len(batimentos) >= 5
+
+
+def test_iterar_em_thread_fecha_o_gerador_se_parar_antes():
+    estado = {"fechado": False, "threads": set()}
+
+    def gerar():
+        try:
+            for i in range(10):
+                estado["threads"].add(threading.get_ident())
+                yield i
+        finally:
+            estado["fechado"] = True
+
+    async def consumir(limite):
+        itens = []
+        async for item in iterar_em_thread(gerar()):
+            itens.append(item)
+            if len(itens) == limite:
+                break
+        return itens
+
+    assert asyncio.run(consumir(3)) == [0, 1, 2]
+    assert estado["fechado"]
+    assert threading.get_ident() not in estado["threads"]
+    assert asyncio.run(consumir(None)) == list(range(10))
+
+
+def test_em_processo_roda_em_outro_processo():
+    try:
+        pid = asyncio.run(em_processo(os.getpid))
+    finally:
+        offload.encerrar()
+
+    assert pid != os.getpid()
@@ -0,0 +1,266 @@
+import asyncio
+from datetime import datetime, timezone
+from itertools import count
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app import database
+from app.models import OAB, Advogado, Capa, Envolvido, Fonte, Processo, ValorCausa
+from app.persistencia import (
+    DiffProcessos,
+    PlanoEscrita,
+    _parear,
+    reservar_ids,
+    linha_advogado,
+    linha_capa,
+    linha_envolvido,
+    linha_fonte,
+    linha_oab,
+    linha_processo,
+    linha_valor_causa,
+    salvar_processos_em_lote,
+)
+from app.versoes import confirmar
+
+SINCRONIZADO_EM = datetime(2026, 10, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _payload(numero_oab="123456"):
+    return {
+        "numero_cnj": "0000001-00.2020.8.26.0000",
+        "titulo_polo_ativo": "Fulano",
+        "data_inicio": "2020-01-02",
+        "data_ultima_verificacao": "2026-09-30T10:00:00+00:00",
+        "unidade_origem": {"tribunal_sigla": "TJSP"},
+        "fontes": [{
+            "id": 7,
+            "processo_fonte_id": 70,
+            "nome": "TJSP",
+            "capa": {"classe": "Precatório", "valor_causa": {"valor": "1500.50", "moeda": "R$"}},
+            "envolvidos": [{
+                "nome": "Fulano",
+                "polo": "ATIVO",
+                "cpf": "123.456.789-01",
+                "advogados": [{"nome": "Advogada", "cpf": "98765432100", "oabs": [{"uf": "SP", "numero": numero_oab}]}],
+            }],
+        }],
+    }
+
+
+def _gravado(data, sincronizado_em=None):
+    """Grafo como viria do banco depois de gravar `data` (objetos transientes, ids sequenciais)."""
+    ids = count(1)
+    processo = Processo(id=next(ids), sincronizado_em=sincronizado_em, **linha_processo(data))
+    processo.processos_relacionados = []
+    processo.fontes = []
+    for f in data["fontes"]:
+        fonte = Fonte(id=next(ids), **linha_fonte(f))
+        fonte.audiencias = []
+        fonte.capa = Capa(id=next(ids), **linha_capa(f["capa"]))
+        fonte.capa.valor_causa = ValorCausa(id=next(ids), **linha_valor_causa(f["capa"]["valor_causa"]))
+        fonte.capa.informacoes_complementares = []
+        fonte.envolvidos = []
+        for e in f["envolvidos"]:
+            env = Envolvido(id=next(ids), **linha_envolvido(e))
+            env.advogados = []
+            for a in e["advogados"]:
+                adv = Advogado(id=next(ids), **linha_advogado(a))
+                adv.oabs = [OAB(id=next(ids), **linha_oab(o)) for o in a["oabs"]]
+                env.advogados.append(adv)
+            fonte.envolvidos.append(env)
+        processo.fontes.append(fonte)
+    return processo
+
+
+def _escritas(diff):
+    return (
+        {m.__name__: linhas for m, linhas in diff.atualizacoes.items() if linhas},
+        {m.__name__: ids for m, ids in diff.remocoes.items() if ids},
+        diff.plano.vazio(),
+    )
+
+
+class _SessaoFalsa:
+    def __init__(self):
+        self.comandos = []
+
+    async def execute(self, stmt, parametros=None):
+        self.comandos.append(str(stmt))
+
+
+def test_processo_sem_mudancas_so_recebe_sincronizado_em():
+    diff = DiffProcessos(SINCRONIZADO_EM)
+    diff.processo(_gravado(_payload(), sincronizado_em=datetime(2026, 1, 1, tzinfo=timezone.utc)), _payload())
+
+    assert _escritas(diff) == ({}, {}, True)
+    assert diff.sincronizados == [1]
+    assert diff.alterados == []
+
+
+def test_sincronizado_em_vai_num_update_unico_do_lote():
+    diff = DiffProcessos(SINCRONIZADO_EM)
+    for _ in range(3):
+        diff.processo(_gravado(_payload()), _payload())
+    sessao = _SessaoFalsa()
+    asyncio.run(diff.aplicar(sessao))
+
+    assert len(sessao.comandos) == 1
+    assert sessao.comandos[0].startswith("UPDATE processos SET sincronizado_em")
+
+
+@pytest.mark.parametrize("numero_payload", ["123456", 123456])
+def test_numero_da_oab_em_texto_ou_inteiro_nao_e_mudanca(numero_payload):
+    gravado = _gravado(_payload(numero_oab=123456))
+    diff = DiffProcessos()
+    diff.processo(gravado, _payload(numero_oab=numero_payload))
+
+    assert gravado.fontes[0].envolvidos[0].advogados[0].oabs[0].numero == 123456
+    assert _escritas(diff) == ({}, {}, True)
+
+
+def test_coluna_alterada_gera_update_so_dela():
+    novo = _payload()
+    novo["titulo_polo_ativo"] = "Fulano de Tal"
+    novo["fontes"][0]["capa"]["valor_causa"]["valor"] = "2000"
+    diff = DiffProcessos()
+    diff.processo(_gravado(_payload()), novo)
+
+    atualizacoes, remocoes, plano_vazio = _escritas(diff)
+    assert atualizacoes == {
+        "Processo": [{"id": 1, "titulo_polo_ativo": "Fulano de Tal"}],
+        "ValorCausa": [{"id": 4, "valor": 2000.0}],
+    }
+    assert remocoes == {} and plano_vazio
+    assert diff.alterados == [1]
+    assert diff.revinculados == []
+
+
+def test_mudanca_em_advogado_refaz_os_vinculos_do_processo():
+    diff = DiffProcessos()
+    diff.processo(_gravado(_payload(numero_oab=123456)), _payload(numero_oab=654321))
+
+    assert diff.alterados == [1]
+    assert diff.revinculados == [1]
+
+
+def test_parear_casa_chaves_repetidas_em_ordem():
+    armazenados = [("a", 1), ("b", 2), ("a", 3)]
+    novos = [("a", "x"), ("a", "y")]
+
+    pares, sobras, novas = _parear(armazenados, novos, lambda o: o[0], lambda n: n[0])
+
+    assert pares == [(("a", 1), ("a", "x")), (("a", 3), ("a", "y"))]
+    assert sobras == [("b", 2)]
+    assert novas == []
+
+
+def test_parear_devolve_sobras_dos_dois_lados():
+    armazenados = [("a", 1), ("a", 2)]
+    novos = [("a", "x"), ("c", "y")]
+
+    pares, sobras, novas = _parear(armazenados, novos, lambda o: o[0], lambda n: n[0])
+
+    assert pares == [(("a", 1), ("a", "x"))]
+    assert sobras == [("a", 2)]
+    assert novas == [("c", "y")]
+
+
+class _SessaoComSequences:
+    """Reserva ids de sequences falsas (uma por tabela) e guarda cada INSERT com as linhas enviadas."""
+
+    def __init__(self):
+        self.reservas = []
+        self.inserts = []
+        self._sequences = {}
+
+    async def execute(self, stmt, parametros=None):
+        if parametros and "n" in parametros:
+            tabela = str(stmt).split("pg_get_serial_sequence('")[1].split("'")[0]
+            inicio = self._sequences.get(tabela, 1000)
+            self._sequences[tabela] = inicio + parametros["n"]
+            self.reservas.append((tabela, parametros["n"]))
+            return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: list(range(inicio, inicio + parametros["n"]))))
+        self.inserts.append((stmt.table.name, [dict(linha) for linha in parametros]))
+
+
+def test_plano_reserva_ids_em_bloco_e_liga_os_filhos():
+    plano = PlanoEscrita()
+    segundo = _payload()
+    segundo["fontes"][0]["envolvidos"].append({"nome": "Beltrano", "polo": "ATIVO", "advogados": []})
+    plano.adicionar_processo(1, _payload())
+    plano.adicionar_processo(2, segundo)
+    sessao = _SessaoComSequences()
+
+    asyncio.run(plano.aplicar(sessao))
+
+    # Uma reserva por tabela com filhos, com o total do lote; um INSERT por tabela
+    assert sessao.reservas == [("fontes", 2), ("fontes_capas", 2), ("fontes_envolvidos", 3), ("envolvidos_advogados", 2)]
+    inserts = dict(sessao.inserts)
+    assert list(inserts) == ["fontes", "fontes_capas", "capa_valores_causa", "fontes_envolvidos", "envolvidos_advogados", "advogados_oabs"]
+    assert [(f["id"], f["processo_id"]) for f in inserts["fontes"]] == [(1000, 1), (1001, 2)]
+    assert [(c["id"], c["fonte_id"]) for c in inserts["fontes_capas"]] == [(1000, 1000), (1001, 1001)]
+    assert [v["capa_id"] for v in inserts["capa_valores_causa"]] == [1000, 1001]
+    assert [(e["id"], e["fonte_id"], e["nome"]) for e in inserts["fontes_envolvidos"]] == [
+        (1000, 1000, "Fulano"), (1001, 1001, "Fulano"), (1002, 1001, "Beltrano"),
+    ]
+    assert [(a["id"], a["envolvido_id"]) for a in inserts["envolvidos_advogados"]] == [(1000, 1000), (1001, 1001)]
+    assert [o["advogado_id"] for o in inserts["advogados_oabs"]] == [1000, 1001]
+
+
+async def _salvar(sessao, payload, atualizar_existentes):
+    async with sessao() as session:
+        await salvar_processos_em_lote(session, [payload], atualizar_existentes=atualizar_existentes)
+        await confirmar(session)
+
+
+async def _estado_gravado(engine, numero_cnj):
+    """Versão do tribunal e marcas das linhas do resumo e dos vínculos (mudam se forem reescritas)."""
+    async with engine.connect() as conn:
+        return (await conn.execute(text(
+            """
+            SELECT (SELECT versao FROM tribunais_versoes WHERE tribunal_sigla = r.tribunal_sigla),
+                   r.atualizado_em,
+                   (SELECT array_agg(a.id ORDER BY a.id) FROM precatorios_resumo_advogados a
+                    WHERE a.processo_id = r.processo_id),
+                   (SELECT array_agg(v.id ORDER BY v.id) FROM fontes_pessoas v
+                    JOIN fontes f ON f.id = v.fonte_id WHERE f.processo_id = r.processo_id),
+                   (SELECT array_agg(v.id ORDER BY v.id) FROM fontes_advogados v
+                    JOIN fontes f ON f.id = v.fonte_id WHERE f.processo_id = r.processo_id)
+            FROM precatorios_resumo r WHERE r.numero_cnj = :cnj
+            """
+        ), {"cnj": numero_cnj})).one()
+
+
+def test_payload_igual_nao_reescreve_resumo_vinculos_nem_versao(banco, monkeypatch):
+    sessao = sessionmaker(banco, expire_on_commit=False, class_=AsyncSession)
+    monkeypatch.setattr(database, "AsyncSessionLocal", sessao)
+    payload = _payload()
+    payload["numero_cnj"] = "CNJ-RESUMO-IGUAL"
+    asyncio.run(_salvar(sessao, payload, atualizar_existentes=False))
+    gravado = asyncio.run(_estado_gravado(banco, payload["numero_cnj"]))
+    assert all(gravado)
+
+    asyncio.run(_salvar(sessao, payload, atualizar_existentes=True))
+    assert asyncio.run(_estado_gravado(banco, payload["numero_cnj"])) == gravado
+
+    payload["titulo_polo_ativo"] = "Fulano de Tal"
+    asyncio.run(_salvar(sessao, payload, atualizar_existentes=True))
+    assert asyncio.run(_estado_gravado(banco, payload["numero_cnj"]))[0] == gravado[0] + 1
+
+
+def test_ids_reservados_nao_voltam_para_a_sequence(banco):
+    async def reservar():
+        async with AsyncSession(banco) as session:
+            reservados = await reservar_ids(session, "fontes", 3)
+            seguinte = (await session.execute(text("SELECT nextval(pg_get_serial_sequence('fontes', 'id'))"))).scalar()
+            await session.rollback()
+        return reservados, seguinte
+
+    reservados, seguinte = asyncio.run(reservar())
+
+    assert len(set(reservados)) == 3
+    assert seguinte > max(reservados)
@@ -0,0 +1,22 @@
+"""
+Planos das consultas dos relatórios num banco com volume realista (fixture
+`banco`), sem forçar índices: um Seq Scan aqui é o que o planejador escolheria
+em produção.
+"""
+import asyncio
+
+import pytest
+
+from app.planos import consultas_relatorio, verificar_planos
+
+TRIBUNAL = "T07"
+
+
+@pytest.fixture(scope="module")
+def planos(banco):
+    return asyncio.run(verificar_planos(banco, TRIBUNAL))
+
+
+@pytest.mark.parametrize("consulta", sorted(consultas_relatorio(TRIBUNAL)))
+def test_consulta_do_relatorio_usa_indice(planos, consulta):
+    assert planos[consulta] == [], f"Seq Scan em {planos[consulta]}"
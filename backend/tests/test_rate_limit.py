@@ -0,0 +1,110 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app import rate_limit
+from app.consultas import _retry_after
+from app.rate_limit import LimitadorAdaptativo
+
+
+class Relogio:
+    """Relógio falso: asyncio.sleep no limitador só avança o tempo."""
+
+    def __init__(self):
+        self.agora = 0.0
+
+    async def dormir(self, segundos):
+        self.agora += segundos
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = Relogio()
+    monkeypatch.setattr(rate_limit, "asyncio", SimpleNamespace(Lock=asyncio.Lock, sleep=relogio.dormir))
+    monkeypatch.setattr(LimitadorAdaptativo, "_relogio", lambda self: relogio.agora)
+    return relogio
+
+
+def _adquirir(limitador, vezes):
+    async def adquirir():
+        for _ in range(vezes):
+            await limitador.adquirir()
+    asyncio.run(adquirir())
+
+
+def test_sucesso_aumenta_a_taxa_aos_poucos_ate_o_maximo():
+    limitador = LimitadorAdaptativo(taxa_inicial=1, taxa_maxima=1.2, incremento=0.1)
+    limitador.registrar_sucesso()
+    assert limitador.taxa == pytest.approx(1.1)
+    for _ in range(5):
+        limitador.registrar_sucesso()
+    assert limitador.taxa == 1.2
+
+
+def test_429_reduz_a_taxa_pela_metade_ate_o_minimo(relogio):
+    limitador = LimitadorAdaptativo(taxa_inicial=8, taxa_minima=1.5, fator_reducao=0.5)
+    limitador.registrar_limite()
+    assert limitador.taxa == 4
+    limitador.registrar_limite()
+    limitador.registrar_limite()
+    assert limitador.taxa == 1.5
+    assert limitador.total_limitado == 3
+
+
+def test_rajada_de_429_concorrentes_reduz_a_taxa_uma_vez(relogio):
+    limitador = LimitadorAdaptativo(taxa_inicial=8, capacidade=5, fator_reducao=0.5)
+
+    async def rajada():
+        requisicoes = await asyncio.gather(*(limitador.adquirir() for _ in range(5)))
+        # As cinco saíram juntas e voltam com 429
+        for requisicao in requisicoes:
+            limitador.registrar_limite(requisicao=requisicao)
+        assert limitador.taxa == 4
+
+        # Uma requisição emitida depois da redução ainda pode reduzir de novo
+        limitador.registrar_limite(requisicao=await limitador.adquirir())
+
+    asyncio.run(rajada())
+    assert limitador.taxa == 2
+    assert limitador.total_limitado == 6
+
+
+def test_rajada_imediata_e_depois_a_taxa(relogio):
+    limitador = LimitadorAdaptativo(taxa_inicial=2, capacidade=5)
+    _adquirir(limitador, 5)
+    assert relogio.agora == 0
+
+    _adquirir(limitador, 4)
+    assert relogio.agora == pytest.approx(2.0)
+
+
+def test_429_esvazia_o_balde_e_respeita_o_retry_after(relogio):
+    limitador = LimitadorAdaptativo(taxa_inicial=10, capacidade=10, fator_reducao=0.5)
+    limitador.registrar_limite(retry_after=3)
+
+    _adquirir(limitador, 1)
+    # 3 s de pausa e, com o balde vazio, 1 token a 5 req/s
+    assert relogio.agora == pytest.approx(3.2)
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    (None, None),
+    ("", None),
+    ("7", 7.0),
+    ("1.5", 1.5),
+    ("-3", 0.0),
+    ("amanhã", None),
+])
+def test_retry_after_em_segundos(valor, esperado):
+    assert _retry_after(valor) == esperado
+
+
+def test_retry_after_em_data_http():
+    futuro = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert _retry_after(format_datetime(futuro, usegmt=True)) == pytest.approx(30, abs=2)
+
+    passado = datetime.now(timezone.utc) - timedelta(minutes=5)
+    assert _retry_after(format_datetime(passado, usegmt=True)) == 0.0
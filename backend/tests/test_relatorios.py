@@ -0,0 +1,86 @@
+"""
+Carregamento do grafo dos relatórios (app.relatorios.opcoes_grafo) no banco
+da fixture `banco`: por nível, uma consulta por bloco de 500 pais, e cada
+linha recebida vira um objeto (sem o produto cartesiano do joinedload).
+"""
+import asyncio
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Processo
+from app.relatorios import consultas_esperadas, opcoes_grafo, particoes
+from bench.bench_relatorios import NIVEIS, Contador, contar_objetos
+
+
+async def _carregar(engine, n: int) -> dict:
+    contador = Contador()
+    event.listen(engine.sync_engine, "after_cursor_execute", contador.depois_de_executar)
+    try:
+        async with AsyncSession(engine) as session:
+            result = await session.execute(
+                select(Processo).options(*opcoes_grafo(**NIVEIS)).where(Processo.id <= n).order_by(Processo.id)
+            )
+            processos = result.scalars().all()
+            objetos = contar_objetos(processos)
+            esperadas = consultas_esperadas(processos, **NIVEIS)
+    finally:
+        event.remove(engine.sync_engine, "after_cursor_execute", contador.depois_de_executar)
+    return {
+        "processos": len(processos),
+        "objetos": objetos,
+        "linhas": contador.linhas,
+        "consultas": contador.consultas,
+        "consultas_esperadas": esperadas,
+    }
+
+
+@pytest.mark.parametrize("n", [100, 500, 1200])
+def test_grafo_carregado_por_nivel(banco, n):
+    medida = asyncio.run(_carregar(banco, n))
+
+    assert medida["processos"] == n
+    assert medida["linhas"] == medida["objetos"]
+    assert medida["consultas"] == medida["consultas_esperadas"]
+
+
+def test_linhas_e_consultas_crescem_linearmente(banco):
+    pequeno, grande = (asyncio.run(_carregar(banco, n)) for n in (500, 2000))
+
+    # Grafo 4x maior: 4x as linhas e as consultas (todos os níveis em blocos cheios)
+    assert grande["linhas"] == 4 * pequeno["linhas"]
+    assert grande["consultas"] - 1 == 4 * (pequeno["consultas"] - 1)
+
+
+async def _particionar(engine, n: int, tamanho: int) -> list:
+    """Por partição: (processos, objetos na sessão, consultas emitidas para carregá-la)."""
+    contador = Contador()
+    medidas = []
+    event.listen(engine.sync_engine, "after_cursor_execute", contador.depois_de_executar)
+    try:
+        async with AsyncSession(engine) as session:
+            stmt = select(Processo).options(*opcoes_grafo(**NIVEIS)).where(Processo.id <= n).order_by(Processo.id)
+            antes = 0
+            async for particao in particoes(session, stmt, tamanho):
+                medidas.append({
+                    "processos": len(particao),
+                    "na_sessao": len(session.identity_map),
+                    "objetos": contar_objetos(particao),
+                    "consultas": contador.consultas - antes,
+                    # A consulta de processos é uma só, aberta no cursor antes da primeira partição
+                    "consultas_esperadas": consultas_esperadas(particao, **NIVEIS) - (1 if medidas else 0),
+                })
+                antes = contador.consultas
+    finally:
+        event.remove(engine.sync_engine, "after_cursor_execute", contador.depois_de_executar)
+    return medidas
+
+
+def test_particoes_carregam_o_grafo_por_particao_e_liberam_a_sessao(banco):
+    medidas = asyncio.run(_particionar(banco, 1200, 500))
+
+    assert [m["processos"] for m in medidas] == [500, 500, 200]
+    for medida in medidas:
+        # Só a partição atual fica na sessão: as anteriores já saíram
+        assert medida["na_sessao"] == medida["objetos"]
+        assert medida["consultas"] == medida["consultas_esperadas"]
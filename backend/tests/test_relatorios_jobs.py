@@ -0,0 +1,130 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app import database, relatorios_jobs
+from app.relatorios_jobs import JOB_CONCLUIDO, JOB_EXECUTANDO, JOB_FALHOU, JOB_PENDENTE
+
+
+class _SessaoFalsa:
+    def __init__(self, job):
+        self.job = job
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def get(self, modelo, job_id):
+        return self.job
+
+
+@pytest.fixture
+def ambiente(monkeypatch, tmp_path):
+    """Job em memória, pool de threads no lugar do de processos e _atualizar registrando os estados."""
+    temporario = tmp_path / ".gerando_x.csv"
+    temporario.write_text("parcial")
+    job = SimpleNamespace(
+        id=1, relatorio="csv", tribunal_sigla="TJSP", versao=3, nome_arquivo="r.csv",
+        arquivo_temporario=str(temporario), criado_em=datetime.now(timezone.utc),
+    )
+    atualizacoes = []
+
+    async def atualizar(job_id, **valores):
+        atualizacoes.append(valores)
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(database, "AsyncSessionLocal", lambda: _SessaoFalsa(job))
+    monkeypatch.setattr(relatorios_jobs, "_atualizar", atualizar)
+    monkeypatch.setattr(relatorios_jobs, "_executor", lambda: pool)
+    yield SimpleNamespace(job=job, temporario=temporario, atualizacoes=atualizacoes)
+    pool.shutdown()
+
+
+def test_excecao_inesperada_do_filho_marca_falhou(monkeypatch, ambiente):
+    def explode(*args):
+        raise TypeError("cannot pickle 'coroutine' object")
+
+    monkeypatch.setattr(relatorios_jobs, "_executar_no_processo", explode)
+    asyncio.run(relatorios_jobs._acompanhar(1))
+
+    assert ambiente.atualizacoes[-1]["status"] == JOB_FALHOU
+    assert "TypeError" in ambiente.atualizacoes[-1]["erro"]
+    assert not ambiente.temporario.exists()
+
+
+def test_falha_ao_guardar_no_cache_marca_falhou(monkeypatch, ambiente):
+    def guardar(*args):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(relatorios_jobs, "_executar_no_processo", lambda *args: None)
+    monkeypatch.setattr(relatorios_jobs.cache_relatorios, "guardar", guardar)
+    asyncio.run(relatorios_jobs._acompanhar(1))
+
+    assert ambiente.atualizacoes[-1]["status"] == JOB_FALHOU
+    assert not ambiente.temporario.exists()
+
+
+def test_sucesso_guarda_e_conclui(monkeypatch, ambiente):
+    guardados = []
+    monkeypatch.setattr(relatorios_jobs, "_executar_no_processo", lambda *args: None)
+    monkeypatch.setattr(relatorios_jobs.cache_relatorios, "guardar", lambda *args: guardados.append(args))
+    asyncio.run(relatorios_jobs._acompanhar(1))
+
+    assert ambiente.atualizacoes[-1]["status"] == JOB_CONCLUIDO
+    assert guardados[0][:3] == ("csv", "TJSP", 3)
+
+
+async def _criar_jobs_ativos(engine) -> list:
+    """Jobs ativos: de um dono vivo, de um dono sem heartbeat há uma hora e um de antes do heartbeat."""
+    async with engine.begin() as conn:
+        result = await conn.execute(text(
+            """
+            INSERT INTO relatorios_jobs (relatorio, tribunal_sigla, versao, status, processados, nome_arquivo, criado_em, dono, heartbeat_em)
+            VALUES ('csv', 'TJOB', 1, 'executando', 10, 'r.csv', now(), 'vivo:1', now()),
+                   ('csv', 'TJOB', 1, 'executando', 10, 'r.csv', now(), 'morto:1', now() - interval '1 hour'),
+                   ('csv', 'TJOB', 1, 'pendente', 0, 'r.csv', now(), NULL, NULL)
+            RETURNING id
+            """
+        ))
+        return result.scalars().all()
+
+
+def test_retomada_assume_so_os_jobs_abandonados_e_uma_vez(banco, monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "AsyncSessionLocal", sessionmaker(banco, expire_on_commit=False, class_=AsyncSession))
+    monkeypatch.setattr(relatorios_jobs.cache_relatorios, "arquivo_temporario", lambda sufixo: str(tmp_path / f"novo{sufixo}"))
+    iniciados = []
+    monkeypatch.setattr(relatorios_jobs, "iniciar_relatorio", iniciados.append)
+    vivo, abandonado, antigo = asyncio.run(_criar_jobs_ativos(banco))
+
+    async def duas_replicas():
+        return await asyncio.gather(
+            relatorios_jobs.retomar_relatorios([vivo, abandonado, antigo]),
+            relatorios_jobs.retomar_relatorios([vivo, abandonado, antigo]),
+        )
+
+    primeira, segunda = asyncio.run(duas_replicas())
+
+    # Cada job abandonado é assumido por uma réplica só; o do dono vivo fica com ele
+    assert sorted(primeira + segunda) == [abandonado, antigo]
+    assert sorted(iniciados) == [abandonado, antigo]
+
+    async def estados():
+        async with banco.connect() as conn:
+            result = await conn.execute(text(
+                "SELECT id, status, processados, dono FROM relatorios_jobs WHERE id = ANY(:ids) ORDER BY id"
+            ), {"ids": [vivo, abandonado, antigo]})
+            return result.all()
+
+    assert asyncio.run(estados()) == [
+        (vivo, JOB_EXECUTANDO, 10, "vivo:1"),
+        (abandonado, JOB_PENDENTE, 0, relatorios_jobs.DONO),
+        (antigo, JOB_PENDENTE, 0, relatorios_jobs.DONO),
+    ]
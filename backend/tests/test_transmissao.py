@@ -0,0 +1,53 @@
+import asyncio
+import os
+
+import pytest
+
+from app import main
+from app.cache_relatorios import CacheRelatorios
+from app.exportacoes import Relatorio
+
+
+async def _partes(tribunal_sigla):
+    yield "a,b\n"
+    yield "1,2\n"
+    yield "3,4\n"
+
+
+RELATORIO = Relatorio("csv", "r_{tribunal}.csv", "text/csv", por_resumo=False, gerar=None, partes=_partes)
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    cache = CacheRelatorios(str(tmp_path))
+    monkeypatch.setattr(main, "cache_relatorios", cache)
+    return cache
+
+
+def _coletar(gerador, limite=None):
+    async def coletar():
+        recebido = []
+        async for parte in gerador:
+            recebido.append(parte)
+            if len(recebido) == limite:
+                await gerador.aclose()
+                break
+        return recebido
+    return asyncio.run(coletar())
+
+
+def test_envio_completo_fica_no_cache(cache):
+    recebido = _coletar(main._partes_com_copia(RELATORIO, "TJSP", 7, "r_TJSP.csv"))
+
+    entrada = cache.obter("csv", "TJSP", 7)
+    assert entrada is not None
+    with open(entrada.caminho, encoding="utf-8") as f:
+        assert f.read() == "".join(recebido) == "a,b\n1,2\n3,4\n"
+    assert [n for n in os.listdir(cache.diretorio) if n.startswith(".gerando_")] == []
+
+
+def test_envio_interrompido_nao_entra_no_cache(cache):
+    _coletar(main._partes_com_copia(RELATORIO, "TJSP", 7, "r_TJSP.csv"), limite=1)
+
+    assert cache.obter("csv", "TJSP", 7) is None
+    assert os.listdir(cache.diretorio) == []
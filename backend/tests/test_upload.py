@@ -0,0 +1,67 @@
+import asyncio
+import io
+
+import pytest
+from fastapi import BackgroundTasks, HTTPException, UploadFile
+
+from app import main
+
+
+@pytest.fixture
+def recebimento(monkeypatch, tmp_path):
+    """Registra qual encerramento o upload deu ao job, sem banco."""
+    chamadas = []
+
+    async def criar_job(nome_arquivo):
+        return 1
+
+    async def registrar(nome, job_id):
+        chamadas.append(nome)
+
+    monkeypatch.setattr(main, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "criar_job", criar_job)
+    monkeypatch.setattr(main, "cancelar_recebimento", lambda job_id: registrar("cancelar", job_id))
+    monkeypatch.setattr(main, "finalizar_recebimento", lambda job_id: registrar("finalizar", job_id))
+    return chamadas
+
+
+def test_arquivo_sem_coluna_numero_cancela_o_job(recebimento):
+    arquivo = UploadFile(io.BytesIO(b"outra\n1\n"), filename="lista.csv")
+
+    with pytest.raises(HTTPException) as erro:
+        asyncio.run(main.upload_file(BackgroundTasks(), arquivo))
+
+    assert erro.value.status_code == 400
+    assert recebimento == ["cancelar"]
+
+
+def test_existente_repetido_em_chunks_diferentes_conta_uma_vez(recebimento, monkeypatch):
+    no_banco = {"0000001-00.2020.8.26.0001"}
+    consultados, no_job = [], set()
+
+    async def existentes(numeros):
+        consultados.append(sorted(numeros))
+        return {numero for numero in numeros if numero in no_banco}
+
+    async def adicionar_itens(job_id, numeros):
+        novos = set(numeros) - no_job
+        no_job.update(novos)
+        return len(novos)
+
+    # Dois CNJs por chunk: o existente aparece no primeiro e no último
+    ler_em_chunks = main.ler_tabela_em_chunks
+    monkeypatch.setattr(main, "ler_tabela_em_chunks", lambda caminho, nome: ler_em_chunks(caminho, nome, linhas_por_chunk=2))
+    monkeypatch.setattr(main, "_cnjs_existentes", existentes)
+    monkeypatch.setattr(main, "adicionar_itens", adicionar_itens)
+    monkeypatch.setattr(main, "iniciar_job", lambda job_id: None)
+    conteudo = "numero\n00000010020208260001\n00000020020208260001\n00000020020208260001\n00000010020208260001\n"
+    arquivo = UploadFile(io.BytesIO(conteudo.encode()), filename="lista.csv")
+
+    resposta = asyncio.run(main.upload_file(BackgroundTasks(), arquivo))
+
+    assert "1 novos precatórios" in resposta["detail"]
+    assert "1 já existiam no DB" in resposta["detail"]
+    assert "2 duplicatas internas" in resposta["detail"]
+    # Os CNJs do último chunk já tinham sido consultados
+    assert consultados == [["0000001-00.2020.8.26.0001", "0000002-00.2020.8.26.0001"], []]
+    assert recebimento == ["finalizar"]
@@ -0,0 +1,86 @@
+"""Versões dos tribunais (app.versoes) com incrementos pendentes, no banco da fixture `banco`."""
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app import database, versoes
+
+
+async def _gravar(sessao, tribunais):
+    async with sessao() as session:
+        versoes.registrar_alteracoes(session, tribunais)
+        await versoes.confirmar(session)
+
+
+async def _versao(sessao, tribunal):
+    async with sessao() as session:
+        return await versoes.versao_tribunal(session, tribunal)
+
+
+async def _linhas(sessao, tribunal):
+    async with sessao() as session:
+        publicada = (await session.execute(
+            text("SELECT versao FROM tribunais_versoes WHERE tribunal_sigla = :t"), {"t": tribunal}
+        )).scalar()
+        pendentes = (await session.execute(
+            text("SELECT count(*) FROM tribunais_versoes_pendentes WHERE tribunal_sigla = :t"), {"t": tribunal}
+        )).scalar()
+    return publicada, pendentes
+
+
+def _sessao(banco, monkeypatch):
+    sessao = sessionmaker(banco, expire_on_commit=False, class_=AsyncSession)
+    monkeypatch.setattr(database, "AsyncSessionLocal", sessao)
+    return sessao
+
+
+def test_confirmar_publica_a_versao(banco, monkeypatch):
+    sessao = _sessao(banco, monkeypatch)
+
+    asyncio.run(_gravar(sessao, ["TVER1", None]))
+    asyncio.run(_gravar(sessao, ["TVER1"]))
+
+    assert asyncio.run(_versao(sessao, "TVER1")) == 2
+    assert asyncio.run(_linhas(sessao, "TVER1")) == (2, 0)
+
+
+def test_versao_muda_no_commit_mesmo_se_a_publicacao_falhar(banco, monkeypatch):
+    sessao = _sessao(banco, monkeypatch)
+    asyncio.run(_gravar(sessao, ["TVER2"]))
+
+    async def falha():
+        raise AssertionError("não deveria publicar")
+
+    # Processo que caiu entre o commit e a publicação: o pendente fica no banco
+    monkeypatch.setattr(versoes, "publicar_versoes", falha)
+    try:
+        asyncio.run(_gravar(sessao, ["TVER2"]))
+    except AssertionError:
+        pass
+    monkeypatch.undo()
+    sessao = _sessao(banco, monkeypatch)
+
+    # A versão lida já conta o pendente: um relatório cacheado antes do commit não vale mais
+    assert asyncio.run(_versao(sessao, "TVER2")) == 2
+    assert asyncio.run(_linhas(sessao, "TVER2")) == (1, 1)
+
+    # O startup (ou o próximo confirmar) aplica o pendente sem mudar a versão lida
+    asyncio.run(versoes.publicar_versoes())
+    assert asyncio.run(_versao(sessao, "TVER2")) == 2
+    assert asyncio.run(_linhas(sessao, "TVER2")) == (2, 0)
+
+
+def test_lote_desfeito_nao_deixa_pendente(banco, monkeypatch):
+    sessao = _sessao(banco, monkeypatch)
+
+    async def desfazer():
+        async with sessao() as session:
+            versoes.registrar_alteracoes(session, ["TVER3"])
+            await versoes.anotar_pendentes(session, session.info.pop(versoes.CHAVE_ALTERADOS))
+            await session.rollback()
+
+    asyncio.run(desfazer())
+
+    assert asyncio.run(_versao(sessao, "TVER3")) == 0
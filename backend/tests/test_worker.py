@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+import pytest
+
+from app import worker
+from app.worker import PipelineIngestao
+
+
+def _executar(pipeline, numeros, timeout=5):
+    """Roda o pipeline e falha o teste se ele não terminar (com sucesso ou erro) bem antes do timeout."""
+    inicio = time.monotonic()
+    try:
+        return asyncio.run(asyncio.wait_for(pipeline.executar(numeros), timeout))
+    finally:
+        assert time.monotonic() - inicio < timeout / 2, "pipeline travado"
+
+
+def test_pipeline_processa_todos(monkeypatch):
+    gravados = []
+
+    async def consultar(session, numero):
+        return {"numero_cnj": numero}
+
+    async def persistir(self, lote):
+        gravados.extend(numero for numero, _, _ in lote)
+
+    monkeypatch.setattr(worker, "consultar_numero", consultar)
+    monkeypatch.setattr(PipelineIngestao, "_persistir", persistir)
+    pipeline = PipelineIngestao(None, fetch_workers=3, persist_workers=2, tamanho_fila=2, espera_lote=0.01)
+    _executar(pipeline, [str(i) for i in range(50)])
+    assert sorted(gravados) == sorted(str(i) for i in range(50))
+
+
+def test_gravador_morto_derruba_o_pipeline(monkeypatch):
+    async def consultar(session, numero):
+        return {"numero_cnj": numero}
+
+    async def persistir(self, lote):
+        raise ConnectionError("banco fora do ar")
+
+    monkeypatch.setattr(worker, "consultar_numero", consultar)
+    monkeypatch.setattr(PipelineIngestao, "_persistir", persistir)
+    # Fila pequena: sem supervisão os buscadores travariam na fila cheia
+    pipeline = PipelineIngestao(None, fetch_workers=2, persist_workers=1, tamanho_fila=1, lote_persistencia=1)
+    with pytest.raises(ConnectionError):
+        _executar(pipeline, [str(i) for i in range(100)])
+
+
+def test_buscador_morto_derruba_o_pipeline(monkeypatch):
+    async def buscar(self):
+        raise RuntimeError("bug no buscador")
+
+    monkeypatch.setattr(PipelineIngestao, "_buscar", buscar)
+    pipeline = PipelineIngestao(None, fetch_workers=2, persist_workers=1, tamanho_fila=1)
+    with pytest.raises(RuntimeError):
+        _executar(pipeline, [str(i) for i in range(100)])
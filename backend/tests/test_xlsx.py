@@ -0,0 +1,57 @@
+from datetime import date, datetime
+
+import openpyxl
+import pandas as pd
+
+from app.xlsx import PlanilhaStreaming
+
+COLUNAS = ["CPF", "Nome", "Valor", "Data"]
+
+
+def _gravar(caminho):
+    with PlanilhaStreaming(str(caminho)) as planilha:
+        credores = planilha.aba("Credores", COLUNAS, colunas_texto=["CPF"])
+        vazia = planilha.aba("Vazia", ["A", "B"])
+        credores.escrever_df(pd.DataFrame({
+            "CPF": ["01234567890", 12345678901],
+            "Nome": ["Fulana", None],
+            "Valor": [1500.5, float("nan")],
+            "Data": [pd.Timestamp(2024, 3, 1), pd.NaT],
+        }))
+        # Abas intercaladas: cada uma mantém a própria ordem de linhas
+        vazia.escrever_linhas([])
+        credores.escrever_dicts([{"CPF": "00000000191", "Valor": 7, "Data": date(2020, 1, 2), "Extra": "ignorado"}])
+
+
+def test_documentos_em_texto_datas_e_nulos(tmp_path):
+    caminho = tmp_path / "r.xlsx"
+    _gravar(caminho)
+
+    ws = openpyxl.load_workbook(caminho)["Credores"]
+    linhas = list(ws.iter_rows(values_only=True))
+
+    assert linhas == [
+        tuple(COLUNAS),
+        ("01234567890", "Fulana", 1500.5, datetime(2024, 3, 1)),
+        ("12345678901", None, None, None),
+        ("00000000191", None, 7, datetime(2020, 1, 2)),
+    ]
+    # Zeros à esquerda preservados: a coluna e as células de documento são texto
+    assert ws["A2"].number_format == "@" and ws["A2"].data_type == "s"
+    assert ws["D2"].number_format == "yyyy-mm-dd"
+
+
+def test_cabecalho_congelado_em_negrito_com_autofiltro(tmp_path):
+    caminho = tmp_path / "r.xlsx"
+    _gravar(caminho)
+
+    planilha = openpyxl.load_workbook(caminho)
+    credores, vazia = planilha["Credores"], planilha["Vazia"]
+
+    assert planilha.sheetnames == ["Credores", "Vazia"]
+    assert all(celula.font.bold for celula in credores[1])
+    assert credores.freeze_panes == "A2"
+    assert credores.auto_filter.ref == "A1:D4"
+    # Sem linhas, o autofiltro cobre o cabeçalho e uma linha
+    assert [c.value for c in vazia[1]] == ["A", "B"]
+    assert vazia.auto_filter.ref == "A1:B2"